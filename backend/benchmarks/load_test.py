@@ -0,0 +1,291 @@
+"""Latency, throughput and memory of /api/generate-campaign at rising concurrency.
+
+Run from backend/:
+
+    python -m benchmarks.load_test                                # API + mock Fal, spawned locally
+    python -m benchmarks.load_test --levels 1,8,32,64 --requests 128
+    python -m benchmarks.load_test --fal-latency lognormal:2,0.5 --fal-failure-rate 0.05
+    python -m benchmarks.load_test --url http://localhost:10000    # an API that is already running
+
+Without --url the mock Fal server (src.services.fal_mock) and the API, with
+FAL_BACKEND=mock, are started as subprocesses on free ports. Requests then go
+over real HTTP, and memory is the API process's own resident set. Every
+request carries its own description, so the result cache never answers for
+Fal. All requests come from one client, so the spawned API runs with its
+per-client rate limit lifted; admission control still applies as
+configured, and its 503s show up as errors. Against --url, that API's own
+limits apply and its 429s show up as errors too; pass --api-key to send a
+key it knows.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from src.services.fal_mock import DEFAULT_IMAGE
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds between memory samples while a level runs
+MEMORY_SAMPLE_INTERVAL = 0.1
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process, or None where it can't be read"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        output = subprocess.run(
+            ["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True, check=True
+        ).stdout
+        return int(output.strip()) / 1024
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return None
+
+
+def make_photo(size=(1600, 1200)) -> bytes:
+    """A phone-sized JPEG, or the mock's tiny canned one without Pillow"""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return DEFAULT_IMAGE
+    img = Image.new('RGB', size, (180, 120, 60))
+    draw = ImageDraw.Draw(img)
+    for i in range(0, size[0], 40):
+        draw.line((i, 0, size[0] - i, size[1]), fill=(i % 256, 90, 200), width=9)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    concurrency: int,
+    requests: int,
+    photo: bytes,
+    platforms: List[str],
+    memory: Optional[Callable[[], Optional[float]]] = None,
+    api_key: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Send ``requests`` campaigns, ``concurrency`` at a time"""
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    samples: List[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+    headers = {'X-API-Key': api_key} if api_key else {}
+
+    async def user():
+        while not queue.empty():
+            i = queue.get_nowait()
+            campaign = {
+                'name': "Load Test Bistro",
+                'description': f"Tasting menu {concurrency}-{i}",
+                'target_audience': "food lovers",
+                'cadence': "daily",
+                'platforms': platforms,
+                'profile': "draft",
+            }
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/api/generate-campaign",
+                    data={'campaign': json.dumps(campaign)},
+                    files={'reference_image': ("dish.jpg", photo, "image/jpeg")},
+                    headers=headers,
+                )
+                outcomes[response.status_code] += 1
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError as e:
+                outcomes[type(e).__name__] += 1
+
+    async def sample_memory():
+        while True:
+            value = memory()
+            if value is not None:
+                samples.append(value)
+            await asyncio.sleep(MEMORY_SAMPLE_INTERVAL)
+
+    sampler = asyncio.create_task(sample_memory()) if memory else None
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[user() for _ in range(concurrency)])
+    finally:
+        seconds = time.perf_counter() - start
+        if sampler:
+            sampler.cancel()
+
+    ok = outcomes.pop(200, 0)
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'ok': ok,
+        'errors': {str(k): v for k, v in sorted(outcomes.items(), key=str)},
+        'seconds': round(seconds, 3),
+        'throughput_rps': round(ok / seconds, 2) if seconds else 0.0,
+        'p50_seconds': round(_percentile(latencies, 50), 3) if latencies else None,
+        'p99_seconds': round(_percentile(latencies, 99), 3) if latencies else None,
+        'mean_seconds': round(statistics.mean(latencies), 3) if latencies else None,
+        'peak_rss_mb': round(max(samples), 1) if samples else None,
+        'end_rss_mb': round(samples[-1], 1) if samples else None,
+    }
+
+
+async def run_load_test(
+    client: httpx.AsyncClient,
+    levels: List[int],
+    requests: int,
+    photo: bytes,
+    platforms: List[str],
+    memory: Optional[Callable[[], Optional[float]]] = None,
+    api_key: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """One run_level per concurrency level, lowest first"""
+    return [
+        await run_level(client, level, max(requests, level), photo, platforms, memory, api_key)
+        for level in sorted(levels)
+    ]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def _spawn(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _print_report(results: List[Dict[str, Any]]) -> None:
+    print(f"{'conc':>5}{'ok':>6}{'errors':>8}{'p50 s':>8}{'p99 s':>8}{'req/s':>8}{'peak MB':>9}{'end MB':>8}")
+
+    def number(value, spec):
+        return '-' if value is None else format(value, spec)
+
+    for row in results:
+        print(
+            f"{row['concurrency']:>5}{row['ok']:>6}{sum(row['errors'].values()):>8}"
+            f"{number(row['p50_seconds'], '.2f'):>8}{number(row['p99_seconds'], '.2f'):>8}"
+            f"{row['throughput_rps']:>8.2f}{number(row['peak_rss_mb'], '.1f'):>9}"
+            f"{number(row['end_rss_mb'], '.1f'):>8}"
+        )
+        if row['errors']:
+            print(f"      errors: {', '.join(f'{k} x{v}' for k, v in row['errors'].items())}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="API to test instead of spawning one against mock Fal")
+    parser.add_argument("--api-key", help="X-API-Key to send; it must be in the API's API_KEYS to count")
+    parser.add_argument("--levels", default="1,4,16,64", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per level (at least the level)")
+    parser.add_argument("--platforms", default="Instagram")
+    parser.add_argument("--fal-latency", default="lognormal:0.5,0.3", help="Mock Fal run latency")
+    parser.add_argument("--fal-workers", type=int, default=16)
+    parser.add_argument("--fal-failure-rate", type=float, default=0.0, help="Injected result failures")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    platforms = args.platforms.split(",")
+    photo = make_photo()
+    processes: List[subprocess.Popen] = []
+    memory = None
+    url = args.url
+
+    try:
+        if url is None:
+            fal_port, api_port = _free_port(), _free_port()
+            fal = _spawn([
+                "-m", "src.services.fal_mock",
+                "--port", str(fal_port),
+                "--run-latency", args.fal_latency,
+                "--workers", str(args.fal_workers),
+                "--result-failure-rate", str(args.fal_failure_rate),
+            ], dict(os.environ))
+            processes.append(fal)
+            _wait_until_up(f"http://127.0.0.1:{fal_port}/stats", fal)
+
+            api = _spawn(
+                ["-m", "uvicorn", "src.api.main:app", "--port", str(api_port), "--log-level", "warning"],
+                {
+                    **os.environ,
+                    "FAL_BACKEND": "mock",
+                    "FAL_MOCK_URL": f"http://127.0.0.1:{fal_port}",
+                    "REFERENCE_STORE": "fal",
+                    # One client sends everything; measure the API, not its rate limit
+                    "RATE_LIMIT_PER_MINUTE": "1000000",
+                    "RATE_LIMIT_BURST": "1000000",
+                },
+            )
+            processes.append(api)
+            url = f"http://127.0.0.1:{api_port}"
+            _wait_until_up(f"{url}/api/health", api)
+            memory = lambda: rss_mb(api.pid)
+
+        async def run():
+            limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+            async with httpx.AsyncClient(base_url=url, timeout=300.0, limits=limits) as client:
+                return await run_load_test(
+                    client, levels, args.requests, photo, platforms, memory, args.api_key
+                )
+
+        results = asyncio.run(run())
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{url} - {len(photo) / 1024:.0f} KB photo, platforms {', '.join(platforms)}")
+        _print_report(results)
+
+
+if __name__ == "__main__":
+    main()
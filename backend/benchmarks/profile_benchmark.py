@@ -0,0 +1,335 @@
+"""Latency and cost of each Fal inference profile on a fixed set of photos.
+
+Run from backend/:
+
+    python -m benchmarks.profile_benchmark                      # stubbed Fal
+    python -m benchmarks.profile_benchmark --replay calls.jsonl # recorded Fal
+    python -m benchmarks.profile_benchmark --record calls.jsonl # live Fal (costs money)
+
+Every photo is pre-processed and stored exactly as the API would, then sent
+through ``FalGateway`` once per platform and profile. The stub backend models
+latency as queue time + startup + a cost per megapixel-step, so it needs no
+network; ``--time-scale`` shrinks its sleeps to keep runs short (reported
+numbers are scaled back up). ``--record`` writes one line per live call that
+``--replay`` later plays back offline.
+"""
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import fal_client
+
+from src.services.fal_gateway import FalGateway
+from src.services.image_preprocessor import IMAGE_SIZES, ImagePreprocessor
+from src.services.inference_profiles import PROFILES, InferenceProfile
+from src.services.prompt_templates import get_prompt_registry
+from src.services.reference_store import LocalReferenceStore, SpooledUpload
+
+# What every request used before profiles existed, for comparison
+LEGACY = InferenceProfile(
+    name='legacy',
+    num_inference_steps=50,
+    num_images=3,
+    guidance_scale=7.0,
+    scheduler='DPM++ 2M Karras',
+)
+
+
+def signature(arguments: Dict[str, Any]) -> str:
+    """Key identifying the arguments that drive inference cost"""
+    return json.dumps(
+        [arguments['num_inference_steps'], arguments['num_images'], arguments['image_size']],
+        sort_keys=True,
+    )
+
+
+def megapixels(image_size) -> float:
+    if isinstance(image_size, str):
+        width, height = IMAGE_SIZES.get(image_size, IMAGE_SIZES['square_hd'])
+    else:
+        width, height = image_size['width'], image_size['height']
+    return width * height / 1_000_000
+
+
+@dataclass
+class LatencyModel:
+    queue_seconds: float = 0.2
+    startup_seconds: float = 0.5
+    seconds_per_megapixel_step: float = 0.02
+    jitter: float = 0.1
+
+    def seconds(self, arguments: Dict[str, Any], rng: random.Random) -> float:
+        work = (
+            arguments['num_inference_steps']
+            * arguments['num_images']
+            * megapixels(arguments['image_size'])
+        )
+        base = self.queue_seconds + self.startup_seconds + work * self.seconds_per_megapixel_step
+        return base * rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class StubHandle:
+    def __init__(self, arguments: Dict[str, Any], queued: float, running: float, time_scale: float):
+        self.request_id = uuid.uuid4().hex
+        self.arguments = arguments
+        self.started = time.perf_counter()
+        self.queued = queued * time_scale
+        self.done = (queued + running) * time_scale
+
+    async def status(self, with_logs: bool = False):
+        elapsed = time.perf_counter() - self.started
+        if elapsed < self.queued:
+            return fal_client.Queued(position=0)
+        if elapsed < self.done:
+            return fal_client.InProgress(logs=[] if with_logs else None)
+        return fal_client.Completed(logs=None, metrics={'inference_time': self.done})
+
+    async def get(self) -> Dict:
+        remaining = self.done - (time.perf_counter() - self.started)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        return {
+            'images': [
+                {'url': f"https://stub.fal.media/{self.request_id}-{i}.jpg"}
+                for i in range(self.arguments['num_images'])
+            ]
+        }
+
+    async def cancel(self) -> None:
+        pass
+
+
+class StubFalClient:
+    """Offline stand-in for fal_client.AsyncClient with modelled latency"""
+
+    def __init__(self, latency: Optional[LatencyModel] = None, time_scale: float = 1.0, seed: int = 0):
+        self.latency = latency or LatencyModel()
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+
+    def _seconds(self, arguments: Dict[str, Any]) -> float:
+        return self.latency.seconds(arguments, self.rng)
+
+    async def submit(self, application: str, arguments: Dict[str, Any]) -> StubHandle:
+        total = self._seconds(arguments)
+        queued = min(self.latency.queue_seconds, total)
+        return StubHandle(arguments, queued, total - queued, self.time_scale)
+
+    async def upload_file(self, path: str) -> str:
+        return f"https://stub.fal.media/{os.path.basename(path)}"
+
+
+class RecordedFalClient(StubFalClient):
+    """Replays latencies recorded with --record, cycling per argument signature.
+
+    Signatures that were never recorded fall back to the latency model.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.recordings: Dict[str, List[float]] = defaultdict(list)
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    call = json.loads(line)
+                    self.recordings[call['signature']].append(call['seconds'])
+        self._next: Dict[str, int] = defaultdict(int)
+
+    def _seconds(self, arguments: Dict[str, Any]) -> float:
+        recorded = self.recordings.get(signature(arguments))
+        if not recorded:
+            return super()._seconds(arguments)
+        index = self._next[signature(arguments)]
+        self._next[signature(arguments)] += 1
+        return recorded[index % len(recorded)]
+
+
+def synthesize_photos(directory: str, count: int = 3, size=(2016, 1512)) -> List[str]:
+    """Deterministic phone-sized JPEGs so runs are comparable without fixtures"""
+    from PIL import Image, ImageDraw
+
+    paths = []
+    for i in range(count):
+        rng = random.Random(i)
+        img = Image.new('RGB', size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(40):
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            r = rng.randrange(40, 400)
+            draw.ellipse(
+                (x - r, y - r, x + r, y + r),
+                fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)),
+            )
+        path = os.path.join(directory, f"photo-{i}.jpg")
+        img.save(path, quality=92)
+        paths.append(path)
+    return paths
+
+
+async def _reference_urls(photos: List[str], templates: Dict[str, Any], store_dir: str) -> List[str]:
+    preprocessor = ImagePreprocessor()
+    store = LocalReferenceStore(store_dir, "http://localhost/api/references")
+    urls = []
+    for photo in photos:
+        # Work on a copy: the store moves files it keeps
+        copy = os.path.join(store_dir, f"upload-{os.path.basename(photo)}")
+        shutil.copyfile(photo, copy)
+        with open(copy, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        upload = SpooledUpload(copy, os.path.getsize(copy), digest, 'image/jpeg')
+        result = await preprocessor.process(upload, [t.image_size for t in templates.values()])
+        urls.append(await store.put(result.upload))
+    return urls
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_benchmark(
+    gateway: FalGateway,
+    photos: List[str],
+    profiles: List[InferenceProfile],
+    platforms: List[str],
+    time_scale: float = 1.0,
+    usd_per_megapixel_step: Optional[float] = None,
+    record_path: Optional[str] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Send every photo x platform through each profile and summarise per profile"""
+    registry = get_prompt_registry()
+    templates = {p: registry.get('enhance', p) for p in platforms}
+    store_dir = tempfile.mkdtemp(prefix="profile-bench-")
+    urls = await _reference_urls(photos, templates, store_dir)
+    record = open(record_path, "a") if record_path else None
+
+    async def one(profile: InferenceProfile, url: str, platform: str):
+        template = templates[platform]
+        arguments = template.fal_arguments(
+            template.render("Benchmark Bistro", "Seasonal tasting menu", "food lovers"),
+            **profile.fal_arguments(template.image_size),
+            reference_image=url,
+        )
+        start = time.perf_counter()
+        result = await gateway.subscribe(template.application, arguments)
+        seconds = (time.perf_counter() - start) / time_scale
+        if record:
+            record.write(json.dumps({'signature': signature(arguments), 'seconds': seconds}) + "\n")
+        return seconds, len(result['images']), profile.megapixel_steps(template.image_size)
+
+    report = {}
+    try:
+        for profile in profiles:
+            calls = await asyncio.gather(*[
+                one(profile, url, platform) for url in urls for platform in platforms
+            ])
+            latencies = [seconds for seconds, _, _ in calls]
+            images = sum(count for _, count, _ in calls)
+            work = sum(mp_steps for _, _, mp_steps in calls)
+            report[profile.name] = {
+                'requests': len(calls),
+                'images': images,
+                'p50_seconds': round(_percentile(latencies, 50), 3),
+                'p95_seconds': round(_percentile(latencies, 95), 3),
+                'mean_seconds': round(statistics.mean(latencies), 3),
+                'seconds_per_image': round(sum(latencies) / images, 3),
+                'megapixel_steps_per_request': round(work / len(calls), 2),
+            }
+            if usd_per_megapixel_step is not None:
+                report[profile.name]['usd_per_request'] = round(
+                    work / len(calls) * usd_per_megapixel_step, 5
+                )
+    finally:
+        if record:
+            record.close()
+    return report
+
+
+def _print_report(report: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'profile':<10}{'p50 s':>8}{'p95 s':>8}{'s/image':>9}{'MP-steps':>10}{'USD':>10}")
+    for name, row in report.items():
+        usd = row.get('usd_per_request')
+        print(
+            f"{name:<10}{row['p50_seconds']:>8.2f}{row['p95_seconds']:>8.2f}"
+            f"{row['seconds_per_image']:>9.2f}{row['megapixel_steps_per_request']:>10.1f}"
+            f"{'-' if usd is None else f'{usd:.4f}':>10}"
+        )
+    if 'draft' in report and 'final' in report:
+        # Drafts for every request, then one final render of the chosen image
+        pick = report['draft']['megapixel_steps_per_request'] + report['final']['megapixel_steps_per_request']
+        print(f"draft + final on the chosen image: {pick:.1f} MP-steps per request")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--photos", help="Directory of test photos (synthesized if omitted)")
+    parser.add_argument("--profiles", default=",".join([*PROFILES, LEGACY.name]))
+    parser.add_argument("--platforms", default="Instagram,LinkedIn")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--time-scale", type=float, default=0.1)
+    parser.add_argument("--usd-per-megapixel-step", type=float)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    backend = parser.add_mutually_exclusive_group()
+    backend.add_argument("--replay", help="JSONL recording to replay instead of the stub")
+    backend.add_argument("--record", help="Call live Fal and append timings to this JSONL file")
+    args = parser.parse_args()
+
+    profiles = {**PROFILES, LEGACY.name: LEGACY}
+    selected = [profiles[name] for name in args.profiles.split(",")]
+    platforms = args.platforms.split(",")
+
+    if args.record:
+        gateway = FalGateway(key=os.getenv("FAL_KEY"), max_concurrency=args.concurrency)
+        time_scale = 1.0
+    else:
+        time_scale = args.time_scale
+        client = (
+            RecordedFalClient(args.replay, time_scale=time_scale)
+            if args.replay else StubFalClient(time_scale=time_scale)
+        )
+        gateway = FalGateway(
+            client=client,
+            max_concurrency=args.concurrency,
+            poll_interval=0.1 * time_scale,
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.photos:
+            photos = sorted(
+                p for p in glob.glob(os.path.join(args.photos, "*"))
+                if p.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
+            )
+        else:
+            photos = synthesize_photos(tmp)
+        report = asyncio.run(run_benchmark(
+            gateway,
+            photos,
+            selected,
+            platforms,
+            time_scale=time_scale,
+            usd_per_megapixel_step=args.usd_per_megapixel_step,
+            record_path=args.record,
+        ))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{len(photos)} photos x {len(platforms)} platforms")
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Time to plan a quarter of posts for many restaurants: hour stepping vs bisect.
+
+Run from backend/:
+
+    python -m benchmarks.schedule_benchmark --restaurants 300 --campaigns 3 --days 90
+
+"legacy" reproduces the old SchedulingAgent loop: step forward an hour at a
+time until the hour is a posting hour. It has no cadence or clash handling,
+so here it only finds the next slot from each day of the quarter. "engine"
+runs PostingScheduler.plan_many over every campaign, daily and weekly mixed,
+with clash avoidance per restaurant.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from src.services.posting_schedule import PostingScheduler, posting_hours_for
+
+TIMEZONES = ['UTC', 'America/New_York', 'America/Los_Angeles', 'Europe/London', 'Asia/Tokyo']
+AUDIENCES = ['restaurant goers', 'retail shoppers', 'students']
+
+
+def make_campaigns(restaurants: int, per_restaurant: int, seed: int = 7) -> List[Dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            'id': f"r{r}-c{c}",
+            'restaurant_id': f"r{r}",
+            'target_audience': rng.choice(AUDIENCES),
+            'cadence': rng.choice(['daily', 'daily', 'weekly']),
+        }
+        for r in range(restaurants)
+        for c in range(per_restaurant)
+    ]
+
+
+def legacy_next_time(now: datetime, hours) -> datetime:
+    next_time = now
+    while True:
+        if next_time.hour in hours:
+            return next_time
+        next_time += timedelta(hours=1)
+
+
+def run_legacy(campaigns: List[Dict], days: int, start: datetime) -> int:
+    slots = 0
+    for campaign in campaigns:
+        hours = posting_hours_for(campaign['target_audience'])
+        for day in range(days):
+            legacy_next_time(start + timedelta(days=day, hours=19, minutes=30), hours)
+            slots += 1
+    return slots
+
+
+def run_engine(campaigns: List[Dict], days: int, start: datetime) -> int:
+    rng = random.Random(11)
+    by_timezone: Dict[str, List[Dict]] = {}
+    for campaign in campaigns:
+        by_timezone.setdefault(rng.choice(TIMEZONES), []).append(campaign)
+
+    scheduler = PostingScheduler()
+    slots = 0
+    for tz, group in by_timezone.items():
+        daily = [c for c in group if c['cadence'] == 'daily']
+        weekly = [c for c in group if c['cadence'] == 'weekly']
+        for plan in scheduler.plan_many(daily, days, start, tz).values():
+            slots += len(plan)
+        for plan in scheduler.plan_many(weekly, days // 7, start, tz).values():
+            slots += len(plan)
+    return slots
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--restaurants", type=int, default=300)
+    parser.add_argument("--campaigns", type=int, default=3)
+    parser.add_argument("--days", type=int, default=90)
+    args = parser.parse_args()
+
+    campaigns = make_campaigns(args.restaurants, args.campaigns)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    print(f"{len(campaigns)} campaigns across {args.restaurants} restaurants, {args.days} days")
+
+    for name, run in (('legacy', run_legacy), ('engine', run_engine)):
+        began = time.perf_counter()
+        slots = run(campaigns, args.days, start)
+        elapsed = time.perf_counter() - began
+        print(
+            f"  {name:<8} {slots:>7} slots in {elapsed * 1000:>8.1f} ms  "
+            f"({elapsed / slots * 1e6:.2f} us/slot)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Peak memory per concurrent upload: inline base64 data URI vs streamed URL.
+
+Run from backend/:
+
+    python -m benchmarks.upload_memory --size-mb 10 --concurrency 4
+
+Each scenario runs in a fresh interpreter so ``ru_maxrss`` only reflects that
+scenario.  "legacy" reproduces the old generate_campaign path (read the whole
+file, base64 it into a data URI, JSON-encode the Fal arguments); "streaming"
+spools the upload to disk and hands Fal a URL.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from typing import Dict
+
+from starlette.datastructures import UploadFile
+
+# Time the simulated Fal call keeps each request's buffers alive
+FAL_CALL_SECONDS = 0.2
+
+
+def _rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def _legacy_request(path: str) -> int:
+    upload = UploadFile(file=open(path, "rb"), filename="photo.jpg")
+    try:
+        contents = await upload.read()
+        data_uri = f"data:image/jpeg;base64,{base64.b64encode(contents).decode('utf-8')}"
+        body = json.dumps({"prompt": "enhance", "reference_image": data_uri})
+        await asyncio.sleep(FAL_CALL_SECONDS)
+        return len(body)
+    finally:
+        await upload.close()
+
+
+async def _streaming_request(path: str, store) -> int:
+    from src.services.reference_store import spool_upload
+
+    upload = UploadFile(file=open(path, "rb"), filename="photo.jpg")
+    try:
+        spooled = await spool_upload(upload, directory=store.directory)
+        url = await store.put(spooled)
+        body = json.dumps({"prompt": "enhance", "reference_image": url})
+        await asyncio.sleep(FAL_CALL_SECONDS)
+        return len(body)
+    finally:
+        await upload.close()
+
+
+async def _run_scenario(scenario: str, path: str, concurrency: int) -> None:
+    from src.services.reference_store import LocalReferenceStore
+
+    store_dir = tempfile.mkdtemp(prefix="refs-")
+    store = LocalReferenceStore(store_dir, "http://localhost/api/references")
+
+    baseline = _rss_mb()
+    tracemalloc.start()
+    if scenario == "legacy":
+        requests = [_legacy_request(path) for _ in range(concurrency)]
+    else:
+        requests = [_streaming_request(path, store) for _ in range(concurrency)]
+    await asyncio.gather(*requests)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak = _rss_mb()
+
+    print(json.dumps({
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "baseline_rss_mb": round(baseline, 2),
+        "peak_rss_mb": round(peak, 2),
+        "rss_per_request_mb": round((peak - baseline) / concurrency, 2),
+        "traced_peak_per_request_mb": round(traced_peak / concurrency / 2**20, 2),
+    }))
+
+
+def run_benchmark(size_mb: float = 10, concurrency: int = 4) -> Dict[str, Dict]:
+    """Run both scenarios in subprocesses and return their measurements"""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    fd, path = tempfile.mkstemp(suffix=".jpg")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(int(size_mb * 2**20)))
+
+        results = {}
+        for scenario in ("legacy", "streaming"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.upload_memory",
+                 "--scenario", scenario, "--path", path,
+                 "--concurrency", str(concurrency)],
+                cwd=backend_dir,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results[scenario] = json.loads(output.strip().splitlines()[-1])
+        return results
+    finally:
+        os.unlink(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--scenario", choices=["legacy", "streaming"])
+    parser.add_argument("--path")
+    args = parser.parse_args()
+
+    if args.scenario:
+        asyncio.run(_run_scenario(args.scenario, args.path, args.concurrency))
+        return
+
+    results = run_benchmark(args.size_mb, args.concurrency)
+    print(f"{args.size_mb} MB photo x {args.concurrency} concurrent requests")
+    for scenario, result in results.items():
+        print(
+            f"  {scenario:<10} peak RSS {result['peak_rss_mb']:>8.1f} MB  "
+            f"per request {result['rss_per_request_mb']:>7.1f} MB  "
+            f"(traced {result['traced_peak_per_request_mb']:.1f} MB)"
+        )
+
+
+if __name__ == "__main__":
+    main()
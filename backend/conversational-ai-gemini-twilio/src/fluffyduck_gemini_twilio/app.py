@@ -1,17 +1,25 @@
 """Main application module for the Gemini-Twilio integration."""
 
 from quart import Quart, websocket, request, Response
+import asyncio
+import functools
 import json
-import base64
 import struct
-from google import genai
-from google.genai import types
 import os
 from dotenv import load_dotenv
+import sys
 import time
 from .config import SYSTEM_PROMPT
-import requests
-from twilio.rest import Client as TwilioClient
+
+# Twilio media framing is shared with the ElevenLabs bridge and lives in the
+# backend's src package, four levels up from here
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)
+)))))
+from src.services.media_framing import MediaFramer, parse_twilio_message
+
+# The GenAI and Twilio SDKs are imported where they're used so the app
+# starts (and its helpers import) without paying for them up front.
 
 # Load environment variables
 load_dotenv()
@@ -21,25 +29,36 @@ app = Quart(__name__)
 # In-memory store for Twilio transcription snippets keyed by CallSid
 transcription_store: dict[str, list[str]] = {}
 
+# Background startup work, cancelled on shutdown
+_startup_tasks: list[asyncio.Task] = []
+
 # ---------------------------------------------------------------------------
 # System Prompt (Catering Menu)
 # ---------------------------------------------------------------------------
 
+@functools.lru_cache(maxsize=None)
+def _genai_client():
+    """Shared GenAI client, built once per process."""
+    from google import genai
+
+    api_key = os.getenv("GENAI_API_KEY")
+    if api_key:
+        return genai.Client(api_key=api_key)
+    return genai.Client(
+        vertexai=True,
+        project=os.getenv("GOOGLE_CLOUD_PROJECT"),
+        location=os.getenv("GOOGLE_CLOUD_LOCATION"),
+    )
+
 class GeminiTwilio:
     """Handles the integration between Twilio and Google Gemini."""
 
     def __init__(self):
         """Initialize the Gemini-Twilio integration."""
-        # Initialize the Google Cloud GenAI SDK
-        api_key = os.getenv("GENAI_API_KEY")
-        if api_key:
-            self.client = genai.Client(api_key=api_key)
-        else:
-            self.client = genai.Client(
-                vertexai=True,
-                project=os.getenv("GOOGLE_CLOUD_PROJECT"),
-                location=os.getenv("GOOGLE_CLOUD_LOCATION"),
-            )
+        from google.genai import types
+
+        # One GenAI client is shared by every call instead of one per socket
+        self.client = _genai_client()
         # Use the Live model variant so we can leverage the new low-latency
         # bidirectional streaming capabilities (voices, VAD, session resume…)
         self.model_id = "gemini-2.0-flash-live-001"
@@ -50,6 +69,7 @@ class GeminiTwilio:
             "system_instruction": types.Content(parts=[types.Part(text=SYSTEM_PROMPT)]),
         }
         self.stream_sid = None
+        self._framer = MediaFramer()
         self._last_activity = time.time()
         self.transcript: list[str] = []  # store assistant messages for debugging
 
@@ -63,27 +83,26 @@ class GeminiTwilio:
 
         while True:
             message = await websocket.receive()
-            data = json.loads(message)
+            # Media frames are decoded straight out of the raw message; only
+            # control events pay for a full JSON parse.
+            event = parse_twilio_message(message)
 
             # Update activity timestamp on every inbound frame from Twilio
             self._last_activity = time.time()
 
-            if data["event"] == "start":
-                self.stream_sid = data["start"]["streamSid"]
-                self.call_sid = data["start"].get("callSid")
+            if event.event == "start":
+                self.stream_sid = event.data["start"]["streamSid"]
+                self.call_sid = event.data["start"].get("callSid")
+                self._framer.reset(self.stream_sid)
                 print(f"Stream started – {self.stream_sid}")
 
-            elif data["event"] == "media":
+            elif event.event == "media":
                 try:
                     import asyncio
 
                     # Heavy processing happens in a worker thread to keep the
                     # event loop responsive (prevents WebSocket ping timeouts).
-                    audio_data = await asyncio.to_thread(
-                        base64.b64decode, data["media"]["payload"]
-                    )
-
-                    pcm_8k = await asyncio.to_thread(ulaw_to_pcm, audio_data)
+                    pcm_8k = await asyncio.to_thread(ulaw_to_pcm, event.audio)
 
                     pcm_16k = await asyncio.to_thread(upsample_to_16k, pcm_8k)
 
@@ -100,7 +119,7 @@ class GeminiTwilio:
                 except Exception as exc:
                     print(f"Error handling Twilio media packet: {exc}")
 
-            elif data["event"] == "stop":
+            elif event.event == "stop":
                 # Break the loop so the task exits; Gemini session continues
                 print("Stream stopped – closing Twilio reader loop")
                 break
@@ -109,16 +128,16 @@ class GeminiTwilio:
     # Gemini → Twilio helpers
     # ---------------------------------------------------------------------
 
-    def _gemini_audio_to_twilio_payload(self, audio_data: bytes) -> str:
-        """Convert 24-kHz PCM from Gemini to Base64 µ-law payload for Twilio."""
+    def _gemini_audio_to_twilio_message(self, audio_data: bytes) -> str:
+        """Convert 24-kHz PCM from Gemini to a Twilio ``media`` JSON message."""
         # 1. Down-sample 24-kHz → 8-kHz 16-bit PCM
         pcm_8k = downsample_to_8k(audio_data)
 
         # 2. Convert to µ-law codec
         mulaw_audio = pcm_to_ulaw(pcm_8k)
 
-        # 3. Base64 encode for Twilio JSON transport
-        return base64.b64encode(mulaw_audio).decode("utf-8")
+        # 3. Splice the Base64 payload into the stream's message template
+        return self._framer.media(mulaw_audio)
 
     async def _gemini_to_twilio(self, session):
         """Continuously read Gemini responses and forward audio to Twilio."""
@@ -127,15 +146,10 @@ class GeminiTwilio:
                 if response.data is not None and self.stream_sid is not None:
                     try:
                         import asyncio
-                        payload = await asyncio.to_thread(
-                            self._gemini_audio_to_twilio_payload, response.data
+                        twilio_msg = await asyncio.to_thread(
+                            self._gemini_audio_to_twilio_message, response.data
                         )
-                        twilio_msg = {
-                            "event": "media",
-                            "streamSid": self.stream_sid,
-                            "media": {"payload": payload},
-                        }
-                        await websocket.send(json.dumps(twilio_msg))
+                        await websocket.send(twilio_msg)
                     except Exception as exc:
                         print(f"Error sending audio back to Twilio: {exc}")
 
@@ -210,10 +224,22 @@ async def talk_to_gemini():
     """WebSocket endpoint for Gemini-Twilio integration."""
     await GeminiTwilio().gemini_websocket()
 
+@app.before_serving
+async def start_background_work():
+    """Warm the GenAI client and update the Twilio webhook without delaying startup."""
+    _startup_tasks.append(asyncio.create_task(asyncio.to_thread(_genai_client)))
+    _startup_tasks.append(asyncio.create_task(asyncio.to_thread(_update_twilio_webhook)))
+
+@app.after_serving
+async def stop_background_work():
+    for task in _startup_tasks:
+        task.cancel()
+    await asyncio.gather(*_startup_tasks, return_exceptions=True)
+    _startup_tasks.clear()
+
 def create_app():
     """Create and configure the Quart application."""
-    # Attempt to update Twilio webhook on startup
-    _update_twilio_webhook()
+    # The Twilio webhook is updated in the background once serving starts
     return app
 
 if __name__ == "__main__":
@@ -364,6 +390,9 @@ def _update_twilio_webhook():
         return
 
     try:
+        import requests
+        from twilio.rest import Client as TwilioClient
+
         ngrok_resp = requests.get("http://127.0.0.1:4040/api/tunnels", timeout=2)
         tunnels = ngrok_resp.json()["tunnels"]
         public_https = next(t["public_url"] for t in tunnels if t["proto"] == "https")
@@ -379,11 +408,10 @@ def _update_twilio_webhook():
 # Simple TwiML endpoint so we don't need a TwiML Bin
 # ---------------------------------------------------------------------------
 
-from twilio.twiml.voice_response import VoiceResponse, Connect, Start
-
-
 @app.route("/twilio/inbound_call", methods=["GET", "POST"])
 async def inbound_call():
+    from twilio.twiml.voice_response import VoiceResponse, Connect
+
     host = request.host.split(":")[0]
     resp = VoiceResponse()
     # Enable Twilio Real-Time Transcription for the caller (inbound track)
@@ -1,4 +1,3 @@
-import json
 import traceback
 import os
 from dotenv import load_dotenv
@@ -59,8 +58,7 @@ async def handle_media_stream(websocket: WebSocket):
                 continue
 
             try:
-                data = json.loads(message)
-                await audio_interface.handle_twilio_message(data)
+                await audio_interface.handle_twilio_message(message)
             except Exception as e:
                 print(f"Error processing message: {str(e)}")
                 traceback.print_exc()
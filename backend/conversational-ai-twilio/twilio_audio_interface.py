@@ -1,17 +1,23 @@
 import asyncio
+import os
+import sys
 from typing import Callable
 import queue
 import threading
-import base64
 from elevenlabs.conversational_ai.conversation import AudioInterface
 import websockets
 
+# Twilio media framing is shared with the Gemini bridge via the backend's src package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.services.media_framing import MediaFramer, parse_twilio_message
+
 class TwilioAudioInterface(AudioInterface):
     def __init__(self, websocket):
         self.websocket = websocket
         self.output_queue = queue.Queue()
         self.should_stop = threading.Event()
         self.stream_sid = None
+        self.framer = MediaFramer()
         self.input_callback = None
         self.output_thread = None
 
@@ -37,15 +43,17 @@ class TwilioAudioInterface(AudioInterface):
             pass
         asyncio.run(self._send_clear_message_to_twilio())
 
-    async def handle_twilio_message(self, data):
+    async def handle_twilio_message(self, message):
+        """Handle a raw Twilio text frame (or an already parsed dict)."""
         try:
-            if data["event"] == "start":
-                self.stream_sid = data["start"]["streamSid"]
+            event = parse_twilio_message(message)
+            if event.event == "start":
+                self.stream_sid = event.data["start"]["streamSid"]
+                self.framer.reset(self.stream_sid)
                 print(f"Started stream with stream_sid: {self.stream_sid}")
-            if data["event"] == "media":
-                audio_data = base64.b64decode(data["media"]["payload"])
+            elif event.event == "media":
                 if self.input_callback:
-                    self.input_callback(audio_data)
+                    self.input_callback(event.audio)
         except Exception as e:
             print(f"Error in input_callback: {e}")
 
@@ -56,13 +64,7 @@ class TwilioAudioInterface(AudioInterface):
     async def _send_audio_to_twilio(self):
         try:
             audio = self.output_queue.get(timeout=0.2)
-            audio_payload = base64.b64encode(audio).decode("utf-8")
-            audio_delta = {
-                "event": "media",
-                "streamSid": self.stream_sid,
-                "media": {"payload": audio_payload},
-            }
-            await self.websocket.send_json(audio_delta)
+            await self.websocket.send_text(self.framer.media(audio))
         except queue.Empty:
             pass
         except Exception as e:
@@ -70,7 +72,6 @@ class TwilioAudioInterface(AudioInterface):
 
     async def _send_clear_message_to_twilio(self):
         try:
-            clear_message = {"event": "clear", "streamSid": self.stream_sid}
-            await self.websocket.send_json(clear_message)
+            await self.websocket.send_text(self.framer.clear())
         except Exception as e:
             print(f"Error sending clear message to Twilio: {e}")
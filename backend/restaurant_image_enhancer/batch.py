@@ -0,0 +1,408 @@
+"""Enhance a restaurant's whole photo library through Fal in one run.
+
+Run from backend/:
+
+    python -m restaurant_image_enhancer.batch photos/ --output enhanced/
+    python -m restaurant_image_enhancer.batch menu.csv --concurrency 8 --platform Instagram
+
+The input is a directory of photos or a manifest: CSV with a ``path`` column,
+or JSON lines with a ``path`` key. Manifest rows may also set ``id``,
+``platform`` and ``description`` (e.g. the dish) per photo. The ``id`` (or
+the path, without one) names the output, so it must stay inside the output
+directory and be unique.
+
+Each photo is copied to a scratch file in chunks, downscaled to the size the
+prompt template renders at and handed to Fal by URL, with at most
+``--concurrency`` photos in flight. Enhanced images are downloaded as each
+request finishes, and a line is appended to the checkpoint file, so an
+interrupted run picks up where it stopped when started again.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlparse
+
+import httpx
+
+from src.services.fal_gateway import FalGateway
+from src.services.image_preprocessor import ImagePreprocessor, sniff_image_format
+from src.services.inference_profiles import get_profile
+from src.services.prompt_templates import get_prompt_registry
+from src.services.reference_store import CHUNK_SIZE, SpooledUpload
+
+logger = logging.getLogger(__name__)
+
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.heic', '.avif')
+
+# Returns a URL Fal can fetch the pre-sized photo from
+Uploader = Callable[[SpooledUpload], Awaitable[str]]
+
+
+@dataclass(frozen=True)
+class Photo:
+    key: str
+    path: str
+    # Output file name, before the enhanced image's own extension. Keeps the
+    # source extension so dish.jpg and dish.png don't overwrite each other.
+    name: str
+    platform: Optional[str] = None
+    description: Optional[str] = None
+
+
+@dataclass
+class BatchReport:
+    total: int = 0
+    skipped: int = 0
+    enhanced: int = 0
+    failed: int = 0
+    images: int = 0
+    seconds: float = 0.0
+    # Per photo, from reading it to its last output written
+    latencies: List[float] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = self.latencies or [0.0]
+        return {
+            'photos': self.total,
+            'skipped': self.skipped,
+            'enhanced': self.enhanced,
+            'failed': self.failed,
+            'images': self.images,
+            'seconds': round(self.seconds, 3),
+            'photos_per_second': round(self.enhanced / self.seconds, 3) if self.seconds else 0.0,
+            'p50_seconds': round(_percentile(latencies, 50), 3),
+            'p95_seconds': round(_percentile(latencies, 95), 3),
+            'mean_seconds': round(statistics.mean(latencies), 3),
+        }
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _output_name(value: str) -> str:
+    """A manifest id or path as a relative name under the output directory"""
+    name = os.path.normpath(value.replace('\\', '/'))
+    if os.path.isabs(name) or name == '.' or name.split(os.sep)[0] == '..':
+        raise ValueError(f"Manifest id {value!r} must be a relative name inside the output directory")
+    return name
+
+
+def discover_photos(source: str) -> List[Photo]:
+    """Photos in a directory (recursively) or listed in a CSV / JSONL manifest"""
+    if os.path.isdir(source):
+        photos = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(PHOTO_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    relative = os.path.relpath(path, source)
+                    photos.append(Photo(relative, path, relative))
+        return photos
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline='') as f:
+        if source.lower().endswith('.csv'):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    photos = []
+    seen: Dict[str, str] = {}
+    for row in rows:
+        if not row.get('path'):
+            raise ValueError(f"Manifest row without a path: {row}")
+        path = os.path.join(base, row['path'])
+        key = _output_name(str(row.get('id') or row['path']))
+        if key in seen:
+            if os.path.normpath(seen[key]) != os.path.normpath(path):
+                raise ValueError(f"Manifest id {key!r} is used for both {seen[key]} and {path}")
+            logger.warning("Manifest lists %s more than once; enhancing it once", key)
+            continue
+        seen[key] = path
+        photos.append(Photo(
+            key,
+            path,
+            key,
+            row.get('platform') or None,
+            row.get('description') or None,
+        ))
+    return photos
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Keys of photos a previous run finished; failures are retried"""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by the interruption
+                continue
+            if entry.get('status') == 'done':
+                done.add(entry['key'])
+    return done
+
+
+def _spool_file(path: str, directory: str) -> SpooledUpload:
+    """Copy a photo to scratch space a chunk at a time, hashing as it goes"""
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    fd, spooled = tempfile.mkstemp(prefix="batch-", dir=directory)
+    try:
+        with open(path, 'rb') as src, os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                if size == 0:
+                    head = chunk[:32]
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.unlink(spooled)
+        raise
+    return SpooledUpload(
+        path=spooled,
+        size=size,
+        sha256=digest.hexdigest(),
+        content_type=sniff_image_format(head) or 'application/octet-stream',
+        filename=os.path.basename(path),
+    )
+
+
+def _extension(url: str, content_type: Optional[str]) -> str:
+    ext = os.path.splitext(urlparse(url).path)[1].lower()
+    if ext in PHOTO_EXTENSIONS:
+        return ext
+    if content_type and 'png' in content_type:
+        return '.png'
+    if content_type and 'webp' in content_type:
+        return '.webp'
+    return '.jpg'
+
+
+class BatchEnhancer:
+    """Runs photos through pre-sizing, upload and Fal with bounded concurrency"""
+
+    def __init__(
+        self,
+        gateway: FalGateway,
+        output_dir: str,
+        checkpoint_path: str,
+        concurrency: int = 4,
+        platform: str = 'Instagram',
+        profile: Optional[str] = 'final',
+        name: str = 'Our restaurant',
+        description: str = 'Signature dishes',
+        target_audience: str = 'food lovers',
+        preprocessor: Optional[ImagePreprocessor] = None,
+        uploader: Optional[Uploader] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.gateway = gateway
+        self.output_dir = output_dir
+        self.checkpoint_path = checkpoint_path
+        self.concurrency = concurrency
+        self.platform = platform
+        self.profile = get_profile(profile)
+        self.name = name
+        self.description = description
+        self.target_audience = target_audience
+        self.preprocessor = preprocessor or ImagePreprocessor()
+        self.uploader = uploader or (lambda upload: gateway.upload_file(upload.path))
+        self._http = http_client
+        self._templates = get_prompt_registry()
+
+    async def run(self, photos: Iterable[Photo]) -> BatchReport:
+        photos = list(photos)
+        done = load_checkpoint(self.checkpoint_path)
+        pending = [photo for photo in photos if photo.key not in done]
+        report = BatchReport(total=len(photos), skipped=len(photos) - len(pending))
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        queue: asyncio.Queue = asyncio.Queue()
+        for photo in pending:
+            queue.put_nowait(photo)
+
+        http = self._http or httpx.AsyncClient(timeout=60.0, follow_redirects=True)
+        scratch = tempfile.mkdtemp(prefix="enhance-batch-")
+        start = time.perf_counter()
+        try:
+            with open(self.checkpoint_path, 'a') as checkpoint:
+                async def worker():
+                    while not queue.empty():
+                        photo = queue.get_nowait()
+                        entry = await self._enhance(photo, http, scratch, report)
+                        checkpoint.write(json.dumps(entry) + "\n")
+                        checkpoint.flush()
+
+                # A fixed pool of workers, so a large library never means
+                # thousands of pending tasks or spooled files
+                await asyncio.gather(*[worker() for _ in range(min(self.concurrency, len(pending)))])
+        finally:
+            report.seconds = time.perf_counter() - start
+            shutil.rmtree(scratch, ignore_errors=True)
+            if self._http is None:
+                await http.aclose()
+        return report
+
+    async def _enhance(
+        self,
+        photo: Photo,
+        http: httpx.AsyncClient,
+        scratch: str,
+        report: BatchReport,
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        template = self._templates.get('enhance', photo.platform or self.platform)
+        spooled = None
+        presized = None
+        try:
+            spooled = await asyncio.to_thread(_spool_file, photo.path, scratch)
+            presized = (await self.preprocessor.process(spooled, [template.image_size])).upload
+            url = await self.uploader(presized)
+
+            arguments = template.fal_arguments(
+                template.render(self.name, photo.description or self.description, self.target_audience),
+                **self.profile.fal_arguments(template.image_size),
+                reference_image=url,
+            )
+            result = await self.gateway.subscribe(template.application, arguments)
+            outputs = [
+                await self._download(image['url'], photo, index, len(result['images']), http)
+                for index, image in enumerate(result['images'])
+            ]
+        except Exception as e:
+            report.failed += 1
+            logger.warning("Could not enhance %s: %s", photo.path, e)
+            return {'key': photo.key, 'status': 'failed', 'error': str(e)}
+        finally:
+            for upload in (spooled, presized):
+                if upload is not None:
+                    upload.discard()
+
+        seconds = time.perf_counter() - started
+        report.enhanced += 1
+        report.images += len(outputs)
+        report.latencies.append(seconds)
+        logger.info("Enhanced %s in %.1fs", photo.path, seconds)
+        return {
+            'key': photo.key,
+            'status': 'done',
+            'outputs': outputs,
+            'seconds': round(seconds, 3),
+            'prompt_version': template.version,
+        }
+
+    async def _download(
+        self,
+        url: str,
+        photo: Photo,
+        index: int,
+        count: int,
+        http: httpx.AsyncClient,
+    ) -> str:
+        """Stream one enhanced image to disk, renamed into place once complete"""
+        async with http.stream('GET', url) as response:
+            response.raise_for_status()
+            suffix = f"-{index + 1}" if count > 1 else ""
+            target = os.path.join(
+                self.output_dir,
+                photo.name + suffix + _extension(url, response.headers.get('content-type')),
+            )
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            partial = target + ".part"
+            with open(partial, 'wb') as out:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    out.write(chunk)
+        os.replace(partial, target)
+        return target
+
+
+def _print_report(report: BatchReport) -> None:
+    summary = report.to_dict()
+    print(
+        f"{summary['enhanced']} enhanced, {summary['skipped']} already done, "
+        f"{summary['failed']} failed of {summary['photos']} photos "
+        f"({summary['images']} images) in {summary['seconds']:.1f}s"
+    )
+    print(
+        f"throughput {summary['photos_per_second']:.2f} photos/s, latency "
+        f"p50 {summary['p50_seconds']:.2f}s p95 {summary['p95_seconds']:.2f}s "
+        f"mean {summary['mean_seconds']:.2f}s"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="Directory of photos, or a CSV / JSONL manifest")
+    parser.add_argument("--output", default="enhanced", help="Directory for enhanced images")
+    parser.add_argument("--checkpoint", help="Progress file (default: <output>/checkpoint.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Photos in flight at once")
+    parser.add_argument("--platform", default="Instagram", help="Prompt template platform")
+    parser.add_argument("--profile", default="final", help="Inference profile")
+    parser.add_argument("--name", default="Our restaurant", help="Restaurant name for the prompt")
+    parser.add_argument("--description", default="Signature dishes")
+    parser.add_argument("--audience", default="food lovers")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    if not os.getenv("FAL_KEY"):
+        raise SystemExit("FAL API key is missing. Add FAL_KEY to your .env file.")
+
+    photos = discover_photos(args.source)
+    gateway = FalGateway(key=os.getenv("FAL_KEY"), max_concurrency=args.concurrency)
+    preprocessor = ImagePreprocessor.from_env()
+    enhancer = BatchEnhancer(
+        gateway,
+        args.output,
+        args.checkpoint or os.path.join(args.output, "checkpoint.jsonl"),
+        concurrency=args.concurrency,
+        platform=args.platform,
+        profile=args.profile,
+        name=args.name,
+        description=args.description,
+        target_audience=args.audience,
+        preprocessor=preprocessor,
+    )
+
+    async def run() -> BatchReport:
+        try:
+            return await enhancer.run(photos)
+        finally:
+            await gateway.aclose()
+            preprocessor.shutdown()
+
+    logging.basicConfig(level=logging.INFO)
+    os.makedirs(args.output, exist_ok=True)
+    try:
+        report = asyncio.run(run())
+    except KeyboardInterrupt:
+        raise SystemExit("Interrupted; run the same command again to resume.")
+
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
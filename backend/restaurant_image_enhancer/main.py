@@ -1,44 +1,22 @@
-from dotenv import load_dotenv
-import os
-import fal_client
-import base64
-# Load environment variables from .env file
-load_dotenv()
-api_key = os.getenv("FAL_KEY")
-
-if not api_key:
-    raise ValueError("FAL API key is missing. Add it to your .env file.")
+"""Enhance every photo in input/ into output/enhanced_images/.
 
-fal_client.api_key = api_key
+Kept so ``python main.py`` still works from this directory; it is the batch
+CLI with this folder's defaults. See batch.py for the options.
+"""
 
+import os
+import sys
 
-def on_queue_update(update):
-    if isinstance(update, fal_client.InProgress):
-        for log in update.logs:
-            print(log["message"])
-
-# Path to the input image
-image_path = "input/test.jpeg"
+HERE = os.path.dirname(os.path.abspath(__file__))
 
-# Open and encode the image as Base64
-with open(image_path, "rb") as image_file:
-    image_data = base64.b64encode(image_file.read()).decode("utf-8")
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(HERE))
 
-result = fal_client.subscribe(
-    "fal-ai/flux-pro/v1.1-ultra-finetuned",
-    arguments={
-        "prompt": "Enhance this image and improve its quality.",  # ✅ Add a required prompt
-        "image": image_data,  # ✅ Ensure the image is sent as a Base64 string
-        "num_images": 1,
-        "enable_safety_checker": True,
-        "safety_tolerance": "2",
-        "output_format": "jpeg",
-        "aspect_ratio": "16:9",
-        "finetune_id": "abc",
-        "finetune_strength": 0.4
-    },
-    with_logs=True,
-    on_queue_update=on_queue_update,
-)
+from restaurant_image_enhancer.batch import main
 
-print(result)
+if __name__ == "__main__":
+    main([
+        os.path.join(HERE, "input"),
+        "--output", os.path.join(HERE, "output", "enhanced_images"),
+        *sys.argv[1:],
+    ])
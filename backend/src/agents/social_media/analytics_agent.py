@@ -1,68 +1,159 @@
-from typing import Dict, List
-from datetime import datetime, timedelta
-from ...database.operations.social_media_ops import SocialMediaDB
+import asyncio
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+from datetime import datetime, timedelta, timezone
+from ...database.operations.campaign_repository import CampaignRepository, get_campaign_repository
+from ...services.campaign_analytics import MetricsFrame, PortfolioReport, analyze_metrics
+from ...services.engagement_aggregates import EngagementAggregates, get_engagement_aggregates
+from ...services.posting_schedule import primary_platform
+
+logger = logging.getLogger(__name__)
 
 class AnalyticsAgent:
-    def __init__(self):
-        self.db = SocialMediaDB()
+    def __init__(
+        self,
+        repository: Optional[CampaignRepository] = None,
+        aggregates: Optional[EngagementAggregates] = None,
+        scheduling_agent=None,
+        timezone: Optional[str] = None
+    ):
+        # Shared read-through cache, so a pipeline run fetches each campaign once
+        self.db = repository or get_campaign_repository()
+        # Running totals, so recommendations don't rescan metric history
+        self.aggregates = aggregates or get_engagement_aggregates()
+        self._scheduling = scheduling_agent
+        # Posting hours are learned in the timezone campaigns are scheduled in
+        self.timezone = timezone or os.getenv("PIPELINE_TIMEZONE", "UTC")
+
+    @property
+    def scheduling(self):
+        # Fits the process-wide posting models the pipeline schedules from
+        if self._scheduling is None:
+            from .scheduling_agent import SchedulingAgent
+            self._scheduling = SchedulingAgent(self.db)
+        return self._scheduling
+
+    async def record_metrics(self, snapshots: Iterable[Dict]) -> List[Dict]:
+        """Store new engagement snapshots and fold them into the aggregates.
+
+        The posting hours of every restaurant the snapshots belong to are
+        refitted too, so the next schedule uses what was just measured.
+        """
+        rows = await self.db.record_campaign_metrics(snapshots)
+        campaigns = await self.db.get_campaigns(row['campaign_id'] for row in rows)
+        await self.aggregates.ingest(
+            rows,
+            {cid: primary_platform(c) or 'unknown' for cid, c in campaigns.items()}
+        )
+        restaurants = sorted({c['restaurant_id'] for c in campaigns.values() if c.get('restaurant_id')})
+        results = await asyncio.gather(
+            *(self.scheduling.learn_posting_hours(r, self.timezone) for r in restaurants),
+            return_exceptions=True
+        )
+        for restaurant, result in zip(restaurants, results):
+            if isinstance(result, Exception):
+                # Stored metrics still count; the next ingest refits
+                logger.warning("Refitting posting hours for %s failed: %s", restaurant, result)
+        return rows
 
     async def analyze_engagement_metrics(
         self,
         campaign_id: str,
-        timeframe_days: int = 7
+        timeframe_days: int = 7,
+        until: Optional[datetime] = None
     ) -> Dict:
-        """Analyze engagement metrics for a campaign"""
+        """Analyze engagement metrics for a campaign over the last timeframe_days"""
         try:
-            # Get campaign data and metrics
             campaign = await self.db.get_campaign(campaign_id)
-            metrics = await self.db.get_campaign_metrics(campaign_id)
+            if campaign is None:
+                raise LookupError(f"Campaign {campaign_id} not found")
+
+            report = await self._report([campaign_id], timeframe_days, until, top_k=3)
+            stats = report.campaigns.get(str(campaign_id))
 
             analysis = {
                 'engagement_rate': 0,
+                'trend': 0,
                 'best_performing_hashtags': [],
                 'audience_response': 'neutral',
                 'recommendations': []
             }
 
-            if metrics:
-                # Calculate engagement rate
-                total_interactions = (
-                    metrics.get('likes', 0) +
-                    metrics.get('comments', 0) +
-                    metrics.get('shares', 0)
-                )
-                impressions = metrics.get('impressions', 1)  # Avoid division by zero
-                analysis['engagement_rate'] = (total_interactions / impressions) * 100
+            if stats:
+                analysis['engagement_rate'] = stats.engagement_rate
+                analysis['trend'] = stats.trend
+                analysis['best_performing_hashtags'] = stats.top_hashtags
 
                 # Analyze performance
-                if analysis['engagement_rate'] > 5:
-                    analysis['audience_response'] = 'positive'
+                analysis['audience_response'] = _audience_response(stats.engagement_rate)
+                if analysis['audience_response'] == 'positive':
                     analysis['recommendations'].append(
                         "Content is performing well. Consider boosting post reach."
                     )
-                elif analysis['engagement_rate'] < 2:
-                    analysis['audience_response'] = 'needs_improvement'
+                elif analysis['audience_response'] == 'needs_improvement':
                     analysis['recommendations'].append(
                         "Consider adjusting content strategy to improve engagement."
                     )
 
-                # Analyze hashtag performance
-                if metrics.get('hashtag_performance'):
-                    analysis['best_performing_hashtags'] = sorted(
-                        metrics['hashtag_performance'].items(),
-                        key=lambda x: x[1],
-                        reverse=True
-                    )[:3]
-
             return analysis
 
         except Exception as e:
             print(f"Error analyzing metrics: {str(e)}")
             raise
 
+    async def analyze_portfolio(
+        self,
+        restaurant_id: Optional[str] = None,
+        campaign_ids: Optional[Iterable[str]] = None,
+        timeframe_days: int = 30,
+        top_k: int = 5,
+        until: Optional[datetime] = None
+    ) -> Dict:
+        """Engagement across many campaigns, from one metrics query.
+
+        Covers the given campaigns, or every campaign of ``restaurant_id``.
+        """
+        if campaign_ids is None:
+            if restaurant_id is None:
+                raise ValueError("Pass restaurant_id or campaign_ids")
+            campaign_ids = [c['id'] for c in await self.db.get_restaurant_campaigns(restaurant_id)]
+
+        report = await self._report(campaign_ids, timeframe_days, until, top_k)
+        result = report.to_dict()
+        result['audience_response'] = _audience_response(report.engagement_rate)
+        result['declining_campaigns'] = sorted(
+            (s.campaign_id for s in report.campaigns.values() if s.trend < 0),
+            key=lambda cid: report.campaigns[cid].trend,
+        )
+        return result
+
+    async def _report(
+        self,
+        campaign_ids: Iterable[str],
+        timeframe_days: int,
+        until: Optional[datetime],
+        top_k: int
+    ) -> PortfolioReport:
+        until = until or datetime.now(timezone.utc)
+        since = until - timedelta(days=timeframe_days)
+        rows = await self.db.get_metrics_window(campaign_ids, since, until)
+        return analyze_metrics(MetricsFrame.from_rows(rows), since, until, top_k=top_k)
+
     async def generate_recommendations(self, campaign_id: str) -> List[str]:
-        """Generate recommendations based on campaign performance"""
-        analysis = await self.analyze_engagement_metrics(campaign_id)
+        """Generate recommendations based on campaign performance.
+
+        Reads the campaign's running totals when it has any, and only
+        analyses raw metrics for campaigns the aggregates haven't seen.
+        """
+        totals = await self.aggregates.campaign(campaign_id)
+        if totals is not None:
+            analysis = {
+                'audience_response': _audience_response(totals['engagement_rate']),
+                'best_performing_hashtags': totals['top_hashtags'],
+            }
+        else:
+            analysis = await self.analyze_engagement_metrics(campaign_id)
         recommendations = []
 
         if analysis['audience_response'] == 'needs_improvement':
@@ -71,10 +162,23 @@ class AnalyticsAgent:
                 "Experiment with different content formats",
                 "Engage more with audience comments"
             ])
+            best_hours = await self.aggregates.best_hours(1)
+            if best_hours:
+                recommendations.append(
+                    f"Engagement grows fastest around {best_hours[0][0]:02d}:00 UTC"
+                )
 
         if analysis['best_performing_hashtags']:
             recommendations.append(
-                f"Continue using successful hashtags: {', '.join(analysis['best_performing_hashtags'])}"
+                "Continue using successful hashtags: "
+                + ', '.join(tag for tag, _ in analysis['best_performing_hashtags'])
             )
 
-        return recommendations
\ No newline at end of file
+        return recommendations
+
+def _audience_response(rate: float) -> str:
+    if rate > 5:
+        return 'positive'
+    if rate < 2:
+        return 'needs_improvement'
+    return 'neutral'
@@ -1,13 +1,28 @@
-from typing import Dict, List
-from ...services.fal_service import FalImageGenerator
-from ...services.elevenlabs_service import ElevenLabsService
-from ...database.operations.social_media_ops import SocialMediaDB
+import asyncio
+from typing import Dict, List, Optional
+from ...services.fal_service import FalService
+from ...services.posting_schedule import primary_platform
+from ...database.operations.campaign_repository import CampaignRepository, get_campaign_repository
 
 class ContentAgent:
-    def __init__(self):
-        self.fal_generator = FalImageGenerator()
-        self.audio_service = ElevenLabsService()
-        self.db = SocialMediaDB()
+    def __init__(
+        self,
+        repository: Optional[CampaignRepository] = None,
+        fal_service: Optional[FalService] = None,
+        audio_service=None
+    ):
+        self.fal_service = fal_service or FalService()
+        self._audio_service = audio_service
+        # Shared read-through cache, so a pipeline run fetches each campaign once
+        self.db = repository or get_campaign_repository()
+
+    @property
+    def audio_service(self):
+        # Only campaigns that need audio pay for the ElevenLabs client
+        if self._audio_service is None:
+            from ...services.elevenlabs_service import ElevenLabsService
+            self._audio_service = ElevenLabsService()
+        return self._audio_service
 
     async def analyze_campaign_requirements(self, campaign_data: Dict) -> Dict:
         """Analyze campaign data and decide content strategy"""
@@ -34,6 +49,27 @@ class ContentAgent:
 
         return content_decisions
 
+    async def generate_image(self, campaign: Dict, requirements: Dict) -> Dict:
+        """Generate the campaign image from the shared campaign prompt template"""
+        images = await self.fal_service.generate_campaign_images(
+            name=campaign['title'],
+            description=campaign['description'],
+            target_audience=campaign['target_audience'],
+            platforms=[primary_platform(campaign) or 'Instagram'],
+            style_preferences=requirements['style_preferences']
+        )
+        return {
+            'image_url': images['generated_images'][0],
+            'prompt_version': images['prompt_version']
+        }
+
+    async def generate_audio(self, campaign: Dict) -> str:
+        """Generate a voice-over for reels"""
+        return await self.audio_service.generate_audio(
+            text=campaign['description'],
+            voice_style='professional'
+        )
+
     async def generate_content(self, campaign_id: str) -> Dict:
         """Generate content based on campaign requirements"""
         try:
@@ -43,23 +79,15 @@ class ContentAgent:
             # Analyze requirements
             requirements = await self.analyze_campaign_requirements(campaign)
             
-            # Generate image
-            image_url = await self.fal_generator.generate_marketing_image(
-                title=campaign['title'],
-                description=campaign['description'],
-                target_audience=campaign['target_audience'],
-                style_preferences=requirements['style_preferences']
-            )
-
-            result = {'image_url': image_url}
-
-            # Generate audio if needed
+            # Image and audio don't depend on each other, so generate them together
             if requirements['needs_audio']:
-                audio_url = await self.audio_service.generate_audio(
-                    text=campaign['description'],
-                    voice_style='professional'
+                result, audio_url = await asyncio.gather(
+                    self.generate_image(campaign, requirements),
+                    self.generate_audio(campaign)
                 )
                 result['audio_url'] = audio_url
+            else:
+                result = await self.generate_image(campaign, requirements)
 
             return result
 
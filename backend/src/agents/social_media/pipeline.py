@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ...database.operations.campaign_repository import CampaignRepository, get_campaign_repository
+from ...services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# A stage receives the outputs of the stages before it
+StageFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class StageSkipped(Exception):
+    """Raised for stages whose dependencies failed"""
+
+
+@dataclass
+class Stage:
+    name: str
+    run: StageFn
+    after: Tuple[str, ...] = ()
+    # Concurrency pool the stage draws from, e.g. "fal" or "supabase"
+    provider: Optional[str] = None
+
+
+@dataclass
+class StageRun:
+    """What happened to each stage of one DAG run"""
+    outputs: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+async def run_stages(
+    stages: Iterable[Stage],
+    limits: Optional[Dict[str, asyncio.Semaphore]] = None,
+) -> StageRun:
+    """Run a DAG of stages, each as soon as everything it depends on is done.
+
+    Independent stages run concurrently. A stage holds its provider's
+    semaphore only while it runs, not while waiting on dependencies. When a
+    stage fails, everything downstream of it is skipped.
+    """
+    stages = {stage.name: stage for stage in stages}
+    for stage in stages.values():
+        missing = [dep for dep in stage.after if dep not in stages]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {missing}")
+
+    limits = limits or {}
+    result = StageRun()
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(stage: Stage) -> Any:
+        for dep in stage.after:
+            try:
+                await tasks[dep]
+            except BaseException:
+                skipped = StageSkipped(f"{stage.name} skipped: {dep} failed")
+                result.errors[stage.name] = skipped
+                raise skipped
+
+        limiter = limits.get(stage.provider)
+        try:
+            if limiter is not None:
+                await limiter.acquire()
+            start = time.perf_counter()
+            try:
+                with span(f"pipeline_{stage.name}"):
+                    output = await stage.run(result.outputs)
+            finally:
+                result.timings[stage.name] = time.perf_counter() - start
+                if limiter is not None:
+                    limiter.release()
+        except BaseException as e:
+            result.errors[stage.name] = e
+            raise
+        result.outputs[stage.name] = output
+        return output
+
+    for name in _topological_order(stages):
+        tasks[name] = asyncio.create_task(run(stages[name]))
+    await asyncio.gather(*tasks.values(), return_exceptions=True)
+    return result
+
+
+def _topological_order(stages: Dict[str, Stage]) -> List[str]:
+    order: List[str] = []
+    state: Dict[str, int] = {}
+
+    def visit(name: str) -> None:
+        if state.get(name) == 2:
+            return
+        if state.get(name) == 1:
+            raise ValueError(f"Stage dependencies form a cycle at {name}")
+        state[name] = 1
+        for dep in stages[name].after:
+            visit(dep)
+        state[name] = 2
+        order.append(name)
+
+    for name in stages:
+        visit(name)
+    return order
+
+
+@dataclass
+class CampaignRunResult:
+    campaign_id: str
+    outputs: Dict[str, Any]
+    timings: Dict[str, float]
+    total_seconds: float
+    error: Optional[str] = None
+    failed_stage: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class CampaignPipeline:
+    """Runs the social-media agents over campaigns as a dependency graph.
+
+        fetch -> {image, audio} -> schedule -> persist
+
+    Image and audio generation overlap, and each external provider has its
+    own concurrency limit shared by every campaign in flight, so running
+    many campaigns at once can't flood Fal or ElevenLabs.
+    """
+
+    def __init__(
+        self,
+        content_agent=None,
+        scheduling_agent=None,
+        repository: Optional[CampaignRepository] = None,
+        provider_limits: Optional[Dict[str, int]] = None,
+        max_campaigns: int = 8,
+        timezone: str = 'UTC',
+    ):
+        self.repository = repository or get_campaign_repository()
+        if content_agent is None:
+            from .content_agent import ContentAgent
+            content_agent = ContentAgent(self.repository)
+        if scheduling_agent is None:
+            from .scheduling_agent import SchedulingAgent
+            scheduling_agent = SchedulingAgent(self.repository)
+        self.content = content_agent
+        self.scheduling = scheduling_agent
+        self.timezone = timezone
+        self.max_campaigns = max_campaigns
+        limits = {'fal': 4, 'elevenlabs': 2, 'supabase': 10, **(provider_limits or {})}
+        self.limits = {provider: asyncio.Semaphore(n) for provider, n in limits.items()}
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "CampaignPipeline":
+        return cls(
+            provider_limits={
+                'fal': int(os.getenv("PIPELINE_FAL_CONCURRENCY", 4)),
+                'elevenlabs': int(os.getenv("PIPELINE_AUDIO_CONCURRENCY", 2)),
+                'supabase': int(os.getenv("PIPELINE_DB_CONCURRENCY", 10)),
+            },
+            max_campaigns=int(os.getenv("PIPELINE_MAX_CAMPAIGNS", 8)),
+            timezone=os.getenv("PIPELINE_TIMEZONE", "UTC"),
+            **kwargs,
+        )
+
+    def stages(self, campaign_id: str) -> List[Stage]:
+        async def fetch(_):
+            campaign = await self.repository.get_campaign(campaign_id)
+            if campaign is None:
+                raise LookupError(f"Campaign {campaign_id} not found")
+            requirements = await self.content.analyze_campaign_requirements(campaign)
+            return {'campaign': campaign, 'requirements': requirements}
+
+        async def image(outputs):
+            fetched = outputs['fetch']
+            return await self.content.generate_image(fetched['campaign'], fetched['requirements'])
+
+        async def audio(outputs):
+            fetched = outputs['fetch']
+            if not fetched['requirements']['needs_audio']:
+                return None
+            return await self.content.generate_audio(fetched['campaign'])
+
+        async def schedule(outputs):
+            # Hold the slot so the restaurant's other campaigns in flight
+            # don't take it; persist gives it back if the write fails
+            return await self.scheduling.determine_optimal_posting_time(
+                outputs['fetch']['campaign'], self.timezone, book=True
+            )
+
+        async def persist(outputs):
+            values = {
+                'media_url': outputs['image']['image_url'],
+                'selected': True,
+                'scheduled_time': outputs['schedule'].isoformat(),
+            }
+            if outputs['audio']:
+                values['audio_url'] = outputs['audio']
+            try:
+                return await self.repository.update_campaign(campaign_id, values)
+            except BaseException:
+                # The slot was only held for this campaign; don't leak it
+                self.scheduling.release_posting_time(outputs['fetch']['campaign'], outputs['schedule'])
+                raise
+
+        return [
+            Stage('fetch', fetch, provider='supabase'),
+            Stage('image', image, after=('fetch',), provider='fal'),
+            Stage('audio', audio, after=('fetch',), provider='elevenlabs'),
+            Stage('schedule', schedule, after=('image', 'audio')),
+            Stage('persist', persist, after=('schedule',), provider='supabase'),
+        ]
+
+    async def run(self, campaign_id: str) -> CampaignRunResult:
+        """Run every stage for one campaign; failures are reported, not raised"""
+        start = time.perf_counter()
+        with self.repository.scope():
+            run = await run_stages(self.stages(campaign_id), self.limits)
+
+        result = CampaignRunResult(
+            campaign_id=campaign_id,
+            outputs=run.outputs,
+            timings=run.timings,
+            total_seconds=time.perf_counter() - start,
+        )
+        # Report the stage that actually failed, not the ones it skipped
+        for name, error in run.errors.items():
+            if not isinstance(error, StageSkipped):
+                result.error = str(error) or type(error).__name__
+                result.failed_stage = name
+                logger.warning("Campaign %s failed at %s: %s", campaign_id, name, result.error)
+                break
+        return result
+
+    async def run_many(self, campaign_ids: Iterable[str]) -> List[CampaignRunResult]:
+        """Run campaigns in parallel, at most max_campaigns at a time"""
+        limiter = asyncio.Semaphore(self.max_campaigns)
+
+        async def run_one(campaign_id: str) -> CampaignRunResult:
+            async with limiter:
+                return await self.run(campaign_id)
+
+        return await asyncio.gather(*(run_one(str(i)) for i in campaign_ids))
@@ -1,43 +1,133 @@
-from datetime import datetime, timedelta
-from typing import Dict, List
-import pytz
-from ...database.operations.social_media_ops import SocialMediaDB
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+from ...database.operations.campaign_repository import CampaignRepository, get_campaign_repository
+from ...services.campaign_analytics import MetricsFrame, analyze_metrics
+from ...services.posting_model import get_posting_models, hour_of_week
+from ...services.posting_schedule import PostingScheduler, posting_hours_for, primary_platform, restaurant_key
 
 class SchedulingAgent:
-    def __init__(self):
-        self.db = SocialMediaDB()
+    def __init__(
+        self,
+        repository: Optional[CampaignRepository] = None,
+        scheduler: Optional[PostingScheduler] = None,
+        explore: bool = False
+    ):
+        # Shared read-through cache, so a pipeline run fetches each campaign once
+        self.db = repository or get_campaign_repository()
+        # Slots booked so far, so this agent never double-books a restaurant.
+        # Hours are learned per restaurant and platform into the shared
+        # models; ``explore`` Thompson-samples them instead of taking the best.
+        self.scheduler = scheduler or PostingScheduler(models=get_posting_models(), explore=explore)
+
+    async def learn_posting_hours(
+        self,
+        restaurant_id: str,
+        timezone: str = 'UTC',
+        timeframe_days: int = 90,
+        until: Optional[datetime] = None
+    ) -> int:
+        """Fit the restaurant's posting-hour models to how its posts performed.
+
+        Safe to call repeatedly: a post seen before has its old engagement
+        replaced, not counted twice. Returns how many posts were used.
+        """
+        campaigns = [
+            c for c in await self.db.get_restaurant_campaigns(restaurant_id)
+            if c.get('scheduled_time')
+        ]
+        if not campaigns or self.scheduler.models is None:
+            return 0
+
+        until = until or datetime.now(dt_timezone.utc)
+        since = until - timedelta(days=timeframe_days)
+        rows = await self.db.get_metrics_window((c['id'] for c in campaigns), since, until)
+        report = analyze_metrics(MetricsFrame.from_rows(rows), since, until)
+
+        tz = ZoneInfo(timezone)
+        learned = 0
+        for campaign in campaigns:
+            stats = report.campaigns.get(str(campaign['id']))
+            if stats is None or stats.impressions <= 0:
+                continue
+            posted = datetime.fromisoformat(campaign['scheduled_time']).astimezone(tz)
+            model = self.scheduler.models.model(
+                restaurant_key(campaign),
+                primary_platform(campaign),
+                posting_hours_for(campaign.get('target_audience')),
+            )
+            model.observe(
+                str(campaign['id']),
+                hour_of_week(posted.weekday(), posted.hour),
+                stats.engagement_rate / 100,
+            )
+            learned += 1
+        return learned
 
     async def determine_optimal_posting_time(
         self,
         campaign_data: Dict,
-        timezone: str = 'UTC'
+        timezone: str = 'UTC',
+        after: Optional[datetime] = None,
+        book: bool = False
     ) -> datetime:
-        """Determine the best time to post based on campaign data"""
-        tz = pytz.timezone(timezone)
-        now = datetime.now(tz)
-        
-        # Basic posting time rules
-        best_hours = {
-            'restaurant': [11, 12, 17, 18],  # Lunch and dinner times
-            'retail': [10, 14, 16],          # Shopping hours
-            'default': [12, 15, 18]          # General engagement times
-        }
+        """Determine the best time to post based on campaign data.
 
-        # Get target audience type
-        audience = campaign_data.get('target_audience', '').lower()
-        posting_hours = best_hours.get(
-            next(
-                (k for k in best_hours.keys() if k in audience),
-                'default'
-            )
+        Nothing is booked unless ``book`` is set; then the slot is held for
+        the campaign's restaurant, and release_posting_time gives it back
+        if the campaign isn't saved.
+        """
+        return self.scheduler.next_slot(campaign_data, after=after, timezone=timezone, book=book)
+
+    def release_posting_time(self, campaign_data: Dict, posting_time: datetime) -> None:
+        """Free a slot determine_optimal_posting_time booked"""
+        self.scheduler.release(restaurant_key(campaign_data), [posting_time])
+
+    async def plan_posting_schedule(
+        self,
+        campaign_id: str,
+        count: int,
+        timezone: str = 'UTC',
+        after: Optional[datetime] = None
+    ) -> Dict:
+        """Plan the campaign's next ``count`` posts from its cadence and save them"""
+        campaign = await self.db.get_campaign(campaign_id)
+        if campaign is None:
+            raise LookupError(f"Campaign {campaign_id} not found")
+
+        after = after or datetime.now(dt_timezone.utc)
+        restaurant = restaurant_key(campaign)
+        # Avoid posts the restaurant's other campaigns already have planned
+        existing = await self.db.get_scheduled_posts(restaurant, after)
+        self.scheduler.book(
+            restaurant, (datetime.fromisoformat(post['scheduled_time']) for post in existing)
         )
 
-        # Find next available posting time
-        next_time = now
-        while True:
-            if next_time.hour in posting_hours:
-                return next_time
-            next_time += timedelta(hours=1)
+        slots: List[datetime] = self.scheduler.plan(campaign, count, after, timezone)
+        try:
+            result = await self.db.save_campaign_posts(
+                {
+                    'campaign_id': campaign_id,
+                    'restaurant_id': restaurant,
+                    'scheduled_time': slot.astimezone(dt_timezone.utc).isoformat(),
+                }
+                for slot in slots
+            )
+            if not result.ok:
+                raise Exception(f"Failed to save posting schedule: {result.failed[0].error}")
+        except BaseException:
+            # The slots were only held for these posts; don't leak them
+            self.scheduler.release(restaurant, slots)
+            raise
+        if slots:
+            await self.db.update_campaign_schedule(campaign_id, slots[0])
+
+        return {
+            'campaign_id': campaign_id,
+            'cadence': campaign.get('cadence') or 'daily',
+            'scheduled_times': slots,
+            'timezone': timezone
+        }
 
     async def create_posting_schedule(
         self,
@@ -47,18 +137,24 @@ class SchedulingAgent:
         """Create a posting schedule for the campaign"""
         try:
             campaign = await self.db.get_campaign(campaign_id)
-            
-            # Determine posting time
+
+            # Take the slot before the awaited save, so a concurrent call
+            # for the same restaurant can't pick it too
             posting_time = await self.determine_optimal_posting_time(
                 campaign,
-                timezone
+                timezone,
+                book=True
             )
 
             # Update campaign with scheduled time
-            await self.db.update_campaign_schedule(
-                campaign_id,
-                posting_time
-            )
+            try:
+                await self.db.update_campaign_schedule(
+                    campaign_id,
+                    posting_time
+                )
+            except BaseException:
+                self.release_posting_time(campaign, posting_time)
+                raise
 
             return {
                 'campaign_id': campaign_id,
@@ -68,4 +164,4 @@ class SchedulingAgent:
 
         except Exception as e:
             print(f"Error creating posting schedule: {str(e)}")
-            raise
\ No newline at end of file
+            raise
@@ -1,20 +1,134 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional, List, Dict
+from fastapi.responses import StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from typing import Any, AsyncIterator, Callable, Optional, List, Dict, Tuple
+import asyncio
+import functools
+from contextlib import asynccontextmanager
 import json
+import logging
 from pydantic import BaseModel
-import fal_client
 import os
 from dotenv import load_dotenv
-import base64
-from io import BytesIO
-from datetime import datetime
+from ..database.postgrest import close_postgrest_client
+from ..services.fal_gateway import (
+    QueueUpdateCallback,
+    describe_status,
+    fal_backend_from_env,
+    get_fal_gateway,
+)
+from ..services.image_preprocessor import ImagePreprocessor, sniff_image_format
+from ..services.reference_store import (
+    LocalReferenceStore,
+    create_reference_store_from_env,
+    spool_upload,
+)
+from ..services.inference_profiles import get_profile
+from ..services.prompt_templates import PromptTemplate, get_prompt_registry
+from ..services.result_cache import ResultCache, make_cache_key
+from ..services.job_queue import (
+    CallbackPolicy,
+    InvalidCallback,
+    JobQueue,
+    JobStoreFull,
+    QueueFull,
+    create_job_store_from_env,
+)
+from ..services.tracing import (
+    RequestTracingMiddleware,
+    begin_span,
+    configure_logging,
+    sample_rate_from_env,
+    shutdown_logging,
+    span,
+    stage_metrics,
+)
+from ..services.admission import (
+    AdmissionController,
+    AdmissionMiddleware,
+    ClientIdentifier,
+    RateLimiter,
+    create_rate_limit_backend_from_env,
+    key_digest,
+)
+from ..services.upload_limits import (
+    UploadLimitMiddleware,
+    max_request_bytes_from_env,
+    max_upload_bytes_from_env,
+)
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup checks and background workers; clients are built on first use"""
+    # Structured logs go through a background queue instead of blocking on
+    # stdout; set up here so importing the app leaves logging alone
+    configure_logging()
+    # Checked here rather than at import so tooling can import the app; the
+    # local mock Fal (FAL_BACKEND=mock) needs no key
+    if fal_backend_from_env() == "fal" and not os.getenv("FAL_KEY"):
+        raise ValueError("FAL_KEY not found in environment variables")
+    await job_queue.start()
+    try:
+        yield
+    finally:
+        await job_queue.stop()
+        image_preprocessor.shutdown()
+        await fal_gateway.aclose()
+        await close_postgrest_client()
+        shutdown_logging()
+
 # Initialize FastAPI app
-app = FastAPI(title="FluffyDuck API - Restaurant Photo Enhancer")
+app = FastAPI(title="FluffyDuck API - Restaurant Photo Enhancer", lifespan=lifespan)
+
+# Callers are told apart by a key listed in API_KEYS or by their address,
+# taken from X-Forwarded-For only behind TRUSTED_PROXIES
+client_identity = ClientIdentifier.from_env()
+
+def tenant_for_scope(scope: Dict) -> str:
+    """Identify the caller by a known API key, falling back to the client address"""
+    return client_identity(scope)
+
+# Endpoints that upload a photo and call Fal
+ENHANCEMENT_PATHS = [
+    "/api/generate-campaign",
+    "/api/generate-campaign/stream",
+    "/api/jobs/generate-campaign",
+]
+
+# Concurrency cap with a bounded wait queue, plus per-client token buckets;
+# saturated requests get 503/429 with Retry-After before their upload is read
+admission = AdmissionController(
+    max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", 8)),
+    max_waiting=int(os.getenv("ADMISSION_MAX_WAITING", 32)),
+    wait_timeout=float(os.getenv("ADMISSION_WAIT_TIMEOUT_SECONDS", 10)),
+)
+rate_limiter = RateLimiter(
+    create_rate_limit_backend_from_env(),
+    rate=float(os.getenv("RATE_LIMIT_PER_MINUTE", 30)) / 60,
+    burst=int(os.getenv("RATE_LIMIT_BURST", 10)),
+)
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission,
+    limiter=rate_limiter,
+    paths=ENHANCEMENT_PATHS,
+    client_key=tenant_for_scope
+)
+
+# Reject oversized or non-image uploads while they stream in (inside CORS so
+# browsers can read the 413/415)
+MAX_UPLOAD_BYTES = max_upload_bytes_from_env()
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_body_bytes=max_request_bytes_from_env(),
+    accept=sniff_image_format
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -30,12 +144,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Check for FAL API key
-FAL_KEY = os.getenv("FAL_KEY")
-if not FAL_KEY:
-    raise ValueError("FAL_KEY not found in environment variables")
+# Request IDs, sampled request logs and per-stage timings; added last so it
+# is outermost and also sees requests the middleware above turns away
+app.add_middleware(RequestTracingMiddleware, sample_rate=sample_rate_from_env())
 
-fal_client.api_key = FAL_KEY
+# Shared async Fal client: pooled connection, timeouts, retries, concurrency cap
+fal_gateway = get_fal_gateway()
+
+# Uploaded photos are downscaled for the target platform and handed to Fal
+# by URL rather than inline base64
+image_preprocessor = ImagePreprocessor.from_env()
+reference_store = create_reference_store_from_env()
+if isinstance(reference_store, LocalReferenceStore):
+    app.mount(
+        "/api/references",
+        StaticFiles(directory=reference_store.directory),
+        name="references"
+    )
 
 class CampaignRequest(BaseModel):
     name: str
@@ -43,139 +168,330 @@ class CampaignRequest(BaseModel):
     target_audience: str
     cadence: str
     platforms: List[str]
+    # draft, standard or final; FAL_DEFAULT_PROFILE when omitted
+    profile: Optional[str] = None
+    # Fal seed from an earlier result: the same campaign, profile and seed
+    # render the same batch again
+    seed: Optional[int] = None
+
+class PlatformImages(BaseModel):
+    generated_images: List[str]
+    prompt: str
+    style_used: str
+    profile: Optional[str] = None
+    prompt_version: Optional[str] = None
+    # One seed for the whole batch, not one per image
+    seed: Optional[int] = None
 
 class ImageGenerationResponse(BaseModel):
+    # Top-level fields mirror the first platform for older clients
     generated_images: List[str]
     prompt: str
     style_used: str
+    profile: Optional[str] = None
+    prompt_version: Optional[str] = None
+    seed: Optional[int] = None
+    platforms: Dict[str, PlatformImages] = {}
+    errors: Dict[str, str] = {}
+
+class JobSubmissionResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    events_url: str
+
+class JobStatusResponse(BaseModel):
+    id: str
+    status: str
+    created_at: str
+    updated_at: str
+    result: Optional[ImageGenerationResponse] = None
+    error: Optional[str] = None
+
+# Prompts, styles and fixed Fal arguments per platform, compiled once
+prompt_registry = get_prompt_registry()
+
+def platform_style_for(platform: str) -> PromptTemplate:
+    """Enhancement template (style, image size, prompt) for a platform"""
+    return prompt_registry.get('enhance', platform)
 
 async def enhance_restaurant_photo(
     name: str,
     description: str,
     target_audience: str,
-    platforms: List[str],
-    reference_image_data: str
+    platform: str,
+    reference_image_url: str,
+    on_queue_update: Optional[QueueUpdateCallback] = None,
+    profile: Optional[str] = None,
+    seed: Optional[int] = None
 ) -> Dict:
     """Enhance existing restaurant food photography while maintaining composition"""
     try:
-        print("\n=== Starting photo enhancement ===")
-        print(f"Processing for platform: {platforms[0] if platforms else 'Instagram'}")
-        
-        # Platform-specific enhancement styles
-        primary_platform = platforms[0] if platforms else "Instagram"
-        style_modifiers = {
-            'Instagram': {
-                'style': (
-                    "enhance this exact food photo, improve lighting and colors, "
-                    "make it instagram-worthy while keeping exact composition, "
-                    "maintain identical plating, enhance existing details, "
-                    "professional food photography color grading"
-                ),
-                'aspect_ratio': "square_hd"
-            },
-            'LinkedIn': {
-                'style': (
-                    "enhance this exact food photo, improve lighting and colors, "
-                    "upscale restaurant style while keeping exact composition, "
-                    "maintain identical plating, enhance existing details, "
-                    "professional business presentation"
-                ),
-                'aspect_ratio': "landscape_hd"
-            },
-            'Facebook': {
-                'style': (
-                    "enhance this exact food photo, improve lighting and colors, "
-                    "social-media optimized while keeping exact composition, "
-                    "maintain identical plating, enhance existing details, "
-                    "engaging food presentation"
-                ),
-                'aspect_ratio': "landscape_hd"
-            },
-            'Twitter': {
-                'style': (
-                    "enhance this exact food photo, improve lighting and colors, "
-                    "attention-grabbing while keeping exact composition, "
-                    "maintain identical plating, enhance existing details, "
-                    "impactful food presentation"
-                ),
-                'aspect_ratio': "landscape_hd"
-            }
-        }
+        inference_profile = get_profile(profile)
+        template = platform_style_for(platform)
 
-        platform_style = style_modifiers.get(primary_platform, {
-            'style': "enhance this exact food photo professionally",
-            'aspect_ratio': "square_hd"
-        })
-
-        print("Crafting enhancement prompt...")
-        # Craft detailed enhancement prompt
-        prompt = (
-            f"Enhance this exact food photo for {name} restaurant marketing. "
-            f"Keep the exact same composition and plating. "
-            f"Campaign focus: {description}. "
-            f"Target audience: {target_audience}. "
-            "DO NOT change food arrangement or composition. "
-            "ONLY enhance: "
-            "- Professional lighting to highlight textures "
-            "- Color balance and vibrancy "
-            "- Sharpness and clarity "
-            "- Professional food photography appeal "
-            "Make lighting and colors match high-end restaurant photography. "
-            "Maintain exact food placement and styling. "
-            "Enhance existing shadows and highlights. "
-            "Keep natural, authentic food appearance."
+        prompt = template.render(name, description, target_audience)
+        arguments = template.fal_arguments(
+            prompt,
+            # Steps, image count, size, guidance and scheduler
+            **inference_profile.fal_arguments(template.image_size),
+            reference_image=reference_image_url
         )
-        print("Prompt created successfully")
-
-        print("Configuring FAL API parameters...")
-        # Configure enhancement parameters
-        arguments = {
-            "prompt": prompt,
-            "negative_prompt": (
-                "different composition, different plating, different food, "
-                "new arrangement, modified layout, alternate angle, "
-                "changed perspective, different setup, artificial looking, "
-                "oversaturated, unrealistic colors, cartoon effect, "
-                "illustration style, painting style, artificial enhancement"
-            ),
-            "image_size": platform_style['aspect_ratio'],
-            "num_inference_steps": 50,
-            "guidance_scale": 7.0,
-            "num_images": 3,
-            "scheduler": "DPM++ 2M Karras",
-            "image_guidance_scale": 2.5,
-            "reference_image": reference_image_data,
-            "reference_weight": 0.98,
-            "control_guidance_start": 0.0,
-            "control_guidance_end": 1.0
-        }
+        if seed is not None:
+            # Reproducible: the same prompt, profile and seed give the same batch
+            arguments['seed'] = seed
 
-        print("Calling FAL API...")
         # Call FAL API
-        result = await fal_client.subscribe(
-            "110602490-sdxl-turbo-food-enhancement",
-            arguments,
-            with_logs=True
-        )
-        
-        print("Raw FAL API response:", result)
-        
+        with span("fal", platform=platform, profile=inference_profile.name):
+            result = await fal_gateway.subscribe(
+                template.application,
+                arguments,
+                with_logs=True,
+                on_queue_update=on_queue_update
+            )
+
         if not isinstance(result, dict) or 'images' not in result:
             raise ValueError(f"Invalid response format from Fal.ai: {result}")
 
         # Extract image URLs
         generated_urls = [img['url'] for img in result['images']]
-        print("Generated image URLs:", generated_urls)
+        logger.info(
+            "Enhanced photo for %s", platform,
+            extra={'platform': platform, 'profile': inference_profile.name, 'images': len(generated_urls)}
+        )
 
         return {
             'generated_images': generated_urls,
             'prompt': prompt,
-            'style_used': platform_style['style']
+            'style_used': template.style,
+            'profile': inference_profile.name,
+            'prompt_version': template.version,
+            'seed': result.get('seed')
         }
 
     except Exception as e:
-        print(f"Error enhancing food image: {str(e)}")
+        logger.warning("Error enhancing food image for %s: %s", platform, e)
+        raise
+
+def parse_campaign_request(campaign: str) -> CampaignRequest:
+    """Validate the JSON campaign form field"""
+    try:
+        with span("parse"):
+            campaign_data = json.loads(campaign)
+            campaign_request = CampaignRequest(**campaign_data)
+            # Resolve the default now so jobs keep the profile they were queued with
+            campaign_request.profile = get_profile(campaign_request.profile).name
+        return campaign_request
+    except json.JSONDecodeError as e:
+        logger.warning("Campaign data validation failed: %s", e)
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid campaign data format"
+        )
+    except ValueError as e:
+        logger.warning("Campaign data validation failed: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def store_reference_image(
+    reference_image: UploadFile,
+    platforms: List[str]
+) -> Tuple[str, str]:
+    """Stream, pre-process and store the uploaded photo.
+
+    Returns the URL Fal should read the image from and the SHA-256 of the
+    original upload.
+    """
+    spooled = processed = None
+    try:
+        with span("read"):
+            spooled = await spool_upload(
+                reference_image,
+                max_size=MAX_UPLOAD_BYTES,
+                check_head=sniff_image_format
+            )
+
+        if spooled.size == 0:
+            raise HTTPException(
+                status_code=400,
+                detail="Empty image file"
+            )
+
+        image_sizes = [
+            platform_style_for(p).image_size for p in (platforms or ["Instagram"])
+        ]
+        try:
+            with span("encode"):
+                result = await image_preprocessor.process(spooled, image_sizes)
+        except ValueError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        processed = result.upload
+        logger.info(
+            "Prepared reference image",
+            extra={
+                'detected_type': result.detected_type,
+                'declared_type': reference_image.content_type,
+                'original_bytes': spooled.size,
+                'sent_bytes': processed.size,
+                'reencoded': result.reencoded,
+            }
+        )
+
+        with span("store"):
+            reference_image_url = await reference_store.put(processed)
+        return reference_image_url, spooled.sha256
+
+    except HTTPException:
         raise
+    except Exception as e:
+        logger.warning("Image processing error: %s", e)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error processing image: {str(e)}"
+        )
+    finally:
+        for upload in (spooled, processed):
+            if upload:
+                upload.discard()
+
+# Identical re-submissions share one Fal call and reuse its result
+result_cache = ResultCache.from_env()
+
+async def cached_enhance_restaurant_photo(
+    name: str,
+    description: str,
+    target_audience: str,
+    platform: str,
+    reference_image_url: str,
+    reference_digest: str,
+    on_queue_update: Optional[QueueUpdateCallback] = None,
+    profile: Optional[str] = None,
+    seed: Optional[int] = None
+) -> Dict:
+    """enhance_restaurant_photo behind the content-addressed result cache.
+
+    Queue updates only reach the caller that actually triggers the Fal call;
+    cache hits and coalesced duplicates finish without progress events.
+    """
+    profile = get_profile(profile).name
+    key = make_cache_key(
+        reference_digest,
+        name=name,
+        description=description,
+        target_audience=target_audience,
+        platform=platform,
+        profile=profile,
+        # Editing a template must not serve results rendered from the old one
+        prompt_version=platform_style_for(platform).version,
+        **({'seed': seed} if seed is not None else {})
+    )
+    return await result_cache.get_or_compute(
+        key,
+        lambda: enhance_restaurant_photo(
+            name=name,
+            description=description,
+            target_audience=target_audience,
+            platform=platform,
+            reference_image_url=reference_image_url,
+            on_queue_update=on_queue_update,
+            profile=profile,
+            seed=seed
+        )
+    )
+
+# Upper bound on concurrent Fal calls fanned out for one campaign
+FAN_OUT_CONCURRENCY = int(os.getenv("FAN_OUT_CONCURRENCY", 4))
+
+def selected_platforms(platforms: List[str]) -> List[str]:
+    """Requested platforms without duplicates, defaulting to Instagram"""
+    return list(dict.fromkeys(platforms)) or ["Instagram"]
+
+async def enhance_for_platforms(
+    name: str,
+    description: str,
+    target_audience: str,
+    platforms: List[str],
+    reference_image_url: str,
+    reference_digest: str,
+    on_queue_update: Optional[Callable[[str, Any], Any]] = None,
+    profile: Optional[str] = None,
+    seed: Optional[int] = None
+) -> AsyncIterator[Tuple[str, Optional[Dict], Optional[str]]]:
+    """Run one enhancement per platform concurrently, yielding as each finishes.
+
+    Yields (platform, result, error) tuples; exactly one of result/error is set.
+    on_queue_update, if given, is called with (platform, status) for every
+    Fal queue status seen.
+    """
+    semaphore = asyncio.Semaphore(FAN_OUT_CONCURRENCY)
+
+    async def run(platform: str):
+        async with semaphore:
+            try:
+                result = await cached_enhance_restaurant_photo(
+                    name=name,
+                    description=description,
+                    target_audience=target_audience,
+                    platform=platform,
+                    reference_image_url=reference_image_url,
+                    reference_digest=reference_digest,
+                    on_queue_update=(
+                        functools.partial(on_queue_update, platform)
+                        if on_queue_update else None
+                    ),
+                    profile=profile,
+                    seed=seed
+                )
+                return platform, result, None
+            except Exception as e:
+                logger.warning("Enhancement for %s failed: %s", platform, e)
+                return platform, None, str(e)
+
+    tasks = [asyncio.create_task(run(p)) for p in selected_platforms(platforms)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def generate_for_platforms(
+    name: str,
+    description: str,
+    target_audience: str,
+    platforms: List[str],
+    reference_image_url: str,
+    reference_digest: str,
+    profile: Optional[str] = None,
+    seed: Optional[int] = None
+) -> Dict:
+    """Collect every platform's result into one ImageGenerationResponse"""
+    results: Dict[str, Dict] = {}
+    errors: Dict[str, str] = {}
+    async for platform, result, error in enhance_for_platforms(
+        name=name,
+        description=description,
+        target_audience=target_audience,
+        platforms=platforms,
+        reference_image_url=reference_image_url,
+        reference_digest=reference_digest,
+        profile=profile,
+        seed=seed
+    ):
+        if error is None:
+            results[platform] = result
+        else:
+            errors[platform] = error
+
+    if not results:
+        raise RuntimeError("; ".join(f"{p}: {e}" for p, e in errors.items()))
+
+    ordered = [p for p in selected_platforms(platforms) if p in results]
+    primary = results[ordered[0]]
+    return {
+        **primary,
+        'platforms': {p: results[p] for p in ordered},
+        'errors': errors
+    }
 
 @app.post("/api/generate-campaign", response_model=ImageGenerationResponse)
 async def generate_campaign(
@@ -184,84 +500,272 @@ async def generate_campaign(
 ):
     """Enhance existing restaurant food photos for marketing campaign"""
     try:
-        print("\n=== Starting new campaign generation ===")
-        print(f"Timestamp: {datetime.now()}")
-        
-        # Debug request data
-        print("1. Checking request data...")
-        print(f"Campaign data received: {campaign}")
-        print(f"Image details:")
-        print(f"- Filename: {reference_image.filename if reference_image else 'No file'}")
-        print(f"- Content type: {reference_image.content_type if reference_image else 'No content type'}")
-
         # Validate campaign data
-        print("2. Validating campaign data...")
-        try:
-            campaign_data = json.loads(campaign)
-            campaign_request = CampaignRequest(**campaign_data)
-            print("Campaign data validation successful")
-        except json.JSONDecodeError as e:
-            print(f"Campaign data validation failed: {str(e)}")
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid campaign data format"
-            )
+        campaign_request = parse_campaign_request(campaign)
 
         # Validate and process image
-        print("3. Processing image...")
-        try:
-            contents = await reference_image.read()
-            file_size = len(contents)
-            print(f"- File size: {file_size} bytes")
-            
-            if file_size == 0:
-                print("Empty file detected")
-                raise HTTPException(
-                    status_code=400,
-                    detail="Empty image file"
-                )
-            
-            print("4. Converting image to base64...")
-            reference_image_data = f"data:image/jpeg;base64,{base64.b64encode(contents).decode('utf-8')}"
-            print("Image conversion successful")
-            
-        except Exception as e:
-            print(f"Image processing error: {str(e)}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Error processing image: {str(e)}"
-            )
+        reference_image_url, reference_digest = await store_reference_image(
+            reference_image, campaign_request.platforms
+        )
 
         # Call FAL API
-        print("5. Calling FAL API...")
         try:
-            result = await enhance_restaurant_photo(
+            result = await generate_for_platforms(
                 name=campaign_request.name,
                 description=campaign_request.description,
                 target_audience=campaign_request.target_audience,
                 platforms=campaign_request.platforms,
-                reference_image_data=reference_image_data
+                reference_image_url=reference_image_url,
+                reference_digest=reference_digest,
+                profile=campaign_request.profile,
+                seed=campaign_request.seed
             )
-            print("6. FAL API call successful")
+            # Ends once FastAPI has validated and sent the response
+            begin_span("respond")
             return result
-            
+
         except Exception as e:
-            print(f"FAL API error: {str(e)}")
+            logger.error("FAL API error: %s", e)
             raise HTTPException(
                 status_code=500,
                 detail=f"Error from FAL API: {str(e)}"
             )
 
-    except HTTPException as he:
-        print(f"HTTP Exception: {he.detail}")
+    except HTTPException:
         raise
     except Exception as e:
-        print(f"Unexpected error: {str(e)}")
+        logger.exception("Unexpected error generating campaign")
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
+async def generation_events(
+    name: str,
+    description: str,
+    target_audience: str,
+    platforms: List[str],
+    reference_image_url: str,
+    reference_digest: str,
+    profile: Optional[str] = None,
+    seed: Optional[int] = None
+) -> AsyncIterator[Dict]:
+    """Progress events for a fan-out generation, in the order they happen.
+
+    Emits queued (with queue position), running, progress (new Fal log lines),
+    one image event per generated URL as soon as its platform completes,
+    platform_complete / error per platform, and finally done.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    last_seen: Dict[str, Tuple] = {}
+    logs_sent: Dict[str, int] = {}
+
+    def on_queue_update(platform: str, status) -> None:
+        update = describe_status(status)
+        if update['status'] == 'queued':
+            if last_seen.get(platform) != ('queued', update['position']):
+                last_seen[platform] = ('queued', update['position'])
+                events.put_nowait({
+                    'event': 'queued',
+                    'platform': platform,
+                    'position': update['position']
+                })
+        elif update['status'] == 'in_progress':
+            if last_seen.get(platform) != ('in_progress',):
+                last_seen[platform] = ('in_progress',)
+                events.put_nowait({'event': 'running', 'platform': platform})
+            new_logs = update['logs'][logs_sent.get(platform, 0):]
+            if new_logs:
+                logs_sent[platform] = len(update['logs'])
+                events.put_nowait({'event': 'progress', 'platform': platform, 'logs': new_logs})
+
+    async def run():
+        try:
+            async for platform, result, error in enhance_for_platforms(
+                name=name,
+                description=description,
+                target_audience=target_audience,
+                platforms=platforms,
+                reference_image_url=reference_image_url,
+                reference_digest=reference_digest,
+                on_queue_update=on_queue_update,
+                profile=profile,
+                seed=seed
+            ):
+                if error is not None:
+                    events.put_nowait({'event': 'error', 'platform': platform, 'error': error})
+                    continue
+                for index, url in enumerate(result['generated_images']):
+                    events.put_nowait({
+                        'event': 'image',
+                        'platform': platform,
+                        'index': index,
+                        'url': url
+                    })
+                events.put_nowait({
+                    'event': 'platform_complete',
+                    'platform': platform,
+                    'result': result
+                })
+        finally:
+            events.put_nowait(None)
+
+    producer = asyncio.create_task(run())
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+        await producer
+        yield {'event': 'done'}
+    finally:
+        producer.cancel()
+
+def _ndjson(event: Dict) -> str:
+    return json.dumps(event) + "\n"
+
+def _sse(event: Dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+@app.post("/api/generate-campaign/stream")
+async def generate_campaign_stream(
+    request: Request,
+    campaign: str = Form(...),
+    reference_image: UploadFile = File(...),
+    format: Optional[str] = None
+):
+    """Like /api/generate-campaign, but streams progress as it happens.
+
+    Sends server-sent events when format=sse or the client accepts
+    text/event-stream, newline-delimited JSON otherwise.
+    """
+    campaign_request = parse_campaign_request(campaign)
+    reference_image_url, reference_digest = await store_reference_image(
+        reference_image, campaign_request.platforms
+    )
+
+    use_sse = format == "sse" or (
+        format is None and "text/event-stream" in request.headers.get("accept", "")
+    )
+    encode = _sse if use_sse else _ndjson
+
+    async def body():
+        async for event in generation_events(
+            name=campaign_request.name,
+            description=campaign_request.description,
+            target_audience=campaign_request.target_audience,
+            platforms=campaign_request.platforms,
+            reference_image_url=reference_image_url,
+            reference_digest=reference_digest,
+            profile=campaign_request.profile,
+            seed=campaign_request.seed
+        ):
+            yield encode(event)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ---------------------------------------------------------------------------
+# Async generation jobs: submit, then poll / stream events / receive a callback
+# ---------------------------------------------------------------------------
+
+async def _run_generation_job(payload: Dict) -> Dict:
+    return await generate_for_platforms(**payload)
+
+job_queue = JobQueue(
+    handler=_run_generation_job,
+    store=create_job_store_from_env(),
+    workers=int(os.getenv("JOB_WORKERS", 4)),
+    per_tenant_limit=int(os.getenv("JOB_TENANT_CONCURRENCY", 2)),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", 100)),
+    # Callbacks only go to public https hosts listed in JOB_CALLBACK_HOSTS
+    callback_policy=CallbackPolicy.from_env(),
+)
+
+def get_tenant(request: Request) -> str:
+    """Identify the caller by a known API key, falling back to the client address"""
+    return tenant_for_scope(request.scope)
+
+@app.post(
+    "/api/jobs/generate-campaign",
+    response_model=JobSubmissionResponse,
+    status_code=202
+)
+async def submit_generation_job(
+    request: Request,
+    campaign: str = Form(...),
+    reference_image: UploadFile = File(...),
+    callback_url: Optional[str] = Form(None)
+):
+    """Queue a photo enhancement job and return its id immediately"""
+    campaign_request = parse_campaign_request(campaign)
+    try:
+        # Refuse before uploading a reference image nobody would use
+        await job_queue.check_submission(callback_url)
+        reference_image_url, reference_digest = await store_reference_image(
+            reference_image, campaign_request.platforms
+        )
+        job = await job_queue.submit(
+            tenant=get_tenant(request),
+            payload={
+                'name': campaign_request.name,
+                'description': campaign_request.description,
+                'target_audience': campaign_request.target_audience,
+                'platforms': campaign_request.platforms,
+                'reference_image_url': reference_image_url,
+                'reference_digest': reference_digest,
+                'profile': campaign_request.profile,
+                'seed': campaign_request.seed
+            },
+            callback_url=callback_url
+        )
+    except InvalidCallback as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (QueueFull, JobStoreFull) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    # The tenant may be a client address; log a digest, never the value
+    logger.info(
+        "Queued generation job %s", job.id,
+        extra={'job_id': job.id, 'tenant': key_digest(job.tenant)}
+    )
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f"/api/jobs/{job.id}",
+        'events_url': f"/api/jobs/{job.id}/events"
+    }
+
+@app.get("/api/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_generation_job(job_id: str):
+    """Poll the state of a generation job"""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_generation_job(job_id: str):
+    """Server-sent events with the job state, ending when the job finishes"""
+    if await job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for job in job_queue.watch(job_id):
+            data = {
+                k: v for k, v in job.to_dict().items()
+                if k not in ('tenant', 'callback_url')
+            }
+            yield f"event: {job.status}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -272,6 +776,18 @@ async def root():
         "service": "food-photography-enhancer"
     }
 
+@app.get("/api/metrics")
+async def metrics():
+    """Runtime metrics for the enhancement pipeline"""
+    return {
+        "result_cache": result_cache.stats(),
+        "fal": fal_gateway.stats(),
+        "jobs": {"pending": job_queue.pending},
+        "stages": stage_metrics.snapshot(),
+        "admission": admission.stats(),
+        "rate_limit": rate_limiter.stats()
+    }
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
@@ -0,0 +1,79 @@
+import logging
+import os
+import socket
+import uuid
+from typing import Dict, Iterable, List, Optional, Set
+from ..postgrest import PostgrestClient, get_postgrest_client
+
+logger = logging.getLogger(__name__)
+
+class LeaseLost(Exception):
+    """Raised when a worker finishes a campaign whose lease it no longer holds"""
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+class CampaignQueue:
+    """Leases unprocessed campaigns to workers through the claim_* RPCs.
+
+    Each claimed campaign belongs to this worker until its lease runs out;
+    heartbeat() keeps leases alive while work is in progress. A worker that
+    dies simply stops renewing, and its campaigns become claimable again
+    once lease_seconds pass (see schema/campaigns.sql).
+    """
+
+    def __init__(
+        self,
+        client: Optional[PostgrestClient] = None,
+        worker_id: Optional[str] = None,
+        lease_seconds: int = 300,
+        max_attempts: int = 5,
+    ):
+        self.client = client or get_postgrest_client()
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    async def claim(self, batch_size: int = 1) -> List[Dict]:
+        """Lease up to batch_size of the oldest unclaimed campaigns"""
+        rows = await self.client.rpc('claim_campaigns', {
+            'worker_id': self.worker_id,
+            'batch_size': batch_size,
+            'lease_seconds': self.lease_seconds,
+            'max_attempts': self.max_attempts,
+        })
+        if rows:
+            logger.info("Worker %s claimed %d campaign(s)", self.worker_id, len(rows))
+        return rows or []
+
+    async def heartbeat(self, campaign_ids: Iterable[str]) -> Set[str]:
+        """Extend leases; returns the IDs this worker still holds"""
+        campaign_ids = list(campaign_ids)
+        if not campaign_ids:
+            return set()
+        held = await self.client.rpc('heartbeat_campaigns', {
+            'worker_id': self.worker_id,
+            'campaign_ids': campaign_ids,
+            'lease_seconds': self.lease_seconds,
+        })
+        return {str(campaign_id) for campaign_id in held or []}
+
+    async def complete(self, campaign_id: str, media_url: str) -> Dict:
+        """Store the generated media and take the campaign off the queue"""
+        rows = await self.client.rpc('complete_campaign', {
+            'worker_id': self.worker_id,
+            'campaign_id': campaign_id,
+            'generated_media_url': media_url,
+        })
+        if not rows:
+            raise LeaseLost(f"Campaign {campaign_id} is no longer leased to {self.worker_id}")
+        return rows[0]
+
+    async def release(self, campaign_id: str, error: Optional[str] = None) -> bool:
+        """Hand a campaign back for another worker to retry"""
+        rows = await self.client.rpc('release_campaign', {
+            'worker_id': self.worker_id,
+            'campaign_id': campaign_id,
+            'error': error,
+        })
+        return bool(rows)
@@ -0,0 +1,243 @@
+import asyncio
+import contextvars
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from ..postgrest import BulkResult
+from .social_media_ops import SocialMediaOps
+
+# Rows read so far in the current request/pipeline run, keyed by campaign ID
+_scope: contextvars.ContextVar[Optional[Dict[str, Dict]]] = contextvars.ContextVar(
+    "fluffyduck_campaign_scope", default=None
+)
+
+class CampaignRepository:
+    """Read-through campaign cache shared by the social-media agents.
+
+    Lookups check, in order, the current scope (one consistent view per
+    request or pipeline run), a process-wide LRU with a TTL, and finally the
+    database. Misses for different IDs requested in the same event-loop tick
+    are fetched together in one ``id=in.(...)`` query, DataLoader-style.
+    Writes made through the repository invalidate both cache levels.
+    """
+
+    def __init__(
+        self,
+        ops: Optional[SocialMediaOps] = None,
+        ttl_seconds: float = 60.0,
+        max_entries: int = 1024,
+        max_batch: int = 100,
+    ):
+        self.ops = ops or SocialMediaOps()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_batch = max_batch
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        # Invalidated while a fetch was in flight, so its result mustn't be stored
+        self._stale: Set[str] = set()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._queued: List[str] = []
+        self._stats = {
+            'scope_hits': 0,
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'batches': 0,
+            'invalidations': 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "CampaignRepository":
+        return cls(
+            ttl_seconds=float(os.getenv("CAMPAIGN_CACHE_TTL_SECONDS", 60)),
+            max_entries=int(os.getenv("CAMPAIGN_CACHE_MAX_ENTRIES", 1024)),
+        )
+
+    @contextmanager
+    def scope(self) -> Iterator[None]:
+        """Pin every campaign read inside the block to its first value"""
+        token = _scope.set({})
+        try:
+            yield
+        finally:
+            _scope.reset(token)
+
+    # -- reads -------------------------------------------------------------
+
+    async def get_campaign(self, campaign_id: str) -> Optional[Dict]:
+        campaign_id = str(campaign_id)
+        scoped = _scope.get()
+        if scoped is not None and campaign_id in scoped:
+            self._stats['scope_hits'] += 1
+            return dict(scoped[campaign_id])
+
+        row = self._get_memory(campaign_id)
+        if row is not None:
+            self._stats['hits'] += 1
+        else:
+            row = await self._load(campaign_id)
+
+        if row is not None and scoped is not None:
+            scoped[campaign_id] = row
+        return dict(row) if row is not None else None
+
+    async def get_campaigns(self, campaign_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Campaigns by ID; IDs that don't exist are left out"""
+        ids = list(dict.fromkeys(str(i) for i in campaign_ids))
+        rows = await asyncio.gather(*(self.get_campaign(i) for i in ids))
+        return {i: row for i, row in zip(ids, rows) if row is not None}
+
+    async def get_campaign_metrics(self, campaign_id: str) -> Optional[Dict]:
+        # Metrics move constantly; always read them fresh
+        return await self.ops.get_campaign_metrics(campaign_id)
+
+    async def get_metrics_window(
+        self,
+        campaign_ids: Iterable[str],
+        since: datetime,
+        until: Optional[datetime] = None
+    ) -> List[Dict]:
+        return await self.ops.get_metrics_window(campaign_ids, since, until)
+
+    async def record_campaign_metrics(self, snapshots: Iterable[Dict]) -> List[Dict]:
+        return await self.ops.record_campaign_metrics(snapshots)
+
+    async def get_restaurant_campaigns(self, restaurant_id: str) -> List[Dict]:
+        """A restaurant's campaigns, caching each row for later lookups by ID"""
+        rows = await self.ops.get_restaurant_campaigns(restaurant_id)
+        scoped = _scope.get()
+        for row in rows:
+            campaign_id = str(row['id'])
+            if campaign_id not in self._pending:
+                self._put_memory(campaign_id, row)
+            if scoped is not None:
+                scoped.setdefault(campaign_id, row)
+        return [dict(row) for row in rows]
+
+    async def get_scheduled_posts(self, restaurant_id: str, after: datetime) -> List[Dict]:
+        return await self.ops.get_scheduled_posts(restaurant_id, after)
+
+    def _get_memory(self, campaign_id: str) -> Optional[Dict]:
+        entry = self._entries.get(campaign_id)
+        if entry is None:
+            return None
+        row, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[campaign_id]
+            return None
+        self._entries.move_to_end(campaign_id)
+        return row
+
+    def _put_memory(self, campaign_id: str, row: Dict) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[campaign_id] = (row, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(campaign_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _load(self, campaign_id: str) -> Optional[Dict]:
+        future = self._pending.get(campaign_id)
+        if future is not None:
+            self._stats['coalesced'] += 1
+        else:
+            self._stats['misses'] += 1
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[campaign_id] = future
+            if not self._queued:
+                # Let every other lookup made this tick join the batch
+                loop.call_soon(self._dispatch)
+            self._queued.append(campaign_id)
+        return await asyncio.shield(future)
+
+    def _dispatch(self) -> None:
+        queued, self._queued = self._queued, []
+        for start in range(0, len(queued), self.max_batch):
+            asyncio.ensure_future(self._fetch(queued[start:start + self.max_batch]))
+
+    async def _fetch(self, batch: List[str]) -> None:
+        self._stats['batches'] += 1
+        try:
+            rows = await self.ops.get_campaigns(batch)
+        except Exception as e:
+            for campaign_id in batch:
+                self._stale.discard(campaign_id)
+                future = self._pending.pop(campaign_id)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        found = {str(row['id']): row for row in rows}
+        for campaign_id in batch:
+            row = found.get(campaign_id)
+            if row is not None and campaign_id not in self._stale:
+                self._put_memory(campaign_id, row)
+            self._stale.discard(campaign_id)
+            future = self._pending.pop(campaign_id)
+            if not future.done():
+                future.set_result(row)
+
+    # -- writes ------------------------------------------------------------
+
+    def invalidate(self, *campaign_ids: str) -> None:
+        """Forget cached copies, here and in the current scope"""
+        scoped = _scope.get()
+        for campaign_id in map(str, campaign_ids):
+            self._stats['invalidations'] += 1
+            if campaign_id in self._pending:
+                self._stale.add(campaign_id)
+            self._entries.pop(campaign_id, None)
+            if scoped is not None:
+                scoped.pop(campaign_id, None)
+
+    def clear(self) -> None:
+        self.invalidate(*list(self._entries))
+
+    # Invalidation runs once the write is done, so a read that raced the
+    # write can neither keep nor store the old row
+
+    async def update_campaign(self, campaign_id: str, values: Dict) -> Dict:
+        try:
+            return await self.ops.update_campaign(campaign_id, values)
+        finally:
+            self.invalidate(campaign_id)
+
+    async def update_campaign_schedule(self, campaign_id: str, scheduled_time: datetime) -> Dict:
+        try:
+            return await self.ops.update_campaign_schedule(campaign_id, scheduled_time)
+        finally:
+            self.invalidate(campaign_id)
+
+    async def update_campaign_media(self, campaign_id: str, generated_image_url: str) -> Dict:
+        try:
+            return await self.ops.update_campaign_media(campaign_id, generated_image_url)
+        finally:
+            self.invalidate(campaign_id)
+
+    async def upsert_campaigns(self, campaigns: Iterable[Dict], chunk_size: Optional[int] = None) -> BulkResult:
+        campaigns = list(campaigns)
+        try:
+            return await self.ops.upsert_campaigns(campaigns, chunk_size=chunk_size)
+        finally:
+            self.invalidate(*(c['id'] for c in campaigns if c.get('id')))
+
+    async def save_campaign_posts(self, posts: Iterable[Dict]) -> BulkResult:
+        # Planned posts live in their own table; cached campaigns are unaffected
+        return await self.ops.save_campaign_posts(posts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'size': len(self._entries), 'pending': len(self._pending)}
+
+
+_repository: Optional[CampaignRepository] = None
+
+def get_campaign_repository() -> CampaignRepository:
+    """Process-wide repository, so every agent shares one cache"""
+    global _repository
+    if _repository is None:
+        _repository = CampaignRepository.from_env()
+    return _repository
@@ -1,80 +1,291 @@
-from typing import Dict, List, Optional
-from ..supabase import supabase_client
+import asyncio
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Mapping, Optional
+from ..postgrest import BulkFailure, BulkResult, PostgrestClient, PostgrestError, eq, get_postgrest_client, in_
+
+logger = logging.getLogger(__name__)
+
+
+def _only_row(result: BulkResult, campaign_id: Optional[str] = None) -> Dict:
+    """The row a one-item bulk write returned; its failure is raised instead"""
+    if result.failed:
+        failure = result.failed[0]
+        if failure.status_code == 404:
+            raise LookupError(f"Campaign {campaign_id} not found")
+        if failure.status_code is not None:
+            raise PostgrestError(failure.status_code, failure.error)
+        raise Exception(failure.error)
+    return result.succeeded[0]
+
 
 class SocialMediaOps:
-    def __init__(self):
-        self.client = supabase_client
+    """Campaign reads and writes over the shared async PostgREST client"""
+
+    def __init__(self, client: Optional[PostgrestClient] = None):
+        self.client = client or get_postgrest_client()
+
+    async def upsert_campaigns(
+        self,
+        campaigns: Iterable[Dict],
+        chunk_size: Optional[int] = None
+    ) -> BulkResult:
+        """Create or update many campaigns, a chunk per request.
+
+        Rows must be complete campaigns, ``title`` included: rows with an
+        ``id`` replace the columns they carry, and rows without one are
+        created. Use update_campaigns_media or update_campaign_schedule to
+        change a few columns. Failures are reported rather than raised.
+        """
+        result = await self.client.bulk_upsert('campaigns', list(campaigns), chunk_size=chunk_size)
+        logger.info(
+            "Upserted %d campaign(s) in %d request(s)", len(result.succeeded), result.requests
+        )
+        return result
 
     async def create_campaign(self, campaign_data: Dict) -> Dict:
-        """Create a new campaign in the database"""
+        """Save one whole campaign through upsert_campaigns.
+
+        As there, a row with the ID of an existing campaign updates the
+        columns it carries.
+        """
         try:
-            result = (
-                self.client
-                .table('campaigns')
-                .insert(campaign_data)
-                .execute()
-            )
-            
-            if not result.data:
-                raise Exception("Failed to create campaign")
-                
-            print(f"Created campaign: {result.data[0]}")
-            return result.data[0]
+            return _only_row(await self.upsert_campaigns([campaign_data]))
 
         except Exception as e:
-            print(f"Error creating campaign: {str(e)}")
+            logger.error("Error creating campaign: %s", e)
             raise
 
+    async def get_campaign(self, campaign_id: str) -> Optional[Dict]:
+        """Get a campaign by ID"""
+        rows = await self.client.select(
+            'campaigns',
+            filters={'id': eq(campaign_id)},
+            limit=1,
+        )
+        return rows[0] if rows else None
+
+    async def get_campaigns(self, campaign_ids: Iterable[str]) -> List[Dict]:
+        """Get several campaigns in one query"""
+        campaign_ids = list(campaign_ids)
+        if not campaign_ids:
+            return []
+        return await self.client.select('campaigns', filters={'id': in_(campaign_ids)})
+
     async def get_latest_campaign(self) -> Optional[Dict]:
-        """Get the most recent unprocessed campaign"""
+        """Get the most recent unprocessed campaign.
+
+        Nothing stops two callers getting the same row; workers that
+        generate media should claim through CampaignQueue instead.
+        """
         try:
-            result = (
-                self.client
-                .table('campaigns')
-                .select('*')
-                .eq('selected', False)  # Get unprocessed campaigns
-                .order('created_at', desc=True)  # Get most recent
-                .limit(1)
-                .execute()
+            rows = await self.client.select(
+                'campaigns',
+                filters={'selected': eq(False)},  # Get unprocessed campaigns
+                order='created_at.desc',  # Get most recent
+                limit=1,
             )
-            
-            if result.data:
-                print(f"Found latest campaign: {result.data[0]}")
-                return result.data[0]
-            
-            print("No unprocessed campaigns found")
+
+            if rows:
+                logger.info("Found latest campaign %s", rows[0].get('id'))
+                return rows[0]
+
+            logger.info("No unprocessed campaigns found")
             return None
 
         except Exception as e:
-            print(f"Error getting latest campaign: {str(e)}")
+            logger.error("Error getting latest campaign: %s", e)
             return None
 
+    async def get_campaign_metrics(self, campaign_id: str) -> Optional[Dict]:
+        """Get the most recent engagement metrics recorded for a campaign"""
+        rows = await self.client.select(
+            'campaign_metrics',
+            filters={'campaign_id': eq(campaign_id)},
+            order='recorded_at.desc',
+            limit=1,
+        )
+        return rows[0] if rows else None
+
+    async def get_metrics_window(
+        self,
+        campaign_ids: Iterable[str],
+        since: datetime,
+        until: Optional[datetime] = None,
+        batch_size: int = 200
+    ) -> List[Dict]:
+        """Every metrics snapshot of the campaigns recorded in [since, until].
+
+        One query per ``batch_size`` campaigns keeps the ``in.(...)`` filter
+        within URL limits; the batches run concurrently.
+        """
+        campaign_ids = list(dict.fromkeys(str(i) for i in campaign_ids))
+        window = [f"gte.{since.isoformat()}"]
+        if until is not None:
+            window.append(f"lte.{until.isoformat()}")
+
+        async def batch(ids: List[str]) -> List[Dict]:
+            return await self.client.select(
+                'campaign_metrics',
+                columns='campaign_id,likes,comments,shares,impressions,hashtag_performance,recorded_at',
+                filters={'campaign_id': in_(ids), 'recorded_at': window},
+                order='recorded_at.asc',
+            )
+
+        batches = await asyncio.gather(*(
+            batch(campaign_ids[start:start + batch_size])
+            for start in range(0, len(campaign_ids), batch_size)
+        ))
+        return [row for rows in batches for row in rows]
+
+    async def record_campaign_metrics(self, snapshots: Iterable[Dict]) -> List[Dict]:
+        """Store engagement snapshots pulled from the platforms"""
+        snapshots = list(snapshots)
+        if not snapshots:
+            return []
+        return await self.client.insert('campaign_metrics', snapshots)
+
+    async def iter_metrics(
+        self,
+        since: Optional[datetime] = None,
+        page_size: int = 1000
+    ) -> AsyncIterator[List[Dict]]:
+        """Every metrics snapshot, oldest first, a page at a time"""
+        filters = {'recorded_at': f"gte.{since.isoformat()}"} if since else None
+        offset = 0
+        while True:
+            rows = await self.client.select(
+                'campaign_metrics',
+                filters=filters,
+                order='recorded_at.asc,id.asc',
+                limit=page_size,
+                offset=offset,
+            )
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            offset += page_size
+
+    async def get_restaurant_campaigns(self, restaurant_id: str) -> List[Dict]:
+        """Every campaign a restaurant has run"""
+        return await self.client.select(
+            'campaigns',
+            filters={'restaurant_id': eq(restaurant_id)},
+            order='created_at.asc',
+        )
+
+    async def update_campaigns_media(
+        self,
+        media_urls: Mapping[str, str],
+        chunk_size: Optional[int] = None
+    ) -> BulkResult:
+        """Set the generated image URL on many campaigns and mark them processed.
+
+        Each chunk is one update_campaigns_media() call, which only touches
+        existing rows; IDs it doesn't return are reported as failed.
+        """
+        chunk_size = chunk_size or self.client.chunk_size
+        items = [{'id': str(campaign_id), 'media_url': url} for campaign_id, url in media_urls.items()]
+        result = BulkResult()
+        limiter = asyncio.Semaphore(self.client.bulk_concurrency)
+
+        async def write(chunk: List[Dict]) -> None:
+            async with limiter:
+                result.requests += 1
+                try:
+                    rows = await self.client.rpc('update_campaigns_media', {'media': chunk})
+                except PostgrestError as e:
+                    result.failed.append(BulkFailure(chunk, e.message, e.status_code))
+                    return
+            updated = {str(row['id']) for row in rows or []}
+            result.succeeded.extend(rows or [])
+            missing = [item for item in chunk if item['id'] not in updated]
+            if missing:
+                result.failed.append(BulkFailure(missing, "campaign not found", 404))
+
+        await asyncio.gather(*(
+            write(items[start:start + chunk_size]) for start in range(0, len(items), chunk_size)
+        ))
+        return result
+
     async def update_campaign_media(
         self,
         campaign_id: str,
         generated_image_url: str
     ) -> Dict:
-        """Update campaign with generated image URL"""
+        """Update campaign with generated image URL, via update_campaigns_media"""
         try:
-            print(f"\nUpdating campaign {campaign_id} with image: {generated_image_url}")
-            
-            result = (
-                self.client
-                .table('campaigns')
-                .update({
-                    'media_url': generated_image_url,
-                    'selected': True
-                })
-                .eq('id', campaign_id)
-                .execute()
-            )
-            
-            if not result.data:
-                raise Exception(f"Failed to update campaign {campaign_id}")
-            
-            print(f"Successfully updated campaign: {result.data[0]}")
-            return result.data[0]
+            logger.info("Updating campaign %s with image %s", campaign_id, generated_image_url)
+            result = await self.update_campaigns_media({campaign_id: generated_image_url})
+            return _only_row(result, campaign_id)
 
         except Exception as e:
-            print(f"Error updating campaign: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error("Error updating campaign: %s", e)
+            raise
+
+    async def save_campaign_media(
+        self,
+        media: Iterable[Dict],
+        chunk_size: Optional[int] = None
+    ) -> BulkResult:
+        """Record generated images (campaign_id, platform, url, ...) in bulk.
+
+        Re-saving the same image for a campaign and platform updates it in
+        place, so writing back a whole generation twice is harmless.
+        """
+        return await self.client.bulk_upsert(
+            'campaign_media',
+            list(media),
+            on_conflict='campaign_id,platform,url',
+            chunk_size=chunk_size,
+        )
+
+    async def update_campaign(self, campaign_id: str, values: Dict) -> Dict:
+        """Change some columns of an existing campaign"""
+        rows = await self.client.update('campaigns', values, filters={'id': eq(campaign_id)})
+        if not rows:
+            raise LookupError(f"Campaign {campaign_id} not found")
+        return rows[0]
+
+    async def update_campaign_schedule(
+        self,
+        campaign_id: str,
+        scheduled_time: datetime
+    ) -> Dict:
+        """Record when a campaign is due to be posted"""
+        rows = await self.client.update(
+            'campaigns',
+            {'scheduled_time': scheduled_time.isoformat()},
+            filters={'id': eq(campaign_id)},
+        )
+        if not rows:
+            raise Exception(f"Failed to schedule campaign {campaign_id}")
+        return rows[0]
+
+    async def save_campaign_posts(
+        self,
+        posts: Iterable[Dict],
+        chunk_size: Optional[int] = None
+    ) -> BulkResult:
+        """Record planned posts (campaign_id, restaurant_id, scheduled_time) in bulk"""
+        return await self.client.bulk_upsert(
+            'campaign_posts',
+            list(posts),
+            on_conflict='campaign_id,scheduled_time',
+            chunk_size=chunk_size,
+        )
+
+    async def get_scheduled_posts(self, restaurant_id: str, after: datetime) -> List[Dict]:
+        """Posts a restaurant already has planned from ``after`` on"""
+        return await self.client.select(
+            'campaign_posts',
+            filters={
+                'restaurant_id': eq(restaurant_id),
+                'scheduled_time': f"gte.{after.isoformat()}",
+            },
+            order='scheduled_time.asc',
+        )
+
+# Name the agents import
+SocialMediaDB = SocialMediaOps
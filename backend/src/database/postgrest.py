@@ -0,0 +1,434 @@
+import asyncio
+import logging
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Worth retrying: the gateway or PostgREST is briefly unavailable
+RETRYABLE_STATUS_CODES = {408, 429, 502, 503, 504}
+
+# Methods that can be replayed without duplicating a write
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "PATCH", "DELETE"}
+
+# A list applies several filters to one column, e.g. a time range
+Filters = Dict[str, Union[str, List[str]]]
+Rows = Union[Dict[str, Any], Sequence[Dict[str, Any]]]
+
+
+@dataclass
+class BulkFailure:
+    rows: List[Dict[str, Any]]
+    error: str
+    status_code: Optional[int] = None
+
+
+@dataclass
+class BulkResult:
+    """Outcome of a chunked write: rows that landed and rows that didn't"""
+    succeeded: List[Dict[str, Any]] = field(default_factory=list)
+    failed: List[BulkFailure] = field(default_factory=list)
+    requests: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    @property
+    def failed_rows(self) -> List[Dict[str, Any]]:
+        return [row for failure in self.failed for row in failure.rows]
+
+
+class PostgrestError(Exception):
+    """A PostgREST or Storage request failed"""
+
+    def __init__(self, status_code: int, message: str, code: Optional[str] = None):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+        self.code = code
+
+
+def _literal(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def eq(value: Any) -> str:
+    return f"eq.{_literal(value)}"
+
+
+def in_(values: Sequence[Any]) -> str:
+    # Values are quoted so commas and parentheses inside them survive
+    quoted = ",".join('"{}"'.format(_literal(v).replace('"', '\\"')) for v in values)
+    return f"in.({quoted})"
+
+
+class PostgrestClient:
+    """Async client for Supabase's PostgREST and Storage HTTP APIs.
+
+    One pooled ``httpx.AsyncClient`` is shared by every caller, with a
+    default timeout that each call can override. Transport errors and
+    408/429/5xx responses are retried with jittered backoff. A plain insert
+    is only replayed when it never reached the server, so it is never
+    applied twice; upserts are safe to replay and retry like reads.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+        chunk_size: int = 500,
+        bulk_concurrency: int = 4,
+        transport: Optional[Any] = None,
+    ):
+        self.url = url.rstrip("/")
+        self.key = key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.chunk_size = chunk_size
+        self.bulk_concurrency = bulk_concurrency
+        self._transport = transport
+        self._http = None
+        self._stats = {'requests': 0, 'retries': 0, 'failures': 0}
+
+    @classmethod
+    def from_env(cls) -> "PostgrestClient":
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_ANON_KEY")
+        if not url or not key:
+            raise ValueError("Missing Supabase environment variables")
+        return cls(
+            url,
+            key,
+            timeout=float(os.getenv("SUPABASE_TIMEOUT_SECONDS", 10)),
+            max_connections=int(os.getenv("SUPABASE_MAX_CONNECTIONS", 20)),
+            max_retries=int(os.getenv("SUPABASE_MAX_RETRIES", 2)),
+            chunk_size=int(os.getenv("SUPABASE_BULK_CHUNK_SIZE", 500)),
+        )
+
+    @property
+    def http(self):
+        if self._http is None:
+            import httpx
+            self._http = httpx.AsyncClient(
+                base_url=self.url,
+                headers={
+                    'apikey': self.key,
+                    'Authorization': f"Bearer {self.key}",
+                },
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                transport=self._transport,
+            )
+        return self._http
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _should_retry(self, idempotent: bool, exc: Optional[BaseException], status: int) -> bool:
+        import httpx
+
+        if exc is not None:
+            # A failed connect means the request was never sent
+            return idempotent or isinstance(exc, httpx.ConnectError)
+        return idempotent and status in RETRYABLE_STATUS_CODES
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        content: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        idempotent: Optional[bool] = None,
+    ):
+        """Send one request with retries; raises PostgrestError on a 4xx/5xx.
+
+        ``idempotent`` overrides the method-based guess for requests, like
+        upserts, that are safe to replay even though they're POSTs.
+        """
+        import httpx
+
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs: Dict[str, Any] = {
+            'params': params,
+            'json': json,
+            'content': content,
+            'headers': headers,
+        }
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+
+        attempt = 0
+        while True:
+            self._stats['requests'] += 1
+            error: Optional[BaseException] = None
+            response = None
+            try:
+                response = await self.http.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                error = e
+            status = response.status_code if response is not None else 0
+            if error is None and status < 400:
+                return response
+
+            if attempt < self.max_retries and self._should_retry(idempotent, error, status):
+                delay = self._backoff(attempt)
+                attempt += 1
+                self._stats['retries'] += 1
+                logger.warning(
+                    "%s %s failed (%s), retry %d in %.2fs",
+                    method, path, error or status, attempt, delay,
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            self._stats['failures'] += 1
+            if error is not None:
+                raise error
+            raise _error_from(response)
+
+    # -- PostgREST -------------------------------------------------------
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Optional[Filters] = None,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Rows matching PostgREST filters, e.g. ``{'id': eq(campaign_id)}``"""
+        params: Dict[str, Any] = {'select': columns, **(filters or {})}
+        if order:
+            params['order'] = order
+        if limit is not None:
+            params['limit'] = limit
+        if offset:
+            params['offset'] = offset
+        response = await self.request("GET", f"/rest/v1/{table}", params=params, timeout=timeout)
+        return response.json()
+
+    async def insert(
+        self,
+        table: str,
+        rows: Rows,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        response = await self.request(
+            "POST",
+            f"/rest/v1/{table}",
+            json=rows,
+            headers={'Prefer': 'return=representation'},
+            timeout=timeout,
+        )
+        return response.json()
+
+    async def upsert(
+        self,
+        table: str,
+        rows: Sequence[Dict[str, Any]],
+        on_conflict: str = "id",
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Insert rows, merging into existing ones that share on_conflict.
+
+        Send whole rows. The statement writes every column any row in the
+        batch mentions, so a row that leaves one of those out resets it to
+        the column default, and NOT NULL columns are checked before the
+        conflict is resolved. Use update() to change a few columns.
+        """
+        columns = sorted({key for row in rows for key in row})
+        response = await self.request(
+            "POST",
+            f"/rest/v1/{table}",
+            params={'on_conflict': on_conflict, 'columns': ",".join(columns)},
+            json=list(rows),
+            headers={'Prefer': 'resolution=merge-duplicates,missing=default,return=representation'},
+            timeout=timeout,
+            idempotent=True,
+        )
+        return response.json()
+
+    async def bulk_upsert(
+        self,
+        table: str,
+        rows: Sequence[Dict[str, Any]],
+        on_conflict: str = "id",
+        chunk_size: Optional[int] = None,
+    ) -> BulkResult:
+        """Upsert any number of rows in chunks, reporting rather than raising failures.
+
+        A chunk Postgres rejects outright (a constraint or type error) is
+        split in half and retried until the offending rows are isolated, so
+        one bad row doesn't sink the rest of its chunk. Chunks that still
+        fail after the client's own retries are reported as they are.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        result = BulkResult()
+        limiter = asyncio.Semaphore(self.bulk_concurrency)
+
+        async def write(chunk: List[Dict[str, Any]]) -> None:
+            async with limiter:
+                result.requests += 1
+                try:
+                    result.succeeded.extend(await self.upsert(table, chunk, on_conflict))
+                    return
+                except PostgrestError as e:
+                    if e.status_code >= 500 or e.status_code in RETRYABLE_STATUS_CODES or len(chunk) == 1:
+                        result.failed.append(BulkFailure(chunk, e.message, e.status_code))
+                        return
+                except Exception as e:
+                    result.failed.append(BulkFailure(chunk, str(e) or type(e).__name__))
+                    return
+            middle = len(chunk) // 2
+            await asyncio.gather(write(chunk[:middle]), write(chunk[middle:]))
+
+        rows = list(rows)
+        await asyncio.gather(*(
+            write(rows[i:i + chunk_size]) for i in range(0, len(rows), chunk_size)
+        ))
+        if result.failed:
+            logger.warning(
+                "Bulk upsert into %s: %d rows written, %d failed",
+                table, len(result.succeeded), len(result.failed_rows),
+            )
+        return result
+
+    async def update(
+        self,
+        table: str,
+        values: Dict[str, Any],
+        filters: Filters,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        if not filters:
+            raise ValueError("update() needs at least one filter")
+        response = await self.request(
+            "PATCH",
+            f"/rest/v1/{table}",
+            params=filters,
+            json=values,
+            headers={'Prefer': 'return=representation'},
+            timeout=timeout,
+        )
+        return response.json()
+
+    async def delete(
+        self,
+        table: str,
+        filters: Filters,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        if not filters:
+            raise ValueError("delete() needs at least one filter")
+        response = await self.request(
+            "DELETE",
+            f"/rest/v1/{table}",
+            params=filters,
+            headers={'Prefer': 'return=representation'},
+            timeout=timeout,
+        )
+        return response.json()
+
+    async def rpc(
+        self,
+        function: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Call a Postgres function exposed by PostgREST"""
+        response = await self.request(
+            "POST", f"/rest/v1/rpc/{function}", json=params or {}, timeout=timeout
+        )
+        return response.json() if response.content else None
+
+    # -- Storage ---------------------------------------------------------
+
+    async def upload_object(
+        self,
+        bucket: str,
+        path: str,
+        content: bytes,
+        content_type: str,
+        upsert: bool = True,
+        timeout: Optional[float] = None,
+    ) -> None:
+        await self.request(
+            "POST",
+            f"/storage/v1/object/{bucket}/{path}",
+            content=content,
+            headers={
+                'Content-Type': content_type,
+                'x-upsert': 'true' if upsert else 'false',
+            },
+            timeout=timeout,
+        )
+
+    def public_url(self, bucket: str, path: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{bucket}/{path}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'max_connections': self.max_connections}
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+def _error_from(response) -> PostgrestError:
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+    message = body.get('message') or body.get('error') or response.text or response.reason_phrase
+    return PostgrestError(response.status_code, message, body.get('code'))
+
+
+_client: Optional[PostgrestClient] = None
+
+
+def get_postgrest_client() -> PostgrestClient:
+    """Process-wide client, so every caller shares one connection pool"""
+    global _client
+    if _client is None:
+        _client = PostgrestClient.from_env()
+    return _client
+
+
+async def close_postgrest_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,181 @@
+-- Campaigns created from the dashboard and processed by the agents. The
+-- dashboard owns this table; its columns follow the generated Supabase types
+-- in src/integrations/supabase/types.ts at the repository root.
+CREATE TABLE IF NOT EXISTS campaigns (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID,
+    title TEXT NOT NULL,
+    description TEXT,
+    target_audience TEXT,
+    platforms TEXT[],
+    hashtags TEXT[],
+    caption TEXT,
+    cadence TEXT,
+    media_url TEXT,
+    selected BOOLEAN DEFAULT FALSE,
+    start_date TIMESTAMP WITH TIME ZONE,
+    end_date TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Columns the agents add on top of the dashboard's
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS status TEXT;
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS scheduled_time TIMESTAMP WITH TIME ZONE;
+
+-- The agents look for unprocessed campaigns with selected = false
+ALTER TABLE campaigns ALTER COLUMN selected SET DEFAULT FALSE;
+UPDATE campaigns SET selected = FALSE WHERE selected IS NULL;
+
+CREATE INDEX IF NOT EXISTS campaigns_unselected_created_at
+    ON campaigns (created_at DESC) WHERE NOT selected;
+
+-- Engagement snapshots pulled from the social platforms
+CREATE TABLE IF NOT EXISTS campaign_metrics (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    campaign_id UUID NOT NULL REFERENCES campaigns (id) ON DELETE CASCADE,
+    likes INTEGER NOT NULL DEFAULT 0,
+    comments INTEGER NOT NULL DEFAULT 0,
+    shares INTEGER NOT NULL DEFAULT 0,
+    impressions INTEGER NOT NULL DEFAULT 0,
+    hashtag_performance JSONB,
+    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS campaign_metrics_campaign_recorded_at
+    ON campaign_metrics (campaign_id, recorded_at DESC);
+
+-- ---------------------------------------------------------------------------
+-- Work queue over unprocessed campaigns
+--
+-- Workers claim batches with claim_campaigns(), which leases each row for
+-- lease_seconds. Rows are locked with SKIP LOCKED, so concurrent claims never
+-- return the same campaign. A worker extends its leases with
+-- heartbeat_campaigns() and finishes with complete_campaign(). A lease that
+-- isn't renewed lapses, and the campaign becomes claimable again.
+-- ---------------------------------------------------------------------------
+
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS claimed_by TEXT;
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS last_error TEXT;
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS audio_url TEXT;
+
+CREATE INDEX IF NOT EXISTS campaigns_claimable
+    ON campaigns (created_at) WHERE NOT selected;
+
+CREATE OR REPLACE FUNCTION claim_campaigns(
+    worker_id TEXT,
+    batch_size INTEGER DEFAULT 1,
+    lease_seconds INTEGER DEFAULT 300,
+    max_attempts INTEGER DEFAULT 5
+) RETURNS SETOF campaigns
+LANGUAGE sql AS $$
+    UPDATE campaigns c
+    SET claimed_by = worker_id,
+        lease_expires_at = NOW() + make_interval(secs => lease_seconds),
+        attempts = c.attempts + 1
+    FROM (
+        SELECT id FROM campaigns
+        WHERE NOT selected
+          AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+          AND attempts < max_attempts
+        ORDER BY created_at
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ) picked
+    WHERE c.id = picked.id
+    RETURNING c.*;
+$$;
+
+-- Extends the caller's live leases; returns the IDs it still holds
+CREATE OR REPLACE FUNCTION heartbeat_campaigns(
+    worker_id TEXT,
+    campaign_ids UUID[],
+    lease_seconds INTEGER DEFAULT 300
+) RETURNS SETOF UUID
+LANGUAGE sql AS $$
+    UPDATE campaigns
+    SET lease_expires_at = NOW() + make_interval(secs => lease_seconds)
+    WHERE id = ANY(campaign_ids)
+      AND claimed_by = worker_id
+      AND NOT selected
+      AND lease_expires_at >= NOW()
+    RETURNING id;
+$$;
+
+-- Marks a campaign done, but only if the caller still holds its lease
+CREATE OR REPLACE FUNCTION complete_campaign(
+    worker_id TEXT,
+    campaign_id UUID,
+    generated_media_url TEXT
+) RETURNS SETOF campaigns
+LANGUAGE sql AS $$
+    UPDATE campaigns
+    SET media_url = generated_media_url,
+        selected = TRUE,
+        claimed_by = NULL,
+        lease_expires_at = NULL,
+        last_error = NULL
+    WHERE id = campaign_id
+      AND claimed_by = worker_id
+      AND NOT selected
+    RETURNING *;
+$$;
+
+-- Gives a campaign back to the queue straight away, e.g. after a failure
+CREATE OR REPLACE FUNCTION release_campaign(
+    worker_id TEXT,
+    campaign_id UUID,
+    error TEXT DEFAULT NULL
+) RETURNS SETOF campaigns
+LANGUAGE sql AS $$
+    UPDATE campaigns
+    SET claimed_by = NULL,
+        lease_expires_at = NULL,
+        last_error = error
+    WHERE id = campaign_id
+      AND claimed_by = worker_id
+      AND NOT selected
+    RETURNING *;
+$$;
+
+-- Sets generated media on many campaigns in one statement. Only existing
+-- rows are touched, and only the rows updated are returned.
+CREATE OR REPLACE FUNCTION update_campaigns_media(media JSONB)
+RETURNS SETOF campaigns
+LANGUAGE sql AS $$
+    UPDATE campaigns c
+    SET media_url = m.media_url,
+        selected = TRUE
+    FROM jsonb_to_recordset(media) AS m(id UUID, media_url TEXT)
+    WHERE c.id = m.id
+    RETURNING c.*;
+$$;
+
+-- Generated images per campaign and platform, written back in bulk
+CREATE TABLE IF NOT EXISTS campaign_media (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    campaign_id UUID NOT NULL REFERENCES campaigns (id) ON DELETE CASCADE,
+    platform VARCHAR NOT NULL,
+    url TEXT NOT NULL,
+    profile VARCHAR,
+    prompt_version VARCHAR,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (campaign_id, platform, url)
+);
+
+-- Posts planned from each campaign's cadence. Slots are booked per
+-- restaurant so its campaigns don't post on top of each other.
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS restaurant_id TEXT;
+
+CREATE TABLE IF NOT EXISTS campaign_posts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    campaign_id UUID NOT NULL REFERENCES campaigns (id) ON DELETE CASCADE,
+    restaurant_id TEXT NOT NULL,
+    scheduled_time TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (campaign_id, scheduled_time)
+);
+
+CREATE INDEX IF NOT EXISTS campaign_posts_restaurant_time
+    ON campaign_posts (restaurant_id, scheduled_time);
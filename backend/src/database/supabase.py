@@ -1,5 +1,5 @@
-from supabase import create_client
 import os
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,10 +12,24 @@ class SupabaseClient:
         if not self.url or not self.key:
             raise ValueError("Missing Supabase environment variables")
         
+        # Imported here so loading this module doesn't pull in the SDK
+        from supabase import create_client
         self.client = create_client(self.url, self.key)
 
     def get_client(self):
         return self.client
 
-# Create a singleton instance
-supabase_client = SupabaseClient().get_client()
\ No newline at end of file
+_client: Optional[SupabaseClient] = None
+
+def get_supabase_client():
+    """Process-wide Supabase client, created on first use"""
+    global _client
+    if _client is None:
+        _client = SupabaseClient()
+    return _client.get_client()
+
+def __getattr__(name):
+    # Older callers import the singleton directly
+    if name == "supabase_client":
+        return get_supabase_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
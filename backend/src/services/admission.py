@@ -0,0 +1,320 @@
+import asyncio
+import hashlib
+import ipaddress
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+
+class Overloaded(Exception):
+    """Raised when a request can't be admitted; carries a Retry-After hint"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def gcra(
+    tat: Optional[float],
+    now: float,
+    rate: float,
+    burst: int,
+) -> Tuple[Optional[float], float]:
+    """One token-bucket decision, expressed as GCRA over a single timestamp.
+
+    ``tat`` is the stored "theoretical arrival time" (None for a new key).
+    Returns the timestamp to store (None if the request is refused) and how
+    many seconds the caller must wait, 0 when allowed. Keeping the bucket as
+    one number is what lets a shared store update it atomically.
+    """
+    interval = 1.0 / rate
+    new_tat = max(tat or now, now) + interval
+    allow_at = new_tat - burst * interval
+    if now < allow_at:
+        return None, allow_at - now
+    return new_tat, 0.0
+
+
+class RateLimitBackend(ABC):
+    """Where token-bucket state lives"""
+
+    @abstractmethod
+    async def hit(self, key: str, rate: float, burst: int) -> float:
+        """Spend one token for key; returns seconds to wait, 0 if allowed"""
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Buckets in this process only; the least recently seen keys are dropped
+    past max_keys, which at worst forgives a client's history"""
+
+    def __init__(self, max_keys: int = 10_000):
+        self.max_keys = max_keys
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+
+    async def hit(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tat, wait = gcra(self._tats.get(key), now, rate, burst)
+        if tat is not None:
+            self._tats[key] = tat
+            self._tats.move_to_end(key)
+            while len(self._tats) > self.max_keys:
+                self._tats.popitem(last=False)
+        return wait
+
+
+# Same algorithm as gcra(), run atomically inside Redis
+_GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = 1 / tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+local new_tat = math.max(tat, now) + interval
+local allow_at = new_tat - burst * interval
+if now < allow_at then
+  return tostring(allow_at - now)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets shared by every worker through Redis.
+
+    ``client`` is anything with redis-py's asyncio ``eval`` signature, so a
+    local stub can stand in for a server.
+    """
+
+    def __init__(self, client: Any, prefix: str = "fluffyduck:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisRateLimitBackend":
+        import redis.asyncio as redis  # optional dependency
+        return cls(redis.from_url(url))
+
+    async def hit(self, key: str, rate: float, burst: int) -> float:
+        # Wall-clock time so every worker agrees on "now"
+        wait = await self.client.eval(
+            _GCRA_SCRIPT, 1, self.prefix + key, time.time(), rate, burst
+        )
+        return float(wait)
+
+
+class RateLimiter:
+    """Per-client token buckets: ``rate`` requests per second, bursts of ``burst``"""
+
+    def __init__(self, backend: RateLimitBackend, rate: float, burst: int):
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+        self._stats = {'allowed': 0, 'limited': 0, 'backend_errors': 0}
+
+    async def check(self, key: str) -> None:
+        """Raises Overloaded if key has no tokens left"""
+        try:
+            wait = await self.backend.hit(key, self.rate, self.burst)
+        except Exception:
+            # A flaky shared store shouldn't take the API down with it
+            self._stats['backend_errors'] += 1
+            wait = 0.0
+        if wait > 0:
+            self._stats['limited'] += 1
+            raise Overloaded("Rate limit exceeded", wait)
+        self._stats['allowed'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            'rate_per_minute': self.rate * 60,
+            'burst': self.burst,
+            'backend': type(self.backend).__name__,
+        }
+
+
+class AdmissionController:
+    """Global concurrency cap with a bounded, time-limited wait queue.
+
+    Requests beyond max_concurrency wait up to wait_timeout seconds; once
+    max_waiting requests are already waiting, new ones are refused at once.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_waiting: int = 32, wait_timeout: float = 10.0):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._active = 0
+        self._waiting = 0
+        # Moving average of how long an admitted request holds its slot
+        self._service_seconds = 1.0
+        self._stats = {
+            'admitted': 0,
+            'rejected_queue_full': 0,
+            'rejected_timeout': 0,
+        }
+
+    def retry_after(self) -> float:
+        """Rough time until a new request would get a slot"""
+        backlog = self._waiting + 1
+        return self._service_seconds * backlog / self.max_concurrency
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        if self._slots.locked():
+            if self._waiting >= self.max_waiting:
+                self._stats['rejected_queue_full'] += 1
+                raise Overloaded("Server is at capacity", self.retry_after())
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.wait_timeout)
+            except asyncio.TimeoutError:
+                self._stats['rejected_timeout'] += 1
+                raise Overloaded("Timed out waiting for capacity", self.retry_after())
+            finally:
+                self._waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        self._active += 1
+        self._stats['admitted'] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._slots.release()
+            self._service_seconds = 0.8 * self._service_seconds + 0.2 * (time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            'active': self._active,
+            'waiting': self._waiting,
+            'max_concurrency': self.max_concurrency,
+            'max_waiting': self.max_waiting,
+            'avg_service_seconds': round(self._service_seconds, 3),
+        }
+
+
+def create_rate_limit_backend_from_env() -> RateLimitBackend:
+    """Build the backend selected by RATE_LIMIT_BACKEND (memory or redis)"""
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    if backend == "memory":
+        return InMemoryRateLimitBackend()
+    if backend == "redis":
+        return RedisRateLimitBackend.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+
+
+def key_digest(api_key: str) -> str:
+    """Stable, non-reversible name for an API key, safe to log or store"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+class ClientIdentifier:
+    """Names the client a request counts against: a known API key, else its address.
+
+    Only keys in ``api_keys`` count, so rotating made-up keys doesn't buy
+    fresh buckets, and keys are named by digest, never by value.
+    X-Forwarded-For is read only when the peer is one of ``trusted_proxies``
+    (addresses or CIDRs), right to left, up to the first address that isn't
+    a proxy: the hop our own proxies saw, which a client can't forge.
+    """
+
+    def __init__(self, api_keys: Iterable[str] = (), trusted_proxies: Iterable[str] = ()):
+        self._digests = {key_digest(key) for key in api_keys if key}
+        self.trusted_proxies = [ipaddress.ip_network(p, strict=False) for p in trusted_proxies if p]
+
+    @classmethod
+    def from_env(cls) -> "ClientIdentifier":
+        def listed(name: str) -> List[str]:
+            return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+        return cls(listed("API_KEYS"), listed("TRUSTED_PROXIES"))
+
+    def __call__(self, scope: Dict[str, Any]) -> str:
+        forwarded: List[str] = []
+        for name, value in scope.get("headers", []):
+            if name == b"x-api-key":
+                digest = key_digest(value.decode('latin-1'))
+                if digest in self._digests:
+                    return f"key:{digest}"
+            elif name == b"x-forwarded-for":
+                forwarded.extend(hop.strip() for hop in value.decode('latin-1').split(","))
+        return f"ip:{self.client_address(scope, forwarded)}"
+
+    def client_address(self, scope: Dict[str, Any], forwarded: List[str]) -> str:
+        client = scope.get("client")
+        peer = client[0] if client else "unknown"
+        if not self._trusted(peer):
+            return peer
+        hops = [hop for hop in forwarded if hop]
+        for hop in reversed(hops):
+            if not self._trusted(hop):
+                return hop
+        # Every hop is one of ours; the first is as close to the client as we get
+        return hops[0] if hops else peer
+
+    def _trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+
+def _error(status_code: int, reason: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": reason},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionMiddleware:
+    """Rate limits and admits requests to expensive routes before their body is read.
+
+    Rate-limited clients get 429, and requests that can't get a slot get 503,
+    both with Retry-After. An admitted request keeps its slot until its
+    response (including any stream) has been sent.
+    """
+
+    def __init__(
+        self,
+        app,
+        controller: AdmissionController,
+        limiter: Optional[RateLimiter],
+        paths: Iterable[str],
+        client_key: Callable[[Dict[str, Any]], str],
+    ):
+        self.app = app
+        self.controller = controller
+        self.limiter = limiter
+        self.paths = set(paths)
+        self.client_key = client_key
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        if self.limiter is not None:
+            try:
+                await self.limiter.check(self.client_key(scope))
+            except Overloaded as e:
+                await _error(429, e.reason, e.retry_after)(scope, receive, send)
+                return
+
+        try:
+            async with self.controller.admit():
+                await self.app(scope, receive, send)
+        except Overloaded as e:
+            await _error(503, e.reason, e.retry_after)(scope, receive, send)
@@ -0,0 +1,285 @@
+import heapq
+import importlib.util
+import math
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# NumPy is optional; without it the same reductions run as plain loops
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+DAY_SECONDS = 24 * 60 * 60
+COUNT_COLUMNS = ('likes', 'comments', 'shares', 'impressions')
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    import numpy
+    return numpy
+
+
+def engagement_rate(interactions: float, impressions: float) -> float:
+    """Interactions per 100 impressions; 0 when nothing was shown"""
+    return interactions / impressions * 100 if impressions > 0 else 0.0
+
+
+def top_hashtags(performance: Optional[Dict[str, float]], k: int) -> List[Tuple[str, float]]:
+    if not performance:
+        return []
+    return heapq.nlargest(k, performance.items(), key=lambda item: item[1])
+
+
+class MetricsFrame:
+    """Metric snapshots for many campaigns as parallel columns.
+
+    Row ``i`` is one snapshot: ``groups[i]`` indexes ``campaign_ids`` and
+    ``times[i]`` is epoch seconds. Columns are NumPy arrays when NumPy is
+    installed and lists otherwise.
+    """
+
+    def __init__(
+        self,
+        campaign_ids: List[str],
+        groups: Sequence[int],
+        times: Sequence[float],
+        columns: Dict[str, Sequence[float]],
+        hashtags: List[Optional[Dict[str, float]]],
+        use_numpy: bool = NUMPY_AVAILABLE,
+    ):
+        self.campaign_ids = campaign_ids
+        self.use_numpy = use_numpy
+        self.hashtags = hashtags
+        if use_numpy:
+            np = _numpy()
+            self.groups = np.asarray(groups, dtype=np.intp)
+            self.times = np.asarray(times, dtype=np.float64)
+            self.columns = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+        else:
+            self.groups = list(groups)
+            self.times = list(times)
+            self.columns = {name: list(values) for name, values in columns.items()}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict], use_numpy: bool = NUMPY_AVAILABLE) -> "MetricsFrame":
+        """Columns from campaign_metrics rows; rows without a recorded_at are skipped"""
+        campaign_ids: List[str] = []
+        positions: Dict[str, int] = {}
+        groups, times, hashtags = [], [], []
+        columns: Dict[str, List[float]] = {name: [] for name in COUNT_COLUMNS}
+
+        for row in rows:
+            recorded_at = _timestamp(row.get('recorded_at'))
+            if recorded_at is None:
+                # Can't be placed in any window
+                continue
+            campaign_id = str(row['campaign_id'])
+            group = positions.get(campaign_id)
+            if group is None:
+                group = positions[campaign_id] = len(campaign_ids)
+                campaign_ids.append(campaign_id)
+            groups.append(group)
+            times.append(recorded_at)
+            for name in COUNT_COLUMNS:
+                columns[name].append(row.get(name) or 0)
+            hashtags.append(row.get('hashtag_performance'))
+
+        return cls(campaign_ids, groups, times, columns, hashtags, use_numpy)
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+
+@dataclass
+class CampaignStats:
+    campaign_id: str
+    engagement_rate: float
+    interactions: float
+    impressions: float
+    # Change in engagement rate per day across the window (least squares)
+    trend: float
+    snapshots: int
+    top_hashtags: List[Tuple[str, float]] = field(default_factory=list)
+
+
+@dataclass
+class PortfolioReport:
+    since: datetime
+    until: datetime
+    engagement_rate: float
+    interactions: float
+    impressions: float
+    campaigns: Dict[str, CampaignStats]
+    # Mean snapshot engagement rate per day of the window, None for empty days
+    daily_engagement: List[Optional[float]]
+    rolling_engagement: List[Optional[float]]
+    top_campaigns: List[Tuple[str, float]]
+    top_hashtags: List[Tuple[str, float]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def analyze_metrics(
+    frame: MetricsFrame,
+    since: datetime,
+    until: datetime,
+    top_k: int = 5,
+    rolling_days: int = 7,
+) -> PortfolioReport:
+    """Per-campaign and portfolio engagement over [since, until].
+
+    Each campaign is judged by its latest snapshot (metrics are cumulative).
+    Trends, daily means and latest snapshots are grouped reductions over
+    every row at once rather than a pass per campaign.
+    """
+    start, end = since.timestamp(), until.timestamp()
+    days = max(1, math.ceil((end - start) / DAY_SECONDS))
+    summarise = _summarise_numpy if frame.use_numpy else _summarise_python
+    latest, trend, counts, day_counts, day_sums = summarise(frame, start, days)
+
+    campaigns: Dict[str, CampaignStats] = {}
+    total_interactions = total_impressions = 0.0
+    hashtag_totals: Dict[str, float] = {}
+    for group, row in enumerate(latest):
+        interactions = float(sum(frame.columns[name][row] for name in ('likes', 'comments', 'shares')))
+        impressions = float(frame.columns['impressions'][row])
+        campaign_id = frame.campaign_ids[group]
+        campaigns[campaign_id] = CampaignStats(
+            campaign_id=campaign_id,
+            engagement_rate=engagement_rate(interactions, impressions),
+            interactions=interactions,
+            impressions=impressions,
+            trend=float(trend[group]),
+            snapshots=int(counts[group]),
+            top_hashtags=top_hashtags(frame.hashtags[row], top_k),
+        )
+        total_interactions += interactions
+        total_impressions += impressions
+        for tag, score in (frame.hashtags[row] or {}).items():
+            hashtag_totals[tag] = hashtag_totals.get(tag, 0.0) + score
+
+    daily = [s / n if n else None for s, n in zip(day_sums, day_counts)]
+    return PortfolioReport(
+        since=since,
+        until=until,
+        engagement_rate=engagement_rate(total_interactions, total_impressions),
+        interactions=total_interactions,
+        impressions=total_impressions,
+        campaigns=campaigns,
+        daily_engagement=daily,
+        rolling_engagement=_rolling_mean(day_sums, day_counts, rolling_days),
+        top_campaigns=_top_campaigns(campaigns, top_k, frame.use_numpy),
+        top_hashtags=top_hashtags(hashtag_totals, top_k),
+    )
+
+
+def _summarise_numpy(frame: MetricsFrame, start: float, days: int):
+    np = _numpy()
+    groups, times, cols = frame.groups, frame.times, frame.columns
+    n_groups = len(frame.campaign_ids)
+    if not len(frame):
+        empty = np.zeros(0)
+        return [], empty, empty, np.zeros(days), np.zeros(days)
+
+    interactions = cols['likes'] + cols['comments'] + cols['shares']
+    rate = np.divide(
+        interactions * 100, cols['impressions'],
+        out=np.zeros_like(interactions), where=cols['impressions'] > 0,
+    )
+
+    # Last row of each campaign once rows are ordered by (campaign, time)
+    order = np.lexsort((times, groups))
+    ordered = groups[order]
+    latest = order[np.r_[ordered[1:] != ordered[:-1], True]]
+
+    # Least-squares slope of rate against day, for every campaign at once
+    x = (times - start) / DAY_SECONDS
+    n = np.bincount(groups, minlength=n_groups).astype(np.float64)
+    sx = np.bincount(groups, weights=x, minlength=n_groups)
+    sy = np.bincount(groups, weights=rate, minlength=n_groups)
+    sxy = np.bincount(groups, weights=x * rate, minlength=n_groups)
+    sxx = np.bincount(groups, weights=x * x, minlength=n_groups)
+    denominator = n * sxx - sx * sx
+    trend = np.divide(
+        n * sxy - sx * sy, denominator,
+        out=np.zeros(n_groups), where=np.abs(denominator) > 1e-12,
+    )
+
+    day = np.clip(np.floor(x).astype(np.intp), 0, days - 1)
+    day_counts = np.bincount(day, minlength=days)
+    day_sums = np.bincount(day, weights=rate, minlength=days)
+    return latest.tolist(), trend, n, day_counts.tolist(), day_sums.tolist()
+
+
+def _summarise_python(frame: MetricsFrame, start: float, days: int):
+    n_groups = len(frame.campaign_ids)
+    cols = frame.columns
+    latest = [-1] * n_groups
+    n, sx, sy, sxy, sxx = ([0.0] * n_groups for _ in range(5))
+    day_counts, day_sums = [0] * days, [0.0] * days
+
+    for i, group in enumerate(frame.groups):
+        t = frame.times[i]
+        last = latest[group]
+        if last < 0 or t >= frame.times[last]:
+            latest[group] = i
+
+        interactions = cols['likes'][i] + cols['comments'][i] + cols['shares'][i]
+        rate = engagement_rate(interactions, cols['impressions'][i])
+        x = (t - start) / DAY_SECONDS
+        n[group] += 1
+        sx[group] += x
+        sy[group] += rate
+        sxy[group] += x * rate
+        sxx[group] += x * x
+
+        day = min(max(int(math.floor(x)), 0), days - 1)
+        day_counts[day] += 1
+        day_sums[day] += rate
+
+    trend = []
+    for g in range(n_groups):
+        denominator = n[g] * sxx[g] - sx[g] * sx[g]
+        trend.append((n[g] * sxy[g] - sx[g] * sy[g]) / denominator if abs(denominator) > 1e-12 else 0.0)
+    return latest, trend, n, day_counts, day_sums
+
+
+def _rolling_mean(sums: List[float], counts: List[int], window: int) -> List[Optional[float]]:
+    """Mean over the trailing ``window`` days, weighted by snapshots per day"""
+    rolling: List[Optional[float]] = []
+    total = count = 0.0
+    for i, (s, c) in enumerate(zip(sums, counts)):
+        total += s
+        count += c
+        if i >= window:
+            total -= sums[i - window]
+            count -= counts[i - window]
+        rolling.append(total / count if count else None)
+    return rolling
+
+
+def _top_campaigns(campaigns: Dict[str, CampaignStats], k: int, use_numpy: bool) -> List[Tuple[str, float]]:
+    stats = list(campaigns.values())
+    if not use_numpy or len(stats) <= k:
+        best = heapq.nlargest(k, stats, key=lambda s: s.engagement_rate)
+        return [(s.campaign_id, s.engagement_rate) for s in best]
+
+    np = _numpy()
+    rates = np.fromiter((s.engagement_rate for s in stats), dtype=np.float64, count=len(stats))
+    # Partial selection of the k best, then sort only those
+    best = np.argpartition(-rates, k - 1)[:k]
+    best = best[np.argsort(-rates[best], kind='stable')]
+    return [(stats[i].campaign_id, float(rates[i])) for i in best]
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    if isinstance(value, datetime):
+        when = value
+    elif value:
+        when = datetime.fromisoformat(str(value))
+    else:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from ..database.operations.campaign_queue import CampaignQueue, LeaseLost
+
+logger = logging.getLogger(__name__)
+
+# Turns a claimed campaign into the URL of its generated media
+CampaignProcessor = Callable[[Dict[str, Any]], Awaitable[str]]
+
+
+class CampaignWorker:
+    """Drains the campaign queue with up to ``concurrency`` campaigns in flight.
+
+    Leases are renewed every ``heartbeat_interval`` seconds while campaigns
+    are processing. If a renewal shows a lease was lost, that campaign's task
+    is cancelled, since another worker may already be generating it.
+    """
+
+    def __init__(
+        self,
+        queue: CampaignQueue,
+        process: CampaignProcessor,
+        concurrency: int = 4,
+        poll_interval: float = 5.0,
+        heartbeat_interval: Optional[float] = None,
+    ):
+        self.queue = queue
+        self.process = process
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval or queue.lease_seconds / 3
+        self._active: Dict[str, asyncio.Task] = {}
+        self._stats = {'completed': 0, 'failed': 0, 'lost': 0}
+
+    @classmethod
+    def from_env(cls, process: CampaignProcessor) -> "CampaignWorker":
+        queue = CampaignQueue(
+            lease_seconds=int(os.getenv("CAMPAIGN_LEASE_SECONDS", 300)),
+            max_attempts=int(os.getenv("CAMPAIGN_MAX_ATTEMPTS", 5)),
+        )
+        return cls(
+            queue,
+            process,
+            concurrency=int(os.getenv("CAMPAIGN_WORKER_CONCURRENCY", 4)),
+            poll_interval=float(os.getenv("CAMPAIGN_POLL_INTERVAL_SECONDS", 5)),
+        )
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        """Claim and process campaigns until stop is set"""
+        stop = stop or asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            while not stop.is_set():
+                free = self.concurrency - len(self._active)
+                claimed = await self._claim(free) if free else 0
+                if not claimed:
+                    # Wake early when a slot frees up or we're asked to stop
+                    waiters = [asyncio.create_task(stop.wait()), *self._active.values()]
+                    await asyncio.wait(
+                        waiters, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    waiters[0].cancel()
+            await asyncio.gather(*self._active.values(), return_exceptions=True)
+        finally:
+            heartbeat.cancel()
+            for task in self._active.values():
+                task.cancel()
+            await asyncio.gather(heartbeat, *self._active.values(), return_exceptions=True)
+
+    async def run_once(self) -> int:
+        """Claim one batch, process it and return how many were claimed"""
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            claimed = await self._claim(self.concurrency)
+            await asyncio.gather(*self._active.values(), return_exceptions=True)
+            return claimed
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def _claim(self, batch_size: int) -> int:
+        try:
+            campaigns = await self.queue.claim(batch_size)
+        except Exception as e:
+            logger.warning("Claiming campaigns failed: %s", e)
+            return 0
+        for campaign in campaigns:
+            campaign_id = str(campaign['id'])
+            self._active[campaign_id] = asyncio.create_task(self._handle(campaign_id, campaign))
+        return len(campaigns)
+
+    async def _handle(self, campaign_id: str, campaign: Dict[str, Any]) -> None:
+        try:
+            media_url = await self.process(campaign)
+            await self.queue.complete(campaign_id, media_url)
+            self._stats['completed'] += 1
+        except asyncio.CancelledError:
+            raise
+        except LeaseLost as e:
+            self._stats['lost'] += 1
+            logger.warning("%s", e)
+        except Exception as e:
+            self._stats['failed'] += 1
+            logger.warning("Campaign %s failed: %s", campaign_id, e)
+            try:
+                await self.queue.release(campaign_id, str(e))
+            except Exception as release_error:
+                # The lease will lapse on its own
+                logger.warning("Releasing campaign %s failed: %s", campaign_id, release_error)
+        finally:
+            self._active.pop(campaign_id, None)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if not self._active:
+                continue
+            ids = list(self._active)
+            try:
+                held = await self.queue.heartbeat(ids)
+            except Exception as e:
+                logger.warning("Lease heartbeat failed: %s", e)
+                continue
+            for campaign_id in ids:
+                task = self._active.get(campaign_id)
+                if campaign_id not in held and task is not None:
+                    self._stats['lost'] += 1
+                    logger.warning("Lease on campaign %s lost; abandoning it", campaign_id)
+                    task.cancel()
+
+    def stats(self):
+        return {**self._stats, 'active': len(self._active)}
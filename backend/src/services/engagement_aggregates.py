@@ -0,0 +1,306 @@
+"""Running engagement totals per campaign, platform, hashtag and hour.
+
+Metric snapshots are cumulative, so each new snapshot is applied as the
+difference from the campaign's previous one. Totals stay exact however
+often a campaign is sampled, and reading them is a primary-key lookup.
+Rebuild them from the raw campaign_metrics table with:
+
+    python -m src.services.engagement_aggregates backfill --path engagement.sqlite3
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .posting_schedule import primary_platform
+
+logger = logging.getLogger(__name__)
+
+# Where the API and the backfill command keep the totals unless told otherwise
+DEFAULT_PATH = "engagement.sqlite3"
+
+COUNTERS = ('likes', 'comments', 'shares', 'impressions')
+
+# Dimensions totals are kept for; 'all' has the single key ''
+DIMENSIONS = ('all', 'campaign', 'platform', 'hashtag', 'hour')
+
+
+def aggregates_path_from_env() -> str:
+    return os.getenv("ENGAGEMENT_AGGREGATES_PATH", DEFAULT_PATH)
+
+
+class EngagementAggregates:
+    """SQLite table of running totals, updated snapshot by snapshot"""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = asyncio.Lock()
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS latest (
+                campaign_id TEXT PRIMARY KEY,
+                platform TEXT NOT NULL,
+                recorded_at REAL NOT NULL,
+                likes REAL NOT NULL,
+                comments REAL NOT NULL,
+                shares REAL NOT NULL,
+                impressions REAL NOT NULL,
+                hashtags TEXT
+            );
+            CREATE TABLE IF NOT EXISTS totals (
+                dimension TEXT NOT NULL,
+                key TEXT NOT NULL,
+                likes REAL NOT NULL DEFAULT 0,
+                comments REAL NOT NULL DEFAULT 0,
+                shares REAL NOT NULL DEFAULT 0,
+                impressions REAL NOT NULL DEFAULT 0,
+                score REAL NOT NULL DEFAULT 0,
+                snapshots INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, key)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS totals_by_score ON totals (dimension, score DESC);
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "EngagementAggregates":
+        return cls(aggregates_path_from_env())
+
+    # -- writes ------------------------------------------------------------
+
+    def _ingest(self, snapshots: Iterable[Dict], platforms: Mapping[str, str]) -> int:
+        applied = 0
+        with self._conn:
+            for snapshot in snapshots:
+                applied += self._apply(snapshot, platforms)
+        return applied
+
+    def _apply(self, snapshot: Dict, platforms: Mapping[str, str]) -> bool:
+        campaign_id = str(snapshot['campaign_id'])
+        recorded_at = _timestamp(snapshot.get('recorded_at'))
+        if recorded_at is None:
+            # Can't be ordered against other snapshots or placed in an hour
+            return False
+        counts = [float(snapshot.get(name) or 0) for name in COUNTERS]
+        hashtags = snapshot.get('hashtag_performance')
+
+        previous = self._conn.execute(
+            "SELECT platform, recorded_at, likes, comments, shares, impressions, hashtags "
+            "FROM latest WHERE campaign_id = ?",
+            (campaign_id,),
+        ).fetchone()
+        if previous is not None and recorded_at <= previous[1]:
+            # Already counted, or older than what was
+            return False
+
+        platform = (
+            snapshot.get('platform') or platforms.get(campaign_id)
+            or (previous[0] if previous else None) or 'unknown'
+        )
+        before = list(previous[2:6]) if previous else [0.0] * len(COUNTERS)
+        delta = [now - then for now, then in zip(counts, before)]
+        old_tags = json.loads(previous[6]) if previous and previous[6] else {}
+        if hashtags is None:
+            hashtags = old_tags
+
+        hour = datetime.fromtimestamp(recorded_at, timezone.utc).hour
+        for dimension, key in (
+            ('all', ''), ('campaign', campaign_id), ('platform', platform), ('hour', str(hour)),
+        ):
+            self._add(dimension, key, delta, 0.0)
+        for tag in set(old_tags) | set(hashtags):
+            self._add('hashtag', tag, [0.0] * len(COUNTERS), hashtags.get(tag, 0) - old_tags.get(tag, 0))
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO latest VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (campaign_id, platform, recorded_at, *counts, json.dumps(hashtags)),
+        )
+        return True
+
+    def _add(self, dimension: str, key: str, delta: List[float], score: float) -> None:
+        self._conn.execute(
+            """
+            INSERT INTO totals (dimension, key, likes, comments, shares, impressions, score, snapshots)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+            ON CONFLICT (dimension, key) DO UPDATE SET
+                likes = likes + excluded.likes,
+                comments = comments + excluded.comments,
+                shares = shares + excluded.shares,
+                impressions = impressions + excluded.impressions,
+                score = score + excluded.score,
+                snapshots = snapshots + 1
+            """,
+            (dimension, key, *delta, score),
+        )
+
+    def _clear(self) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM latest")
+            self._conn.execute("DELETE FROM totals")
+
+    # -- reads -------------------------------------------------------------
+
+    def _totals(self, dimension: str, key: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT likes, comments, shares, impressions, score, snapshots "
+            "FROM totals WHERE dimension = ? AND key = ?",
+            (dimension, key),
+        ).fetchone()
+        return _totals_dict(key, row) if row else None
+
+    def _campaign(self, campaign_id: str, top_k: int) -> Optional[Dict[str, Any]]:
+        totals = self._totals('campaign', str(campaign_id))
+        if totals is None:
+            return None
+        (platform, hashtags) = self._conn.execute(
+            "SELECT platform, hashtags FROM latest WHERE campaign_id = ?", (str(campaign_id),)
+        ).fetchone()
+        tags = json.loads(hashtags) if hashtags else {}
+        totals['platform'] = platform
+        totals['top_hashtags'] = sorted(tags.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return totals
+
+    def _ranked(self, dimension: str, order: str, k: int) -> List[Dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT key, likes, comments, shares, impressions, score, snapshots "
+            f"FROM totals WHERE dimension = ? ORDER BY {order} LIMIT ?",
+            (dimension, k),
+        ).fetchall()
+        return [_totals_dict(row[0], row[1:]) for row in rows]
+
+    # -- async API ---------------------------------------------------------
+
+    async def ingest(
+        self,
+        snapshots: Iterable[Dict],
+        platforms: Optional[Mapping[str, str]] = None,
+    ) -> int:
+        """Apply snapshots in order; returns how many were new.
+
+        Snapshots without a recorded_at are skipped, as in MetricsFrame.
+        """
+        snapshots = list(snapshots)
+        async with self._lock:
+            return await asyncio.to_thread(self._ingest, snapshots, platforms or {})
+
+    async def clear(self) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._clear)
+
+    async def totals(self, dimension: str, key: str = '') -> Optional[Dict[str, Any]]:
+        async with self._lock:
+            return await asyncio.to_thread(self._totals, dimension, key)
+
+    async def campaign(self, campaign_id: str, top_k: int = 3) -> Optional[Dict[str, Any]]:
+        """A campaign's totals, platform and best hashtags, or None if never seen"""
+        async with self._lock:
+            return await asyncio.to_thread(self._campaign, campaign_id, top_k)
+
+    async def top_hashtags(self, k: int = 5) -> List[Tuple[str, float]]:
+        async with self._lock:
+            rows = await asyncio.to_thread(self._ranked, 'hashtag', 'score DESC', k)
+        return [(row['key'], row['score']) for row in rows]
+
+    async def best_hours(self, k: int = 3) -> List[Tuple[int, float]]:
+        """UTC hours in which engagement grew fastest relative to reach"""
+        async with self._lock:
+            rows = await asyncio.to_thread(
+                self._ranked, 'hour',
+                "(likes + comments + shares) / MAX(impressions, 1) DESC", k,
+            )
+        return [(int(row['key']), row['engagement_rate']) for row in rows if row['impressions'] > 0]
+
+    async def close(self) -> None:
+        self._conn.close()
+
+
+def _totals_dict(key: str, row) -> Dict[str, Any]:
+    likes, comments, shares, impressions, score, snapshots = row
+    interactions = likes + comments + shares
+    return {
+        'key': key,
+        'likes': likes,
+        'comments': comments,
+        'shares': shares,
+        'impressions': impressions,
+        'interactions': interactions,
+        'engagement_rate': interactions / impressions * 100 if impressions > 0 else 0.0,
+        'score': score,
+        'snapshots': snapshots,
+    }
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    if isinstance(value, datetime):
+        when = value
+    elif value:
+        when = datetime.fromisoformat(str(value))
+    else:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+
+async def backfill(
+    aggregates: EngagementAggregates,
+    ops,
+    since: Optional[datetime] = None,
+    page_size: int = 1000,
+) -> int:
+    """Rebuild every aggregate from the raw campaign_metrics table"""
+    await aggregates.clear()
+    platforms: Dict[str, str] = {}
+    applied = 0
+    async for rows in ops.iter_metrics(since=since, page_size=page_size):
+        unseen = {str(row['campaign_id']) for row in rows} - platforms.keys()
+        if unseen:
+            for campaign in await ops.get_campaigns(unseen):
+                platforms[str(campaign['id'])] = primary_platform(campaign) or 'unknown'
+        applied += await aggregates.ingest(rows, platforms)
+    logger.info("Backfilled engagement aggregates from %d snapshot(s)", applied)
+    return applied
+
+
+_aggregates: Optional[EngagementAggregates] = None
+
+def get_engagement_aggregates() -> EngagementAggregates:
+    global _aggregates
+    if _aggregates is None:
+        _aggregates = EngagementAggregates.from_env()
+    return _aggregates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain engagement aggregates")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("backfill", help="Rebuild aggregates from campaign_metrics")
+    rebuild.add_argument("--path", default=aggregates_path_from_env())
+    rebuild.add_argument("--since", type=datetime.fromisoformat, help="Only snapshots from this time")
+    rebuild.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    from ..database.operations.social_media_ops import SocialMediaOps
+    from ..database.postgrest import close_postgrest_client
+
+    async def run() -> int:
+        aggregates = EngagementAggregates(args.path)
+        try:
+            return await backfill(aggregates, SocialMediaOps(), args.since, args.page_size)
+        finally:
+            await aggregates.close()
+            await close_postgrest_client()
+
+    logging.basicConfig(level=logging.INFO)
+    print(f"Applied {asyncio.run(run())} snapshot(s) to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import asyncio
+import inspect
+import logging
+import os
+import random
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Called with fal_client.Queued / InProgress / Completed statuses
+QueueUpdateCallback = Callable[[Any], Any]
+
+# Status codes worth another attempt (same set fal_client uses internally)
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+class FalGatewayError(Exception):
+    """Raised when a Fal call fails after exhausting its retries"""
+
+
+class FalTimeoutError(FalGatewayError):
+    """Raised when a Fal request doesn't finish within the gateway timeout"""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Transport errors, timeouts and 408/409/429/5xx responses are transient"""
+    import httpx
+    from fal_client.client import FalClientError
+
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    if isinstance(exc, FalClientError):
+        exc = exc.__cause__
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    return False
+
+
+def is_retryable_submit(exc: BaseException) -> bool:
+    """Only failures that prove Fal never queued the run: connect errors and 429.
+
+    A submit that timed out or got a 5xx may still have started a paid run,
+    so it is not sent again.
+    """
+    import httpx
+    from fal_client.client import FalClientError
+
+    if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return True
+    if isinstance(exc, FalClientError):
+        exc = exc.__cause__
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429
+    return False
+
+
+def describe_status(status) -> Dict[str, Any]:
+    """Plain-dict view of a Fal queue status for forwarding to clients"""
+    import fal_client
+
+    if isinstance(status, fal_client.Queued):
+        return {'status': 'queued', 'position': status.position}
+    if isinstance(status, fal_client.InProgress):
+        return {
+            'status': 'in_progress',
+            'logs': [log.get('message', '') for log in status.logs or []],
+        }
+    if isinstance(status, fal_client.Completed):
+        return {'status': 'completed', 'metrics': status.metrics or {}}
+    return {'status': type(status).__name__.lower()}
+
+
+def fal_backend_from_env() -> str:
+    """FAL_BACKEND: "fal" for the real API, "mock" for a local fal_mock server"""
+    backend = os.getenv("FAL_BACKEND", "fal").lower()
+    if backend not in ("fal", "mock"):
+        raise ValueError(f"Unknown FAL_BACKEND: {backend}")
+    return backend
+
+
+class FalGateway:
+    """Single entry point for Fal inference calls.
+
+    Wraps one ``fal_client.AsyncClient`` (and therefore one pooled HTTP
+    connection) with a concurrency limit, an end-to-end timeout and jittered
+    exponential backoff. Only the submit, status and result requests are
+    retried – never the whole subscribe – so a flaky poll can't launch a
+    second paid inference run. Submits are only retried when Fal provably
+    never queued them (see ``is_retryable_submit``).
+
+    fal_client (and httpx under it) is only imported once the first request
+    needs the client, keeping it off the API's import path.
+    """
+
+    def __init__(
+        self,
+        client: Optional[Any] = None,
+        key: Optional[str] = None,
+        timeout: float = 180.0,
+        request_timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        poll_interval: float = 0.5,
+        max_concurrency: int = 8,
+    ):
+        self._client = client
+        self._key = key
+        self._request_timeout = request_timeout
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.max_concurrency = max_concurrency
+        self._limiter = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'retries': 0,
+            'timeouts': 0,
+            'failures': 0,
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            import fal_client
+            self._client = fal_client.AsyncClient(
+                key=self._key, default_timeout=self._request_timeout
+            )
+        return self._client
+
+    @classmethod
+    def from_env(cls) -> "FalGateway":
+        key = os.getenv("FAL_KEY")
+        request_timeout = float(os.getenv("FAL_REQUEST_TIMEOUT_SECONDS", 30))
+        client = None
+        if fal_backend_from_env() == "mock":
+            from .fal_mock import MockFalClient
+            client = MockFalClient(
+                os.getenv("FAL_MOCK_URL", "http://127.0.0.1:8765"),
+                key=key,
+                default_timeout=request_timeout,
+            )
+        return cls(
+            client=client,
+            key=key,
+            timeout=float(os.getenv("FAL_TIMEOUT_SECONDS", 180)),
+            request_timeout=request_timeout,
+            max_retries=int(os.getenv("FAL_MAX_RETRIES", 3)),
+            poll_interval=float(os.getenv("FAL_POLL_INTERVAL_SECONDS", 0.5)),
+            max_concurrency=int(os.getenv("FAL_MAX_CONCURRENCY", 8)),
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": spreads retries from many requests hitting the same outage
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _retry(
+        self,
+        operation: Callable[[], Awaitable[Any]],
+        what: str,
+        retryable: Callable[[BaseException], bool] = is_retryable,
+    ) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return await operation()
+            except Exception as e:
+                if attempt >= self.max_retries or not retryable(e):
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                self._stats['retries'] += 1
+                logger.warning(
+                    "Fal %s failed (%s), retry %d in %.2fs",
+                    what, str(e) or type(e).__name__, attempt, delay,
+                )
+                await asyncio.sleep(delay)
+
+    async def _wait_for_result(
+        self,
+        handle,
+        with_logs: bool,
+        on_queue_update: Optional[QueueUpdateCallback],
+    ) -> Dict:
+        import fal_client
+
+        while True:
+            status = await self._retry(
+                lambda: handle.status(with_logs=with_logs), "status"
+            )
+            if on_queue_update is not None:
+                outcome = on_queue_update(status)
+                if inspect.isawaitable(outcome):
+                    await outcome
+            if isinstance(status, fal_client.Completed):
+                break
+            await asyncio.sleep(self.poll_interval)
+        return await self._retry(handle.get, "result")
+
+    async def _cancel(self, handle) -> None:
+        try:
+            await handle.cancel()
+        except Exception as e:
+            logger.warning("Could not cancel Fal request %s: %s", handle.request_id, e)
+
+    async def subscribe(
+        self,
+        application: str,
+        arguments: Dict,
+        with_logs: bool = False,
+        on_queue_update: Optional[QueueUpdateCallback] = None,
+    ) -> Dict:
+        """Submit a request to the Fal queue and wait for its result.
+
+        on_queue_update may be a plain function or a coroutine function and is
+        called with every status (Queued, InProgress, Completed) seen.
+        """
+        async with self._limiter:
+            self._in_flight += 1
+            try:
+                handle = await self._retry(
+                    lambda: self.client.submit(application, arguments),
+                    "submit",
+                    is_retryable_submit,
+                )
+                self._stats['submitted'] += 1
+                try:
+                    result = await asyncio.wait_for(
+                        self._wait_for_result(handle, with_logs, on_queue_update),
+                        timeout=self.timeout,
+                    )
+                except asyncio.TimeoutError:
+                    self._stats['timeouts'] += 1
+                    await self._cancel(handle)
+                    raise FalTimeoutError(
+                        f"Fal request {handle.request_id} timed out after {self.timeout}s"
+                    )
+                except asyncio.CancelledError:
+                    # Don't keep paying for work nobody is waiting on
+                    await asyncio.shield(self._cancel(handle))
+                    raise
+                self._stats['completed'] += 1
+                return result
+            except FalGatewayError:
+                self._stats['failures'] += 1
+                raise
+            except Exception as e:
+                self._stats['failures'] += 1
+                raise FalGatewayError(str(e)) from e
+            finally:
+                self._in_flight -= 1
+
+    async def upload_file(self, path: str) -> str:
+        """Upload a local file to the Fal CDN and return its URL"""
+        return await self._retry(lambda: self.client.upload_file(path), "upload")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            'in_flight': self._in_flight,
+            'max_concurrency': self.max_concurrency,
+        }
+
+    async def aclose(self) -> None:
+        # Only close the pooled connection if the client ever opened one
+        http_client = getattr(self._client, "__dict__", {}).get("_client")
+        if http_client is not None:
+            await http_client.aclose()
+
+
+_gateway: Optional[FalGateway] = None
+
+
+def get_fal_gateway() -> FalGateway:
+    """Process-wide gateway shared by every Fal caller"""
+    global _gateway
+    if _gateway is None:
+        _gateway = FalGateway.from_env()
+    return _gateway
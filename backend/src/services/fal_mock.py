@@ -0,0 +1,479 @@
+"""Local stand-in for Fal's queue API, for offline load and regression tests.
+
+Speaks the same protocol fal_client uses: submit returns a request id plus
+status/response/cancel URLs, status moves IN_QUEUE -> IN_PROGRESS ->
+COMPLETED, and the response holds image URLs this server also serves.
+Latency is drawn from configurable distributions, a fixed number of workers
+runs requests so queueing shows up under load, and failures can be
+injected at submit or at result time.
+
+Run it, then point the API at it:
+
+    python -m src.services.fal_mock --port 8765 --run-latency lognormal:1.5,0.4
+    FAL_BACKEND=mock FAL_MOCK_URL=http://127.0.0.1:8765 uvicorn src.api.main:app
+"""
+
+import argparse
+import asyncio
+import base64
+import functools
+import logging
+import mimetypes
+import os
+import random
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from .image_preprocessor import IMAGE_SIZES
+
+logger = logging.getLogger(__name__)
+
+# 1x1 black JPEG served when no canned images are configured
+DEFAULT_IMAGE = base64.b64decode(
+    "/9j/4AAQSkZJRgABAQEAYABgAAD/2wBDAP//////////////////////////////////////////////////////////////////////////////////////2wBDAf//////////////////////////////////////////////////////////////////////////////////////wAARCAABAAEDASIAAhEBAxEB/8QAFQABAQAAAAAAAAAAAAAAAAAAAAn/xAAUEAEAAAAAAAAAAAAAAAAAAAAA/8QAFQEBAQAAAAAAAAAAAAAAAAAAAAX/xAAUEQEAAAAAAAAAAAAAAAAAAAAA/9oADAMBAAIRAxEAPwCdABmX/9k="
+)
+
+LATENCY_KINDS = ('fixed', 'uniform', 'normal', 'lognormal', 'exponential')
+
+
+@dataclass(frozen=True)
+class Latency:
+    """A latency distribution in seconds, written as ``kind:a[,b]``.
+
+    fixed:s, uniform:low,high, normal:mean,stddev, lognormal:median,sigma
+    or exponential:mean. Samples are never negative.
+    """
+    kind: str
+    a: float
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, _, values = spec.partition(':')
+        kind = kind.strip().lower()
+        if kind not in LATENCY_KINDS:
+            raise ValueError(f"Unknown latency distribution '{kind}', expected one of: {', '.join(LATENCY_KINDS)}")
+        numbers = [float(v) for v in values.split(',') if v.strip()] if values else []
+        if not 1 <= len(numbers) <= 2:
+            raise ValueError(f"Latency '{spec}' needs one or two numbers")
+        return cls(kind, *numbers)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'uniform':
+            value = rng.uniform(self.a, self.b)
+        elif self.kind == 'normal':
+            value = rng.gauss(self.a, self.b)
+        elif self.kind == 'lognormal':
+            value = self.a * rng.lognormvariate(0.0, self.b) if self.a > 0 else 0.0
+        elif self.kind == 'exponential':
+            value = rng.expovariate(1 / self.a) if self.a > 0 else 0.0
+        else:
+            value = self.a
+        return max(0.0, value)
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{self.a:g}" + (f",{self.b:g}" if self.kind not in ('fixed', 'exponential') else "")
+
+
+@dataclass
+class MockFalConfig:
+    # Time before a worker picks the request up, on top of waiting for one
+    queue_latency: Latency = Latency('fixed', 0.05)
+    run_latency: Latency = Latency('lognormal', 1.0, 0.3)
+    # Requests run at once; the rest wait IN_QUEUE
+    workers: int = 16
+    # Chance a submit is rejected with failure_status
+    submit_failure_rate: float = 0.0
+    # Chance a request completes but its result is an error
+    result_failure_rate: float = 0.0
+    failure_status: int = 503
+    # Directory of canned outputs, served round-robin
+    images_dir: Optional[str] = None
+    seed: Optional[int] = None
+    # Finished requests kept for status and result lookups
+    max_finished: int = 10_000
+    max_uploads: int = 256
+
+    @classmethod
+    def from_env(cls) -> "MockFalConfig":
+        seed = os.getenv("FAL_MOCK_SEED")
+        return cls(
+            queue_latency=Latency.parse(os.getenv("FAL_MOCK_QUEUE_LATENCY", "fixed:0.05")),
+            run_latency=Latency.parse(os.getenv("FAL_MOCK_RUN_LATENCY", "lognormal:1.0,0.3")),
+            workers=int(os.getenv("FAL_MOCK_WORKERS", 16)),
+            submit_failure_rate=float(os.getenv("FAL_MOCK_SUBMIT_FAILURE_RATE", 0)),
+            result_failure_rate=float(os.getenv("FAL_MOCK_RESULT_FAILURE_RATE", 0)),
+            failure_status=int(os.getenv("FAL_MOCK_FAILURE_STATUS", 503)),
+            images_dir=os.getenv("FAL_MOCK_IMAGES_DIR") or None,
+            seed=int(seed) if seed else None,
+        )
+
+
+@dataclass
+class MockRequest:
+    id: str
+    application: str
+    arguments: Dict[str, Any]
+    submitted: float
+    status: str = 'IN_QUEUE'
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    logs: List[Dict[str, Any]] = field(default_factory=list)
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+
+
+def _image_size(arguments: Dict[str, Any]):
+    size = arguments.get('image_size', 'square_hd')
+    if isinstance(size, dict):
+        return size.get('width', 1024), size.get('height', 1024)
+    return IMAGE_SIZES.get(size, IMAGE_SIZES['square_hd'])
+
+
+class MockFal:
+    """Queue state and simulated workers behind the mock server"""
+
+    def __init__(self, config: Optional[MockFalConfig] = None):
+        self.config = config or MockFalConfig()
+        self.rng = random.Random(self.config.seed)
+        self.requests: "OrderedDict[str, MockRequest]" = OrderedDict()
+        self._finished: deque = deque()
+        self.uploads: "OrderedDict[str, tuple]" = OrderedDict()
+        self.images = self._load_images(self.config.images_dir)
+        self._next_image = 0
+        self._workers: Optional[asyncio.Semaphore] = None
+        self.queued = 0
+        self.running = 0
+        self._stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'peak_running': 0,
+        }
+
+    @staticmethod
+    def _load_images(directory: Optional[str]) -> List[tuple]:
+        if not directory:
+            return [('default.jpg', DEFAULT_IMAGE, 'image/jpeg')]
+        images = []
+        for name in sorted(os.listdir(directory)):
+            content_type = mimetypes.guess_type(name)[0]
+            if content_type and content_type.startswith('image/'):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    images.append((name, f.read(), content_type))
+        if not images:
+            raise ValueError(f"No canned images found in {directory}")
+        return images
+
+    @property
+    def workers(self) -> asyncio.Semaphore:
+        # Created on first use so it binds to the server's event loop
+        if self._workers is None:
+            self._workers = asyncio.Semaphore(self.config.workers)
+        return self._workers
+
+    def submit(self, application: str, arguments: Dict[str, Any]) -> Optional[MockRequest]:
+        """Queue a request, or return None if failure injection rejects it"""
+        if self.rng.random() < self.config.submit_failure_rate:
+            self._stats['rejected'] += 1
+            return None
+        request = MockRequest(uuid.uuid4().hex, application, arguments, time.monotonic())
+        self.requests[request.id] = request
+        self.queued += 1
+        request.task = asyncio.create_task(self._run(request))
+        # A callback rather than finally: it also runs if the task is
+        # cancelled before it ever starts
+        request.task.add_done_callback(lambda task: self._finish(request, task))
+        self._stats['submitted'] += 1
+        return request
+
+    async def _run(self, request: MockRequest) -> None:
+        await asyncio.sleep(self.config.queue_latency.sample(self.rng))
+        async with self.workers:
+            self._start(request)
+            try:
+                request.logs.append({'message': f"Running {request.application}", 'level': 'INFO'})
+                await asyncio.sleep(self.config.run_latency.sample(self.rng))
+            finally:
+                # Before the worker is released, so running never exceeds workers
+                self.running -= 1
+                request.status = 'COMPLETED'
+                request.finished = time.monotonic()
+        if self.rng.random() < self.config.result_failure_rate:
+            request.error = "Injected inference failure"
+            self._stats['failed'] += 1
+        else:
+            self._stats['completed'] += 1
+
+    def _start(self, request: MockRequest) -> None:
+        request.status = 'IN_PROGRESS'
+        request.started = time.monotonic()
+        self.queued -= 1
+        self.running += 1
+        self._stats['peak_running'] = max(self._stats['peak_running'], self.running)
+
+    def _finish(self, request: MockRequest, task: asyncio.Task) -> None:
+        if task.cancelled():
+            request.error = "Request was cancelled"
+            self._stats['cancelled'] += 1
+        if request.status == 'IN_QUEUE':
+            self.queued -= 1
+            request.status = 'COMPLETED'
+            request.finished = time.monotonic()
+        request.task = None
+        self._finished.append(request.id)
+        while len(self._finished) > self.config.max_finished:
+            self.requests.pop(self._finished.popleft(), None)
+
+    def position(self, request: MockRequest) -> int:
+        ahead = 0
+        for other in self.requests.values():
+            if other is request:
+                break
+            if other.status == 'IN_QUEUE':
+                ahead += 1
+        return ahead
+
+    def status(self, request: MockRequest, with_logs: bool) -> Dict[str, Any]:
+        logs = list(request.logs) if with_logs else None
+        if request.status == 'IN_QUEUE':
+            return {'status': 'IN_QUEUE', 'queue_position': self.position(request), 'logs': logs}
+        if request.status == 'IN_PROGRESS':
+            return {'status': 'IN_PROGRESS', 'logs': logs}
+        return {
+            'status': 'COMPLETED',
+            'logs': logs,
+            'metrics': {'inference_time': round(request.finished - (request.started or request.finished), 3)},
+        }
+
+    def result(self, request: MockRequest, base_url: str) -> Dict[str, Any]:
+        width, height = _image_size(request.arguments)
+        images = []
+        for _ in range(int(request.arguments.get('num_images', 1))):
+            name, _, content_type = self.images[self._next_image % len(self.images)]
+            self._next_image += 1
+            images.append({
+                'url': f"{base_url}/files/{name}",
+                'width': width,
+                'height': height,
+                'content_type': content_type,
+            })
+        return {
+            'images': images,
+            'seed': request.arguments.get('seed', self.rng.randrange(2 ** 31)),
+            'prompt': request.arguments.get('prompt', ''),
+        }
+
+    def upload(self, data: bytes, content_type: str, filename: Optional[str]) -> str:
+        extension = os.path.splitext(filename or '')[1] or mimetypes.guess_extension(content_type) or '.bin'
+        name = f"{uuid.uuid4().hex}{extension}"
+        self.uploads[name] = (data, content_type)
+        while len(self.uploads) > self.config.max_uploads:
+            self.uploads.popitem(last=False)
+        return name
+
+    def file(self, name: str) -> Optional[tuple]:
+        if name in self.uploads:
+            return self.uploads[name]
+        for canned, data, content_type in self.images:
+            if canned == name:
+                return data, content_type
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, 'queued': self.queued, 'running': self.running, 'workers': self.config.workers}
+
+
+def create_mock_fal_app(config: Optional[MockFalConfig] = None) -> FastAPI:
+    """FastAPI app serving the Fal queue protocol from a MockFal"""
+    mock = MockFal(config)
+    app = FastAPI(title="Mock Fal")
+    app.state.mock = mock
+
+    def not_found(request_id: str) -> JSONResponse:
+        return JSONResponse({'detail': f"Request {request_id} not found"}, status_code=404)
+
+    def base_url(request: Request) -> str:
+        return str(request.base_url).rstrip('/')
+
+    @app.get("/stats")
+    async def stats():
+        return mock.stats()
+
+    @app.post("/files/upload")
+    async def upload(request: Request):
+        name = mock.upload(
+            await request.body(),
+            request.headers.get('content-type', 'application/octet-stream'),
+            request.headers.get('x-fal-file-name'),
+        )
+        return {'access_url': f"{base_url(request)}/files/{name}"}
+
+    @app.get("/files/{name}")
+    async def file(name: str):
+        found = mock.file(name)
+        if found is None:
+            return JSONResponse({'detail': "File not found"}, status_code=404)
+        return Response(found[0], media_type=found[1])
+
+    @app.get("/requests/{request_id}/status")
+    async def status(request_id: str, logs: str = "false"):
+        request = mock.requests.get(request_id)
+        if request is None:
+            return not_found(request_id)
+        return mock.status(request, logs.lower() in ('1', 'true'))
+
+    @app.get("/requests/{request_id}")
+    async def result(request_id: str, request: Request):
+        queued = mock.requests.get(request_id)
+        if queued is None:
+            return not_found(request_id)
+        if queued.status != 'COMPLETED':
+            return JSONResponse({'detail': "Request is still in progress"}, status_code=400)
+        if queued.error:
+            return JSONResponse({'detail': queued.error}, status_code=422)
+        return mock.result(queued, base_url(request))
+
+    @app.put("/requests/{request_id}/cancel")
+    async def cancel(request_id: str):
+        request = mock.requests.get(request_id)
+        if request is None:
+            return not_found(request_id)
+        if request.task is None:
+            return JSONResponse({'status': "ALREADY_COMPLETED"}, status_code=400)
+        request.task.cancel()
+        return JSONResponse({'status': "CANCELLATION_REQUESTED"}, status_code=202)
+
+    # Last, so it doesn't shadow the routes above
+    @app.post("/{application:path}")
+    async def submit(application: str, request: Request):
+        queued = mock.submit(application, await request.json())
+        if queued is None:
+            return JSONResponse(
+                {'detail': "Injected submit failure"},
+                status_code=mock.config.failure_status,
+            )
+        url = f"{base_url(request)}/requests/{queued.id}"
+        return {
+            'request_id': queued.id,
+            'response_url': url,
+            'status_url': f"{url}/status",
+            'cancel_url': f"{url}/cancel",
+            'queue_position': mock.position(queued),
+        }
+
+    return app
+
+
+class MockFalClient:
+    """The parts of fal_client.AsyncClient FalGateway uses, aimed at a mock server.
+
+    fal_client hardcodes the queue and CDN hosts, so only submit and upload
+    are reimplemented; status, result and cancel go through fal_client's own
+    request handle, following the URLs the server hands back.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        key: Optional[str] = None,
+        default_timeout: float = 120.0,
+        transport: Optional[Any] = None,
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.key = key
+        self.default_timeout = default_timeout
+        self.transport = transport
+
+    @functools.cached_property
+    def _client(self):
+        import httpx
+        return httpx.AsyncClient(
+            headers={'Authorization': f"Key {self.key or 'mock'}"},
+            timeout=self.default_timeout,
+            transport=self.transport,
+        )
+
+    @staticmethod
+    def _raise_for_status(response) -> None:
+        import httpx
+        from fal_client.client import FalClientError
+
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            try:
+                message = response.json()['detail']
+            except (ValueError, KeyError):
+                message = response.text
+            raise FalClientError(message) from exc
+
+    async def submit(self, application: str, arguments: Dict[str, Any]):
+        from fal_client.client import AsyncRequestHandle
+
+        response = await self._client.post(f"{self.base_url}/{application}", json=arguments)
+        self._raise_for_status(response)
+        data = response.json()
+        return AsyncRequestHandle(
+            request_id=data['request_id'],
+            response_url=data['response_url'],
+            status_url=data['status_url'],
+            cancel_url=data['cancel_url'],
+            client=self._client,
+        )
+
+    async def upload_file(self, path: str) -> str:
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        with open(path, 'rb') as f:
+            data = f.read()
+        response = await self._client.post(
+            f"{self.base_url}/files/upload",
+            content=data,
+            headers={'Content-Type': content_type, 'X-Fal-File-Name': os.path.basename(path)},
+        )
+        self._raise_for_status(response)
+        return response.json()['access_url']
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    defaults = MockFalConfig.from_env()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--queue-latency", type=Latency.parse, default=defaults.queue_latency)
+    parser.add_argument("--run-latency", type=Latency.parse, default=defaults.run_latency)
+    parser.add_argument("--workers", type=int, default=defaults.workers)
+    parser.add_argument("--submit-failure-rate", type=float, default=defaults.submit_failure_rate)
+    parser.add_argument("--result-failure-rate", type=float, default=defaults.result_failure_rate)
+    parser.add_argument("--failure-status", type=int, default=defaults.failure_status)
+    parser.add_argument("--images", default=defaults.images_dir, help="Directory of canned outputs")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = MockFalConfig(
+        queue_latency=args.queue_latency,
+        run_latency=args.run_latency,
+        workers=args.workers,
+        submit_failure_rate=args.submit_failure_rate,
+        result_failure_rate=args.result_failure_rate,
+        failure_status=args.failure_status,
+        images_dir=args.images,
+        seed=args.seed,
+    )
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Mock Fal on %s:%d (run latency %s, %d workers)", args.host, args.port, config.run_latency, config.workers)
+    uvicorn.run(create_mock_fal_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,22 @@
+import logging
 import os
 from typing import List, Optional, Dict
-import fal_client
 from dotenv import load_dotenv
+from .fal_gateway import get_fal_gateway
+from .inference_profiles import get_profile
+from .prompt_templates import get_prompt_registry
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class FalService:
     def __init__(self):
         self.fal_key = os.getenv("FAL_KEY")
         if not self.fal_key:
             raise ValueError("Missing FAL_KEY environment variable")
+        self.gateway = get_fal_gateway()
+        self.prompts = get_prompt_registry()
 
     async def generate_campaign_images(
         self,
@@ -17,50 +24,42 @@ class FalService:
         description: str,
         target_audience: str,
         platforms: List[str],
-        reference_image_url: Optional[str] = None
+        reference_image_url: Optional[str] = None,
+        profile: Optional[str] = None,
+        style_preferences: Optional[List[str]] = None,
+        seed: Optional[int] = None
     ) -> Dict:
         try:
-            # Style based on platform
-            style_modifiers = {
-                'Instagram': "instagram-style, vibrant, engaging, square format",
-                'LinkedIn': "professional, corporate, clean design",
-                'Facebook': "social media optimized, engaging, community focused",
-                'Twitter': "attention-grabbing, concise, shareable"
-            }
-            
             primary_platform = platforms[0]
-            style = style_modifiers.get(primary_platform, "professional marketing")
+            template = self.prompts.get('campaign', primary_platform)
+            style = template.style
+            # Profiles are tuned per model; the turbo ones don't suit SD 1.5
+            inference_profile = get_profile(profile, template.application)
 
-            # Base prompt
-            prompt = (
-                f"Create a professional {primary_platform} marketing image for {target_audience}. "
-                f"Campaign: {name}. {description}. "
-                f"Style: High-quality, professional photography, {style}. "
-                "Make it authentic and engaging, avoid artificial or stock photo look."
-            )
+            prompt = template.render(name, description, target_audience)
+            if style_preferences:
+                prompt += f" Emphasize: {', '.join(style_preferences)}."
 
-            # Configure parameters
-            arguments = {
-                "prompt": prompt,
-                "negative_prompt": "text overlay, watermark, low quality, logo, blurry, artificial looking",
-                "image_size": "square_hd",
-                "num_inference_steps": 50,
-                "guidance_scale": 7.5,
-                "num_images": 3
-            }
+            arguments = template.fal_arguments(
+                prompt,
+                **inference_profile.fal_arguments(template.image_size)
+            )
+            if seed is not None:
+                arguments["seed"] = seed
 
             # Add reference image if provided
             if reference_image_url:
                 arguments["reference_image"] = reference_image_url
                 arguments["reference_weight"] = 0.5  # Adjust influence of reference image
 
-            print(f"\nGenerating images with prompt: {prompt}")
-            if reference_image_url:
-                print(f"Using reference image: {reference_image_url}")
-            
-            result = fal_client.subscribe(
-                "fal-ai/stable-diffusion-v15",
-                arguments=arguments,
+            logger.debug(
+                "Generating campaign images",
+                extra={'platform': primary_platform, 'reference_image_used': bool(reference_image_url)}
+            )
+
+            result = await self.gateway.subscribe(
+                template.application,
+                arguments,
                 with_logs=True
             )
             
@@ -69,11 +68,14 @@ class FalService:
                     'generated_images': [img['url'] for img in result['images']],
                     'prompt': prompt,
                     'style_used': style,
-                    'reference_image_used': bool(reference_image_url)
+                    'reference_image_used': bool(reference_image_url),
+                    'profile': inference_profile.name,
+                    'prompt_version': template.version,
+                    'seed': result.get('seed')
                 }
             else:
                 raise ValueError("Invalid response format from Fal.ai")
 
         except Exception as e:
-            print(f"Error generating images: {str(e)}")
+            logger.warning("Error generating images: %s", e)
             raise
\ No newline at end of file
@@ -0,0 +1,223 @@
+import asyncio
+import functools
+import hashlib
+import importlib.util
+import logging
+import os
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Iterable, Optional, Tuple
+
+from .reference_store import SpooledUpload
+
+# Pillow is optional – without it uploads pass through. It's imported on
+# first use so the API doesn't pay for it at startup.
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+HEIF_AVAILABLE = PILLOW_AVAILABLE and importlib.util.find_spec("pillow_heif") is not None
+
+# Pixel dimensions Fal renders for each image_size preset
+IMAGE_SIZES = {
+    'square_hd': (1024, 1024),
+    'square': (512, 512),
+    'landscape_hd': (1024, 576),
+    'landscape_4_3': (1024, 768),
+    'landscape_16_9': (1024, 576),
+    'portrait_4_3': (768, 1024),
+    'portrait_16_9': (576, 1024),
+}
+
+OUTPUT_CONTENT_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+OUTPUT_EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+
+logger = logging.getLogger(__name__)
+
+HEIF_BRANDS = {b'heic', b'heix', b'hevc', b'hevx', b'heim', b'heis', b'mif1', b'msf1'}
+
+# Formats Fal can't read, so they must be re-encoded rather than passed through
+MUST_DECODE = {'image/heic'}
+
+
+def sniff_image_format(head: bytes) -> Optional[str]:
+    """Return the MIME type implied by an image's magic bytes, if recognised"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand in (b'avif', b'avis'):
+            return 'image/avif'
+        if brand in HEIF_BRANDS:
+            return 'image/heic'
+    return None
+
+
+def target_size(image_sizes: Iterable[str]) -> Tuple[int, int]:
+    """Smallest box that covers every requested image_size preset"""
+    sizes = [IMAGE_SIZES.get(s, IMAGE_SIZES['square_hd']) for s in image_sizes]
+    if not sizes:
+        return IMAGE_SIZES['square_hd']
+    return max(w for w, _ in sizes), max(h for _, h in sizes)
+
+
+@functools.lru_cache(maxsize=None)
+def _pillow():
+    """Import Pillow once per process, registering the HEIF opener if present"""
+    from PIL import Image, ImageOps
+    try:
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+    except ImportError:  # HEIC/HEIF decoding needs pillow-heif
+        pass
+    return Image, ImageOps
+
+
+def preprocess_file(
+    source: str,
+    destination: str,
+    size: Tuple[int, int],
+    output_format: str = 'JPEG',
+    quality: int = 85,
+) -> Tuple[int, int]:
+    """Orient, downscale and re-encode an image file; returns the new dimensions.
+
+    The image is shrunk just enough to still cover ``size`` so the model keeps
+    the full composition at the resolution it will render. EXIF and other
+    metadata are dropped on re-encode.
+    """
+    Image, ImageOps = _pillow()
+    with Image.open(source) as img:
+        # Let the JPEG decoder skip detail we'd throw away anyway; the box is
+        # square because EXIF rotation hasn't been applied yet
+        longest = max(size)
+        img.draft('RGB', (longest, longest))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        scale = max(size[0] / img.width, size[1] / img.height)
+        if scale < 1:
+            img = img.resize(
+                (max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                Image.LANCZOS,
+            )
+        img.save(destination, format=output_format, quality=quality)
+        return img.width, img.height
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class PreprocessResult:
+    upload: SpooledUpload
+    detected_type: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+    reencoded: bool = False
+
+
+class ImagePreprocessor:
+    """Sniffs, orients, downscales and re-encodes uploads off the event loop"""
+
+    def __init__(
+        self,
+        output_format: str = 'JPEG',
+        quality: int = 85,
+        executor: Optional[Executor] = None,
+        enabled: bool = True,
+    ):
+        if output_format not in OUTPUT_CONTENT_TYPES:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        self.output_format = output_format
+        self.quality = quality
+        self.executor = executor
+        self.enabled = enabled and PILLOW_AVAILABLE
+
+    @classmethod
+    def from_env(cls) -> "ImagePreprocessor":
+        workers = int(os.getenv("IMAGE_PREPROCESS_WORKERS", 2))
+        if os.getenv("IMAGE_PREPROCESS_EXECUTOR", "thread").lower() == "process":
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preprocess")
+        return cls(
+            output_format=os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG").upper(),
+            quality=int(os.getenv("IMAGE_QUALITY", 85)),
+            executor=executor,
+            enabled=os.getenv("IMAGE_PREPROCESS", "1") != "0",
+        )
+
+    async def process(
+        self,
+        upload: SpooledUpload,
+        image_sizes: Iterable[str],
+    ) -> PreprocessResult:
+        """Return a compact upload sized for the given image_size presets.
+
+        Raises ValueError if the bytes are not a recognised image, or are
+        HEIC that can't be decoded here. Otherwise, when Pillow is unavailable
+        (or can't decode the format) the original file is passed through,
+        relabelled with its real content type.
+        """
+        with open(upload.path, 'rb') as f:
+            head = f.read(32)
+        detected = sniff_image_format(head)
+        if detected is None:
+            raise ValueError("Unsupported image format")
+
+        if detected in MUST_DECODE and not (self.enabled and HEIF_AVAILABLE):
+            raise ValueError("HEIC images can't be decoded on this server")
+
+        original = replace(upload, content_type=detected)
+        if not self.enabled:
+            return PreprocessResult(original, detected)
+
+        # Keep a real extension so CDNs infer the right content type
+        fd, destination = tempfile.mkstemp(
+            prefix="preprocessed-",
+            suffix=OUTPUT_EXTENSIONS[self.output_format],
+            dir=os.path.dirname(upload.path),
+        )
+        os.close(fd)
+        loop = asyncio.get_running_loop()
+        try:
+            width, height = await loop.run_in_executor(
+                self.executor,
+                preprocess_file,
+                upload.path,
+                destination,
+                target_size(image_sizes),
+                self.output_format,
+                self.quality,
+            )
+            digest = await loop.run_in_executor(self.executor, _sha256_file, destination)
+        except Exception as e:
+            os.unlink(destination)
+            if detected in MUST_DECODE:
+                raise ValueError(f"Could not decode {detected} image: {e}")
+            logger.warning("Image preprocessing skipped (%s): %s", detected, e)
+            return PreprocessResult(original, detected)
+
+        processed = SpooledUpload(
+            path=destination,
+            size=os.path.getsize(destination),
+            sha256=digest,
+            content_type=OUTPUT_CONTENT_TYPES[self.output_format],
+            filename=upload.filename,
+        )
+        return PreprocessResult(processed, detected, width, height, reencoded=True)
+
+    def shutdown(self) -> None:
+        if self.executor:
+            self.executor.shutdown(wait=False)
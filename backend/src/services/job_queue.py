@@ -0,0 +1,573 @@
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATES = (SUCCEEDED, FAILED)
+
+
+class JobStoreFull(Exception):
+    """Raised when the store has no room for another unfinished job"""
+
+
+class QueueFull(Exception):
+    """Raised when the queue already holds its maximum number of pending jobs"""
+
+
+class InvalidCallback(ValueError):
+    """Raised for callback URLs the server won't call"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@dataclass
+class Job:
+    id: str
+    tenant: str
+    status: str = QUEUED
+    created_at: str = field(default_factory=_now)
+    updated_at: str = field(default_factory=_now)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    callback_url: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+
+class JobStore(ABC):
+    """Bounded storage for job state.
+
+    A store that outlives the process also keeps each unfinished job's
+    payload, so the queue can pick its jobs up again after a restart.
+    """
+
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+
+    @abstractmethod
+    async def create(self, job: Job, payload: Optional[Dict[str, Any]] = None) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Job]:
+        ...
+
+    @abstractmethod
+    async def update(self, job: Job, expected: Optional[str] = None) -> bool:
+        """Save the job; with ``expected``, only if its stored status still is that.
+
+        Returns whether the job was saved.
+        """
+
+    async def claim(self, job_id: str, owner: str, lease_seconds: float) -> Optional[Job]:
+        """Move a queued job to running; None if it's gone or already taken.
+
+        The claim is leased to ``owner`` for ``lease_seconds``, renewed with
+        heartbeat(); stores that aren't shared can ignore both.
+        """
+        job = await self.get(job_id)
+        if job is None or job.status != QUEUED:
+            return None
+        job.status = RUNNING
+        return job if await self.update(job, expected=QUEUED) else None
+
+    async def heartbeat(self, job_ids: Iterable[str], owner: str, lease_seconds: float) -> None:
+        """Extend owner's leases on running jobs"""
+
+    async def unfinished(self) -> List[Tuple[Job, Optional[Dict[str, Any]]]]:
+        """Queued jobs, and running jobs whose lease lapsed, with their payloads.
+
+        Running jobs that a live worker still holds are left out.
+        """
+        return []
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryJobStore(JobStore):
+    """Keeps jobs in insertion order and evicts the oldest finished ones"""
+
+    def __init__(self, max_jobs: int = 1000):
+        super().__init__(max_jobs)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    async def create(self, job: Job, payload: Optional[Dict[str, Any]] = None) -> None:
+        if len(self._jobs) >= self.max_jobs:
+            for job_id, existing in list(self._jobs.items()):
+                if existing.finished:
+                    del self._jobs[job_id]
+                    break
+            else:
+                raise JobStoreFull(f"Job store is full ({self.max_jobs} unfinished jobs)")
+        self._jobs[job.id] = Job(**job.to_dict())
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        return Job(**job.to_dict()) if job else None
+
+    async def update(self, job: Job, expected: Optional[str] = None) -> bool:
+        current = self._jobs.get(job.id)
+        if expected is not None and (current is None or current.status != expected):
+            return False
+        job.updated_at = _now()
+        self._jobs[job.id] = Job(**job.to_dict())
+        return True
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite-backed store so jobs survive restarts and are shared by workers.
+
+    Payloads are kept until a job finishes. Claiming a job is a single
+    conditional UPDATE, so two workers never both run it, and the claim is
+    leased to the worker: only jobs whose lease lapsed count as abandoned.
+    """
+
+    COLUMNS = "id, tenant, status, created_at, updated_at, result, error, callback_url"
+
+    def __init__(self, path: str = "jobs.sqlite3", max_jobs: int = 1000):
+        super().__init__(max_jobs)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = asyncio.Lock()
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                tenant TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                callback_url TEXT,
+                payload TEXT,
+                owner TEXT,
+                lease_expires_at REAL
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (('payload', 'TEXT'), ('owner', 'TEXT'), ('lease_expires_at', 'REAL')):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at)")
+        self._conn.commit()
+
+    def _create(self, job: Job, payload: Optional[Dict[str, Any]]) -> None:
+        with self._conn:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+            if count >= self.max_jobs:
+                evicted = self._conn.execute(
+                    """
+                    DELETE FROM jobs WHERE id = (
+                        SELECT id FROM jobs WHERE status IN (?, ?)
+                        ORDER BY created_at LIMIT 1
+                    )
+                    """,
+                    TERMINAL_STATES,
+                ).rowcount
+                if not evicted:
+                    raise JobStoreFull(f"Job store is full ({self.max_jobs} unfinished jobs)")
+            self._conn.execute(
+                f"INSERT INTO jobs ({self.COLUMNS}, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._row(job) + (json.dumps(payload) if payload is not None else None,),
+            )
+
+    @staticmethod
+    def _job(row) -> Job:
+        values = list(row)
+        values[5] = json.loads(values[5]) if values[5] else None
+        return Job(*values)
+
+    def _get(self, job_id: str) -> Optional[Job]:
+        row = self._conn.execute(
+            f"SELECT {self.COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self._job(row) if row is not None else None
+
+    def _update(self, job: Job, expected: Optional[str]) -> bool:
+        with self._conn:
+            # A finished job's payload and lease are no longer needed
+            return bool(self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, result = ?, error = ?, "
+                "payload = CASE WHEN ? THEN NULL ELSE payload END, "
+                "lease_expires_at = CASE WHEN ? THEN NULL ELSE lease_expires_at END "
+                "WHERE id = ? AND (? IS NULL OR status = ?)",
+                (job.status, job.updated_at,
+                 json.dumps(job.result) if job.result is not None else None,
+                 job.error, job.finished, job.finished, job.id, expected, expected),
+            ).rowcount)
+
+    def _claim(self, job_id: str, owner: str, lease_seconds: float) -> Optional[Job]:
+        with self._conn:
+            claimed = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, owner = ?, lease_expires_at = ? "
+                "WHERE id = ? AND status = ?",
+                (RUNNING, _now(), owner, time.time() + lease_seconds, job_id, QUEUED),
+            ).rowcount
+        return self._get(job_id) if claimed else None
+
+    def _heartbeat(self, job_ids: List[str], owner: str, lease_seconds: float) -> None:
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                [(time.time() + lease_seconds, job_id, owner, RUNNING) for job_id in job_ids],
+            )
+
+    def _unfinished(self) -> List[Tuple[Job, Optional[Dict[str, Any]]]]:
+        rows = self._conn.execute(
+            f"SELECT {self.COLUMNS}, payload FROM jobs WHERE status = ? "
+            "OR (status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)) "
+            "ORDER BY created_at",
+            (QUEUED, RUNNING, time.time()),
+        ).fetchall()
+        return [(self._job(row[:-1]), json.loads(row[-1]) if row[-1] else None) for row in rows]
+
+    @staticmethod
+    def _row(job: Job):
+        return (
+            job.id, job.tenant, job.status, job.created_at, job.updated_at,
+            json.dumps(job.result) if job.result is not None else None,
+            job.error, job.callback_url,
+        )
+
+    async def create(self, job: Job, payload: Optional[Dict[str, Any]] = None) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._create, job, payload)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, job_id)
+
+    async def update(self, job: Job, expected: Optional[str] = None) -> bool:
+        job.updated_at = _now()
+        async with self._lock:
+            return await asyncio.to_thread(self._update, job, expected)
+
+    async def claim(self, job_id: str, owner: str, lease_seconds: float) -> Optional[Job]:
+        async with self._lock:
+            return await asyncio.to_thread(self._claim, job_id, owner, lease_seconds)
+
+    async def heartbeat(self, job_ids: Iterable[str], owner: str, lease_seconds: float) -> None:
+        job_ids = list(job_ids)
+        if job_ids:
+            async with self._lock:
+                await asyncio.to_thread(self._heartbeat, job_ids, owner, lease_seconds)
+
+    async def unfinished(self) -> List[Tuple[Job, Optional[Dict[str, Any]]]]:
+        async with self._lock:
+            return await asyncio.to_thread(self._unfinished)
+
+    async def close(self) -> None:
+        self._conn.close()
+
+
+def create_job_store_from_env() -> JobStore:
+    """Build the job store selected by JOB_STORE (memory or sqlite)"""
+    backend = os.getenv("JOB_STORE", "memory").lower()
+    max_jobs = int(os.getenv("JOB_STORE_MAX_JOBS", 1000))
+    if backend == "sqlite":
+        return SQLiteJobStore(os.getenv("JOB_STORE_PATH", "jobs.sqlite3"), max_jobs)
+    if backend != "memory":
+        raise ValueError(f"Unknown JOB_STORE backend: {backend}")
+    return InMemoryJobStore(max_jobs)
+
+
+class CallbackPolicy:
+    """Which URLs job callbacks may be sent to.
+
+    Only https URLs on an allowed host are accepted: an exact name, or
+    ``*.example.com`` for its subdomains. Hosts that resolve to a private,
+    loopback, link-local or otherwise non-public address are refused, and
+    they are resolved again before each delivery, so a DNS change after
+    submission can't point a callback inward. No hosts means no callbacks.
+    """
+
+    def __init__(self, allowed_hosts: Iterable[str] = (), schemes: Iterable[str] = ("https",)):
+        self.allowed_hosts = {host.strip().lower().rstrip('.') for host in allowed_hosts if host.strip()}
+        self.schemes = set(schemes)
+
+    @classmethod
+    def from_env(cls) -> "CallbackPolicy":
+        return cls(os.getenv("JOB_CALLBACK_HOSTS", "").split(","))
+
+    def allows_host(self, host: str) -> bool:
+        host = host.lower().rstrip('.')
+        return host in self.allowed_hosts or any(
+            pattern.startswith('*.') and host.endswith(pattern[1:])
+            for pattern in self.allowed_hosts
+        )
+
+    async def check(self, url: str) -> None:
+        """Raises InvalidCallback unless url may be called back"""
+        if not self.allowed_hosts:
+            raise InvalidCallback("Callbacks are not enabled on this server")
+        try:
+            parts = urlsplit(url)
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+        except ValueError:
+            raise InvalidCallback("Callback URL is malformed")
+        if parts.scheme not in self.schemes:
+            raise InvalidCallback(f"Callback URL must use {' or '.join(sorted(self.schemes))}")
+        host = parts.hostname or ''
+        if not host or not self.allows_host(host):
+            raise InvalidCallback(f"Callback host {host!r} is not allowed")
+
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror:
+            raise InvalidCallback(f"Callback host {host!r} does not resolve")
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0].split('%')[0])
+            if address.version == 6 and address.ipv4_mapped:
+                address = address.ipv4_mapped
+            if not address.is_global or address.is_multicast:
+                raise InvalidCallback(f"Callback host {host!r} is not a public address")
+
+
+class JobQueue:
+    """Worker pool that runs submitted jobs with per-tenant concurrency limits.
+
+    Pending jobs are kept per tenant and workers pick tenants round-robin, so a
+    tenant at its limit never ties up a worker that another tenant could use.
+    Running jobs are leased to this queue and the leases renewed every
+    ``lease_seconds / 3``; a store shared with other processes only treats a
+    job as abandoned once its lease lapses.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        store: Optional[JobStore] = None,
+        workers: int = 4,
+        per_tenant_limit: int = 2,
+        max_pending: int = 100,
+        poll_interval: float = 1.0,
+        callback_policy: Optional[CallbackPolicy] = None,
+        lease_seconds: float = 60.0,
+    ):
+        self.handler = handler
+        self.store = store or InMemoryJobStore()
+        self.callback_policy = callback_policy or CallbackPolicy()
+        self.workers = workers
+        self.per_tenant_limit = per_tenant_limit
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        # Distinguishes this queue's leases from its sibling workers'
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._claimed: set = set()
+        self._pending: "OrderedDict[str, Deque[tuple]]" = OrderedDict()
+        self._running: Dict[str, int] = {}
+        self._pending_count = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._tasks: list = []
+        self._updates: Dict[str, asyncio.Event] = {}
+
+    @property
+    def pending(self) -> int:
+        return self._pending_count
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._cond = asyncio.Condition()
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._heartbeat_loop()))
+        await self._recover()
+
+    async def _recover(self) -> None:
+        """Requeue queued jobs from the store; fail running ones whose worker died.
+
+        A job that was running may already have reached Fal, so running it
+        again could pay for it twice; its owner is told it failed instead.
+        Jobs a live sibling worker holds keep their lease and are left alone.
+        """
+        requeued = failed = 0
+        for job, payload in await self.store.unfinished():
+            if job.status == QUEUED and payload is not None:
+                await self._enqueue(job.tenant, job.id, payload)
+                requeued += 1
+            else:
+                expected = job.status
+                job.status = FAILED
+                job.error = "Job interrupted by a server restart"
+                if await self.store.update(job, expected=expected):
+                    failed += 1
+        if requeued or failed:
+            logger.info("Recovered jobs after restart: %d requeued, %d failed", requeued, failed)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.store.heartbeat(self._claimed, self.owner, self.lease_seconds)
+            except Exception as e:
+                logger.warning("Job lease heartbeat failed: %s", e)
+
+    async def _enqueue(self, tenant: str, job_id: str, payload: Dict[str, Any]) -> None:
+        async with self._cond:
+            self._pending.setdefault(tenant, deque()).append((job_id, payload))
+            self._pending_count += 1
+            self._cond.notify()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.store.close()
+
+    async def check_submission(self, callback_url: Optional[str] = None) -> None:
+        """Raise QueueFull or InvalidCallback if a job submitted now would be refused.
+
+        Lets callers reject a request before doing expensive work for it.
+        """
+        if self._pending_count >= self.max_pending:
+            raise QueueFull(f"Job queue is full ({self.max_pending} pending jobs)")
+        if callback_url is not None:
+            await self.callback_policy.check(callback_url)
+
+    async def submit(
+        self,
+        tenant: str,
+        payload: Dict[str, Any],
+        callback_url: Optional[str] = None,
+    ) -> Job:
+        """Persist a new job and hand it to the worker pool"""
+        await self.start()
+        await self.check_submission(callback_url)
+
+        job = Job(id=uuid.uuid4().hex, tenant=tenant, callback_url=callback_url)
+        await self.store.create(job, payload)
+        await self._enqueue(tenant, job.id, payload)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.store.get(job_id)
+
+    async def watch(self, job_id: str) -> AsyncIterator[Job]:
+        """Yield the job every time it changes, ending once it has finished"""
+        last_seen = None
+        while True:
+            event = self._updates.setdefault(job_id, asyncio.Event())
+            job = await self.store.get(job_id)
+            if job is None:
+                return
+            if (job.status, job.updated_at) != last_seen:
+                last_seen = (job.status, job.updated_at)
+                yield job
+            if job.finished:
+                self._updates.pop(job_id, None)
+                return
+            # Wake on local updates; the timeout covers stores shared across processes
+            try:
+                await asyncio.wait_for(event.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _notify(self, job_id: str) -> None:
+        event = self._updates.pop(job_id, None)
+        if event:
+            event.set()
+
+    def _next_runnable(self) -> Optional[tuple]:
+        for tenant, queue in self._pending.items():
+            if queue and self._running.get(tenant, 0) < self.per_tenant_limit:
+                item = queue.popleft()
+                if queue:
+                    self._pending.move_to_end(tenant)
+                else:
+                    del self._pending[tenant]
+                return tenant, item
+        return None
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            async with self._cond:
+                while (runnable := self._next_runnable()) is None:
+                    await self._cond.wait()
+                tenant, (job_id, payload) = runnable
+                self._pending_count -= 1
+                self._running[tenant] = self._running.get(tenant, 0) + 1
+
+            try:
+                await self._run(job_id, payload)
+            finally:
+                async with self._cond:
+                    self._running[tenant] -= 1
+                    if not self._running[tenant]:
+                        del self._running[tenant]
+                    self._cond.notify_all()
+
+    async def _run(self, job_id: str, payload: Dict[str, Any]) -> None:
+        job = await self.store.claim(job_id, self.owner, self.lease_seconds)
+        if job is None:
+            return
+        self._claimed.add(job_id)
+        self._notify(job_id)
+
+        try:
+            job.result = await self.handler(payload)
+            job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            job.status = FAILED
+            job.error = "Job cancelled during shutdown"
+            await self.store.update(job, expected=RUNNING)
+            raise
+        except Exception as e:
+            logger.warning("Job %s failed: %s", job_id, e)
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            self._claimed.discard(job_id)
+
+        # Only if nobody declared the job abandoned in the meantime
+        if not await self.store.update(job, expected=RUNNING):
+            logger.warning("Job %s was already finished elsewhere; result dropped", job_id)
+            return
+        self._notify(job_id)
+
+        if job.callback_url:
+            await self._send_callback(job)
+
+    async def _send_callback(self, job: Job) -> None:
+        try:
+            import httpx
+
+            await self.callback_policy.check(job.callback_url)
+            body = {k: v for k, v in job.to_dict().items() if k not in ('tenant', 'callback_url')}
+            async with httpx.AsyncClient(timeout=10.0, follow_redirects=False) as client:
+                response = await client.post(job.callback_url, json=body)
+                response.raise_for_status()
+        except Exception as e:
+            logger.warning("Error delivering callback for job %s: %s", job.id, e)
@@ -0,0 +1,130 @@
+"""Low-copy JSON framing for Twilio Media Stream messages.
+
+Twilio sends and expects one JSON text frame per 20 ms audio chunk.  Building a
+dict, base64-encoding into a ``str`` and running ``json.dumps`` on every chunk
+costs several allocations per frame, and so does ``json.loads`` + ``b64decode``
+on the inbound side.  The helpers here keep that work to the minimum:
+
+* inbound ``media`` events are recognised with a key scan and the payload is
+  decoded straight out of the raw message (base64 never contains ``"`` or
+  ``\\``, so no JSON unescaping is needed).  Anything else falls back to a full
+  parse with ``orjson`` when installed, ``json`` otherwise.
+* outbound ``media`` messages are spliced into a per-stream pre-serialized
+  template held in a reusable ``bytearray``.
+"""
+
+import binascii
+import json
+import re
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+try:  # orjson is optional – it is only used on the slow (non-media) path
+    import orjson as _orjson  # type: ignore
+except ImportError:  # pragma: no cover - depends on the environment
+    _orjson = None
+
+Message = Union[str, bytes, bytearray, memoryview]
+
+_MEDIA_EVENT = re.compile(r'"event"\s*:\s*"media"')
+_PAYLOAD = re.compile(r'"payload"\s*:\s*"([A-Za-z0-9+/=]*)"')
+_MEDIA_EVENT_B = re.compile(_MEDIA_EVENT.pattern.encode("ascii"))
+_PAYLOAD_B = re.compile(_PAYLOAD.pattern.encode("ascii"))
+
+class TwilioEvent(NamedTuple):
+    """A parsed Twilio Media Stream message.
+
+    ``audio`` is only set for ``media`` events; ``data`` carries the fully
+    parsed message for every other event (``start``, ``stop``, ``mark``…).
+    """
+
+    event: str
+    audio: Optional[bytes] = None
+    data: Optional[Dict[str, Any]] = None
+
+
+def loads(message: Message) -> Dict[str, Any]:
+    """Parse a JSON message, preferring orjson when it is available."""
+    if _orjson is not None:
+        return _orjson.loads(message)
+    if isinstance(message, (bytes, bytearray, memoryview)):
+        message = bytes(message).decode("utf-8")
+    return json.loads(message)
+
+
+def _scan_media_payload(message: Message):
+    """Return the raw base64 payload of a ``media`` event, or ``None``.
+
+    For bytes-like messages the result is a ``memoryview`` into the original
+    buffer so the payload is never copied before decoding.
+    """
+    if isinstance(message, str):
+        if _MEDIA_EVENT.search(message) is None:
+            return None
+        match = _PAYLOAD.search(message)
+        return match.group(1) if match else None
+
+    raw = bytes(message) if isinstance(message, memoryview) else message
+    if _MEDIA_EVENT_B.search(raw) is None:
+        return None
+    match = _PAYLOAD_B.search(raw)
+    if match is None:
+        return None
+    return memoryview(raw)[match.start(1):match.end(1)]
+
+def parse_twilio_message(message: Union[Message, Dict[str, Any]]) -> TwilioEvent:
+    """Parse an inbound Twilio message, decoding media payloads on the fast path."""
+    if isinstance(message, dict):
+        data = message
+    else:
+        payload = _scan_media_payload(message)
+        if payload is not None:
+            try:
+                return TwilioEvent("media", binascii.a2b_base64(payload))
+            except (binascii.Error, ValueError):
+                pass  # malformed payload – let the full parser have a go
+        data = loads(message)
+
+    event = data.get("event", "")
+    if event == "media":
+        return TwilioEvent(
+            "media", binascii.a2b_base64(data["media"]["payload"]), data
+        )
+    return TwilioEvent(event, None, data)
+
+
+class MediaFramer:
+    """Builds outbound Twilio messages for a single stream.
+
+    The JSON around the payload is serialized once per stream; each call to
+    :meth:`media` only base64-encodes the audio into the reused buffer.
+    """
+
+    _SUFFIX = b'"}}'
+
+    def __init__(self, stream_sid: Optional[str] = None):
+        self._buf = bytearray()
+        self._prefix_len = 0
+        self.stream_sid: Optional[str] = None
+        self._clear = ""
+        self.reset(stream_sid)
+
+    def reset(self, stream_sid: Optional[str]) -> None:
+        """Re-target the framer at a (new) stream SID."""
+        self.stream_sid = stream_sid
+        sid = json.dumps(stream_sid)
+        prefix = ('{"event":"media","streamSid":%s,"media":{"payload":"' % sid)
+        self._buf = bytearray(prefix.encode("utf-8"))
+        self._prefix_len = len(self._buf)
+        self._clear = '{"event":"clear","streamSid":%s}' % sid
+
+    def media(self, audio: bytes) -> str:
+        """Return a ``media`` message carrying ``audio`` as a JSON text frame."""
+        buf = self._buf
+        del buf[self._prefix_len:]
+        buf += binascii.b2a_base64(audio, newline=False)
+        buf += self._SUFFIX
+        return buf.decode("utf-8")
+
+    def clear(self) -> str:
+        """Return a ``clear`` message for the stream."""
+        return self._clear
@@ -0,0 +1,140 @@
+import random
+from array import array
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+HOURS_PER_WEEK = 7 * 24
+
+# Evidence from one post also counts, at reduced weight, for the hours
+# either side of it, so sparse data still gives a smooth week
+KERNEL = ((-1, 0.5), (0, 1.0), (1, 0.5))
+
+
+def hour_of_week(weekday: int, hour: int) -> int:
+    """Monday 00:00 is 0, Sunday 23:00 is 167"""
+    return weekday * 24 + hour
+
+
+class PostingHourModel:
+    """Beta posterior over a post's engagement rate for each hour of the week.
+
+    Each post adds its engagement rate (0-1) as a fractional success to the
+    hour it went out. The prior favours ``prior_hours`` so the model starts
+    where the static rules were. A few arrays of 168 floats are the whole
+    state; ranked hours are cached until the next observation.
+    """
+
+    def __init__(
+        self,
+        prior_hours: Sequence[int],
+        posts_per_day: Optional[int] = None,
+        prior_rate: float = 0.02,
+        prior_boost: float = 1.5,
+        prior_strength: float = 4.0,
+    ):
+        self.posts_per_day = posts_per_day or len(prior_hours)
+        self.alpha = array('d', [0.0]) * HOURS_PER_WEEK
+        self.beta = array('d', [0.0]) * HOURS_PER_WEEK
+        # Weight of the posts behind each hour, prior excluded
+        self.evidence = array('d', [0.0]) * HOURS_PER_WEEK
+        self.preferred = frozenset(prior_hours)
+        for slot in range(HOURS_PER_WEEK):
+            mean = prior_rate * (prior_boost if slot % 24 in self.preferred else 1.0)
+            self.alpha[slot] = mean * prior_strength
+            self.beta[slot] = (1 - mean) * prior_strength
+        self.observations = 0
+        # Each post's current contribution, so a re-measured post replaces it
+        self._posts: Dict[str, Tuple[int, float]] = {}
+        self._week: Optional[Tuple[Tuple[int, ...], ...]] = None
+
+    def observe(self, post_id: str, slot: int, rate: float) -> None:
+        """Record (or update) the engagement rate of a post made at ``slot``"""
+        rate = min(max(rate, 0.0), 1.0)
+        previous = self._posts.get(post_id)
+        if previous is not None:
+            self._add(*previous, sign=-1.0)
+        else:
+            self.observations += 1
+        self._add(slot, rate, sign=1.0)
+        self._posts[post_id] = (slot, rate)
+        self._week = None
+
+    def _add(self, slot: int, rate: float, sign: float) -> None:
+        for offset, weight in KERNEL:
+            b = (slot + offset) % HOURS_PER_WEEK
+            self.alpha[b] += sign * weight * rate
+            self.beta[b] += sign * weight * (1 - rate)
+            self.evidence[b] += sign * weight
+
+    def mean(self, slot: int) -> float:
+        return self.alpha[slot] / (self.alpha[slot] + self.beta[slot])
+
+    def week(self, rng: Optional[random.Random] = None) -> Tuple[Tuple[int, ...], ...]:
+        """The best ``posts_per_day`` local hours for each weekday, Monday first.
+
+        With ``rng``, ranks a Thompson sample from the posterior instead of
+        the posterior mean, so uncertain hours still get tried now and then.
+        Only hours with posts behind them, or favoured by the prior, are
+        candidates: at engagement-rate scale the prior's long tail would
+        otherwise keep sending posts out at 3am.
+        """
+        if rng is None:
+            if self._week is None:
+                self._week = self._rank(self.mean)
+            return self._week
+
+        def sample(slot: int) -> float:
+            if self.evidence[slot] > 1e-9 or slot % 24 in self.preferred:
+                return rng.betavariate(self.alpha[slot], self.beta[slot])
+            # Behind every candidate, in posterior order
+            return self.mean(slot) - 1
+
+        return self._rank(sample)
+
+    def _rank(self, score) -> Tuple[Tuple[int, ...], ...]:
+        week = []
+        for weekday in range(7):
+            base = weekday * 24
+            scores = [score(base + hour) for hour in range(24)]
+            best = sorted(range(24), key=lambda hour: (-scores[hour], hour))[:self.posts_per_day]
+            week.append(tuple(sorted(best)))
+        return tuple(week)
+
+
+class PostingModels:
+    """A PostingHourModel per restaurant and platform"""
+
+    def __init__(self, **model_options):
+        self.model_options = model_options
+        self._models: Dict[Tuple[str, str], PostingHourModel] = {}
+
+    @staticmethod
+    def _key(restaurant: str, platform: Optional[str]) -> Tuple[str, str]:
+        return str(restaurant), (platform or 'any').lower()
+
+    def get(self, restaurant: str, platform: Optional[str] = None) -> Optional[PostingHourModel]:
+        return self._models.get(self._key(restaurant, platform))
+
+    def model(
+        self,
+        restaurant: str,
+        platform: Optional[str],
+        prior_hours: Iterable[int],
+    ) -> PostingHourModel:
+        key = self._key(restaurant, platform)
+        model = self._models.get(key)
+        if model is None:
+            model = self._models[key] = PostingHourModel(tuple(prior_hours), **self.model_options)
+        return model
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+
+_models: Optional[PostingModels] = None
+
+def get_posting_models() -> PostingModels:
+    """Process-wide models, so hours learned from metrics reach every scheduler"""
+    global _models
+    if _models is None:
+        _models = PostingModels()
+    return _models
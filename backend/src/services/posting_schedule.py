@@ -0,0 +1,288 @@
+import random
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from .posting_model import PostingModels
+
+# Local hours that get the most engagement, by target audience
+POSTING_HOURS: Dict[str, Tuple[int, ...]] = {
+    'restaurant': (11, 12, 17, 18),  # Lunch and dinner times
+    'retail': (10, 14, 16),          # Shopping hours
+    'default': (12, 15, 18),         # General engagement times
+}
+
+# Days between posts for each campaign cadence
+CADENCE_DAYS: Dict[str, int] = {
+    'daily': 1,
+    'weekly': 7,
+}
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+def posting_hours_for(target_audience: Optional[str]) -> Tuple[int, ...]:
+    audience = (target_audience or '').lower()
+    key = next((k for k in POSTING_HOURS if k != 'default' and k in audience), 'default')
+    return POSTING_HOURS[key]
+
+
+def cadence_days(cadence: Optional[str]) -> int:
+    """Days between posts; campaigns without a cadence post daily"""
+    key = (cadence or 'daily').strip().lower()
+    if key not in CADENCE_DAYS:
+        raise ValueError(f"Unknown cadence {cadence!r}; expected one of {sorted(CADENCE_DAYS)}")
+    return CADENCE_DAYS[key]
+
+
+def restaurant_key(campaign: Dict) -> str:
+    """Campaigns without a restaurant_id only conflict with themselves"""
+    return str(campaign.get('restaurant_id') or campaign.get('id') or '')
+
+
+def primary_platform(campaign: Dict) -> Optional[str]:
+    """The first of a campaign's ``platforms``, or None if it lists none"""
+    platforms = campaign.get('platforms') or []
+    return platforms[0] if platforms else None
+
+
+class PostingHours:
+    """The posting hours of one timezone as sorted epoch seconds, a day at a time.
+
+    Each local day's slots are computed once with zoneinfo, so the DST shift
+    days come out right: an hour skipped in spring lands on the next real
+    hour, and a repeated hour in autumn is used once. Finding the next slot
+    is then a bisect rather than a walk.
+    """
+
+    # Days kept per timezone; a year either side of now is plenty
+    MAX_DAYS = 800
+
+    def __init__(self, hours: Sequence[int], timezone: str = 'UTC'):
+        self.hours = tuple(sorted(set(hours)))
+        if not self.hours or not all(0 <= h < 24 for h in self.hours):
+            raise ValueError(f"Posting hours must be within 0-23, got {hours!r}")
+        self.tz = ZoneInfo(timezone)
+        self._days: Dict[date, Tuple[int, ...]] = {}
+
+    def local_date(self, epoch: int) -> date:
+        return datetime.fromtimestamp(epoch, self.tz).date()
+
+    def day_start(self, day: date) -> int:
+        return int(datetime(day.year, day.month, day.day, tzinfo=self.tz).timestamp())
+
+    def hours_on(self, day: date) -> Tuple[int, ...]:
+        return self.hours
+
+    def day_slots(self, day: date) -> Tuple[int, ...]:
+        slots = self._days.get(day)
+        if slots is None:
+            if len(self._days) >= self.MAX_DAYS:
+                self._days.clear()
+            slots = tuple(sorted({
+                int(datetime(day.year, day.month, day.day, hour, tzinfo=self.tz).timestamp())
+                for hour in self.hours_on(day)
+            }))
+            self._days[day] = slots
+        return slots
+
+    def candidates(self, after: int, day: Optional[date] = None) -> Iterator[Tuple[date, int]]:
+        """Every (local day, slot) at or after ``after``, in order, forever"""
+        day = day or self.local_date(after)
+        slots = self.day_slots(day)
+        for slot in slots[bisect_left(slots, after):]:
+            yield day, slot
+        while True:
+            day += timedelta(days=1)
+            for slot in self.day_slots(day):
+                yield day, slot
+
+    def next_slot(self, after: int) -> int:
+        return next(self.candidates(after))[1]
+
+
+class WeeklyPostingHours(PostingHours):
+    """Posting hours that differ by weekday, Monday first"""
+
+    def __init__(self, week: Sequence[Sequence[int]], timezone: str = 'UTC'):
+        if len(week) != 7:
+            raise ValueError(f"Expected hours for 7 weekdays, got {len(week)}")
+        super().__init__([hour for hours in week for hour in hours], timezone)
+        self.week = tuple(tuple(sorted(set(hours))) for hours in week)
+
+    def hours_on(self, day: date) -> Tuple[int, ...]:
+        return self.week[day.weekday()]
+
+
+@lru_cache(maxsize=256)
+def posting_hours(hours: Tuple[int, ...], timezone: str = 'UTC') -> PostingHours:
+    """Shared per (hours, timezone), so every campaign reuses the day cache"""
+    return PostingHours(hours, timezone)
+
+
+@lru_cache(maxsize=256)
+def weekly_posting_hours(week: Tuple[Tuple[int, ...], ...], timezone: str = 'UTC') -> WeeklyPostingHours:
+    return WeeklyPostingHours(week, timezone)
+
+
+class SlotIndex:
+    """Booked posting times of one restaurant, sorted for bisecting.
+
+    Each post occupies ``min_gap`` seconds either side of its time; a
+    conflict check is one bisect and one comparison.
+    """
+
+    def __init__(self, min_gap: int = 3600):
+        self.min_gap = min_gap
+        self.times: List[int] = []
+
+    def conflicts(self, epoch: int) -> bool:
+        i = bisect_right(self.times, epoch - self.min_gap)
+        return i < len(self.times) and self.times[i] < epoch + self.min_gap
+
+    def add(self, epoch: int) -> None:
+        i = bisect_left(self.times, epoch)
+        if i == len(self.times) or self.times[i] != epoch:
+            self.times.insert(i, epoch)
+
+    def remove(self, epoch: int) -> None:
+        i = bisect_left(self.times, epoch)
+        if i < len(self.times) and self.times[i] == epoch:
+            del self.times[i]
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+
+class PostingScheduler:
+    """Picks posting times from audience hours and cadence, without clashes.
+
+    Slots are booked per restaurant, so two campaigns of one restaurant are
+    never posted within ``min_gap_minutes`` of each other. Seed it with posts
+    that are already scheduled through ``book``.
+    """
+
+    def __init__(
+        self,
+        min_gap_minutes: int = 60,
+        horizon_days: int = 366,
+        models: Optional[PostingModels] = None,
+        explore: bool = False,
+        rng: Optional[random.Random] = None,
+    ):
+        self.min_gap = int(min_gap_minutes * 60)
+        self.horizon = horizon_days * DAY_SECONDS
+        self._booked: Dict[str, SlotIndex] = {}
+        # Learned hours per restaurant and platform; static hours without them
+        self.models = models
+        # Thompson-sample the learned hours instead of always taking the best
+        self.explore = explore
+        self.rng = rng or random.Random()
+
+    def hours_for(self, campaign: Dict, timezone: str = 'UTC') -> PostingHours:
+        """Posting hours for a campaign: learned ones once there is data"""
+        static = posting_hours_for(campaign.get('target_audience'))
+        model = self.models.get(restaurant_key(campaign), primary_platform(campaign)) if self.models else None
+        if model is None or not model.observations:
+            return posting_hours(static, timezone)
+        return weekly_posting_hours(model.week(self.rng if self.explore else None), timezone)
+
+    def index(self, restaurant: str) -> SlotIndex:
+        index = self._booked.get(restaurant)
+        if index is None:
+            index = self._booked[restaurant] = SlotIndex(self.min_gap)
+        return index
+
+    def book(self, restaurant: str, times: Iterable[datetime]) -> None:
+        index = self.index(restaurant)
+        for when in times:
+            index.add(_epoch(when))
+
+    def release(self, restaurant: str, times: Iterable[datetime]) -> None:
+        """Free slots booked for posts that were never saved"""
+        index = self.index(restaurant)
+        for when in times:
+            index.remove(_epoch(when))
+
+    def next_slot(
+        self,
+        campaign: Dict,
+        after: Optional[datetime] = None,
+        timezone: str = 'UTC',
+        book: bool = True,
+    ) -> datetime:
+        """The first free posting time at or after ``after`` (default now)"""
+        hours = self.hours_for(campaign, timezone)
+        index = self.index(restaurant_key(campaign))
+        _, slot = self._first_free(hours, index, _epoch(after))
+        if book:
+            index.add(slot)
+        return datetime.fromtimestamp(slot, hours.tz)
+
+    def plan(
+        self,
+        campaign: Dict,
+        count: int,
+        after: Optional[datetime] = None,
+        timezone: str = 'UTC',
+    ) -> List[datetime]:
+        """Book ``count`` posts following the campaign's cadence.
+
+        Each post goes in the first free slot from the day its cadence falls
+        due, so a busy day pushes that post later rather than dropping it.
+        """
+        hours = self.hours_for(campaign, timezone)
+        index = self.index(restaurant_key(campaign))
+        period = timedelta(days=cadence_days(campaign.get('cadence')))
+
+        slots = []
+        cursor, day = _epoch(after), None
+        for _ in range(count):
+            day, slot = self._first_free(hours, index, cursor, day)
+            index.add(slot)
+            slots.append(slot)
+            # The next post is due from midnight, local time, a period later
+            day += period
+            cursor = hours.day_start(day)
+        return [datetime.fromtimestamp(slot, hours.tz) for slot in slots]
+
+    def plan_many(
+        self,
+        campaigns: Iterable[Dict],
+        count: int,
+        after: Optional[datetime] = None,
+        timezone: str = 'UTC',
+    ) -> Dict[str, List[datetime]]:
+        """Plan every campaign in turn; campaigns are keyed by ID"""
+        after = after or datetime.now(dt_timezone.utc)
+        return {
+            str(campaign['id']): self.plan(campaign, count, after, timezone)
+            for campaign in campaigns
+        }
+
+    def _first_free(
+        self,
+        hours: PostingHours,
+        index: SlotIndex,
+        after: int,
+        day: Optional[date] = None,
+    ) -> Tuple[date, int]:
+        limit = after + self.horizon
+        for day, slot in hours.candidates(after, day):
+            if slot > limit:
+                break
+            if not index.conflicts(slot):
+                return day, slot
+        raise ValueError(f"No free posting slot within {self.horizon // DAY_SECONDS} days")
+
+
+def _epoch(when: Optional[datetime]) -> int:
+    if when is None:
+        when = datetime.now(dt_timezone.utc)
+    elif when.tzinfo is None:
+        when = when.replace(tzinfo=dt_timezone.utc)
+    # Round up to the second so a slot is never before ``when``
+    seconds = when.timestamp()
+    return int(seconds) + (seconds % 1 > 0)
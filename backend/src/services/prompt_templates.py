@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import string
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+# Campaign fields a template may substitute
+TEMPLATE_FIELDS = {'name', 'description', 'target_audience', 'platform', 'style'}
+
+DEFAULT_PLATFORM = 'default'
+
+DEFAULT_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    # Restaurant photo enhancement used by the API
+    'enhance': {
+        'defaults': {
+            'application': "110602490-sdxl-turbo-food-enhancement",
+            'prompt': (
+                "Enhance this exact food photo for {name} restaurant marketing. "
+                "Keep the exact same composition and plating. "
+                "Campaign focus: {description}. "
+                "Target audience: {target_audience}. "
+                "DO NOT change food arrangement or composition. "
+                "ONLY enhance: "
+                "- Professional lighting to highlight textures "
+                "- Color balance and vibrancy "
+                "- Sharpness and clarity "
+                "- Professional food photography appeal "
+                "Make lighting and colors match high-end restaurant photography. "
+                "Maintain exact food placement and styling. "
+                "Enhance existing shadows and highlights. "
+                "Keep natural, authentic food appearance."
+            ),
+            'negative_prompt': (
+                "different composition, different plating, different food, "
+                "new arrangement, modified layout, alternate angle, "
+                "changed perspective, different setup, artificial looking, "
+                "oversaturated, unrealistic colors, cartoon effect, "
+                "illustration style, painting style, artificial enhancement"
+            ),
+            'style': "enhance this exact food photo professionally",
+            'image_size': "square_hd",
+            'arguments': {
+                'image_guidance_scale': 2.5,
+                'reference_weight': 0.98,
+                'control_guidance_start': 0.0,
+                'control_guidance_end': 1.0,
+            },
+        },
+        'platforms': {
+            'Instagram': {
+                'style': (
+                    "enhance this exact food photo, improve lighting and colors, "
+                    "make it instagram-worthy while keeping exact composition, "
+                    "maintain identical plating, enhance existing details, "
+                    "professional food photography color grading"
+                ),
+            },
+            'LinkedIn': {
+                'style': (
+                    "enhance this exact food photo, improve lighting and colors, "
+                    "upscale restaurant style while keeping exact composition, "
+                    "maintain identical plating, enhance existing details, "
+                    "professional business presentation"
+                ),
+                'image_size': "landscape_hd",
+            },
+            'Facebook': {
+                'style': (
+                    "enhance this exact food photo, improve lighting and colors, "
+                    "social-media optimized while keeping exact composition, "
+                    "maintain identical plating, enhance existing details, "
+                    "engaging food presentation"
+                ),
+                'image_size': "landscape_hd",
+            },
+            'Twitter': {
+                'style': (
+                    "enhance this exact food photo, improve lighting and colors, "
+                    "attention-grabbing while keeping exact composition, "
+                    "maintain identical plating, enhance existing details, "
+                    "impactful food presentation"
+                ),
+                'image_size': "landscape_hd",
+            },
+        },
+    },
+    # Generated campaign images (FalService / ContentAgent)
+    'campaign': {
+        'defaults': {
+            'application': "fal-ai/stable-diffusion-v15",
+            'prompt': (
+                "Create a professional {platform} marketing image for {target_audience}. "
+                "Campaign: {name}. {description}. "
+                "Style: High-quality, professional photography, {style}. "
+                "Make it authentic and engaging, avoid artificial or stock photo look."
+            ),
+            'negative_prompt': "text overlay, watermark, low quality, logo, blurry, artificial looking",
+            'style': "professional marketing",
+            'image_size': "square_hd",
+            'arguments': {
+                'guidance_scale': 7.5,
+            },
+        },
+        'platforms': {
+            'Instagram': {'style': "instagram-style, vibrant, engaging, square format"},
+            'LinkedIn': {'style': "professional, corporate, clean design"},
+            'Facebook': {'style': "social media optimized, engaging, community focused"},
+            'Twitter': {'style': "attention-grabbing, concise, shareable"},
+        },
+    },
+}
+
+
+def _content_hash(data: Any) -> str:
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]
+
+
+def _check_fields(kind: str, platform: str, template: str) -> None:
+    """Fail at load time, not mid-request, on an unknown placeholder"""
+    for _, field_name, _, _ in string.Formatter().parse(template):
+        if field_name is not None and field_name not in TEMPLATE_FIELDS:
+            raise ValueError(
+                f"Prompt template {kind}/{platform} uses unknown field '{{{field_name}}}'"
+            )
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """One platform's prompt and fixed Fal arguments, built once at load"""
+    kind: str
+    platform: str
+    application: str
+    prompt: str
+    negative_prompt: str
+    style: str
+    image_size: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+    # Content hash of everything above; changes whenever the template does
+    version: str = ''
+
+    @classmethod
+    def compile(cls, kind: str, platform: str, spec: Dict[str, Any]) -> "PromptTemplate":
+        _check_fields(kind, platform, spec['prompt'])
+        # Everything that doesn't depend on the campaign is formatted now
+        prompt = spec['prompt'].replace('{platform}', platform).replace('{style}', spec['style'])
+        content = {
+            'application': spec['application'],
+            'prompt': prompt,
+            'negative_prompt': spec['negative_prompt'],
+            'style': spec['style'],
+            'image_size': spec['image_size'],
+            'arguments': dict(spec.get('arguments') or {}),
+        }
+        return cls(kind=kind, platform=platform, version=_content_hash(content), **content)
+
+    def render(self, name: str, description: str, target_audience: str) -> str:
+        return self.prompt.format(
+            name=name,
+            description=description,
+            target_audience=target_audience,
+        )
+
+    def fal_arguments(self, prompt: str, **overrides: Any) -> Dict[str, Any]:
+        """Fal arguments for a rendered prompt; overrides win over fixed values"""
+        return {
+            'prompt': prompt,
+            'negative_prompt': self.negative_prompt,
+            **self.arguments,
+            **overrides,
+        }
+
+
+class PromptRegistry:
+    """Compiled templates by kind and platform"""
+
+    def __init__(self, templates: Optional[Dict[str, Dict[str, Any]]] = None):
+        templates = templates or DEFAULT_TEMPLATES
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        for kind, spec in templates.items():
+            defaults = spec.get('defaults', {})
+            compiled = {
+                DEFAULT_PLATFORM: PromptTemplate.compile(kind, DEFAULT_PLATFORM, defaults)
+            }
+            for platform, overrides in (spec.get('platforms') or {}).items():
+                compiled[platform] = PromptTemplate.compile(
+                    kind, platform, {**defaults, **overrides}
+                )
+            self._templates[kind] = compiled
+        self.version = _content_hash(
+            {kind: {p: t.version for p, t in by_platform.items()}
+             for kind, by_platform in self._templates.items()}
+        )
+
+    @classmethod
+    def from_yaml(cls, path: str) -> "PromptRegistry":
+        """Load templates from a YAML file shaped like DEFAULT_TEMPLATES"""
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("PyYAML is required to load prompt templates from YAML")
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+        return cls(data.get('templates', data))
+
+    @classmethod
+    def from_env(cls) -> "PromptRegistry":
+        path = os.getenv("PROMPT_TEMPLATES_PATH")
+        return cls.from_yaml(path) if path else cls()
+
+    def get(self, kind: str, platform: str) -> PromptTemplate:
+        """Template for a platform, falling back to the kind's defaults"""
+        try:
+            by_platform = self._templates[kind]
+        except KeyError:
+            raise ValueError(f"Unknown prompt template kind: {kind}")
+        return by_platform.get(platform) or by_platform[DEFAULT_PLATFORM]
+
+    def kinds(self):
+        return list(self._templates)
+
+
+_registry: Optional[PromptRegistry] = None
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """Process-wide registry, loaded on first use"""
+    global _registry
+    if _registry is None:
+        _registry = PromptRegistry.from_env()
+    return _registry
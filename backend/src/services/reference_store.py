@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from .fal_gateway import get_fal_gateway
+from .upload_limits import UnsupportedUpload, UploadTooLarge
+
+# Uploads are copied to disk in chunks of this size so a request never holds
+# more than one chunk of the photo in memory.
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SpooledUpload:
+    path: str
+    size: int
+    sha256: str
+    content_type: str
+    filename: Optional[str] = None
+
+    @property
+    def extension(self) -> str:
+        return mimetypes.guess_extension(self.content_type) or ".bin"
+
+    def discard(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def spool_upload(
+    upload,
+    directory: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+    max_size: Optional[int] = None,
+    check_head: Optional[Callable[[bytes], object]] = None,
+) -> SpooledUpload:
+    """Stream an UploadFile to a temporary file, hashing it on the way.
+
+    Raises UploadTooLarge once more than max_size bytes have been read, and
+    UnsupportedUpload if check_head rejects the first chunk, without reading
+    the rest of the file.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="upload-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                if size == 0 and check_head is not None and not check_head(chunk[:32]):
+                    raise UnsupportedUpload()
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise UploadTooLarge(max_size)
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    return SpooledUpload(
+        path=path,
+        size=size,
+        sha256=digest.hexdigest(),
+        content_type=upload.content_type or "application/octet-stream",
+        filename=upload.filename,
+    )
+
+
+class ReferenceStore(ABC):
+    """Somewhere Fal can fetch reference images from by URL"""
+
+    @abstractmethod
+    async def put(self, upload: SpooledUpload) -> str:
+        """Store the spooled file and return a URL for it"""
+
+
+class FalReferenceStore(ReferenceStore):
+    """Uploads to Fal's CDN so inference reads the image next to the model"""
+
+    async def put(self, upload: SpooledUpload) -> str:
+        return await get_fal_gateway().upload_file(upload.path)
+
+
+class LocalReferenceStore(ReferenceStore):
+    """Content-addressed files on local disk, served by the API itself.
+
+    Meant for development and tests; Fal can only reach it when base_url is
+    publicly routable.
+    """
+
+    def __init__(self, directory: str, base_url: str):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(directory, exist_ok=True)
+
+    async def put(self, upload: SpooledUpload) -> str:
+        name = f"{upload.sha256}{upload.extension}"
+        target = os.path.join(self.directory, name)
+        if os.path.exists(target):
+            upload.discard()
+        else:
+            await asyncio.to_thread(shutil.move, upload.path, target)
+        return f"{self.base_url}/{name}"
+
+
+class SupabaseReferenceStore(ReferenceStore):
+    """Stores references in the Supabase campaign-images bucket"""
+
+    def __init__(self, storage_service=None):
+        if storage_service is None:
+            from .storage_service import StorageService
+            storage_service = StorageService()
+        self.storage = storage_service
+
+    async def put(self, upload: SpooledUpload) -> str:
+        return await self.storage.upload_reference_file(
+            upload.path,
+            f"references/{upload.sha256}{upload.extension}",
+            upload.content_type,
+        )
+
+
+def create_reference_store_from_env() -> ReferenceStore:
+    """Build the store selected by REFERENCE_STORE (fal, supabase or local)"""
+    backend = os.getenv("REFERENCE_STORE", "fal").lower()
+    if backend == "fal":
+        return FalReferenceStore()
+    if backend == "supabase":
+        return SupabaseReferenceStore()
+    if backend == "local":
+        return LocalReferenceStore(
+            os.getenv("REFERENCE_STORE_DIR", "reference_images"),
+            os.getenv("REFERENCE_BASE_URL", "http://localhost:10000/api/references"),
+        )
+    raise ValueError(f"Unknown REFERENCE_STORE backend: {backend}")
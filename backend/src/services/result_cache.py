@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def _normalize(value: Any) -> Any:
+    """Collapse whitespace so cosmetic differences don't change the cache key"""
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+def make_cache_key(image_digest: str, **fields: Any) -> str:
+    """Content-addressed key from the reference image digest and prompt fields"""
+    canonical = json.dumps(
+        {'image': image_digest, 'fields': _normalize(fields)},
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class _SQLiteTier:
+    """Optional on-disk tier so results survive restarts"""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[Dict, float]]:
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= time.time():
+            self.delete(key)
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Dict, expires_at: float) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def purge_expired(self) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM results")
+
+
+class ResultCache:
+    """LRU + TTL cache with an optional SQLite tier and single-flight lookups.
+
+    Concurrent calls for the same key share one upstream computation; failures
+    are propagated to every waiter and never cached.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 3600,
+        disk_path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._disk = _SQLiteTier(disk_path) if disk_path else None
+        self._stats = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'errors': 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        return cls(
+            max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 256)),
+            ttl_seconds=float(os.getenv("RESULT_CACHE_TTL_SECONDS", 3600)),
+            disk_path=os.getenv("RESULT_CACHE_DB") or None,
+        )
+
+    def _get_memory(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_memory(self, key: str, value: Dict, expires_at: float) -> None:
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    async def get(self, key: str) -> Optional[Dict]:
+        value = self._get_memory(key)
+        if value is not None:
+            self._stats['hits'] += 1
+            return value
+        if self._disk:
+            stored = await asyncio.to_thread(self._disk.get, key)
+            if stored is not None:
+                self._stats['disk_hits'] += 1
+                self._put_memory(key, *stored)
+                return stored[0]
+        return None
+
+    async def set(self, key: str, value: Dict) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        self._put_memory(key, value, expires_at)
+        if self._disk:
+            await asyncio.to_thread(self._disk.set, key, value, expires_at)
+
+    async def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._disk:
+            await asyncio.to_thread(self._disk.delete, key)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        if self._disk:
+            await asyncio.to_thread(self._disk.clear)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict]],
+    ) -> Dict:
+        """Return the cached value for key, computing it at most once at a time"""
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats['coalesced'] += 1
+        else:
+            self._stats['misses'] += 1
+            task = asyncio.ensure_future(self._compute_and_store(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield so one cancelled caller doesn't abort the shared upstream call
+        return await asyncio.shield(task)
+
+    async def _compute_and_store(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict]],
+    ) -> Dict:
+        try:
+            value = await compute()
+        except Exception:
+            self._stats['errors'] += 1
+            raise
+        await self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats['hits'] + self._stats['disk_hits'] + \
+            self._stats['misses'] + self._stats['coalesced']
+        served = lookups - self._stats['misses']
+        return {
+            **self._stats,
+            'size': len(self._entries),
+            'inflight': len(self._inflight),
+            'hit_rate': served / lookups if lookups else 0.0,
+        }
@@ -1,51 +1,64 @@
-from typing import Dict
-from supabase import create_client
-import os
+import asyncio
+import logging
+from typing import Dict, Optional
 from dotenv import load_dotenv
-
-# Remove this line as it's causing the circular import:
-# from ..services.storage_service import StorageService
+from ..database.operations.social_media_ops import SocialMediaOps
+from ..database.postgrest import PostgrestClient, get_postgrest_client
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+BUCKET = 'campaign-images'
+
+def _read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
 class StorageService:
-    def __init__(self):
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_ANON_KEY")
-        
-        if not supabase_url or not supabase_key:
-            raise ValueError("Missing Supabase credentials")
-            
-        self.client = create_client(supabase_url, supabase_key)
+    """Supabase Storage uploads and campaign rows over the shared async client"""
+
+    def __init__(self, client: Optional[PostgrestClient] = None):
+        self.client = client or get_postgrest_client()
 
     async def upload_reference_image(self, file) -> str:
         """Upload reference image and return URL"""
         try:
             # Upload to Supabase storage
-            result = await self.client.storage.from_('campaign-images').upload(
+            await self.client.upload_object(
+                BUCKET,
                 file.filename,
-                file.file.read()
+                await file.read(),
+                file.content_type or 'application/octet-stream'
             )
-            return result['Key']  # Return the URL
+            return self.client.public_url(BUCKET, file.filename)
         except Exception as e:
-            print(f"Error uploading image: {str(e)}")
+            logger.error("Error uploading image: %s", e)
+            raise
+
+    async def upload_reference_file(
+        self,
+        path: str,
+        destination: str,
+        content_type: str
+    ) -> str:
+        """Upload a file from disk to the reference bucket and return its public URL"""
+        try:
+            content = await asyncio.to_thread(_read, path)
+            await self.client.upload_object(BUCKET, destination, content, content_type)
+            return self.client.public_url(BUCKET, destination)
+        except Exception as e:
+            logger.error("Error uploading reference file: %s", e)
             raise
 
     async def save_campaign(self, campaign_data: Dict, image_url: str) -> Dict:
         try:
-            result = (
-                self.client
-                .table('campaigns')
-                .insert({
-                    **campaign_data,
-                    'media_url': image_url,
-                    'status': 'active'
-                })
-                .execute()
-            )
-            
-            return result.data[0]
+            return await SocialMediaOps(self.client).create_campaign({
+                **campaign_data,
+                'media_url': image_url,
+                'status': 'active'
+            })
 
         except Exception as e:
-            print(f"Error saving campaign: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error("Error saving campaign: %s", e)
+            raise
@@ -0,0 +1,271 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, Optional
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# LogRecord attributes that aren't caller-supplied extra fields
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+
+@dataclass
+class Trace:
+    """Per-request tracing state, shared by every task the request spawns"""
+    request_id: str
+    sampled: bool
+    started: float = field(default_factory=time.perf_counter)
+    # Spans begun in a handler but finished once the response is sent
+    open_spans: Dict[str, float] = field(default_factory=dict)
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "fluffyduck_trace", default=None
+)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current.get()
+    return trace.request_id if trace else None
+
+
+def is_sampled() -> bool:
+    """Whether detailed logs should be written for the current request"""
+    trace = _current.get()
+    return trace is None or trace.sampled
+
+
+class StageMetrics:
+    """Latency per pipeline stage: totals plus a window of recent samples"""
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._count: Dict[str, int] = {}
+        self._total: Dict[str, float] = {}
+        self._max: Dict[str, float] = {}
+        self._recent: Dict[str, Deque[float]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        if stage not in self._count:
+            self._count[stage] = 0
+            self._total[stage] = 0.0
+            self._max[stage] = 0.0
+            self._recent[stage] = deque(maxlen=self.window)
+        self._count[stage] += 1
+        self._total[stage] += seconds
+        self._max[stage] = max(self._max[stage], seconds)
+        self._recent[stage].append(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        stats = {}
+        for stage, count in self._count.items():
+            recent = sorted(self._recent[stage])
+            stats[stage] = {
+                'count': count,
+                'mean_ms': round(self._total[stage] / count * 1000, 2),
+                'p50_ms': round(recent[len(recent) // 2] * 1000, 2),
+                'p95_ms': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 2),
+                'max_ms': round(self._max[stage] * 1000, 2),
+            }
+        return stats
+
+
+stage_metrics = StageMetrics()
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def span(stage: str, **fields: Any) -> Iterator[None]:
+    """Time a pipeline stage into stage_metrics and, if sampled, the log"""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_metrics.observe(stage, elapsed)
+        if is_sampled():
+            logger.info(
+                "stage %s finished",
+                stage,
+                extra={'stage': stage, 'duration_ms': round(elapsed * 1000, 2), 'failed': failed, **fields},
+            )
+
+
+def begin_span(stage: str) -> None:
+    """Start a span that ends when the current response has been sent"""
+    trace = _current.get()
+    if trace is not None:
+        trace.open_spans[stage] = time.perf_counter()
+
+
+class RequestTracingMiddleware:
+    """Assigns each HTTP request an ID and a sampling decision.
+
+    The ID comes from the X-Request-ID header when the client sends one and
+    is echoed back on the response. Total request time is recorded as the
+    "request" stage; spans opened with begin_span close when the last body
+    chunk goes out.
+    """
+
+    def __init__(self, app, sample_rate: float = 1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        trace = Trace(
+            request_id=request_id or uuid.uuid4().hex,
+            sampled=random.random() < self.sample_rate,
+        )
+        token = _current.set(trace)
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [
+                    *message["headers"],
+                    (REQUEST_ID_HEADER.encode(), trace.request_id.encode()),
+                ]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                now = time.perf_counter()
+                for stage, started in trace.open_spans.items():
+                    stage_metrics.observe(stage, now - started)
+                trace.open_spans.clear()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - trace.started
+            stage_metrics.observe("request", elapsed)
+            if trace.sampled or status >= 500:
+                logger.info(
+                    "%s %s %s",
+                    scope["method"],
+                    scope["path"],
+                    status,
+                    extra={'status': status, 'duration_ms': round(elapsed * 1000, 2)},
+                )
+            _current.reset(token)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the request ID and drops unsampled chatter.
+
+    Warnings and errors are always kept.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = _current.get()
+        record.request_id = trace.request_id if trace else None
+        return trace is None or trace.sampled or record.levelno >= logging.WARNING
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[logging.handlers.QueueHandler] = None
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+) -> None:
+    """Route all logging through a queue drained by a background thread.
+
+    Request handlers only pay for enqueueing a record; formatting and the
+    write to stdout happen on the listener thread. Safe to call twice, and
+    again after shutdown_logging().
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+
+    output = logging.StreamHandler()
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        ))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _handler = logging.handlers.QueueHandler(records)
+    _handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    # Registering again after a shutdown would run it twice at exit
+    atexit.unregister(shutdown_logging)
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Detach the queue from the root logger, flush it and stop the listener thread"""
+    global _listener, _handler
+    if _handler is not None:
+        # Nothing drains the queue once the listener stops
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def sample_rate_from_env() -> float:
+    return float(os.getenv("TRACE_SAMPLE_RATE", 0.1))
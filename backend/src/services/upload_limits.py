@@ -0,0 +1,156 @@
+import os
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+# Photos straight off a phone are 3-12 MB; leave headroom for HEIC/ProRAW
+DEFAULT_MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+
+# Bytes of a file part needed to recognise its format
+HEAD_BYTES = 16
+
+# How far into a multipart body to look for the file part before giving up
+# and leaving the check to the handler
+SNIFF_SCAN_LIMIT = 64 * 1024
+
+BODY_METHODS = {"POST", "PUT", "PATCH"}
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=f"Upload exceeds the {limit} byte limit")
+
+
+class UnsupportedUpload(HTTPException):
+    def __init__(self, detail: str = "Unsupported image format"):
+        super().__init__(status_code=415, detail=detail)
+
+
+def max_upload_bytes_from_env() -> int:
+    return int(os.getenv("MAX_UPLOAD_BYTES", DEFAULT_MAX_UPLOAD_BYTES))
+
+
+def max_request_bytes_from_env() -> int:
+    # Room for the other form fields and multipart framing on top of the file
+    return int(os.getenv("MAX_REQUEST_BYTES", max_upload_bytes_from_env() + 1024 * 1024))
+
+
+def _boundary(content_type: str) -> Optional[bytes]:
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary" and value:
+            return value.strip('"').encode("latin-1")
+    return None
+
+
+class MultipartFileSniffer:
+    """Finds the first file part in a streamed multipart body and checks it.
+
+    Fed the body chunk by chunk; holds at most SNIFF_SCAN_LIMIT bytes and
+    stops buffering as soon as it has seen the file's first bytes.
+    """
+
+    def __init__(self, boundary: bytes, accept: Callable[[bytes], object]):
+        self.delimiter = b"--" + boundary
+        self.accept = accept
+        self.buffer = bytearray()
+        self.position = 0
+        self.done = False
+
+    def feed(self, chunk: bytes) -> bool:
+        """False once the file part is known not to be acceptable"""
+        if self.done:
+            return True
+        self.buffer += chunk
+
+        while True:
+            start = self.buffer.find(self.delimiter, self.position)
+            if start == -1:
+                break
+            headers_end = self.buffer.find(b"\r\n\r\n", start)
+            if headers_end == -1:
+                break
+            body_start = headers_end + 4
+            if b"filename=" not in self.buffer[start:headers_end].lower():
+                self.position = body_start
+                continue
+            if len(self.buffer) - body_start < HEAD_BYTES:
+                break
+            head = bytes(self.buffer[body_start:body_start + HEAD_BYTES])
+            self._finish()
+            return bool(self.accept(head))
+
+        if len(self.buffer) > SNIFF_SCAN_LIMIT:
+            self._finish()
+        return True
+
+    def _finish(self) -> None:
+        self.done = True
+        self.buffer = bytearray()
+
+
+class UploadLimitMiddleware:
+    """Rejects oversized or non-image uploads while the body is still arriving.
+
+    A declared Content-Length over max_body_bytes is refused with 413 before
+    any of the body is read. Otherwise the body is counted as the app reads
+    it, and multipart file parts have their magic bytes checked by ``accept``
+    as soon as they start, so a bad upload fails with 413/415 instead of
+    being spooled in full first.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_body_bytes: int,
+        accept: Optional[Callable[[bytes], object]] = None,
+    ):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.accept = accept
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in BODY_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = content_type = None
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                content_length = value
+            elif name == b"content-type":
+                content_type = value.decode("latin-1")
+
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                declared = None
+            if declared is not None and declared > self.max_body_bytes:
+                error = UploadTooLarge(self.max_body_bytes)
+                response = JSONResponse({"detail": error.detail}, status_code=413)
+                await response(scope, receive, send)
+                return
+
+        sniffer = None
+        if self.accept and content_type and content_type.lower().startswith("multipart/form-data"):
+            boundary = _boundary(content_type)
+            if boundary:
+                sniffer = MultipartFileSniffer(boundary, self.accept)
+
+        received = 0
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                received += len(chunk)
+                if received > self.max_body_bytes:
+                    raise UploadTooLarge(self.max_body_bytes)
+                if sniffer is not None and not sniffer.feed(chunk):
+                    raise UnsupportedUpload()
+            return message
+
+        await self.app(scope, counting_receive, send)
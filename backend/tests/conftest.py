@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.admission import InMemoryRateLimitBackend
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limits(monkeypatch):
+    """Give every test empty rate-limit buckets.
+
+    All in-process requests come from one client address, so without this
+    the API tests would share a single bucket and fail depending on order.
+    The API module is only touched if something already imported it; a
+    first import starts out empty anyway.
+    """
+    main = sys.modules.get("src.api.main")
+    if main is not None:
+        monkeypatch.setattr(main.rate_limiter, "backend", InMemoryRateLimitBackend())
+    yield
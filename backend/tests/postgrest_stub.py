@@ -0,0 +1,359 @@
+"""SQLite-backed stand-in for Supabase's PostgREST and Storage APIs.
+
+Serves the subset of the HTTP API the data layer uses through an
+``httpx.MockTransport``, so tests exercise real requests without a server.
+Rows are stored as JSON documents and filtered with json_extract.
+"""
+import json
+import re
+import sqlite3
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+OPERATORS = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+RESERVED_PARAMS = {'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'}
+
+
+def _coerce(raw: str) -> Any:
+    if raw == 'true':
+        return 1
+    if raw == 'false':
+        return 0
+    if raw == 'null':
+        return None
+    if re.fullmatch(r'-?\d+', raw):
+        return int(raw)
+    if re.fullmatch(r'-?\d+\.\d+', raw):
+        return float(raw)
+    return raw
+
+
+def _split_in(raw: str) -> List[str]:
+    inner = raw[1:-1] if raw.startswith('(') and raw.endswith(')') else raw
+    items = re.findall(r'"(?:[^"\\]|\\.)*"|[^,]+', inner)
+    return [item[1:-1].replace('\\"', '"') if item.startswith('"') else item for item in items]
+
+
+def _column(name: str) -> str:
+    if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', name):
+        raise ValueError(f"bad column {name}")
+    return f"json_extract(data, '$.{name}')"
+
+
+class PostgrestStub:
+    """In-process PostgREST: tables appear on first insert"""
+
+    def __init__(self):
+        self.db = sqlite3.connect(":memory:")
+        self.db.execute(
+            "CREATE TABLE rows (tbl TEXT NOT NULL, id TEXT NOT NULL, seq INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+        )
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self.functions: Dict[str, Callable[["PostgrestStub", Dict[str, Any]], Any]] = {}
+        # Per-table row checks standing in for constraints; return an error or None
+        self.checks: Dict[str, Callable[[Dict[str, Any]], Optional[str]]] = {}
+        # NOT NULL columns without a default, as in the real schema
+        self.not_null: Dict[str, List[str]] = {'campaigns': ['title']}
+        # Column defaults other than id and created_at
+        self.defaults: Dict[str, Dict[str, Any]] = {'campaigns': {'selected': False}}
+        self.requests: List[httpx.Request] = []
+        # Queued failures: (status code or exception, method or None)
+        self.failures: List[Tuple[Any, Optional[str]]] = []
+        # now() for stored functions; tests can replace it to move time on
+        self.clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def fail_next(self, failure: Any, times: int = 1, method: Optional[str] = None) -> None:
+        """Make the next matching requests return a status code or raise an exception"""
+        self.failures.extend([(failure, method)] * times)
+
+    # -- direct table access for test setup/assertions -----------------
+
+    def seed(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [self._insert(table, row) for row in rows]
+
+    def all(self, table: str) -> List[Dict[str, Any]]:
+        return [json.loads(d) for (d,) in self.db.execute(
+            "SELECT data FROM rows WHERE tbl = ? ORDER BY seq", (table,)
+        )]
+
+    def save(self, table: str, row: Dict[str, Any]) -> None:
+        self.db.execute(
+            "UPDATE rows SET data = ? WHERE tbl = ? AND id = ?",
+            (json.dumps(row), table, str(row['id'])),
+        )
+
+    def _default(self, table: str, column: str) -> Any:
+        if column == 'id':
+            return str(uuid.uuid4())
+        if column == 'created_at':
+            return datetime.now(timezone.utc).isoformat()
+        return self.defaults.get(table, {}).get(column)
+
+    def _find(self, table: str, row: Dict[str, Any], conflict: List[str]) -> Optional[Dict[str, Any]]:
+        if all(row.get(column) is not None for column in conflict):
+            for existing in self.all(table):
+                if all(str(existing.get(c)) == str(row[c]) for c in conflict):
+                    return existing
+        return None
+
+    def _upsert(self, table: str, row: Dict[str, Any], conflict: List[str]) -> Dict[str, Any]:
+        # ON CONFLICT DO UPDATE sets every column of the statement, so a
+        # column this row left out overwrites the stored value with its default
+        existing = self._find(table, row, conflict)
+        if existing is None:
+            return self._insert(table, row)
+        existing.update(row)
+        self.save(table, existing)
+        return existing
+
+    def _insert(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = {
+            'id': str(uuid.uuid4()),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            **row,
+        }
+        self.db.execute(
+            "INSERT INTO rows (tbl, id, data) VALUES (?, ?, ?)",
+            (table, str(row['id']), json.dumps(row)),
+        )
+        return row
+
+    def _where(self, table: str, params: httpx.QueryParams) -> Tuple[str, List[Any]]:
+        clauses, args = ["tbl = ?"], [table]
+        for name, value in params.multi_items():
+            if name in RESERVED_PARAMS:
+                continue
+            op, _, raw = value.partition('.')
+            column = _column(name)
+            if op == 'in':
+                items = _split_in(raw)
+                clauses.append(f"CAST({column} AS TEXT) IN ({','.join('?' * len(items))})")
+                args.extend(items)
+            elif op == 'is':
+                clauses.append(f"{column} IS NULL" if raw == 'null' else f"{column} = ?")
+                if raw != 'null':
+                    args.append(_coerce(raw))
+            elif op == 'eq':
+                # Match either the typed value or its text, as Postgres casts would
+                clauses.append(f"({column} = ? OR CAST({column} AS TEXT) = ?)")
+                args.extend([_coerce(raw), raw])
+            elif op in OPERATORS:
+                clauses.append(f"{column} {OPERATORS[op]} ?")
+                args.append(_coerce(raw))
+            else:
+                raise ValueError(f"unsupported operator {op}")
+        return " AND ".join(clauses), args
+
+    def _select(self, table: str, params: httpx.QueryParams) -> List[Tuple[int, Dict[str, Any]]]:
+        where, args = self._where(table, params)
+        sql = f"SELECT seq, data FROM rows WHERE {where}"
+        if params.get('order'):
+            terms = []
+            for term in params['order'].split(','):
+                name, _, direction = term.partition('.')
+                terms.append(f"{_column(name)} {'DESC' if direction.startswith('desc') else 'ASC'}")
+            sql += " ORDER BY " + ", ".join(terms) + ", seq"
+        else:
+            sql += " ORDER BY seq"
+        if params.get('limit'):
+            sql += f" LIMIT {int(params['limit'])}"
+            if params.get('offset'):
+                sql += f" OFFSET {int(params['offset'])}"
+        return [(seq, json.loads(data)) for seq, data in self.db.execute(sql, args)]
+
+    @staticmethod
+    def _project(row: Dict[str, Any], select: Optional[str]) -> Dict[str, Any]:
+        if not select or select == '*':
+            return row
+        return {c: row.get(c) for c in select.split(',')}
+
+    # -- HTTP ------------------------------------------------------------
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        for i, (failure, method) in enumerate(self.failures):
+            if method is None or method == request.method:
+                del self.failures[i]
+                if isinstance(failure, Exception):
+                    raise failure
+                return httpx.Response(failure, json={'message': 'injected failure'})
+
+        path = request.url.path
+        try:
+            if path.startswith('/rest/v1/rpc/'):
+                return self._rpc(path[len('/rest/v1/rpc/'):], request)
+            if path.startswith('/rest/v1/'):
+                return self._table(path[len('/rest/v1/'):], request)
+            if path.startswith('/storage/v1/object/') and request.method == 'POST':
+                bucket, _, name = path[len('/storage/v1/object/'):].partition('/')
+                if (bucket, name) in self.objects and request.headers.get('x-upsert') != 'true':
+                    return httpx.Response(409, json={'error': 'Duplicate'})
+                self.objects[(bucket, name)] = request.content
+                return httpx.Response(200, json={'Key': f"{bucket}/{name}"})
+        except (ValueError, KeyError) as e:
+            return httpx.Response(400, json={'message': str(e), 'code': 'PGRST100'})
+        return httpx.Response(404, json={'message': f"no route for {path}"})
+
+    def _rpc(self, name: str, request: httpx.Request) -> httpx.Response:
+        if name not in self.functions:
+            return httpx.Response(404, json={'message': f"function {name} not found", 'code': 'PGRST202'})
+        params = json.loads(request.content or b'{}')
+        with self.db:
+            result = self.functions[name](self, params)
+        return httpx.Response(200, json=result)
+
+    def _table(self, table: str, request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        if request.method == 'GET':
+            rows = [self._project(r, params.get('select')) for _, r in self._select(table, params)]
+            return httpx.Response(200, json=rows)
+
+        if request.method == 'POST':
+            body = json.loads(request.content)
+            rows = body if isinstance(body, list) else [body]
+            prefer = request.headers.get('prefer', '')
+            if params.get('columns'):
+                # Keys a row leaves out are NULL, or the column default with missing=default
+                missing = 'missing=default' in prefer
+                rows = [
+                    {c: row[c] if c in row else (self._default(table, c) if missing else None)
+                     for c in params['columns'].split(',')}
+                    for row in rows
+                ]
+            # Like a single INSERT statement, one bad row rejects the lot.
+            # Postgres checks constraints on the proposed row before ON CONFLICT.
+            check = self.checks.get(table)
+            for row in rows:
+                for column in self.not_null.get(table, []):
+                    if row.get(column) is None:
+                        return httpx.Response(400, json={
+                            'message': f'null value in column "{column}" violates not-null constraint',
+                            'code': '23502',
+                        })
+                problem = check(row) if check else None
+                if problem:
+                    return httpx.Response(400, json={'message': problem, 'code': '23514'})
+            merge = 'resolution=merge-duplicates' in prefer
+            conflict = params.get('on_conflict', 'id').split(',')
+            if not merge and any(self._find(table, row, ['id']) for row in rows):
+                return httpx.Response(409, json={
+                    'message': 'duplicate key value violates unique constraint', 'code': '23505'
+                })
+            with self.db:
+                written = [
+                    self._upsert(table, row, conflict) if merge else self._insert(table, row)
+                    for row in rows
+                ]
+            return httpx.Response(201, json=written)
+
+        if request.method == 'PATCH':
+            values = json.loads(request.content)
+            updated = []
+            with self.db:
+                for seq, row in self._select(table, params):
+                    row.update(values)
+                    self.db.execute("UPDATE rows SET data = ? WHERE seq = ?", (json.dumps(row), seq))
+                    updated.append(row)
+            return httpx.Response(200, json=updated)
+
+        if request.method == 'DELETE':
+            deleted = []
+            with self.db:
+                for seq, row in self._select(table, params):
+                    self.db.execute("DELETE FROM rows WHERE seq = ?", (seq,))
+                    deleted.append(row)
+            return httpx.Response(200, json=deleted)
+
+        return httpx.Response(405, json={'message': 'method not allowed'})
+
+
+# -- Stored functions from schema/campaigns.sql -----------------------------
+
+def _lease_live(row: Dict[str, Any], now: datetime) -> bool:
+    expires = row.get('lease_expires_at')
+    return expires is not None and datetime.fromisoformat(expires) >= now
+
+
+def _claim_campaigns(stub: PostgrestStub, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    now = stub.clock()
+    lease = timedelta(seconds=params.get('lease_seconds', 300))
+    candidates = sorted(
+        (row for row in stub.all('campaigns')
+         if not row.get('selected')
+         and not _lease_live(row, now)
+         and row.get('attempts', 0) < params.get('max_attempts', 5)),
+        key=lambda row: row['created_at'],
+    )
+    claimed = []
+    for row in candidates[:params.get('batch_size', 1)]:
+        row.update(
+            claimed_by=params['worker_id'],
+            lease_expires_at=(now + lease).isoformat(),
+            attempts=row.get('attempts', 0) + 1,
+        )
+        stub.save('campaigns', row)
+        claimed.append(row)
+    return claimed
+
+
+def _heartbeat_campaigns(stub: PostgrestStub, params: Dict[str, Any]) -> List[str]:
+    now = stub.clock()
+    lease = timedelta(seconds=params.get('lease_seconds', 300))
+    held = []
+    for row in stub.all('campaigns'):
+        if (row['id'] in params['campaign_ids']
+                and row.get('claimed_by') == params['worker_id']
+                and not row.get('selected')
+                and _lease_live(row, now)):
+            row['lease_expires_at'] = (now + lease).isoformat()
+            stub.save('campaigns', row)
+            held.append(row['id'])
+    return held
+
+
+def _finish(stub: PostgrestStub, params: Dict[str, Any], **values: Any) -> List[Dict[str, Any]]:
+    for row in stub.all('campaigns'):
+        if (row['id'] == params['campaign_id']
+                and row.get('claimed_by') == params['worker_id']
+                and not row.get('selected')):
+            row.update(claimed_by=None, lease_expires_at=None, **values)
+            stub.save('campaigns', row)
+            return [row]
+    return []
+
+
+def _update_campaigns_media(stub: PostgrestStub, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    urls = {item['id']: item['media_url'] for item in params['media']}
+    updated = []
+    for row in stub.all('campaigns'):
+        if row['id'] in urls:
+            row.update(media_url=urls[row['id']], selected=True)
+            stub.save('campaigns', row)
+            updated.append(row)
+    return updated
+
+
+def install_campaign_media(stub: PostgrestStub) -> PostgrestStub:
+    """Register the batch media update RPC"""
+    stub.functions['update_campaigns_media'] = _update_campaigns_media
+    return stub
+
+
+def install_campaign_queue(stub: PostgrestStub) -> PostgrestStub:
+    """Register Python versions of the campaign queue RPCs"""
+    stub.functions.update({
+        'claim_campaigns': _claim_campaigns,
+        'heartbeat_campaigns': _heartbeat_campaigns,
+        'complete_campaign': lambda s, p: _finish(
+            s, p, media_url=p['generated_media_url'], selected=True, last_error=None
+        ),
+        'release_campaign': lambda s, p: _finish(s, p, last_error=p.get('error')),
+    })
+    return stub
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.admission import (
+    AdmissionController,
+    AdmissionMiddleware,
+    ClientIdentifier,
+    InMemoryRateLimitBackend,
+    Overloaded,
+    RateLimiter,
+    RedisRateLimitBackend,
+    gcra,
+    key_digest,
+)
+
+
+def test_gcra_allows_burst_then_paces():
+    tat, allowed = None, 0
+    for _ in range(5):
+        new_tat, wait = gcra(tat, 100.0, rate=1.0, burst=3)
+        if wait == 0:
+            tat = new_tat
+            allowed += 1
+    assert allowed == 3
+    _, wait = gcra(tat, 100.0, rate=1.0, burst=3)
+    assert wait == pytest.approx(1.0)
+    # One interval later a single token has refilled
+    assert gcra(tat, 101.0, rate=1.0, burst=3)[1] == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_is_per_key():
+    limiter = RateLimiter(InMemoryRateLimitBackend(), rate=0.5, burst=2)
+    await limiter.check("a")
+    await limiter.check("a")
+    with pytest.raises(Overloaded) as e:
+        await limiter.check("a")
+    assert 0 < e.value.retry_after <= 2
+    await limiter.check("b")
+    assert limiter.stats()['limited'] == 1
+
+
+class StubRedis:
+    """Runs the rate-limit script's logic in Python instead of Lua"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def eval(self, script, numkeys, key, now, rate, burst):
+        tat, wait = gcra(self.values.get(key), now, rate, burst)
+        if tat is not None:
+            self.values[key] = tat
+        return str(wait)
+
+
+@pytest.mark.asyncio
+async def test_shared_backend_is_shared_between_limiters():
+    redis = StubRedis()
+    first = RateLimiter(RedisRateLimitBackend(redis), rate=0.1, burst=1)
+    second = RateLimiter(RedisRateLimitBackend(redis), rate=0.1, burst=1)
+    await first.check("key:abc")
+    with pytest.raises(Overloaded):
+        await second.check("key:abc")
+    assert list(redis.values) == ["fluffyduck:ratelimit:key:abc"]
+
+
+@pytest.mark.asyncio
+async def test_controller_queues_then_sheds():
+    controller = AdmissionController(max_concurrency=1, max_waiting=1, wait_timeout=0.05)
+    release = asyncio.Event()
+
+    async def hold():
+        async with controller.admit():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert controller.stats()['waiting'] == 1
+
+    # Queue is full: refused immediately
+    with pytest.raises(Overloaded):
+        async with controller.admit():
+            pass
+    assert controller.stats()['rejected_queue_full'] == 1
+
+    # The queued request gives up after wait_timeout
+    with pytest.raises(Overloaded):
+        await waiter
+    assert controller.stats()['rejected_timeout'] == 1
+
+    release.set()
+    await holder
+    async with controller.admit():
+        assert controller.stats()['active'] == 1
+    assert controller.stats()['admitted'] == 2
+
+
+def _app(controller, limiter):
+    app = FastAPI()
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=controller,
+        limiter=limiter,
+        paths=["/slow"],
+        client_key=lambda scope: "ip:test",
+    )
+    gate = asyncio.Event()
+
+    @app.post("/slow")
+    async def slow():
+        await gate.wait()
+        return {"ok": True}
+
+    @app.get("/fast")
+    async def fast():
+        return {"ok": True}
+
+    return app, gate
+
+
+@pytest.mark.asyncio
+async def test_middleware_answers_503_and_429_with_retry_after():
+    controller = AdmissionController(max_concurrency=1, max_waiting=0, wait_timeout=1)
+    app, gate = _app(controller, RateLimiter(InMemoryRateLimitBackend(), rate=0.01, burst=2))
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        first = asyncio.create_task(client.post("/slow"))
+        await asyncio.sleep(0.05)
+
+        busy = await client.post("/slow")
+        assert busy.status_code == 503
+        assert int(busy.headers["retry-after"]) >= 1
+
+        limited = await client.post("/slow")
+        assert limited.status_code == 429
+        assert int(limited.headers["retry-after"]) >= 1
+
+        # Other routes are untouched
+        assert (await client.get("/fast")).status_code == 200
+
+        gate.set()
+        assert (await first).status_code == 200
+    assert controller.stats()['active'] == 0
+
+
+def _scope(peer, *headers):
+    return {'client': (peer, 1234), 'headers': [(n.encode(), v.encode()) for n, v in headers]}
+
+
+def test_clients_are_keyed_by_known_keys_or_their_address():
+    identify = ClientIdentifier(api_keys=["secret"], trusted_proxies=["10.0.0.0/8"])
+
+    assert identify(_scope("203.0.113.9", ("x-api-key", "secret"))) == f"key:{key_digest('secret')}"
+    assert "secret" not in identify(_scope("203.0.113.9", ("x-api-key", "secret")))
+    # Made-up keys don't get buckets of their own
+    assert identify(_scope("203.0.113.9", ("x-api-key", "rotated-1"))) == "ip:203.0.113.9"
+
+    # Behind our proxies the client is the last hop they didn't add
+    behind = _scope("10.0.0.2", ("x-forwarded-for", "1.2.3.4, 198.51.100.7, 10.0.0.5"))
+    assert identify(behind) == "ip:198.51.100.7"
+    # A client talking to us directly can't pick its address
+    direct = _scope("198.51.100.7", ("x-forwarded-for", "1.2.3.4"))
+    assert identify(direct) == "ip:198.51.100.7"
+    assert ClientIdentifier()(behind) == "ip:10.0.0.2"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
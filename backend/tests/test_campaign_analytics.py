@@ -0,0 +1,167 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agents.social_media.analytics_agent import AnalyticsAgent
+from src.database.operations.campaign_repository import CampaignRepository
+from src.database.operations.social_media_ops import SocialMediaOps
+from src.database.postgrest import PostgrestClient
+from src.services.campaign_analytics import NUMPY_AVAILABLE, MetricsFrame, analyze_metrics
+from src.services.engagement_aggregates import EngagementAggregates
+from tests.postgrest_stub import PostgrestStub
+
+UNTIL = datetime(2024, 6, 11, tzinfo=timezone.utc)
+SINCE = UNTIL - timedelta(days=10)
+
+BACKENDS = [False, pytest.param(True, marks=pytest.mark.skipif(not NUMPY_AVAILABLE, reason="numpy not installed"))]
+
+
+def snapshot(campaign_id, day, likes, impressions, hashtags=None, comments=0, shares=0):
+    return {
+        'campaign_id': campaign_id,
+        'likes': likes,
+        'comments': comments,
+        'shares': shares,
+        'impressions': impressions,
+        'hashtag_performance': hashtags,
+        'recorded_at': (SINCE + timedelta(days=day, hours=12)).isoformat(),
+    }
+
+
+ROWS = [
+    # Rising: 2% -> 4% -> 6% on days 0, 1, 2
+    snapshot('a', 0, 2, 100),
+    snapshot('a', 2, 6, 100, {'#brunch': 9, '#eggs': 4, '#coffee': 7}),
+    snapshot('a', 1, 4, 100),
+    # Falling: 10% -> 5% on days 0 and 5
+    snapshot('b', 0, 10, 100, {'#brunch': 1}),
+    snapshot('b', 5, 5, 50, {'#pasta': 3}, comments=3, shares=2),
+    # Never shown
+    snapshot('c', 9, 0, 0),
+]
+
+
+@pytest.mark.parametrize("use_numpy", BACKENDS)
+def test_report_per_campaign_and_portfolio(use_numpy):
+    report = analyze_metrics(MetricsFrame.from_rows(ROWS, use_numpy), SINCE, UNTIL, top_k=2, rolling_days=3)
+
+    a, b, c = (report.campaigns[k] for k in 'abc')
+    # Judged by the latest snapshot, whatever order rows arrive in
+    assert a.engagement_rate == pytest.approx(6)
+    assert a.trend == pytest.approx(2)
+    assert a.snapshots == 3
+    assert a.top_hashtags == [('#brunch', 9), ('#coffee', 7)]
+    assert b.engagement_rate == pytest.approx(20)
+    assert b.trend == pytest.approx((20 - 10) / 5)
+    assert c.engagement_rate == 0 and c.trend == 0
+
+    assert report.impressions == 150
+    assert report.engagement_rate == pytest.approx((6 + 10) / 150 * 100)
+    assert report.top_campaigns == [('b', pytest.approx(20)), ('a', pytest.approx(6))]
+    assert report.top_hashtags == [('#brunch', 9), ('#coffee', 7)]
+
+    assert len(report.daily_engagement) == 10
+    assert report.daily_engagement[0] == pytest.approx(6)
+    assert report.daily_engagement[3] is None
+    # Days 0-2 have snapshots 2, 10, 4, 6 -> rolling mean of the rates
+    assert report.rolling_engagement[2] == pytest.approx((2 + 10 + 4 + 6) / 4)
+    assert report.rolling_engagement[4] == pytest.approx(6)
+    assert report.rolling_engagement[8] is None
+
+
+def test_numpy_and_python_backends_agree():
+    if not NUMPY_AVAILABLE:
+        pytest.skip("numpy not installed")
+    python = analyze_metrics(MetricsFrame.from_rows(ROWS, False), SINCE, UNTIL).to_dict()
+    vectorized = analyze_metrics(MetricsFrame.from_rows(ROWS, True), SINCE, UNTIL).to_dict()
+    assert rounded(python) == rounded(vectorized)
+
+
+def rounded(value):
+    if isinstance(value, float):
+        return round(value, 9)
+    if isinstance(value, dict):
+        return {k: rounded(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [rounded(v) for v in value]
+    return value
+
+
+@pytest.mark.parametrize("use_numpy", BACKENDS)
+def test_snapshots_without_a_time_are_skipped(use_numpy):
+    undated = [{**snapshot('a', 0, 90, 100), 'recorded_at': None}, {**snapshot('d', 0, 5, 10), 'recorded_at': ''}]
+    frame = MetricsFrame.from_rows(ROWS + undated, use_numpy)
+    assert len(frame) == len(ROWS) and 'd' not in frame.campaign_ids
+    assert analyze_metrics(frame, SINCE, UNTIL).to_dict() == analyze_metrics(
+        MetricsFrame.from_rows(ROWS, use_numpy), SINCE, UNTIL
+    ).to_dict()
+
+
+def test_empty_window():
+    report = analyze_metrics(MetricsFrame.from_rows([]), SINCE, UNTIL)
+    assert report.campaigns == {} and report.engagement_rate == 0
+    assert report.daily_engagement == [None] * 10
+
+
+def setup():
+    stub = PostgrestStub()
+    campaigns = stub.seed('campaigns', [
+        {'title': 'brunch', 'restaurant_id': 'r1'},
+        {'title': 'dinner', 'restaurant_id': 'r1'},
+        {'title': 'elsewhere', 'restaurant_id': 'r2'},
+    ])
+    ids = [c['id'] for c in campaigns]
+    stub.seed('campaign_metrics', [
+        {**row, 'campaign_id': ids['ab'.index(row['campaign_id'])]}
+        for row in ROWS if row['campaign_id'] in 'ab'
+    ] + [
+        # Outside the window
+        {**snapshot('x', -30, 90, 100), 'campaign_id': ids[0]},
+        snapshot(ids[2], 1, 50, 100),
+    ])
+    client = PostgrestClient("https://project.supabase.co", "anon-key", transport=stub.transport())
+    return stub, ids, AnalyticsAgent(CampaignRepository(SocialMediaOps(client)), EngagementAggregates())
+
+
+@pytest.mark.asyncio
+async def test_portfolio_loads_a_restaurant_in_one_metrics_query():
+    stub, ids, agent = setup()
+
+    report = await agent.analyze_portfolio('r1', timeframe_days=10, until=UNTIL)
+
+    assert set(report['campaigns']) == {ids[0], ids[1]}
+    assert report['campaigns'][ids[0]]['engagement_rate'] == pytest.approx(6)
+    assert report['declining_campaigns'] == []
+    assert report['audience_response'] == 'positive'
+    metric_reads = [r for r in stub.requests if r.url.path == "/rest/v1/campaign_metrics"]
+    assert len(metric_reads) == 1
+    assert metric_reads[0].url.params.get_list('recorded_at') == [
+        f"gte.{SINCE.isoformat()}", f"lte.{UNTIL.isoformat()}"
+    ]
+
+    # Campaigns listed for the restaurant are cached for lookups by ID
+    await agent.db.get_campaign(ids[0])
+    assert not [r for r in stub.requests if 'id' in r.url.params]
+
+
+@pytest.mark.asyncio
+async def test_single_campaign_analysis_honours_the_timeframe():
+    stub, ids, agent = setup()
+
+    analysis = await agent.analyze_engagement_metrics(ids[0], timeframe_days=10, until=UNTIL)
+    assert analysis['engagement_rate'] == pytest.approx(6)
+    assert analysis['trend'] == pytest.approx(2)
+    assert analysis['audience_response'] == 'positive'
+
+    # Only the last day of the window: no snapshots
+    analysis = await agent.analyze_engagement_metrics(ids[0], timeframe_days=1, until=UNTIL)
+    assert analysis['engagement_rate'] == 0 and analysis['audience_response'] == 'neutral'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agents.social_media.pipeline import CampaignPipeline, Stage, StageSkipped, run_stages
+from src.database.operations.campaign_repository import CampaignRepository
+from src.database.operations.social_media_ops import SocialMediaOps
+from src.database.postgrest import PostgrestClient
+from tests.postgrest_stub import PostgrestStub
+
+POST_TIME = datetime(2024, 6, 1, 18, tzinfo=timezone.utc)
+
+
+class Tracker:
+    """Counts how many calls of each kind are in flight at once"""
+
+    def __init__(self):
+        self.active = {}
+        self.peak = {}
+
+    async def hold(self, kind, seconds):
+        self.active[kind] = self.active.get(kind, 0) + 1
+        self.peak[kind] = max(self.peak.get(kind, 0), self.active[kind])
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.active[kind] -= 1
+
+
+class FakeContentAgent:
+    def __init__(self, tracker, fail_titles=()):
+        self.tracker = tracker
+        self.fail_titles = set(fail_titles)
+        self.overlap_seen = False
+
+    async def analyze_campaign_requirements(self, campaign):
+        needs_audio = 'reel' in campaign['description']
+        return {'needs_audio': needs_audio, 'style_preferences': []}
+
+    async def generate_image(self, campaign, requirements):
+        if campaign['title'] in self.fail_titles:
+            raise RuntimeError("fal exploded")
+        await self.tracker.hold('image', 0.05)
+        return {'image_url': f"https://cdn/{campaign['title']}.jpg", 'prompt_version': 'v1'}
+
+    async def generate_audio(self, campaign):
+        await asyncio.sleep(0.01)
+        if self.tracker.active.get('image'):
+            self.overlap_seen = True
+        await self.tracker.hold('audio', 0.04)
+        return f"https://cdn/{campaign['title']}.mp3"
+
+
+class FakeSchedulingAgent:
+    def __init__(self):
+        self.calls = 0
+        self.released = []
+
+    async def determine_optimal_posting_time(self, campaign, tz, book=False):
+        self.calls += 1
+        return POST_TIME
+
+    def release_posting_time(self, campaign, when):
+        self.released.append((campaign['id'], when))
+
+
+def setup(campaigns, fail_titles=(), **kwargs):
+    stub = PostgrestStub()
+    rows = stub.seed('campaigns', campaigns)
+    client = PostgrestClient("https://project.supabase.co", "anon-key", transport=stub.transport())
+    tracker = Tracker()
+    content = FakeContentAgent(tracker, fail_titles)
+    scheduling = FakeSchedulingAgent()
+    pipeline = CampaignPipeline(
+        content, scheduling, CampaignRepository(SocialMediaOps(client)), **kwargs
+    )
+    return stub, rows, pipeline, tracker, content, scheduling
+
+
+@pytest.mark.asyncio
+async def test_image_and_audio_run_concurrently_then_persist():
+    stub, rows, pipeline, tracker, content, _ = setup([
+        {'title': 'brunch', 'description': 'a reel of our brunch', 'selected': False},
+    ])
+
+    result = await pipeline.run(rows[0]['id'])
+
+    assert result.ok, result.error
+    assert content.overlap_seen
+    assert set(result.timings) == {'fetch', 'image', 'audio', 'schedule', 'persist'}
+    # Overlapping stages finish in about the time of the slower one
+    assert result.total_seconds < result.timings['image'] + result.timings['audio']
+
+    (row,) = stub.all('campaigns')
+    assert row['selected'] is True
+    assert row['media_url'] == "https://cdn/brunch.jpg"
+    assert row['audio_url'] == "https://cdn/brunch.mp3"
+    assert row['scheduled_time'] == POST_TIME.isoformat()
+
+
+@pytest.mark.asyncio
+async def test_many_campaigns_respect_provider_limits():
+    stub, rows, pipeline, tracker, _, _ = setup(
+        [{'title': f"c{i}", 'description': 'dinner', 'selected': False} for i in range(6)],
+        provider_limits={'fal': 2},
+        max_campaigns=6,
+    )
+
+    results = await pipeline.run_many(row['id'] for row in rows)
+
+    assert all(r.ok for r in results)
+    assert tracker.peak['image'] == 2
+    assert all(row['selected'] for row in stub.all('campaigns'))
+    # Six 50ms images, two at a time
+    assert max(r.total_seconds for r in results) < 6 * 0.05
+
+
+@pytest.mark.asyncio
+async def test_failed_stage_skips_downstream_and_spares_other_campaigns():
+    stub, rows, pipeline, _, _, scheduling = setup(
+        [
+            {'title': 'good', 'description': 'lunch', 'selected': False},
+            {'title': 'bad', 'description': 'lunch', 'selected': False},
+        ],
+        fail_titles={'bad'},
+    )
+
+    good, bad = await pipeline.run_many([rows[0]['id'], rows[1]['id']])
+
+    assert good.ok
+    assert not bad.ok
+    assert bad.failed_stage == 'image' and bad.error == "fal exploded"
+    assert 'schedule' not in bad.outputs and 'persist' not in bad.outputs
+    assert scheduling.calls == 1
+    assert [row['selected'] for row in stub.all('campaigns')] == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_failed_persist_releases_the_slot_and_writes_nothing():
+    stub, rows, pipeline, _, _, scheduling = setup([
+        {'title': 'brunch', 'description': 'lunch', 'selected': False},
+    ])
+    stub.fail_next(400, method='PATCH')
+
+    result = await pipeline.run(rows[0]['id'])
+
+    assert result.failed_stage == 'persist'
+    assert scheduling.released == [(rows[0]['id'], POST_TIME)]
+    # Only the existing row, untouched; nothing was inserted
+    assert stub.all('campaigns') == rows
+    assert not any(r.method == 'POST' for r in stub.requests)
+
+
+@pytest.mark.asyncio
+async def test_missing_campaign_is_reported():
+    _, _, pipeline, _, _, _ = setup([])
+    result = await pipeline.run("nope")
+    assert result.failed_stage == 'fetch'
+    assert "not found" in result.error
+
+
+@pytest.mark.asyncio
+async def test_run_stages_validates_the_graph():
+    async def noop(outputs):
+        return None
+
+    with pytest.raises(ValueError, match="unknown"):
+        await run_stages([Stage('a', noop, after=('missing',))])
+    with pytest.raises(ValueError, match="cycle"):
+        await run_stages([Stage('a', noop, after=('b',)), Stage('b', noop, after=('a',))])
+
+    async def boom(outputs):
+        raise KeyError("x")
+
+    run = await run_stages([Stage('a', boom), Stage('b', noop, after=('a',))])
+    assert isinstance(run.errors['a'], KeyError)
+    assert isinstance(run.errors['b'], StageSkipped)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.operations.campaign_queue import CampaignQueue, LeaseLost
+from src.database.postgrest import PostgrestClient
+from src.services.campaign_worker import CampaignWorker
+from tests.postgrest_stub import PostgrestStub, install_campaign_queue
+
+
+class Clock:
+    def __init__(self):
+        self.now = datetime(2024, 6, 1, 12, tzinfo=timezone.utc)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+def setup(count=5):
+    stub = install_campaign_queue(PostgrestStub())
+    clock = stub.clock = Clock()
+    stub.seed('campaigns', [
+        {'title': f"c{i}", 'selected': False, 'attempts': 0,
+         'created_at': f"2024-01-{i + 1:02d}T00:00:00+00:00"}
+        for i in range(count)
+    ])
+    client = PostgrestClient("https://project.supabase.co", "anon-key", transport=stub.transport())
+    return stub, clock, client
+
+
+@pytest.mark.asyncio
+async def test_concurrent_claims_never_overlap():
+    stub, _, client = setup(count=7)
+    queues = [CampaignQueue(client, worker_id=f"w{i}", lease_seconds=60) for i in range(3)]
+
+    batches = await asyncio.gather(*(q.claim(3) for q in queues))
+    ids = [row['id'] for batch in batches for row in batch]
+    assert len(ids) == len(set(ids)) == 7
+    # Oldest first
+    assert [row['title'] for row in batches[0]] == ['c0', 'c1', 'c2']
+    assert await queues[0].claim(3) == []
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_requeued_and_late_completion_rejected():
+    stub, clock, client = setup(count=1)
+    first = CampaignQueue(client, worker_id="first", lease_seconds=60)
+    second = CampaignQueue(client, worker_id="second", lease_seconds=60)
+
+    (campaign,) = await first.claim()
+    assert await second.claim() == []
+
+    clock.advance(61)
+    assert await first.heartbeat([campaign['id']]) == set()
+    (stolen,) = await second.claim()
+    assert stolen['id'] == campaign['id'] and stolen['attempts'] == 2
+
+    with pytest.raises(LeaseLost):
+        await first.complete(campaign['id'], "https://cdn/late.jpg")
+    done = await second.complete(campaign['id'], "https://cdn/ok.jpg")
+    assert done['selected'] is True and done['claimed_by'] is None
+    assert done['media_url'] == "https://cdn/ok.jpg"
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_keeps_lease_alive():
+    stub, clock, client = setup(count=1)
+    worker = CampaignQueue(client, worker_id="w", lease_seconds=60)
+    other = CampaignQueue(client, worker_id="other", lease_seconds=60)
+
+    (campaign,) = await worker.claim()
+    for _ in range(3):
+        clock.advance(45)
+        assert await worker.heartbeat([campaign['id']]) == {campaign['id']}
+    assert await other.claim() == []
+
+
+@pytest.mark.asyncio
+async def test_release_requeues_until_attempts_run_out():
+    stub, _, client = setup(count=1)
+    queue = CampaignQueue(client, worker_id="w", max_attempts=2)
+
+    (campaign,) = await queue.claim()
+    assert await queue.release(campaign['id'], "fal timed out")
+    assert stub.all('campaigns')[0]['last_error'] == "fal timed out"
+
+    (again,) = await queue.claim()
+    assert again['attempts'] == 2
+    await queue.release(again['id'])
+    assert await queue.claim() == []
+
+
+@pytest.mark.asyncio
+async def test_workers_drain_backlog_in_parallel_without_duplicates():
+    stub, _, client = setup(count=10)
+    processed = []
+    in_flight = peak = 0
+
+    async def process(campaign):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        processed.append(campaign['id'])
+        return f"https://cdn/{campaign['title']}.jpg"
+
+    workers = [
+        CampaignWorker(CampaignQueue(client, worker_id=f"w{i}"), process, concurrency=2, poll_interval=0.01)
+        for i in range(3)
+    ]
+    while any(await asyncio.gather(*(w.run_once() for w in workers))):
+        pass
+
+    assert len(processed) == len(set(processed)) == 10
+    assert peak > 2
+    rows = stub.all('campaigns')
+    assert all(row['selected'] and row['media_url'].endswith(f"{row['title']}.jpg") for row in rows)
+    assert sum(w.stats()['completed'] for w in workers) == 10
+
+
+@pytest.mark.asyncio
+async def test_failed_campaign_is_released_for_retry():
+    stub, _, client = setup(count=1)
+    calls = 0
+
+    async def process(campaign):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("fal exploded")
+        return "https://cdn/ok.jpg"
+
+    worker = CampaignWorker(CampaignQueue(client, worker_id="w"), process)
+    assert await worker.run_once() == 1
+    assert stub.all('campaigns')[0]['last_error'] == "fal exploded"
+    assert await worker.run_once() == 1
+    assert stub.all('campaigns')[0]['selected'] is True
+    assert worker.stats() == {'completed': 1, 'failed': 1, 'lost': 0, 'active': 0}
+
+
+@pytest.mark.asyncio
+async def test_lost_lease_cancels_in_flight_work():
+    stub, _, client = setup(count=1)
+    started = asyncio.Event()
+    finished = False
+
+    async def process(campaign):
+        nonlocal finished
+        started.set()
+        await asyncio.sleep(1)
+        finished = True
+        return "https://cdn/never.jpg"
+
+    worker = CampaignWorker(CampaignQueue(client, worker_id="w"), process, heartbeat_interval=0.01)
+    run = asyncio.create_task(worker.run_once())
+    await started.wait()
+
+    # Someone else took the campaign over
+    row = stub.all('campaigns')[0]
+    row['claimed_by'] = "other"
+    stub.save('campaigns', row)
+
+    await asyncio.wait_for(run, timeout=0.5)
+    assert not finished
+    assert worker.stats()['lost'] == 1
+    assert stub.all('campaigns')[0]['claimed_by'] == "other"
+
+
+@pytest.mark.asyncio
+async def test_run_stops_when_asked():
+    stub, _, client = setup(count=3)
+
+    async def process(campaign):
+        return "https://cdn/x.jpg"
+
+    worker = CampaignWorker(CampaignQueue(client, worker_id="w"), process, poll_interval=0.01)
+    stop = asyncio.Event()
+    run = asyncio.create_task(worker.run(stop))
+    while worker.stats()['completed'] < 3:
+        await asyncio.sleep(0.01)
+    stop.set()
+    await asyncio.wait_for(run, timeout=0.5)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
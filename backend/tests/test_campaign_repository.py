@@ -0,0 +1,168 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agents.social_media.analytics_agent import AnalyticsAgent
+from src.database.operations.campaign_repository import CampaignRepository
+from src.database.operations.social_media_ops import SocialMediaOps
+from src.database.postgrest import PostgrestClient, PostgrestError
+from src.services.engagement_aggregates import EngagementAggregates
+from tests.postgrest_stub import PostgrestStub, install_campaign_media
+
+
+def setup(count=3, transport=None, **kwargs):
+    stub = install_campaign_media(PostgrestStub())
+    rows = stub.seed('campaigns', [{'title': f"c{i}"} for i in range(count)])
+    client = PostgrestClient(
+        "https://project.supabase.co", "anon-key",
+        transport=transport or stub.transport(), max_retries=0,
+    )
+    return stub, rows, CampaignRepository(SocialMediaOps(client), **kwargs)
+
+
+def campaign_reads(stub):
+    return [r for r in stub.requests if r.method == "GET" and r.url.path == "/rest/v1/campaigns"]
+
+
+@pytest.mark.asyncio
+async def test_repeat_lookups_hit_the_cache():
+    stub, rows, repo = setup()
+
+    for _ in range(3):
+        assert (await repo.get_campaign(rows[0]['id']))['title'] == 'c0'
+    assert len(campaign_reads(stub)) == 1
+    assert repo.stats()['hits'] == 2
+
+    # Callers get copies; mutating one doesn't touch the cache
+    (await repo.get_campaign(rows[0]['id']))['title'] = 'changed'
+    assert (await repo.get_campaign(rows[0]['id']))['title'] == 'c0'
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_batched_into_one_query():
+    stub, rows, repo = setup(count=5)
+    ids = [row['id'] for row in rows]
+
+    found = await asyncio.gather(*(repo.get_campaign(i) for i in ids + ids[:2] + ['missing']))
+    assert [f['title'] for f in found[:5]] == ['c0', 'c1', 'c2', 'c3', 'c4']
+    assert found[-1] is None
+
+    (request,) = campaign_reads(stub)
+    assert request.url.params['id'].startswith("in.(")
+    assert repo.stats()['batches'] == 1
+    assert repo.stats()['coalesced'] == 2
+
+    assert set(await repo.get_campaigns(ids)) == set(ids)
+    assert len(campaign_reads(stub)) == 1
+
+
+@pytest.mark.asyncio
+async def test_batches_are_capped():
+    stub, rows, repo = setup(count=5, max_batch=2)
+    await repo.get_campaigns(row['id'] for row in rows)
+    assert len(campaign_reads(stub)) == 3
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_after_ttl():
+    stub, rows, repo = setup(ttl_seconds=0.05)
+
+    await repo.get_campaign(rows[0]['id'])
+    await asyncio.sleep(0.06)
+    await repo.get_campaign(rows[0]['id'])
+    assert len(campaign_reads(stub)) == 2
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_cached_rows():
+    stub, rows, repo = setup()
+    campaign_id = rows[0]['id']
+    await repo.get_campaign(campaign_id)
+
+    when = datetime(2024, 5, 1, 18, tzinfo=timezone.utc)
+    await repo.update_campaign_schedule(campaign_id, when)
+    assert (await repo.get_campaign(campaign_id))['scheduled_time'] == when.isoformat()
+
+    await repo.update_campaign_media(campaign_id, "https://cdn/a.jpg")
+    assert (await repo.get_campaign(campaign_id))['media_url'] == "https://cdn/a.jpg"
+
+    await repo.upsert_campaigns([{'id': campaign_id, 'title': 'renamed'}])
+    assert (await repo.get_campaign(campaign_id))['title'] == 'renamed'
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_fetch_discards_the_stale_row():
+    gate = asyncio.Event()
+
+    async def held(request):
+        await gate.wait()
+        return stub.handle(request)
+
+    stub, rows, repo = setup(transport=httpx.MockTransport(held))
+    campaign_id = rows[0]['id']
+
+    read = asyncio.create_task(repo.get_campaign(campaign_id))
+    await asyncio.sleep(0)
+    repo.invalidate(campaign_id)
+    gate.set()
+    assert (await read)['title'] == 'c0'
+    assert repo.stats()['size'] == 0
+
+
+@pytest.mark.asyncio
+async def test_scope_pins_reads_for_a_pipeline_run():
+    stub, rows, repo = setup(ttl_seconds=0)
+    campaign_id = rows[0]['id']
+
+    with repo.scope():
+        await repo.get_campaign(campaign_id)
+        row = stub.all('campaigns')[0]
+        row['title'] = 'edited elsewhere'
+        stub.save('campaigns', row)
+        assert (await repo.get_campaign(campaign_id))['title'] == 'c0'
+        assert len(campaign_reads(stub)) == 1
+
+    # No process-level caching with ttl 0, so a new run sees the edit
+    with repo.scope():
+        assert (await repo.get_campaign(campaign_id))['title'] == 'edited elsewhere'
+    assert len(campaign_reads(stub)) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_fetch_reaches_every_waiter_and_is_not_cached():
+    stub, rows, repo = setup()
+    stub.fail_next(500)
+
+    results = await asyncio.gather(
+        repo.get_campaign(rows[0]['id']), repo.get_campaign(rows[1]['id']),
+        return_exceptions=True,
+    )
+    assert all(isinstance(r, PostgrestError) for r in results)
+    assert (await repo.get_campaign(rows[0]['id']))['title'] == 'c0'
+
+
+@pytest.mark.asyncio
+async def test_agents_share_one_fetch_per_campaign():
+    stub, rows, repo = setup()
+    stub.seed('campaign_metrics', [
+        {'campaign_id': rows[0]['id'], 'likes': 10, 'comments': 0, 'shares': 0, 'impressions': 100,
+         'recorded_at': datetime.now(timezone.utc).isoformat()},
+    ])
+    agents = [AnalyticsAgent(repo, EngagementAggregates()), AnalyticsAgent(repo, EngagementAggregates())]
+
+    with repo.scope():
+        for agent in agents:
+            analysis = await agent.analyze_engagement_metrics(rows[0]['id'])
+            assert analysis['engagement_rate'] == 10
+    assert len(campaign_reads(stub)) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,123 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agents.social_media.analytics_agent import AnalyticsAgent
+from src.database.operations.campaign_repository import CampaignRepository
+from src.database.operations.social_media_ops import SocialMediaOps
+from src.database.postgrest import PostgrestClient
+from src.services.engagement_aggregates import EngagementAggregates, backfill
+from tests.postgrest_stub import PostgrestStub
+
+START = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def snapshot(campaign_id, hour, likes, impressions, hashtags=None, **extra):
+    return {
+        'campaign_id': campaign_id,
+        'likes': likes,
+        'comments': 0,
+        'shares': 0,
+        'impressions': impressions,
+        'hashtag_performance': hashtags,
+        'recorded_at': (START + timedelta(hours=hour)).isoformat(),
+        **extra,
+    }
+
+
+SNAPSHOTS = [
+    snapshot('a', 11, 10, 100, {'#brunch': 5}),
+    snapshot('b', 11, 1, 100, {'#brunch': 1, '#pasta': 2}),
+    # Cumulative: 'a' gained 30 likes and 100 impressions by 18:00
+    snapshot('a', 18, 40, 200, {'#brunch': 8, '#eggs': 3}),
+    snapshot('b', 18, 2, 400),
+]
+PLATFORMS = {'a': 'Instagram', 'b': 'TikTok'}
+
+
+@pytest.mark.asyncio
+async def test_snapshots_update_running_totals():
+    aggregates = EngagementAggregates()
+    assert await aggregates.ingest(SNAPSHOTS, PLATFORMS) == 4
+
+    a = await aggregates.campaign('a')
+    assert (a['likes'], a['impressions'], a['snapshots']) == (40, 200, 2)
+    assert a['engagement_rate'] == pytest.approx(20)
+    assert a['platform'] == 'Instagram'
+    assert a['top_hashtags'] == [('#brunch', 8), ('#eggs', 3)]
+
+    assert (await aggregates.totals('platform', 'TikTok'))['impressions'] == 400
+    everything = await aggregates.totals('all')
+    assert (everything['likes'], everything['impressions']) == (42, 600)
+
+    # Growth lands in the hour it happened: 11 likes/200 shown by 11:00, 31/400 after
+    eleven, eighteen = await aggregates.totals('hour', '11'), await aggregates.totals('hour', '18')
+    assert (eleven['likes'], eleven['impressions']) == (11, 200)
+    assert (eighteen['likes'], eighteen['impressions']) == (31, 400)
+    assert [hour for hour, _ in await aggregates.best_hours(2)] == [18, 11]
+
+    # Hashtag scores follow each campaign's latest snapshot; 'b' kept its tags
+    assert await aggregates.top_hashtags(2) == [('#brunch', 9), ('#eggs', 3)]
+    assert (await aggregates.totals('hashtag', '#pasta'))['score'] == 2
+
+    # Replays and late arrivals are ignored
+    assert await aggregates.ingest([SNAPSHOTS[0], SNAPSHOTS[2]]) == 0
+    assert (await aggregates.campaign('a'))['likes'] == 40
+    assert await aggregates.campaign('missing') is None
+
+    # Undated snapshots can't be ordered, so they are skipped rather than stamped now
+    assert await aggregates.ingest([snapshot('a', 0, 99, 999, recorded_at=None)]) == 0
+    assert (await aggregates.campaign('a'))['likes'] == 40
+
+
+@pytest.mark.asyncio
+async def test_backfill_rebuilds_from_raw_metrics():
+    stub = PostgrestStub()
+    campaigns = stub.seed('campaigns', [{'title': k, 'platforms': [p]} for k, p in PLATFORMS.items()])
+    ids = {c['title']: c['id'] for c in campaigns}
+    stub.seed('campaign_metrics', [{**row, 'campaign_id': ids[row['campaign_id']]} for row in SNAPSHOTS])
+    client = PostgrestClient("https://project.supabase.co", "anon-key", transport=stub.transport())
+
+    aggregates = EngagementAggregates()
+    await aggregates.ingest([snapshot(ids['a'], 1, 999, 1)])
+    assert await backfill(aggregates, SocialMediaOps(client), page_size=3) == 4
+
+    # Stale totals are gone and pages were fetched in order
+    a = await aggregates.campaign(ids['a'])
+    assert (a['likes'], a['platform']) == (40, 'Instagram')
+    everything = await aggregates.totals('all')
+    assert (everything['likes'], everything['impressions']) == (42, 600)
+    pages = [r for r in stub.requests if r.url.path == "/rest/v1/campaign_metrics"]
+    assert [r.url.params.get('offset') for r in pages] == [None, '3']
+
+
+@pytest.mark.asyncio
+async def test_recommendations_read_aggregates_not_history():
+    stub = PostgrestStub()
+    (campaign,) = stub.seed('campaigns', [{'title': 'brunch', 'platforms': ['Instagram', 'Facebook']}])
+    client = PostgrestClient("https://project.supabase.co", "anon-key", transport=stub.transport())
+    agent = AnalyticsAgent(CampaignRepository(SocialMediaOps(client)), EngagementAggregates())
+
+    await agent.record_metrics([
+        snapshot(campaign['id'], 11, 1, 100, {'#brunch': 4}),
+        snapshot(campaign['id'], 19, 2, 300, {'#brunch': 6, '#eggs': 1}),
+    ])
+    assert len(stub.all('campaign_metrics')) == 2
+    assert (await agent.aggregates.campaign(campaign['id']))['platform'] == 'Instagram'
+
+    stub.requests.clear()
+    recommendations = await agent.generate_recommendations(campaign['id'])
+
+    assert "Try posting at different times" in recommendations
+    assert "Engagement grows fastest around 11:00 UTC" in recommendations
+    assert "Continue using successful hashtags: #brunch, #eggs" in recommendations
+    assert stub.requests == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import sys
+
+import fal_client
+import httpx
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.fal_gateway import (
+    FalGateway,
+    FalGatewayError,
+    FalTimeoutError,
+    is_retryable,
+    is_retryable_submit,
+)
+
+
+class FakeHandle:
+    def __init__(self, request_id, statuses, result, status_errors=0):
+        self.request_id = request_id
+        self.statuses = list(statuses)
+        self.result = result
+        self.status_errors = status_errors
+        self.status_calls = 0
+        self.cancelled = False
+
+    async def status(self, with_logs=False):
+        self.status_calls += 1
+        if self.status_errors:
+            self.status_errors -= 1
+            raise httpx.ConnectError("connection reset")
+        await asyncio.sleep(0)
+        return self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+
+    async def get(self):
+        return self.result
+
+    async def cancel(self):
+        self.cancelled = True
+
+
+class FakeClient:
+    """Stands in for fal_client.AsyncClient"""
+
+    def __init__(self, handle_factory, submit_errors=None):
+        self.handle_factory = handle_factory
+        self.submit_errors = list(submit_errors or [])
+        self.submits = 0
+        self.active = 0
+        self.peak = 0
+
+    async def submit(self, application, arguments):
+        if self.submit_errors:
+            raise self.submit_errors.pop(0)
+        self.submits += 1
+        return self.handle_factory(self)
+
+
+def _status_error(code):
+    request = httpx.Request("POST", "https://queue.fal.run/app")
+    response = httpx.Response(code, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+def _gateway(client, **kwargs):
+    kwargs.setdefault('backoff_base', 0.001)
+    kwargs.setdefault('poll_interval', 0.001)
+    return FalGateway(client=client, **kwargs)
+
+
+def _completed():
+    return fal_client.Completed(logs=None, metrics={})
+
+
+def test_retryable_errors():
+    assert is_retryable(httpx.ConnectError("reset"))
+    assert is_retryable(asyncio.TimeoutError())
+    assert is_retryable(_status_error(503))
+    assert is_retryable(_status_error(429))
+    assert not is_retryable(_status_error(422))
+    assert not is_retryable(ValueError("bad arguments"))
+
+    # A submit may only be repeated if Fal can't have queued it
+    assert is_retryable_submit(httpx.ConnectError("refused"))
+    assert is_retryable_submit(_status_error(429))
+    assert not is_retryable_submit(httpx.ReadTimeout("no response"))
+    assert not is_retryable_submit(_status_error(502))
+
+
+@pytest.mark.asyncio
+async def test_subscribe_reports_queue_updates_and_retries_polls():
+    handles = []
+
+    def make_handle(client):
+        handle = FakeHandle(
+            "req-1",
+            [fal_client.Queued(position=2), fal_client.InProgress(logs=None), _completed()],
+            {'images': [{'url': 'https://fal.media/1.jpg'}]},
+            status_errors=1,
+        )
+        handles.append(handle)
+        return handle
+
+    client = FakeClient(make_handle, submit_errors=[httpx.ConnectError("refused")])
+    gateway = _gateway(client)
+    updates = []
+
+    async def on_update(status):
+        updates.append(type(status).__name__)
+
+    result = await gateway.subscribe("app", {}, on_queue_update=on_update)
+
+    assert result == {'images': [{'url': 'https://fal.media/1.jpg'}]}
+    assert updates == ['Queued', 'InProgress', 'Completed']
+    # The failed submit and the failed poll were retried, with only one real submission
+    assert client.submits == 1
+    assert gateway.stats()['retries'] == 2
+    assert gateway.stats()['completed'] == 1
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_errors_fail_fast():
+    client = FakeClient(None, submit_errors=[_status_error(422)])
+    gateway = _gateway(client)
+    with pytest.raises(FalGatewayError):
+        await gateway.subscribe("app", {})
+    assert gateway.stats()['retries'] == 0
+    assert gateway.stats()['failures'] == 1
+
+
+@pytest.mark.asyncio
+async def test_submits_that_may_have_started_a_run_are_not_repeated():
+    for error in (_status_error(503), httpx.ReadTimeout("no response")):
+        client = FakeClient(lambda client: FakeHandle("req", [_completed()], {}), submit_errors=[error])
+        gateway = _gateway(client)
+        with pytest.raises(FalGatewayError):
+            await gateway.subscribe("app", {})
+        assert client.submits == 0 and gateway.stats()['retries'] == 0
+
+
+@pytest.mark.asyncio
+async def test_timeout_cancels_the_fal_request():
+    handles = []
+
+    def make_handle(client):
+        handles.append(FakeHandle("req-slow", [fal_client.InProgress(logs=None)], None))
+        return handles[-1]
+
+    gateway = _gateway(FakeClient(make_handle), timeout=0.05)
+    with pytest.raises(FalTimeoutError):
+        await gateway.subscribe("app", {})
+    assert handles[0].cancelled
+    assert gateway.stats()['timeouts'] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_limited():
+    def make_handle(client):
+        class Tracked(FakeHandle):
+            async def status(self, with_logs=False):
+                client.active += 1
+                client.peak = max(client.peak, client.active)
+                await asyncio.sleep(0.01)
+                client.active -= 1
+                return _completed()
+        return Tracked("req", [], {'images': []})
+
+    client = FakeClient(make_handle)
+    gateway = _gateway(client, max_concurrency=2)
+    await asyncio.gather(*[gateway.subscribe("app", {}) for _ in range(6)])
+    assert client.submits == 6
+    assert client.peak == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
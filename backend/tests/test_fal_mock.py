@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+import pytest
+from httpx import AsyncClient
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.load_test import run_load_test
+from src.services.fal_gateway import FalGateway, FalGatewayError, FalTimeoutError
+from src.services.fal_mock import DEFAULT_IMAGE, Latency, MockFalClient, MockFalConfig, create_mock_fal_app
+from src.services.reference_store import LocalReferenceStore
+from src.services.result_cache import ResultCache
+
+FAST = dict(queue_latency=Latency('fixed', 0.0), run_latency=Latency('fixed', 0.05))
+
+
+def _gateway(config: MockFalConfig, **options):
+    app = create_mock_fal_app(config)
+    client = MockFalClient("http://fal.mock", transport=httpx.ASGITransport(app=app))
+    options = {'poll_interval': 0.01, 'backoff_base': 0.001, **options}
+    return FalGateway(client=client, **options), app.state.mock
+
+
+def test_latency_specs():
+    assert Latency.parse("uniform:0.5,2") == Latency('uniform', 0.5, 2.0)
+    assert Latency.parse("fixed:1").sample(None) == 1.0
+    assert str(Latency.parse("lognormal:1.5,0.4")) == "lognormal:1.5,0.4"
+    with pytest.raises(ValueError):
+        Latency.parse("gamma:1")
+    with pytest.raises(ValueError):
+        Latency.parse("uniform")
+
+
+@pytest.mark.asyncio
+async def test_requests_queue_behind_busy_workers(tmp_path):
+    gateway, mock = _gateway(MockFalConfig(workers=1, **FAST))
+    statuses = []
+
+    photo = tmp_path / "dish.jpg"
+    photo.write_bytes(DEFAULT_IMAGE)
+    url = await gateway.upload_file(str(photo))
+
+    results = await asyncio.gather(*[
+        gateway.subscribe(
+            "110602490-sdxl-turbo-food-enhancement",
+            {'prompt': "enhance", 'reference_image': url, 'num_images': 2, 'image_size': 'landscape_4_3'},
+            with_logs=True,
+            on_queue_update=statuses.append,
+        )
+        for _ in range(3)
+    ])
+
+    assert [len(r['images']) for r in results] == [2, 2, 2]
+    assert results[0]['images'][0]['width'] == 1024 and results[0]['images'][0]['height'] == 768
+    names = {type(s).__name__ for s in statuses}
+    assert names == {'Queued', 'InProgress', 'Completed'}
+    assert max(s.position for s in statuses if type(s).__name__ == 'Queued') >= 1
+    assert mock.stats()['peak_running'] == 1 and mock.stats()['completed'] == 3
+
+    # Both the upload and the canned outputs are served back
+    async with AsyncClient(app=create_mock_fal_app(), base_url="http://fal.mock") as client:
+        assert (await client.get("/files/default.jpg")).content == DEFAULT_IMAGE
+    assert mock.file(url.rsplit("/", 1)[1])[0] == DEFAULT_IMAGE
+    await gateway.aclose()
+
+
+@pytest.mark.asyncio
+async def test_injected_failures_reach_the_gateway():
+    gateway, mock = _gateway(MockFalConfig(submit_failure_rate=1.0, failure_status=429, **FAST), max_retries=2)
+    with pytest.raises(FalGatewayError):
+        await gateway.subscribe("fal-ai/app", {'prompt': "x"})
+    # 429 is retryable, so the gateway tried three times
+    assert mock.stats()['rejected'] == 3 and gateway.stats()['retries'] == 2
+
+    gateway, mock = _gateway(MockFalConfig(result_failure_rate=1.0, **FAST))
+    with pytest.raises(FalGatewayError, match="Injected inference failure"):
+        await gateway.subscribe("fal-ai/app", {'prompt': "x"})
+    assert mock.stats()['failed'] == 1 and gateway.stats()['retries'] == 0
+
+
+@pytest.mark.asyncio
+async def test_timed_out_requests_are_cancelled_on_the_server():
+    config = MockFalConfig(queue_latency=Latency('fixed', 0), run_latency=Latency('fixed', 5))
+    gateway, mock = _gateway(config, timeout=0.1)
+    with pytest.raises(FalTimeoutError):
+        await gateway.subscribe("fal-ai/app", {'prompt': "x"})
+    await asyncio.sleep(0.05)
+    assert mock.stats()['cancelled'] == 1 and mock.stats()['running'] == 0
+
+
+@pytest.mark.asyncio
+async def test_load_test_drives_the_api_against_mock_fal(monkeypatch, tmp_path):
+    from src.api import main
+
+    gateway, mock = _gateway(MockFalConfig(workers=4, **FAST))
+    monkeypatch.setattr(main, "fal_gateway", gateway)
+    monkeypatch.setattr(main, "reference_store", LocalReferenceStore(str(tmp_path), "http://api/refs"))
+    monkeypatch.setattr(main, "result_cache", ResultCache())
+    # Every request comes from this one client
+    monkeypatch.setattr(main.rate_limiter, "burst", 1000)
+
+    async with AsyncClient(app=main.app, base_url="http://test") as client:
+        results = await run_load_test(client, [1, 4], 6, DEFAULT_IMAGE, ["Instagram", "LinkedIn"])
+
+        # A requested seed is passed through to Fal and reported back
+        campaign = {'name': "Bistro", 'description': "Chosen dish", 'target_audience': "food lovers",
+                    'cadence': "daily", 'platforms': ["Instagram"], 'profile': "final", 'seed': 42}
+        final = await client.post(
+            "/api/generate-campaign",
+            data={'campaign': json.dumps(campaign)},
+            files={'reference_image': ("dish.jpg", DEFAULT_IMAGE, "image/jpeg")},
+        )
+
+    assert [(r['concurrency'], r['ok'], r['errors']) for r in results] == [(1, 6, {}), (4, 6, {})]
+    assert all(r['p99_seconds'] >= r['p50_seconds'] > 0 and r['throughput_rps'] > 0 for r in results)
+    # Distinct descriptions: every platform of every request reached Fal
+    assert mock.stats()['completed'] == 25
+    assert final.json()['seed'] == 42 and len(final.json()['generated_images']) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,156 @@
+import json
+import os
+import sys
+
+import httpx
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.profile_benchmark import LatencyModel, StubFalClient
+from restaurant_image_enhancer.batch import BatchEnhancer, discover_photos, load_checkpoint
+from src.services.fal_gateway import FalGateway
+from src.services.image_preprocessor import PILLOW_AVAILABLE
+
+ENHANCED = b"\xff\xd8\xff\xe0enhanced"
+
+
+class CountingClient(StubFalClient):
+    """Stub Fal that records peak concurrency and can fail chosen photos"""
+
+    def __init__(self, fail=()):
+        super().__init__(LatencyModel(queue_seconds=0.01, startup_seconds=0.02,
+                                      seconds_per_megapixel_step=0, jitter=0))
+        self.fail = set(fail)
+        self.uploads = []
+        self.active = 0
+        self.peak = 0
+
+    async def upload_file(self, path):
+        self.uploads.append(os.path.getsize(path))
+        return await super().upload_file(path)
+
+    async def submit(self, application, arguments):
+        if any(name in arguments['prompt'] for name in self.fail):
+            raise ValueError("bad photo")
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        handle = await super().submit(application, arguments)
+        get = handle.get
+
+        async def finished():
+            try:
+                return await get()
+            finally:
+                self.active -= 1
+        handle.get = finished
+        return handle
+
+
+def _photos(directory, count=5):
+    os.makedirs(directory)
+    for i in range(count):
+        path = os.path.join(directory, f"dish-{i}.jpg")
+        if PILLOW_AVAILABLE:
+            from PIL import Image
+            Image.new('RGB', (3000, 2000), (i * 40, 90, 30)).save(path)
+        else:
+            with open(path, 'wb') as f:
+                f.write(b"\xff\xd8\xff\xe0" + os.urandom(50_000))
+    with open(os.path.join(directory, "notes.txt"), 'w') as f:
+        f.write("not a photo")
+
+
+def _enhancer(tmp_path, client, concurrency=2):
+    downloads = httpx.AsyncClient(transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, content=ENHANCED, headers={'content-type': 'image/jpeg'})
+    ))
+    gateway = FalGateway(client=client, poll_interval=0.005, max_concurrency=8)
+    return BatchEnhancer(
+        gateway,
+        str(tmp_path / "out"),
+        str(tmp_path / "checkpoint.jsonl"),
+        concurrency=concurrency,
+        profile='final',
+        http_client=downloads,
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_enhances_a_directory_with_bounded_concurrency(tmp_path):
+    _photos(str(tmp_path / "photos"))
+    photos = discover_photos(str(tmp_path / "photos"))
+    assert [p.key for p in photos] == [f"dish-{i}.jpg" for i in range(5)]
+
+    client = CountingClient()
+    report = await _enhancer(tmp_path, client).run(photos)
+
+    assert (report.enhanced, report.failed, report.images) == (5, 0, 5)
+    assert client.peak == 2
+    for i in range(5):
+        with open(tmp_path / "out" / f"dish-{i}.jpg.jpg", 'rb') as f:
+            assert f.read() == ENHANCED
+    if PILLOW_AVAILABLE:
+        # Pre-sized before upload, not sent at phone resolution
+        assert all(size < os.path.getsize(photos[0].path) for size in client.uploads)
+    summary = report.to_dict()
+    assert summary['photos_per_second'] > 0 and summary['p95_seconds'] >= summary['p50_seconds']
+
+
+def test_photos_differing_only_in_extension_keep_separate_outputs(tmp_path):
+    (tmp_path / "dish.jpg").write_bytes(b"jpeg")
+    (tmp_path / "dish.png").write_bytes(b"png")
+    assert [p.name for p in discover_photos(str(tmp_path))] == ["dish.jpg", "dish.png"]
+
+
+def test_manifest_ids_stay_inside_the_output_directory(tmp_path):
+    def manifest(*rows):
+        path = tmp_path / "menu.jsonl"
+        path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+        return str(path)
+
+    for bad in ("../escape", "/etc/dish", "a/../../b", "..\\dish", "."):
+        with pytest.raises(ValueError, match="relative name"):
+            discover_photos(manifest({'path': "dish.jpg", 'id': bad}))
+
+    photos = discover_photos(manifest(
+        {'path': "dish.jpg", 'id': "mains/./dish"},
+        # Listed twice: enhanced once
+        {'path': "./dish.jpg", 'id': "mains/dish"},
+        {'path': "soup.jpg"},
+    ))
+    assert [(p.key, p.name) for p in photos] == [("mains/dish", "mains/dish"), ("soup.jpg", "soup.jpg")]
+
+    # The same id for two different photos would overwrite one output
+    with pytest.raises(ValueError, match="used for both"):
+        discover_photos(manifest({'path': "dish.jpg", 'id': "dish"}, {'path': "soup.jpg", 'id': "dish"}))
+
+
+@pytest.mark.asyncio
+async def test_batch_resumes_from_its_checkpoint(tmp_path):
+    _photos(str(tmp_path / "photos"), count=3)
+    manifest = tmp_path / "menu.jsonl"
+    manifest.write_text("".join(
+        json.dumps({'path': f"photos/dish-{i}.jpg", 'id': f"dish{i}", 'description': f"Course {i}"}) + "\n"
+        for i in range(3)
+    ))
+    photos = discover_photos(str(manifest))
+
+    report = await _enhancer(tmp_path, CountingClient(fail={"Course 1"})).run(photos)
+    assert (report.enhanced, report.failed) == (2, 1)
+    assert load_checkpoint(str(tmp_path / "checkpoint.jsonl")) == {"dish0", "dish2"}
+
+    # A torn last line from an interrupted run is ignored
+    with open(tmp_path / "checkpoint.jsonl", 'a') as f:
+        f.write('{"key": "dish1", "sta')
+
+    client = CountingClient()
+    report = await _enhancer(tmp_path, client).run(photos)
+    assert (report.skipped, report.enhanced, report.failed) == (2, 1, 0)
+    assert len(client.uploads) == 1
+    assert os.path.exists(tmp_path / "out" / "dish1.jpg")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
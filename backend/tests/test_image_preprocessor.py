@@ -0,0 +1,108 @@
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.image_preprocessor import (
+    ImagePreprocessor,
+    sniff_image_format,
+    target_size,
+)
+from src.services.reference_store import SpooledUpload
+
+
+def _spooled(tmp_path, data: bytes, content_type: str = "image/jpeg") -> SpooledUpload:
+    path = tmp_path / "upload.bin"
+    path.write_bytes(data)
+    return SpooledUpload(str(path), len(data), "digest", content_type, "dish.jpg")
+
+
+def _encode(img: Image.Image, fmt: str, **kwargs) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def test_sniff_image_format():
+    assert sniff_image_format(b"\xff\xd8\xff\xe1....") == "image/jpeg"
+    assert sniff_image_format(b"\x89PNG\r\n\x1a\n....") == "image/png"
+    assert sniff_image_format(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_image_format(b"\x00\x00\x00\x18ftypheic\x00\x00") == "image/heic"
+    assert sniff_image_format(b"%PDF-1.7") is None
+
+
+def test_target_size_covers_all_platforms():
+    assert target_size(["square_hd"]) == (1024, 1024)
+    assert target_size(["square_hd", "landscape_hd"]) == (1024, 1024)
+    assert target_size(["landscape_16_9", "portrait_4_3"]) == (1024, 1024)
+
+
+@pytest.mark.asyncio
+async def test_downscales_and_applies_exif_orientation(tmp_path):
+    # 4000x3000 landscape sensor image the phone says to rotate 90°
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    data = _encode(Image.new("RGB", (4000, 3000), "orange"), "JPEG", exif=exif)
+
+    result = await ImagePreprocessor().process(_spooled(tmp_path, data), ["square_hd"])
+    try:
+        assert result.reencoded
+        assert result.detected_type == "image/jpeg"
+        # Rotated to portrait, shrunk until the short side covers 1024
+        assert (result.width, result.height) == (1024, 1365)
+        assert result.upload.size < len(data)
+        with Image.open(result.upload.path) as out:
+            assert out.size == (1024, 1365)
+            assert not out.getexif()
+    finally:
+        result.upload.discard()
+
+
+@pytest.mark.asyncio
+async def test_mislabelled_png_is_reencoded_as_jpeg(tmp_path):
+    data = _encode(Image.new("RGBA", (800, 600), (0, 128, 0, 255)), "PNG")
+    result = await ImagePreprocessor(output_format="WEBP").process(
+        _spooled(tmp_path, data, content_type="image/jpeg"), ["landscape_hd"]
+    )
+    try:
+        assert result.detected_type == "image/png"
+        assert result.upload.content_type == "image/webp"
+        # Already smaller than the target – re-encoded but not upscaled
+        assert (result.width, result.height) == (800, 600)
+    finally:
+        result.upload.discard()
+
+
+@pytest.mark.asyncio
+async def test_disabled_preprocessing_relabels_and_passes_through(tmp_path):
+    data = _encode(Image.new("RGB", (64, 64)), "PNG")
+    spooled = _spooled(tmp_path, data)
+    result = await ImagePreprocessor(enabled=False).process(spooled, ["square_hd"])
+    assert result.upload.path == spooled.path
+    assert result.upload.content_type == "image/png"
+    assert not result.reencoded
+
+
+@pytest.mark.asyncio
+async def test_rejects_non_images(tmp_path):
+    with pytest.raises(ValueError):
+        await ImagePreprocessor().process(_spooled(tmp_path, b"%PDF-1.7 ..."), ["square_hd"])
+
+
+@pytest.mark.asyncio
+async def test_rejects_heic_it_cannot_decode(tmp_path):
+    # Fal can't read HEIC, so it is never passed through as-is
+    heic = b"\x00\x00\x00\x18ftypheic\x00\x00\x00\x00" + b"\x00" * 64
+    for preprocessor in (ImagePreprocessor(), ImagePreprocessor(enabled=False)):
+        with pytest.raises(ValueError):
+            await preprocessor.process(_spooled(tmp_path, heic), ["square_hd"])
+    assert os.listdir(tmp_path) == ["upload.bin"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GEMINI_SRC = os.path.join(BACKEND_DIR, "conversational-ai-gemini-twilio", "src")
+
+# SDKs that must wait until a request (or the lifespan hook) needs them
+LAZY_MODULES = ["fal_client", "httpx", "PIL", "yaml", "supabase"]
+
+
+def _import_profile(module: str, cwd: str, extra_env=None):
+    """Import module in a fresh interpreter; returns (modules loaded, cumulative µs by module)"""
+    env = {**os.environ, "FAL_KEY": "", **(extra_env or {})}
+    code = f"import sys, {module}; print(','.join(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if total.isdigit():
+            cumulative[name] = int(total)
+    return set(result.stdout.strip().split(",")), cumulative
+
+
+def test_api_imports_without_fal_key_or_heavy_sdks():
+    loaded, cumulative = _import_profile("src.api.main", BACKEND_DIR)
+    eager = [m for m in LAZY_MODULES if m in loaded]
+    assert not eager, f"imported at startup: {eager}"
+    print(f"src.api.main cumulative import time: {cumulative.get('src.api.main', 0) / 1000:.1f} ms")
+
+
+def test_api_import_leaves_logging_to_the_lifespan():
+    code = "import logging, threading, src.api.main; print(len(logging.getLogger().handlers), threading.active_count())"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR, env={**os.environ, "FAL_KEY": ""}, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert result.stdout.split() == ["0", "1"]
+
+
+def test_gemini_app_defers_sdk_imports():
+    pytest.importorskip("quart")
+    loaded, cumulative = _import_profile(
+        "fluffyduck_gemini_twilio.app", GEMINI_SRC, {"PYTHONPATH": GEMINI_SRC}
+    )
+    eager = [m for m in ("google.genai", "twilio", "requests") if m in loaded]
+    assert not eager, f"imported at startup: {eager}"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.profile_benchmark import StubFalClient, run_benchmark, synthesize_photos
+from src.api import main
+from src.services.fal_gateway import FalGateway
+from src.services.inference_profiles import PROFILES, get_profile
+
+
+def test_default_profile_comes_from_env(monkeypatch):
+    monkeypatch.delenv("FAL_DEFAULT_PROFILE", raising=False)
+    assert get_profile().name == 'draft'
+    monkeypatch.setenv("FAL_DEFAULT_PROFILE", "Final")
+    assert get_profile(None).name == 'final'
+    assert get_profile('standard').name == 'standard'
+    with pytest.raises(ValueError):
+        get_profile('ultra')
+
+
+def test_profile_arguments():
+    draft = PROFILES['draft'].fal_arguments('landscape_16_9')
+    assert draft['image_size'] == {'width': 512, 'height': 288}
+    assert draft['num_images'] == 3
+    final = PROFILES['final'].fal_arguments('landscape_16_9')
+    assert final['image_size'] == 'landscape_16_9'
+    assert (final['num_inference_steps'], final['num_images']) == (50, 1)
+    assert PROFILES['draft'].megapixel_steps('square_hd') < PROFILES['final'].megapixel_steps('square_hd')
+
+
+def test_profiles_are_scoped_to_their_application(monkeypatch):
+    monkeypatch.delenv("FAL_DEFAULT_PROFILE", raising=False)
+    sd15 = get_profile(None, 'fal-ai/stable-diffusion-v15')
+    # SD 1.5 keeps its original 50-step settings instead of turbo drafts
+    assert sd15.fal_arguments('square_hd') == {
+        'image_size': 'square_hd', 'num_inference_steps': 50, 'num_images': 3, 'guidance_scale': 7.5,
+    }
+    with pytest.raises(ValueError):
+        get_profile('draft', 'fal-ai/stable-diffusion-v15')
+    assert get_profile(None, '110602490-sdxl-turbo-food-enhancement').name == 'draft'
+
+
+def test_campaign_profile_is_resolved_and_validated(monkeypatch):
+    monkeypatch.delenv("FAL_DEFAULT_PROFILE", raising=False)
+    campaign = (
+        '{"name": "a", "description": "b", "target_audience": "c", '
+        '"cadence": "daily", "platforms": ["Instagram"]%s}'
+    )
+    assert main.parse_campaign_request(campaign % '').profile == 'draft'
+    assert main.parse_campaign_request(campaign % ', "profile": "final"').profile == 'final'
+    with pytest.raises(HTTPException) as e:
+        main.parse_campaign_request(campaign % ', "profile": "ultra"')
+    assert e.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_benchmark_reports_drafts_cheaper_and_faster(tmp_path):
+    photos = synthesize_photos(str(tmp_path), count=2, size=(800, 600))
+    gateway = FalGateway(client=StubFalClient(time_scale=0.01), poll_interval=0.001)
+    report = await run_benchmark(
+        gateway,
+        photos,
+        [PROFILES['draft'], PROFILES['final']],
+        ['Instagram'],
+        time_scale=0.01,
+        usd_per_megapixel_step=0.0001,
+    )
+    assert report['draft']['requests'] == report['final']['requests'] == 2
+    assert report['draft']['images'] == 6
+    assert report['draft']['mean_seconds'] < report['final']['mean_seconds']
+    assert report['draft']['usd_per_request'] < report['final']['usd_per_request']
+    # The synthesized photos survive the run
+    assert all(os.path.exists(p) for p in photos)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
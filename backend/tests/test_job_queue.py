@@ -0,0 +1,230 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.job_queue import (
+    FAILED,
+    SUCCEEDED,
+    CallbackPolicy,
+    InMemoryJobStore,
+    InvalidCallback,
+    Job,
+    JobQueue,
+    JobStoreFull,
+    QueueFull,
+    SQLiteJobStore,
+)
+
+
+async def _wait_finished(queue: JobQueue, job_id: str) -> Job:
+    async for job in queue.watch(job_id):
+        last = job
+    return last
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+async def test_job_runs_to_completion(backend, tmp_path):
+    store = (
+        InMemoryJobStore() if backend == "memory"
+        else SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    )
+
+    async def handler(payload):
+        await asyncio.sleep(0.01)
+        return {'generated_images': [payload['name']]}
+
+    queue = JobQueue(handler, store=store, workers=2, poll_interval=0.05)
+    try:
+        job = await queue.submit("tenant-a", {'name': 'duck.jpg'})
+        assert job.status == "queued"
+
+        statuses = [j.status async for j in queue.watch(job.id)]
+        assert statuses[-1] == SUCCEEDED
+
+        finished = await queue.get(job.id)
+        assert finished.result == {'generated_images': ['duck.jpg']}
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_job_records_error():
+    async def handler(payload):
+        raise ValueError("Fal is down")
+
+    queue = JobQueue(handler, poll_interval=0.05)
+    try:
+        job = await queue.submit("tenant-a", {})
+        finished = await _wait_finished(queue, job.id)
+        assert finished.status == FAILED
+        assert finished.error == "Fal is down"
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_per_tenant_limit_does_not_block_other_tenants():
+    running = {'a': 0, 'b': 0}
+    peak = {'a': 0, 'b': 0}
+    release = asyncio.Event()
+
+    async def handler(payload):
+        tenant = payload['tenant']
+        running[tenant] += 1
+        peak[tenant] = max(peak[tenant], running[tenant])
+        if tenant == 'a':
+            await release.wait()
+        running[tenant] -= 1
+        return {}
+
+    queue = JobQueue(handler, workers=4, per_tenant_limit=1, poll_interval=0.05)
+    try:
+        a_jobs = [await queue.submit('a', {'tenant': 'a'}) for _ in range(3)]
+        b_job = await queue.submit('b', {'tenant': 'b'})
+
+        # Tenant b finishes while tenant a is still stuck on its first job
+        assert (await _wait_finished(queue, b_job.id)).status == SUCCEEDED
+        assert peak['a'] == 1
+
+        release.set()
+        for job in a_jobs:
+            assert (await _wait_finished(queue, job.id)).status == SUCCEEDED
+        assert peak['a'] == 1
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_store_and_queue_are_bounded():
+    store = InMemoryJobStore(max_jobs=2)
+    await store.create(Job(id='1', tenant='t', status=SUCCEEDED))
+    await store.create(Job(id='2', tenant='t'))
+    await store.create(Job(id='3', tenant='t'))  # evicts finished job 1
+    assert await store.get('1') is None
+    with pytest.raises(JobStoreFull):
+        await store.create(Job(id='4', tenant='t'))
+
+    blocker = asyncio.Event()
+
+    async def handler(payload):
+        await blocker.wait()
+        return {}
+
+    queue = JobQueue(handler, workers=1, max_pending=1)
+    try:
+        await queue.submit('t', {})
+        await asyncio.sleep(0)  # let the worker pick up the first job
+        await queue.submit('t', {})
+        with pytest.raises(QueueFull):
+            await queue.submit('t', {})
+    finally:
+        blocker.set()
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_jobs_are_recovered_after_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = SQLiteJobStore(path)
+    await store.create(Job(id='queued', tenant='t'), {'name': 'duck.jpg'})
+    await store.create(Job(id='running', tenant='t'), {'name': 'goose.jpg'})
+    # Claimed by a worker that died: its lease has already lapsed
+    await store.claim('running', 'dead-worker', 0)
+    assert await store.claim('running', 'other', 60) is None
+    await store.close()
+
+    seen = []
+
+    async def handler(payload):
+        seen.append(payload['name'])
+        return {'generated_images': [payload['name']]}
+
+    # A new process over the same file picks up where the old one stopped
+    queue = JobQueue(handler, store=SQLiteJobStore(path), poll_interval=0.05)
+    try:
+        await queue.start()
+        assert (await _wait_finished(queue, 'queued')).status == SUCCEEDED
+        interrupted = await queue.get('running')
+        assert interrupted.status == FAILED and "restart" in interrupted.error
+        assert seen == ['duck.jpg']
+        assert await queue.store.unfinished() == []
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_starting_a_worker_leaves_its_siblings_jobs_alone(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    release = asyncio.Event()
+
+    async def slow(payload):
+        await release.wait()
+        return {'generated_images': [payload['name']]}
+
+    sibling = JobQueue(slow, store=SQLiteJobStore(path), poll_interval=0.05)
+    late = JobQueue(slow, store=SQLiteJobStore(path), poll_interval=0.05)
+    try:
+        job = await sibling.submit('t', {'name': 'duck.jpg'})
+        while (await sibling.get(job.id)).status != 'running':
+            await asyncio.sleep(0.01)
+
+        # Another worker starting on the same file must not fail the live job
+        await late.start()
+        assert (await late.get(job.id)).status == 'running'
+
+        release.set()
+        assert (await _wait_finished(sibling, job.id)).status == SUCCEEDED
+    finally:
+        await sibling.stop()
+        await late.stop()
+
+    # A job declared abandoned stays failed when its old owner reports back
+    store = SQLiteJobStore(path)
+    await store.create(Job(id='stale', tenant='t'), {'name': 'goose.jpg'})
+    claimed = await store.claim('stale', 'slow-worker', 60)
+    abandoned = Job(**{**claimed.to_dict(), 'status': FAILED, 'error': "interrupted"})
+    assert await store.update(abandoned, expected='running')
+    claimed.status = SUCCEEDED
+    assert not await store.update(claimed, expected='running')
+    assert (await store.get('stale')).status == FAILED
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_callbacks_only_go_to_allowed_public_hosts():
+    policy = CallbackPolicy(["93.184.216.34", "127.0.0.1", "*.example.com"])
+    await policy.check("https://93.184.216.34/hooks/done")
+
+    for url, reason in [
+        ("http://93.184.216.34/hooks/done", "https"),
+        ("https://127.0.0.1/hooks/done", "public"),
+        ("https://10.0.0.1/hooks/done", "not allowed"),
+        ("https://169.254.169.254/latest/meta-data", "not allowed"),
+        ("file:///etc/passwd", "https"),
+    ]:
+        with pytest.raises(InvalidCallback, match=reason):
+            await policy.check(url)
+
+    assert policy.allows_host("hooks.example.com")
+    assert not policy.allows_host("example.com.evil.test")
+
+    # Without an allowlist callbacks are refused before a job is created
+    queue = JobQueue(lambda payload: None)
+    try:
+        with pytest.raises(InvalidCallback, match="not enabled"):
+            await queue.check_submission("https://93.184.216.34/hook")
+        with pytest.raises(InvalidCallback, match="not enabled"):
+            await queue.submit('t', {}, callback_url="https://93.184.216.34/hook")
+        assert queue.pending == 0
+    finally:
+        await queue.stop()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
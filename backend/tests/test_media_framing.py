@@ -0,0 +1,111 @@
+import base64
+import json
+import os
+import sys
+import time
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.media_framing import MediaFramer, parse_twilio_message
+
+STREAM_SID = "MZ18ad3ab5a668481ce02b83e7395059f0"
+# 20 ms of 8 kHz µ-law audio – what Twilio sends per frame
+CHUNK = bytes(range(256))[:160]
+ITERATIONS = 20000
+
+
+def _twilio_media_message(audio: bytes) -> str:
+    return json.dumps({
+        "event": "media",
+        "sequenceNumber": "3",
+        "media": {
+            "track": "inbound",
+            "chunk": "1",
+            "timestamp": "5",
+            "payload": base64.b64encode(audio).decode("utf-8"),
+        },
+        "streamSid": STREAM_SID,
+    })
+
+
+def _legacy_outbound(stream_sid: str, audio: bytes) -> str:
+    """What GeminiTwilio / TwilioAudioInterface used to do per chunk."""
+    payload = base64.b64encode(audio).decode("utf-8")
+    return json.dumps({
+        "event": "media",
+        "streamSid": stream_sid,
+        "media": {"payload": payload},
+    })
+
+
+def _legacy_inbound(message: str) -> bytes:
+    data = json.loads(message)
+    return base64.b64decode(data["media"]["payload"])
+
+
+def _bench(fn, *args) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn(*args)
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+def test_outbound_media_matches_legacy_json():
+    framer = MediaFramer(STREAM_SID)
+    for audio in (CHUNK, b"", b"\x00" * 321):
+        assert json.loads(framer.media(audio)) == json.loads(
+            _legacy_outbound(STREAM_SID, audio)
+        )
+
+
+def test_framer_reset_and_clear():
+    framer = MediaFramer()
+    assert json.loads(framer.media(CHUNK))["streamSid"] is None
+    framer.reset(STREAM_SID)
+    assert json.loads(framer.media(CHUNK))["streamSid"] == STREAM_SID
+    assert json.loads(framer.clear()) == {"event": "clear", "streamSid": STREAM_SID}
+
+
+def test_parse_media_fast_path():
+    message = _twilio_media_message(CHUNK)
+    for raw in (message, message.encode("utf-8"), bytearray(message.encode("utf-8"))):
+        event = parse_twilio_message(raw)
+        assert event.event == "media"
+        assert event.audio == CHUNK
+        assert event.data is None  # decoded without a full JSON parse
+
+
+def test_parse_control_events_and_dicts():
+    start = {"event": "start", "start": {"streamSid": STREAM_SID, "callSid": "CA1"}}
+    event = parse_twilio_message(json.dumps(start))
+    assert event.event == "start"
+    assert event.data["start"]["streamSid"] == STREAM_SID
+
+    assert parse_twilio_message({"event": "stop"}).event == "stop"
+    parsed = parse_twilio_message(json.loads(_twilio_media_message(CHUNK)))
+    assert parsed.audio == CHUNK
+
+
+# The benchmarks only report timings (run with -s to see them); wall-clock
+# comparisons depend on the machine and would make the suite flaky.
+
+def test_benchmark_gemini_twilio_outbound():
+    """GeminiTwilio._gemini_to_twilio framing: dict + json.dumps vs template."""
+    framer = MediaFramer(STREAM_SID)
+    legacy = _bench(_legacy_outbound, STREAM_SID, CHUNK)
+    framed = _bench(framer.media, CHUNK)
+    print(f"\nGeminiTwilio outbound: legacy {legacy:.2f} µs, framer {framed:.2f} µs")
+
+
+def test_benchmark_twilio_audio_interface_inbound():
+    """TwilioAudioInterface.handle_twilio_message: json.loads + b64decode vs scan."""
+    message = _twilio_media_message(CHUNK)
+    legacy = _bench(_legacy_inbound, message)
+    fast = _bench(parse_twilio_message, message)
+    print(f"\nTwilioAudioInterface inbound: legacy {legacy:.2f} µs, fast path {fast:.2f} µs")
+
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v", "-s"])
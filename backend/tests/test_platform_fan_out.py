@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.api import main
+from src.services.result_cache import ResultCache
+
+LATENCY = {'Instagram': 0.2, 'LinkedIn': 0.05, 'Facebook': 0.1, 'Twitter': 0.1}
+
+
+@pytest.fixture
+def fake_fal(monkeypatch):
+    calls = []
+
+    async def fake_enhance(name, description, target_audience, platform, reference_image_url,
+                           on_queue_update=None, profile=None, seed=None):
+        calls.append(platform)
+        await asyncio.sleep(LATENCY[platform])
+        if platform == 'Twitter':
+            raise ValueError("Fal rejected the request")
+        return {
+            'generated_images': [f"https://fal.media/{platform}.jpg"],
+            'prompt': f"prompt for {name}",
+            'style_used': main.platform_style_for(platform).style
+        }
+
+    monkeypatch.setattr(main, "enhance_restaurant_photo", fake_enhance)
+    monkeypatch.setattr(main, "result_cache", ResultCache())
+    return calls
+
+
+def _kwargs(platforms):
+    return {
+        'name': 'Burma Love',
+        'description': 'Tea leaf salad',
+        'target_audience': 'foodies',
+        'platforms': platforms,
+        'reference_image_url': 'https://example.com/dish.jpg',
+        'reference_digest': 'abc123'
+    }
+
+
+@pytest.mark.asyncio
+async def test_platforms_run_concurrently_and_group_results(fake_fal):
+    start = time.perf_counter()
+    result = await main.generate_for_platforms(
+        **_kwargs(['Instagram', 'LinkedIn', 'Facebook', 'Instagram'])
+    )
+    elapsed = time.perf_counter() - start
+
+    # Wall-clock is the slowest platform, not the sum
+    assert elapsed < 0.3
+    assert sorted(fake_fal) == ['Facebook', 'Instagram', 'LinkedIn']
+    assert list(result['platforms']) == ['Instagram', 'LinkedIn', 'Facebook']
+    # Top-level fields keep describing the first platform for older clients
+    assert result['generated_images'] == ["https://fal.media/Instagram.jpg"]
+    assert result['errors'] == {}
+
+
+@pytest.mark.asyncio
+async def test_results_stream_in_completion_order_with_errors(fake_fal):
+    order = []
+    async for platform, result, error in main.enhance_for_platforms(
+        **_kwargs(['Instagram', 'LinkedIn', 'Twitter'])
+    ):
+        order.append((platform, error))
+
+    assert order == [
+        ('LinkedIn', None),
+        ('Twitter', 'Fal rejected the request'),
+        ('Instagram', None),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_all_platforms_failing_raises(fake_fal):
+    with pytest.raises(RuntimeError, match="Twitter"):
+        await main.generate_for_platforms(**_kwargs(['Twitter']))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
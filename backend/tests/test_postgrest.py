@@ -0,0 +1,291 @@
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.operations.social_media_ops import SocialMediaOps
+from src.database.postgrest import PostgrestClient, PostgrestError, eq, in_
+from src.services.storage_service import StorageService
+from tests.postgrest_stub import PostgrestStub, install_campaign_media
+
+
+def make_client(stub, transport=None, **kwargs):
+    kwargs.setdefault('backoff_base', 0)
+    return PostgrestClient(
+        "https://project.supabase.co", "anon-key",
+        transport=transport or stub.transport(), **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_campaign_crud_round_trip():
+    stub = install_campaign_media(PostgrestStub())
+    client = make_client(stub)
+    ops = SocialMediaOps(client)
+
+    older = await ops.create_campaign({'title': 'Brunch', 'selected': False, 'created_at': '2024-01-01T00:00:00+00:00'})
+    newer = await ops.create_campaign({'title': 'Dinner', 'selected': False, 'created_at': '2024-02-01T00:00:00+00:00'})
+    await ops.create_campaign({'title': 'Done', 'selected': True, 'created_at': '2024-03-01T00:00:00+00:00'})
+
+    assert (await ops.get_campaign(older['id']))['title'] == 'Brunch'
+    assert await ops.get_campaign('missing') is None
+    assert (await ops.get_latest_campaign())['id'] == newer['id']
+
+    updated = await ops.update_campaign_media(newer['id'], "https://cdn/img.jpg")
+    assert updated['selected'] is True and updated['media_url'] == "https://cdn/img.jpg"
+    assert (await ops.get_latest_campaign())['id'] == older['id']
+
+    when = datetime(2024, 5, 1, 18, tzinfo=timezone.utc)
+    scheduled = await ops.update_campaign_schedule(older['id'], when)
+    assert scheduled['scheduled_time'] == when.isoformat()
+
+    stub.seed('campaign_metrics', [
+        {'campaign_id': older['id'], 'likes': 1, 'recorded_at': '2024-05-01T00:00:00+00:00'},
+        {'campaign_id': older['id'], 'likes': 9, 'recorded_at': '2024-05-02T00:00:00+00:00'},
+    ])
+    assert (await ops.get_campaign_metrics(older['id']))['likes'] == 9
+    assert await ops.get_campaign_metrics(newer['id']) is None
+
+    request = stub.requests[0]
+    assert request.headers['apikey'] == "anon-key"
+    assert request.headers['authorization'] == "Bearer anon-key"
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_in_filter_and_select_columns():
+    stub = PostgrestStub()
+    client = make_client(stub)
+    rows = stub.seed('campaigns', [{'title': t} for t in ('a', 'b, "quoted"', 'c')])
+
+    found = await client.select(
+        'campaigns', columns='id,title', filters={'id': in_([rows[0]['id'], rows[1]['id']])}
+    )
+    assert sorted(r['title'] for r in found) == ['a', 'b, "quoted"']
+    assert set(found[0]) == {'id', 'title'}
+
+    found = await client.select('campaigns', filters={'title': in_(['b, "quoted"'])})
+    assert [r['id'] for r in found] == [rows[1]['id']]
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_reads_retry_transient_failures():
+    stub = PostgrestStub()
+    client = make_client(stub, max_retries=2)
+    stub.seed('campaigns', [{'title': 'a'}])
+
+    stub.fail_next(503)
+    stub.fail_next(httpx.ReadTimeout("slow"))
+    assert len(await client.select('campaigns')) == 1
+    assert client.stats()['retries'] == 2
+
+    stub.fail_next(503, times=3)
+    with pytest.raises(PostgrestError) as exc:
+        await client.select('campaigns')
+    assert exc.value.status_code == 503
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_inserts_are_not_replayed_after_reaching_the_server():
+    stub = PostgrestStub()
+    client = make_client(stub, max_retries=3)
+
+    stub.fail_next(503, method="POST")
+    with pytest.raises(PostgrestError):
+        await client.insert('campaigns', {'title': 'a'})
+    assert stub.all('campaigns') == []
+
+    stub.fail_next(httpx.ReadTimeout("lost response"), method="POST")
+    with pytest.raises(httpx.ReadTimeout):
+        await client.insert('campaigns', {'title': 'a'})
+
+    # A refused connection never reached the server, so it is safe to resend
+    stub.fail_next(httpx.ConnectError("refused"), method="POST")
+    await client.insert('campaigns', {'title': 'a'})
+    assert len(stub.all('campaigns')) == 1
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    stub = PostgrestStub()
+    client = make_client(stub)
+
+    with pytest.raises(PostgrestError) as exc:
+        await client.select('campaigns', filters={'title': 'like.*a*'})
+    assert exc.value.status_code == 400
+    assert exc.value.code == 'PGRST100'
+    assert len(stub.requests) == 1
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_the_loop():
+    stub = PostgrestStub()
+    stub.seed('campaigns', [{'title': 'a'}])
+
+    async def slow(request):
+        await asyncio.sleep(0.05)
+        return stub.handle(request)
+
+    client = make_client(stub, transport=httpx.MockTransport(slow), max_connections=20)
+    ops = SocialMediaOps(client)
+    campaign_id = stub.all('campaigns')[0]['id']
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(ops.get_campaign(campaign_id) for _ in range(20)))
+    elapsed = time.perf_counter() - start
+
+    assert all(r['title'] == 'a' for r in results)
+    # Twenty 50ms round trips overlap instead of running back to back
+    assert elapsed < 0.5
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_storage_upload_returns_public_url(tmp_path):
+    stub = PostgrestStub()
+    client = make_client(stub)
+    storage = StorageService(client)
+
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(b"\xff\xd8\xff" + b"0" * 100)
+
+    url = await storage.upload_reference_file(str(path), "references/abc.jpg", "image/jpeg")
+    assert url == "https://project.supabase.co/storage/v1/object/public/campaign-images/references/abc.jpg"
+    assert stub.objects[('campaign-images', 'references/abc.jpg')] == path.read_bytes()
+    assert stub.requests[-1].headers['content-type'] == "image/jpeg"
+
+    saved = await storage.save_campaign({'title': 'Brunch'}, url)
+    assert saved['status'] == 'active' and saved['media_url'] == url
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_chunks_and_merges():
+    stub = install_campaign_media(PostgrestStub())
+    client = make_client(stub, chunk_size=4)
+    ops = SocialMediaOps(client)
+    existing = stub.seed('campaigns', [{'title': 'old', 'selected': False, 'media_url': "https://cdn/old.jpg"}])[0]
+
+    result = await ops.upsert_campaigns(
+        [{'id': existing['id'], 'title': 'renamed'}] + [{'title': f"new{i}"} for i in range(9)]
+    )
+    assert result.ok and result.requests == 3
+    rows = stub.all('campaigns')
+    assert len(rows) == 10
+    # Columns no row in the chunk mentions keep their stored value
+    assert rows[0]['title'] == 'renamed' and rows[0]['selected'] is False
+
+    # A column some rows of a chunk set is reset on the rows that leave it out
+    await ops.upsert_campaigns([
+        {'id': existing['id'], 'title': 'renamed'},
+        {'id': rows[1]['id'], 'title': 'new0', 'media_url': "https://cdn/new0.jpg"},
+    ])
+    assert stub.all('campaigns')[0]['media_url'] is None
+
+    media = await ops.update_campaigns_media({row['id']: f"https://cdn/{row['title']}.jpg" for row in rows})
+    assert media.ok and media.requests == 3
+    assert all(row['selected'] and row['media_url'].endswith(".jpg") for row in stub.all('campaigns'))
+
+
+@pytest.mark.asyncio
+async def test_partial_updates_never_insert_or_drop_columns():
+    stub = install_campaign_media(PostgrestStub())
+    client = make_client(stub)
+    ops = SocialMediaOps(client)
+    campaign = await ops.create_campaign({'title': 'Brunch', 'description': 'Eggs'})
+
+    # Partial rows can't go through upsert: title is NOT NULL
+    result = await ops.upsert_campaigns([{'id': campaign['id'], 'media_url': "https://cdn/x.jpg"}])
+    assert result.failed[0].status_code == 400 and 'not-null' in result.failed[0].error
+
+    media = await ops.update_campaigns_media({campaign['id']: "https://cdn/1.jpg", 'missing': "https://cdn/2.jpg"})
+    assert [row['id'] for row in media.succeeded] == [campaign['id']]
+    assert media.failed_rows == [{'id': 'missing', 'media_url': "https://cdn/2.jpg"}]
+    assert media.failed[0].status_code == 404
+    # The single-row call is the same write, and reports the same failure
+    with pytest.raises(LookupError, match="Campaign missing not found"):
+        await ops.update_campaign_media('missing', "https://cdn/2.jpg")
+
+    [row] = stub.all('campaigns')
+    assert (row['title'], row['description'], row['media_url']) == ('Brunch', 'Eggs', "https://cdn/1.jpg")
+
+    # Creating is an upsert: an existing ID gets only the columns sent
+    merged = await ops.create_campaign({'id': campaign['id'], 'title': 'Dinner'})
+    assert (merged['title'], merged['description'], merged['media_url']) == ('Dinner', 'Eggs', "https://cdn/1.jpg")
+    assert len(stub.all('campaigns')) == 1
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_isolates_rejected_rows():
+    stub = PostgrestStub()
+    stub.checks['campaigns'] = lambda row: "title required" if not row.get('title') else None
+    client = make_client(stub, chunk_size=8)
+    ops = SocialMediaOps(client)
+
+    rows = [{'title': f"t{i}"} for i in range(8)]
+    rows[5] = {'title': ''}
+    result = await ops.upsert_campaigns(rows)
+
+    assert not result.ok
+    assert result.failed_rows == [{'title': ''}]
+    assert result.failed[0].error == "title required"
+    assert result.failed[0].status_code == 400
+    assert len(result.succeeded) == 7 == len(stub.all('campaigns'))
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_reports_chunks_that_stay_unavailable():
+    stub = PostgrestStub()
+    client = make_client(stub, chunk_size=2, max_retries=1, bulk_concurrency=1)
+    ops = SocialMediaOps(client)
+
+    # Upserts are retried like reads; the first chunk fails twice, the second once
+    stub.fail_next(503, times=3, method="POST")
+    result = await ops.upsert_campaigns([{'title': f"t{i}"} for i in range(4)])
+
+    assert [failure.status_code for failure in result.failed] == [503]
+    assert result.failed_rows == [{'title': 't0'}, {'title': 't1'}]
+    assert [row['title'] for row in stub.all('campaigns')] == ['t2', 't3']
+
+
+@pytest.mark.asyncio
+async def test_single_row_methods_wrap_bulk_writes():
+    stub = PostgrestStub()
+    stub.checks['campaigns'] = lambda row: "title required" if row.get('title') == '' else None
+    client = make_client(stub)
+    ops = SocialMediaOps(client)
+
+    created = await ops.create_campaign({'title': 'Brunch'})
+    with pytest.raises(Exception, match="title required"):
+        await ops.create_campaign({'title': ''})
+
+    saved = await ops.save_campaign_media([
+        {'campaign_id': created['id'], 'platform': 'Instagram', 'url': "https://cdn/1.jpg"},
+        {'campaign_id': created['id'], 'platform': 'Instagram', 'url': "https://cdn/2.jpg"},
+    ])
+    again = await ops.save_campaign_media([
+        {'campaign_id': created['id'], 'platform': 'Instagram', 'url': "https://cdn/1.jpg", 'profile': 'final'},
+    ])
+    assert saved.ok and again.ok
+    media = stub.all('campaign_media')
+    assert len(media) == 2 and media[0]['profile'] == 'final'
+
+    request = stub.requests[-1]
+    assert request.url.params['on_conflict'] == 'campaign_id,platform,url'
+    assert 'resolution=merge-duplicates' in request.headers['prefer']
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,163 @@
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agents.social_media.analytics_agent import AnalyticsAgent
+from src.agents.social_media.scheduling_agent import SchedulingAgent
+from src.database.operations.campaign_repository import CampaignRepository
+from src.database.operations.social_media_ops import SocialMediaOps
+from src.database.postgrest import PostgrestClient
+from src.services import posting_model
+from src.services.engagement_aggregates import EngagementAggregates
+from src.services.posting_model import PostingHourModel, PostingModels, hour_of_week
+from src.services.posting_schedule import PostingScheduler
+from tests.postgrest_stub import PostgrestStub
+
+RESTAURANT_HOURS = (11, 12, 17, 18)
+TUESDAY = 1
+
+
+def test_untrained_model_keeps_the_static_hours():
+    model = PostingHourModel(RESTAURANT_HOURS)
+    assert model.week() == (RESTAURANT_HOURS,) * 7
+
+
+def test_observations_move_the_best_hours():
+    model = PostingHourModel(RESTAURANT_HOURS)
+    for i in range(5):
+        model.observe(f"post{i}", hour_of_week(TUESDAY, 9), 0.08)
+    model.observe("flop", hour_of_week(TUESDAY, 18), 0.0)
+
+    week = model.week()
+    assert 9 in week[TUESDAY] and 18 not in week[TUESDAY]
+    # Smoothing lifts the neighbouring hours too
+    assert model.mean(hour_of_week(TUESDAY, 10)) > model.mean(hour_of_week(TUESDAY, 14))
+    assert week[TUESDAY + 1] == RESTAURANT_HOURS
+
+
+def test_remeasured_posts_replace_their_old_rate():
+    model = PostingHourModel(RESTAURANT_HOURS)
+    slot = hour_of_week(TUESDAY, 9)
+    prior = model.alpha[slot]
+
+    model.observe("post", slot, 0.5)
+    model.observe("post", slot, 0.1)
+    assert model.observations == 1
+    assert model.alpha[slot] == pytest.approx(prior + 0.1)
+
+
+def test_thompson_sampling_explores_then_settles():
+    rng = random.Random(3)
+    model = PostingHourModel(RESTAURANT_HOURS, posts_per_day=1)
+    model.observe("one", hour_of_week(TUESDAY, 9), 0.05)
+    sampled = {model.week(rng)[TUESDAY] for _ in range(50)}
+    assert len(sampled) > 3
+    assert all(hour in (8, 9, 10) + RESTAURANT_HOURS for (hour,) in sampled)
+
+    for i in range(200):
+        model.observe(f"post{i}", hour_of_week(TUESDAY, 9), 0.2)
+    picks = [model.week(rng)[TUESDAY][0] for _ in range(50)]
+    # Mostly the proven hour or its smoothed neighbours
+    assert max(set(picks), key=picks.count) == 9
+    assert sum(hour in (8, 9, 10) for hour in picks) >= 45
+
+
+def test_ranked_week_is_cached_between_observations():
+    model = PostingHourModel(RESTAURANT_HOURS)
+    model.observe("post", hour_of_week(TUESDAY, 9), 0.1)
+    model.week()
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        model.week()
+    assert (time.perf_counter() - start) / 10000 < 20e-6
+
+
+def test_scheduler_uses_the_learned_hours_per_platform():
+    models = PostingModels(posts_per_day=1)
+    models.model('r1', 'Instagram', RESTAURANT_HOURS).observe("post", hour_of_week(TUESDAY, 9), 0.2)
+    scheduler = PostingScheduler(models=models)
+    monday = datetime(2024, 6, 3, 12, tzinfo=timezone.utc)
+
+    learned = {'id': 'c1', 'restaurant_id': 'r1', 'platforms': ['instagram'], 'target_audience': 'restaurant'}
+    other = {**learned, 'id': 'c2', 'platforms': ['TikTok']}
+    # Monday's best hour (11:00) has passed, so Tuesday's learned 9:00 is next
+    assert scheduler.next_slot(learned, monday) == datetime(2024, 6, 4, 9, tzinfo=timezone.utc)
+    # Other platforms of the restaurant keep the static hours
+    assert scheduler.next_slot(other, monday).hour == 12
+
+
+@pytest.mark.asyncio
+async def test_agent_learns_from_stored_metrics():
+    stub = PostgrestStub()
+    until = datetime(2024, 7, 1, tzinfo=timezone.utc)
+    # Three Wednesdays at 20:00 Paris time do well; lunchtime posts don't
+    posted = [datetime(2024, 6, d, 18, tzinfo=timezone.utc) for d in (5, 12, 19)]
+    posted += [datetime(2024, 6, d, 9, tzinfo=timezone.utc) for d in (6, 13, 20)]
+    campaigns = stub.seed('campaigns', [
+        {'restaurant_id': 'r1', 'platforms': ['Instagram'], 'target_audience': 'restaurant',
+         'scheduled_time': when.isoformat()}
+        for when in posted
+    ] + [{'restaurant_id': 'r1', 'platforms': ['Instagram'], 'title': 'not posted yet'}])
+    stub.seed('campaign_metrics', [
+        {'campaign_id': c['id'], 'likes': 9 if i < 3 else 1, 'comments': 0, 'shares': 0,
+         'impressions': 100, 'recorded_at': (posted[i] + timedelta(days=2)).isoformat()}
+        for i, c in enumerate(campaigns[:6])
+    ])
+    client = PostgrestClient("https://project.supabase.co", "anon-key", transport=stub.transport())
+    agent = SchedulingAgent(
+        CampaignRepository(SocialMediaOps(client)),
+        PostingScheduler(models=PostingModels(posts_per_day=1)),
+    )
+
+    assert await agent.learn_posting_hours('r1', 'Europe/Paris', until=until) == 6
+    # Learning again replaces rather than double counts
+    assert await agent.learn_posting_hours('r1', 'Europe/Paris', until=until) == 6
+    assert agent.scheduler.models.get('r1', 'instagram').observations == 6
+
+    # Tuesday afternoon: the next best slot is Wednesday at 20:00
+    when = await agent.determine_optimal_posting_time(
+        campaigns[0], 'Europe/Paris', after=datetime(2024, 7, 2, 12, tzinfo=timezone.utc)
+    )
+    assert (when.weekday(), when.hour) == (2, 20)
+
+
+@pytest.mark.asyncio
+async def test_recorded_metrics_refit_the_hours_every_scheduler_uses(monkeypatch):
+    monkeypatch.setattr(posting_model, "_models", PostingModels(posts_per_day=1))
+    stub = PostgrestStub()
+    posted = [datetime(2024, 6, d, 18, tzinfo=timezone.utc) for d in (5, 12, 19)]
+    campaigns = stub.seed('campaigns', [
+        {'title': 'dinner', 'restaurant_id': 'r1', 'platforms': ['Instagram'],
+         'target_audience': 'restaurant', 'scheduled_time': when.isoformat()}
+        for when in posted
+    ])
+    client = PostgrestClient("https://project.supabase.co", "anon-key", transport=stub.transport())
+    repository = CampaignRepository(SocialMediaOps(client))
+    analytics = AnalyticsAgent(repository, EngagementAggregates(), timezone='Europe/Paris')
+
+    await analytics.record_metrics([
+        {'campaign_id': c['id'], 'likes': 9, 'comments': 0, 'shares': 0, 'impressions': 100,
+         'recorded_at': datetime.now(timezone.utc).isoformat()}
+        for c in campaigns
+    ])
+
+    # A scheduler built later, as the pipeline does, sees what was learned
+    scheduling = SchedulingAgent(repository)
+    assert scheduling.scheduler.models.get('r1', 'instagram').observations == 3
+    after = datetime(2024, 7, 2, 12, tzinfo=timezone.utc)
+    when = await scheduling.determine_optimal_posting_time(campaigns[0], 'Europe/Paris', after=after)
+    assert (when.weekday(), when.hour) == (2, 20)
+    # Asking books nothing, so asking again gives the same answer
+    assert await scheduling.determine_optimal_posting_time(campaigns[0], 'Europe/Paris', after=after) == when
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agents.social_media.scheduling_agent import SchedulingAgent
+from src.database.operations.campaign_repository import CampaignRepository
+from src.database.operations.social_media_ops import SocialMediaOps
+from src.database.postgrest import PostgrestClient
+from src.services.posting_schedule import PostingHours, PostingScheduler, cadence_days
+from tests.postgrest_stub import PostgrestStub
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_next_slot_is_the_next_posting_hour_on_the_hour():
+    scheduler = PostingScheduler()
+    campaign = {'id': 'c', 'target_audience': 'Restaurant diners'}
+
+    assert scheduler.next_slot(campaign, utc(2024, 6, 1, 12, 30), book=False) == utc(2024, 6, 1, 17)
+    assert scheduler.next_slot(campaign, utc(2024, 6, 1, 11), book=False) == utc(2024, 6, 1, 11)
+    assert scheduler.next_slot(campaign, utc(2024, 6, 1, 18, 0, 1), book=False) == utc(2024, 6, 2, 11)
+    # Unknown audiences fall back to the default hours
+    assert scheduler.next_slot({'id': 'x'}, utc(2024, 6, 1, 13), book=False).hour == 15
+
+
+def test_slots_follow_local_time_across_dst():
+    hours = PostingHours((2, 18), 'America/New_York')
+
+    # 2am doesn't exist on the spring-forward day; it lands on 3am EDT
+    spring = hours.day_slots(datetime(2024, 3, 10).date())
+    assert [datetime.fromtimestamp(s, hours.tz).hour for s in spring] == [3, 18]
+
+    # Dinner stays at 6pm local while the UTC hour moves
+    dinner = PostingHours((18,), 'America/New_York')
+    before = datetime.fromtimestamp(dinner.next_slot(int(utc(2024, 3, 9).timestamp())), timezone.utc)
+    after = datetime.fromtimestamp(dinner.next_slot(int(utc(2024, 3, 11).timestamp())), timezone.utc)
+    assert (before.hour, after.hour) == (23, 22)
+
+    # 1am happens twice on the fall-back day but is one slot
+    assert len(PostingHours((1,), 'America/New_York').day_slots(datetime(2024, 11, 3).date())) == 1
+
+
+def test_plan_follows_cadence():
+    scheduler = PostingScheduler()
+    weekly = {'id': 'w', 'target_audience': 'restaurant', 'cadence': 'Weekly'}
+
+    slots = scheduler.plan(weekly, 4, utc(2024, 6, 1, 12), 'Europe/Paris')
+    local = [(s.date().isoformat(), s.hour) for s in slots]
+    assert local == [('2024-06-01', 17), ('2024-06-08', 11), ('2024-06-15', 11), ('2024-06-22', 11)]
+    assert all(s.utcoffset() == timedelta(hours=2) for s in slots)
+
+    assert cadence_days(None) == 1
+    with pytest.raises(ValueError, match="Unknown cadence"):
+        cadence_days('hourly')
+
+
+def test_campaigns_of_one_restaurant_never_clash():
+    scheduler = PostingScheduler()
+    campaigns = [
+        {'id': f"c{i}", 'restaurant_id': 'r1', 'target_audience': 'restaurant', 'cadence': 'daily'}
+        for i in range(3)
+    ] + [{'id': 'other', 'restaurant_id': 'r2', 'target_audience': 'restaurant'}]
+
+    plans = scheduler.plan_many(campaigns, 5, utc(2024, 6, 1))
+
+    booked = sorted(s for cid, slots in plans.items() if cid != 'other' for s in slots)
+    assert len(booked) == 15
+    assert all(b - a >= timedelta(hours=1) for a, b in zip(booked, booked[1:]))
+    # Another restaurant takes the best slots regardless
+    assert plans['other'][0] == utc(2024, 6, 1, 11)
+    assert [plans[c][0].hour for c in ('c0', 'c1', 'c2')] == [11, 12, 17]
+
+    # With a wider gap, 12:00 and 18:00 sit too close to a booked post
+    wide = PostingScheduler(min_gap_minutes=90)
+    first = wide.plan_many(campaigns[:3], 1, utc(2024, 6, 1))
+    assert [first[c][0] for c in ('c0', 'c1', 'c2')] == [
+        utc(2024, 6, 1, 11), utc(2024, 6, 1, 17), utc(2024, 6, 2, 11)
+    ]
+
+
+def test_released_slots_can_be_booked_again():
+    scheduler = PostingScheduler()
+    campaign = {'id': 'c', 'restaurant_id': 'r1', 'target_audience': 'restaurant'}
+
+    held = scheduler.next_slot(campaign, utc(2024, 6, 1))
+    assert scheduler.next_slot(campaign, utc(2024, 6, 1), book=False) == utc(2024, 6, 1, 12)
+    scheduler.release('r1', [held])
+    assert scheduler.next_slot(campaign, utc(2024, 6, 1)) == held == utc(2024, 6, 1, 11)
+
+
+def test_full_calendar_raises():
+    scheduler = PostingScheduler(horizon_days=1)
+    campaign = {'id': 'c', 'target_audience': 'retail'}
+    scheduler.book('c', [utc(2024, 6, 1, h) for h in (10, 14, 16)] + [utc(2024, 6, 2, 10)])
+
+    with pytest.raises(ValueError, match="No free posting slot"):
+        scheduler.next_slot(campaign, utc(2024, 6, 1))
+
+
+@pytest.mark.asyncio
+async def test_agent_plans_around_posts_already_saved():
+    stub = PostgrestStub()
+    (campaign,) = stub.seed('campaigns', [
+        {'title': 'brunch', 'restaurant_id': 'r1', 'target_audience': 'restaurant', 'cadence': 'daily'},
+    ])
+    stub.seed('campaign_posts', [
+        {'campaign_id': 'older', 'restaurant_id': 'r1', 'scheduled_time': utc(2024, 6, 1, 11).isoformat()},
+    ])
+    client = PostgrestClient("https://project.supabase.co", "anon-key", transport=stub.transport())
+    agent = SchedulingAgent(CampaignRepository(SocialMediaOps(client)))
+
+    plan = await agent.plan_posting_schedule(campaign['id'], 3, after=utc(2024, 6, 1))
+
+    assert plan['scheduled_times'] == [utc(2024, 6, 1, 12), utc(2024, 6, 2, 11), utc(2024, 6, 3, 11)]
+    saved = [p['scheduled_time'] for p in stub.all('campaign_posts') if p['campaign_id'] == campaign['id']]
+    assert saved == [t.isoformat() for t in plan['scheduled_times']]
+    assert stub.all('campaigns')[0]['scheduled_time'] == utc(2024, 6, 1, 12).isoformat()
+
+    # A second plan works around the posts the first one booked
+    await agent.plan_posting_schedule(campaign['id'], 1, after=utc(2024, 6, 1))
+    assert len(stub.all('campaign_posts')) == 5
+
+
+class SlowRepository:
+    """Saves yield to the event loop and fail for the campaign ids in ``fail``"""
+
+    def __init__(self, campaigns, fail=()):
+        self.campaigns = {c['id']: c for c in campaigns}
+        self.fail = set(fail)
+        self.scheduled = {}
+
+    async def get_campaign(self, campaign_id):
+        return self.campaigns[campaign_id]
+
+    async def get_scheduled_posts(self, restaurant_id, after):
+        return []
+
+    async def save_campaign_posts(self, posts):
+        posts = list(posts)
+        await asyncio.sleep(0)
+        if any(p['campaign_id'] in self.fail for p in posts):
+            raise ConnectionError("database unavailable")
+
+    async def update_campaign_schedule(self, campaign_id, scheduled_time):
+        await asyncio.sleep(0)
+        if campaign_id in self.fail:
+            raise ConnectionError("database unavailable")
+        self.scheduled[campaign_id] = scheduled_time
+
+
+@pytest.mark.asyncio
+async def test_concurrent_schedules_get_distinct_slots_and_failures_release_theirs():
+    campaigns = [{'id': c, 'restaurant_id': 'r1', 'target_audience': 'restaurant'} for c in ('a', 'b', 'bad')]
+    repository = SlowRepository(campaigns, fail={'bad'})
+    agent = SchedulingAgent(repository, scheduler=PostingScheduler())
+
+    await asyncio.gather(agent.create_posting_schedule('a'), agent.create_posting_schedule('b'))
+    assert repository.scheduled['a'] != repository.scheduled['b']
+
+    # Neither a failed schedule nor a failed plan keeps the slots it took
+    free = agent.scheduler.next_slot(campaigns[2], book=False)
+    with pytest.raises(ConnectionError):
+        await agent.create_posting_schedule('bad')
+    with pytest.raises(ConnectionError):
+        await agent.plan_posting_schedule('bad', 3)
+    assert agent.scheduler.next_slot(campaigns[2], book=False) == free
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
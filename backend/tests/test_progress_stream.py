@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import sys
+
+import fal_client
+import pytest
+from httpx import AsyncClient
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.api import main
+from src.services.fal_gateway import describe_status
+from src.services.result_cache import ResultCache
+
+LATENCY = {'Instagram': 0.03, 'LinkedIn': 0.01}
+
+
+@pytest.fixture
+def fake_fal(monkeypatch):
+    async def fake_enhance(name, description, target_audience, platform, reference_image_url,
+                           on_queue_update=None, profile=None, seed=None):
+        statuses = [
+            fal_client.Queued(position=2),
+            fal_client.Queued(position=2),
+            fal_client.Queued(position=1),
+            fal_client.InProgress(logs=[{'message': 'step 1'}]),
+            fal_client.InProgress(logs=[{'message': 'step 1'}, {'message': 'step 2'}]),
+            fal_client.Completed(logs=None, metrics={'inference_time': 1.2}),
+        ]
+        for status in statuses:
+            if on_queue_update:
+                on_queue_update(status)
+            await asyncio.sleep(LATENCY[platform])
+        return {
+            'generated_images': [f"https://fal.media/{platform}-{i}.jpg" for i in range(2)],
+            'prompt': f"prompt for {name}",
+            'style_used': main.platform_style_for(platform).style
+        }
+
+    async def fake_store(reference_image, platforms):
+        return 'https://example.com/dish.jpg', 'abc123'
+
+    monkeypatch.setattr(main, "enhance_restaurant_photo", fake_enhance)
+    monkeypatch.setattr(main, "store_reference_image", fake_store)
+    monkeypatch.setattr(main, "result_cache", ResultCache())
+
+
+def test_describe_status():
+    assert describe_status(fal_client.Queued(position=3)) == {'status': 'queued', 'position': 3}
+    assert describe_status(fal_client.InProgress(logs=[{'message': 'loading'}])) == {
+        'status': 'in_progress', 'logs': ['loading']
+    }
+    assert describe_status(fal_client.Completed(logs=None, metrics=None)) == {
+        'status': 'completed', 'metrics': {}
+    }
+
+
+@pytest.mark.asyncio
+async def test_events_are_deduplicated_and_images_arrive_per_platform(fake_fal):
+    events = [event async for event in main.generation_events(
+        name='Burma Love',
+        description='Tea leaf salad',
+        target_audience='foodies',
+        platforms=['Instagram', 'LinkedIn'],
+        reference_image_url='https://example.com/dish.jpg',
+        reference_digest='abc123'
+    )]
+
+    linkedin = [e for e in events if e.get('platform') == 'LinkedIn']
+    assert [e['event'] for e in linkedin] == [
+        'queued', 'queued', 'running', 'progress', 'progress',
+        'image', 'image', 'platform_complete'
+    ]
+    assert [e['position'] for e in linkedin if e['event'] == 'queued'] == [2, 1]
+    assert [e['logs'] for e in linkedin if e['event'] == 'progress'] == [['step 1'], ['step 2']]
+
+    # The faster platform's images are sent before the slower one finishes
+    first_image = next(i for i, e in enumerate(events) if e['event'] == 'image')
+    assert events[first_image]['platform'] == 'LinkedIn'
+    instagram_done = next(
+        i for i, e in enumerate(events)
+        if e['event'] == 'platform_complete' and e['platform'] == 'Instagram'
+    )
+    assert first_image < instagram_done
+    assert events[-1] == {'event': 'done'}
+
+
+def _form():
+    campaign = {
+        'name': 'Burma Love',
+        'description': 'Tea leaf salad',
+        'target_audience': 'foodies',
+        'cadence': 'daily',
+        'platforms': ['Instagram', 'LinkedIn']
+    }
+    return (
+        {'campaign': json.dumps(campaign)},
+        {'reference_image': ('dish.jpg', b'\xff\xd8\xff\xe0', 'image/jpeg')}
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_speaks_ndjson_and_sse(fake_fal):
+    data, files = _form()
+    async with AsyncClient(app=main.app, base_url="http://test") as client:
+        response = await client.post("/api/generate-campaign/stream", data=data, files=files)
+        assert response.headers['content-type'].startswith('application/x-ndjson')
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[-1] == {'event': 'done'}
+        assert sum(line['event'] == 'image' for line in lines) == 4
+
+        response = await client.post(
+            "/api/generate-campaign/stream",
+            data=data,
+            files=files,
+            headers={'Accept': 'text/event-stream'}
+        )
+        assert response.headers['content-type'].startswith('text/event-stream')
+        frames = response.text.strip().split("\n\n")
+        assert frames[0].startswith("event: ")
+        assert frames[-1] == 'event: done\ndata: {"event": "done"}'
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,87 @@
+import os
+import sys
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.prompt_templates import DEFAULT_TEMPLATES, PromptRegistry
+
+
+def test_platform_templates_inherit_defaults():
+    registry = PromptRegistry()
+    instagram = registry.get('enhance', 'Instagram')
+    linkedin = registry.get('enhance', 'LinkedIn')
+    assert instagram.image_size == 'square_hd'
+    assert linkedin.image_size == 'landscape_hd'
+    assert instagram.arguments == linkedin.arguments
+    assert 'instagram-worthy' in instagram.style
+    # Unknown platforms fall back to the kind's defaults
+    assert registry.get('enhance', 'Myspace').style == "enhance this exact food photo professionally"
+    with pytest.raises(ValueError):
+        registry.get('unknown', 'Instagram')
+
+
+def test_render_only_substitutes_campaign_fields():
+    template = PromptRegistry().get('campaign', 'LinkedIn')
+    prompt = template.render("Burma Love", "Tea leaf salad", "foodies")
+    assert prompt.startswith("Create a professional LinkedIn marketing image for foodies.")
+    assert "Campaign: Burma Love. Tea leaf salad." in prompt
+    assert "professional, corporate, clean design" in prompt
+
+    arguments = template.fal_arguments(prompt, num_images=1)
+    assert arguments['prompt'] == prompt
+    assert arguments['guidance_scale'] == 7.5
+    assert arguments['num_images'] == 1
+
+
+def test_versions_are_stable_content_hashes():
+    first, second = PromptRegistry(), PromptRegistry()
+    assert first.get('enhance', 'Instagram').version == second.get('enhance', 'Instagram').version
+    assert first.version == second.version
+    assert first.get('enhance', 'Instagram').version != first.get('enhance', 'LinkedIn').version
+
+    edited = {**DEFAULT_TEMPLATES, 'enhance': {
+        **DEFAULT_TEMPLATES['enhance'],
+        'defaults': {**DEFAULT_TEMPLATES['enhance']['defaults'], 'negative_prompt': "blurry"},
+    }}
+    assert PromptRegistry(edited).get('enhance', 'Instagram').version != \
+        first.get('enhance', 'Instagram').version
+
+
+def test_unknown_placeholder_fails_at_load():
+    bad = {'enhance': {'defaults': {
+        **DEFAULT_TEMPLATES['enhance']['defaults'],
+        'prompt': "Enhance {dish} for {name}",
+    }}}
+    with pytest.raises(ValueError, match="dish"):
+        PromptRegistry(bad)
+
+
+def test_yaml_templates(tmp_path):
+    pytest.importorskip("yaml")
+    path = tmp_path / "prompts.yaml"
+    path.write_text(
+        "version: 2\n"
+        "templates:\n"
+        "  enhance:\n"
+        "    defaults:\n"
+        "      application: fal-ai/test\n"
+        "      prompt: 'Make {name} look great for {target_audience}'\n"
+        "      negative_prompt: blurry\n"
+        "      style: bright\n"
+        "      image_size: square\n"
+        "    platforms:\n"
+        "      Instagram:\n"
+        "        style: vivid\n"
+    )
+    registry = PromptRegistry.from_yaml(str(path))
+    template = registry.get('enhance', 'Instagram')
+    assert template.application == 'fal-ai/test'
+    assert template.style == 'vivid'
+    assert template.render("Burma Love", "", "foodies") == "Make Burma Love look great for foodies"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,63 @@
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+from starlette.datastructures import UploadFile
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.upload_memory import run_benchmark
+from src.services.reference_store import LocalReferenceStore, spool_upload
+
+PHOTO = b"\xff\xd8\xff\xe0" + os.urandom(300_000)
+
+
+def _upload(data: bytes = PHOTO) -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(data),
+        filename="dish.jpg",
+        headers={"content-type": "image/jpeg"},
+    )
+
+
+@pytest.mark.asyncio
+async def test_spool_upload_streams_and_hashes(tmp_path):
+    spooled = await spool_upload(_upload(), directory=str(tmp_path), chunk_size=64 * 1024)
+    try:
+        assert spooled.size == len(PHOTO)
+        assert spooled.sha256 == hashlib.sha256(PHOTO).hexdigest()
+        assert spooled.content_type == "image/jpeg"
+        with open(spooled.path, "rb") as f:
+            assert f.read() == PHOTO
+    finally:
+        spooled.discard()
+
+
+@pytest.mark.asyncio
+async def test_local_store_is_content_addressed(tmp_path):
+    store = LocalReferenceStore(str(tmp_path / "refs"), "http://localhost/api/references/")
+
+    urls = []
+    for _ in range(2):
+        spooled = await spool_upload(_upload(), directory=str(tmp_path))
+        urls.append(await store.put(spooled))
+        spooled.discard()
+
+    digest = hashlib.sha256(PHOTO).hexdigest()
+    assert urls[0] == urls[1] == f"http://localhost/api/references/{digest}.jpg"
+    assert os.listdir(tmp_path / "refs") == [f"{digest}.jpg"]
+
+
+def test_streaming_upload_bounds_memory_per_request():
+    results = run_benchmark(size_mb=8, concurrency=3)
+    legacy = results['legacy']['traced_peak_per_request_mb']
+    streaming = results['streaming']['traced_peak_per_request_mb']
+    print(f"\nPeak memory per request: legacy {legacy} MB, streaming {streaming} MB")
+    assert streaming * 4 < legacy
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.result_cache import ResultCache, make_cache_key
+
+
+def _key(**overrides):
+    fields = {
+        'name': 'Burma Love',
+        'description': 'Tea leaf salad special',
+        'target_audience': 'foodies',
+        'platforms': ['Instagram'],
+    }
+    fields.update(overrides)
+    return make_cache_key('abc123', **fields)
+
+
+def test_cache_key_is_normalized_and_content_addressed():
+    assert _key() == _key(description='  Tea leaf   salad special ')
+    assert _key() != _key(platforms=['LinkedIn'])
+    assert _key() != make_cache_key('def456', name='Burma Love')
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_upstream_call():
+    cache = ResultCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {'generated_images': ['https://fal.media/1.jpg']}
+
+    results = await asyncio.gather(
+        *[cache.get_or_compute(_key(), compute) for _ in range(5)]
+    )
+    assert calls == 1
+    assert all(r == results[0] for r in results)
+
+    await cache.get_or_compute(_key(), compute)
+    stats = cache.stats()
+    assert calls == 1
+    assert stats['misses'] == 1
+    assert stats['coalesced'] == 4
+    assert stats['hits'] == 1
+    assert stats['hit_rate'] == pytest.approx(5 / 6)
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached():
+    cache = ResultCache()
+
+    async def failing():
+        raise RuntimeError("Fal timeout")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_compute(_key(), failing)
+
+    async def working():
+        return {'generated_images': []}
+
+    assert await cache.get_or_compute(_key(), working) == {'generated_images': []}
+    assert cache.stats()['errors'] == 1
+
+
+@pytest.mark.asyncio
+async def test_lru_and_ttl_eviction():
+    cache = ResultCache(max_entries=2)
+    await cache.set('a', {'v': 1})
+    await cache.set('b', {'v': 2})
+    await cache.get('a')  # 'b' is now least recently used
+    await cache.set('c', {'v': 3})
+    assert await cache.get('b') is None
+    assert await cache.get('a') == {'v': 1}
+    assert cache.stats()['evictions'] == 1
+
+    expiring = ResultCache(ttl_seconds=0)
+    await expiring.set('a', {'v': 1})
+    assert await expiring.get('a') is None
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    await ResultCache(disk_path=path).set('a', {'v': 1})
+
+    restarted = ResultCache(disk_path=path)
+    assert await restarted.get('a') == {'v': 1}
+    assert restarted.stats()['disk_hits'] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
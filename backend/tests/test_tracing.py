@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import logging.handlers
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.tracing import (
+    JsonFormatter,
+    RequestContextFilter,
+    RequestTracingMiddleware,
+    StageMetrics,
+    begin_span,
+    configure_logging,
+    current_request_id,
+    shutdown_logging,
+    span,
+    stage_metrics,
+)
+
+
+def _app(sample_rate):
+    app = FastAPI()
+    app.add_middleware(RequestTracingMiddleware, sample_rate=sample_rate)
+    seen = {}
+
+    @app.get("/work")
+    async def work():
+        seen['request_id'] = current_request_id()
+        with span("test_parse"):
+            await asyncio.sleep(0.01)
+        begin_span("test_respond")
+        return {"ok": True}
+
+    return app, seen
+
+
+@pytest.mark.asyncio
+async def test_request_ids_are_propagated_and_echoed():
+    app, seen = _app(sample_rate=1.0)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/work", headers={"X-Request-ID": "abc-123"})
+        assert response.headers["x-request-id"] == "abc-123"
+        assert seen['request_id'] == "abc-123"
+
+        response = await client.get("/work")
+        assert len(response.headers["x-request-id"]) == 32
+        assert seen['request_id'] == response.headers["x-request-id"]
+
+    stages = stage_metrics.snapshot()
+    assert stages['test_parse']['count'] >= 2
+    assert stages['test_parse']['p50_ms'] >= 10
+    assert 'test_respond' in stages
+    assert 'request' in stages
+
+
+class _Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.addFilter(RequestContextFilter())
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.mark.asyncio
+async def test_unsampled_requests_only_log_warnings():
+    handler = _Collect()
+    logger = logging.getLogger("src.services.tracing")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        app, _ = _app(sample_rate=0.0)
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            await client.get("/work")
+        assert handler.records == []
+
+        app, _ = _app(sample_rate=1.0)
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            await client.get("/work", headers={"X-Request-ID": "sampled"})
+        assert {r.request_id for r in handler.records} == {"sampled"}
+        stage_record = next(r for r in handler.records if getattr(r, 'stage', None) == 'test_parse')
+        assert stage_record.duration_ms >= 10
+    finally:
+        logger.removeHandler(handler)
+
+
+def test_json_formatter_includes_extra_fields():
+    record = logging.makeLogRecord({
+        'name': 'src.api.main',
+        'levelno': logging.INFO,
+        'levelname': 'INFO',
+        'msg': "Enhanced photo for %s",
+        'args': ('Instagram',),
+        'request_id': 'abc',
+        'platform': 'Instagram',
+    })
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['message'] == "Enhanced photo for Instagram"
+    assert entry['request_id'] == 'abc'
+    assert entry['platform'] == 'Instagram'
+    assert 'args' not in entry
+
+
+def test_stage_metrics_percentiles():
+    metrics = StageMetrics(window=10)
+    for ms in range(1, 21):
+        metrics.observe("fal", ms / 1000)
+    fal = metrics.snapshot()['fal']
+    assert fal['count'] == 20
+    assert fal['max_ms'] == 20
+    # Percentiles only cover the most recent window
+    assert fal['p50_ms'] == 16
+    assert fal['p95_ms'] == 20
+
+
+def test_logging_shutdown_detaches_the_queue_handler():
+    from src.services import tracing
+
+    def queue_handlers():
+        return [h for h in logging.getLogger().handlers if isinstance(h, logging.handlers.QueueHandler)]
+
+    was_configured = tracing._listener is not None
+    level = logging.getLogger().level
+    try:
+        shutdown_logging()
+        assert queue_handlers() == []
+        configure_logging()
+        configure_logging()
+        assert len(queue_handlers()) == 1
+        shutdown_logging()
+        assert queue_handlers() == [] and tracing._listener is None
+    finally:
+        if was_configured:
+            configure_logging()
+        logging.getLogger().setLevel(level)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
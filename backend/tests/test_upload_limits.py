@@ -0,0 +1,142 @@
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from httpx import AsyncClient
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.image_preprocessor import sniff_image_format
+from src.services.reference_store import spool_upload
+from src.services.upload_limits import (
+    MultipartFileSniffer,
+    UploadLimitMiddleware,
+    UploadTooLarge,
+    UnsupportedUpload,
+)
+
+JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 60
+
+
+def _app(max_body_bytes=4096):
+    app = FastAPI()
+    app.add_middleware(
+        UploadLimitMiddleware, max_body_bytes=max_body_bytes, accept=sniff_image_format
+    )
+    calls = []
+
+    @app.post("/upload")
+    async def upload(reference_image: UploadFile = File(...)):
+        calls.append(reference_image.filename)
+        return {"ok": True}
+
+    return app, calls
+
+
+@pytest.mark.asyncio
+async def test_declared_oversize_body_is_refused_before_reading():
+    app, calls = _app()
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/upload", files={'reference_image': ('big.jpg', JPEG + b'\x00' * 8192, 'image/jpeg')}
+        )
+    assert response.status_code == 413
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_streamed_oversize_body_is_cut_off():
+    app, calls = _app()
+    received = []
+
+    async def chunks():
+        # No Content-Length: a chunked upload that never says how big it is
+        yield (
+            b'--abc\r\nContent-Disposition: form-data; name="reference_image"; '
+            b'filename="big.jpg"\r\nContent-Type: image/jpeg\r\n\r\n' + JPEG
+        )
+        for _ in range(100):
+            received.append(1)
+            yield b'x' * 1024
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/upload",
+            content=chunks(),
+            headers={'content-type': 'multipart/form-data; boundary=abc'}
+        )
+    assert response.status_code == 413
+    assert calls == []
+    assert len(received) < 10
+
+
+@pytest.mark.asyncio
+async def test_non_image_upload_is_rejected_from_the_first_bytes():
+    app, calls = _app()
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/upload", files={'reference_image': ('doc.jpg', b'%PDF-1.7' + b'\x00' * 100, 'image/jpeg')}
+        )
+        assert response.status_code == 415
+        assert calls == []
+
+        response = await client.post(
+            "/upload", files={'reference_image': ('dish.jpg', JPEG, 'image/jpeg')}
+        )
+        assert response.status_code == 200
+        assert calls == ['dish.jpg']
+
+
+def test_sniffer_handles_chunks_split_anywhere():
+    body = (
+        b'--xyz\r\nContent-Disposition: form-data; name="campaign"\r\n\r\n{"name": "a"}\r\n'
+        b'--xyz\r\nContent-Disposition: form-data; name="reference_image"; filename="a.png"\r\n'
+        b'Content-Type: image/png\r\n\r\n' + b'GIF89a' + b'\x00' * 40 + b'\r\n--xyz--\r\n'
+    )
+    for split in range(1, len(body)):
+        sniffer = MultipartFileSniffer(b'xyz', sniff_image_format)
+        results = [sniffer.feed(body[:split]), sniffer.feed(body[split:])]
+        assert all(results)
+        assert sniffer.done
+
+    sniffer = MultipartFileSniffer(b'xyz', sniff_image_format)
+    assert sniffer.feed(body.replace(b'GIF89a', b'<html>')) is False
+
+
+class _Upload:
+    def __init__(self, data, content_type='image/jpeg'):
+        self.data = data
+        self.content_type = content_type
+        self.filename = 'dish.jpg'
+        self.reads = 0
+
+    async def read(self, size):
+        self.reads += 1
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+
+@pytest.mark.asyncio
+async def test_spool_upload_enforces_limits(tmp_path):
+    upload = _Upload(JPEG * 100)
+    with pytest.raises(UploadTooLarge):
+        await spool_upload(upload, directory=str(tmp_path), chunk_size=64, max_size=1000)
+    assert upload.reads == 16
+    assert list(tmp_path.iterdir()) == []
+
+    upload = _Upload(b'not an image' * 100)
+    with pytest.raises(UnsupportedUpload):
+        await spool_upload(upload, directory=str(tmp_path), chunk_size=64, check_head=sniff_image_format)
+    assert upload.reads == 1
+
+    spooled = await spool_upload(
+        _Upload(JPEG), directory=str(tmp_path), max_size=1000, check_head=sniff_image_format
+    )
+    assert spooled.size == len(JPEG)
+    spooled.discard()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])